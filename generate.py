@@ -1,129 +1,75 @@
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import os
-from geopy.distance import geodesic
-
-in_minutes = True
-
-# Read and filter data more efficiently
-df = pd.read_csv('EnduranceKnownData.csv')
-filtered_df = df[df['Sensor'].isin(['Longitude', 'Latitude'])]
-
-# Pivot the data to have lat/lon in separate columns
-pivot_df = filtered_df.pivot_table(
-    index='Timestamp', 
-    columns='Sensor', 
-    values='Value', 
-    aggfunc='first'
-).reset_index()
-
-# Drop rows where either lat or lon is missing
-pivot_df = pivot_df.dropna(subset=['Latitude', 'Longitude'])
-
-# Convert timestamp to seconds
-pivot_df['seconds'] = pivot_df['Timestamp'] / 1000
-
-# Skip first 3 timestamps and remove duplicates by second
-pivot_df = pivot_df.iloc[3:].copy()
-pivot_df['second_int'] = pivot_df['seconds'].astype(int)
-pivot_df = pivot_df.drop_duplicates(subset=['second_int'], keep='first')
-
-# Sort by timestamp to ensure proper order
-pivot_df = pivot_df.sort_values('seconds').reset_index(drop=True)
-
-# Vectorized speed calculation using numpy
-def calculate_speeds_vectorized(df):
-    if len(df) <= 1:
-        return np.array([0])
-    
-    # Get coordinate arrays
-    coords = df[['Latitude', 'Longitude']].values
-    times = df['seconds'].values
-    
-    # Calculate distances vectorized (for small datasets, loop is still needed for geodesic)
-    speeds = np.zeros(len(df))
-    
-    for i in range(1, len(df)):
-        distance = geodesic(coords[i-1], coords[i]).meters
-        time_diff = times[i] - times[i-1]
-        speed = distance / time_diff if time_diff > 0 else 0
-        
-        # Cap unrealistic speeds
-        speeds[i] = 0 if speed > 134 else speed
-    
-    return speeds
+"""
+Speed vs time charts of a CAN log: a line, a heatmap and a scatter plot.
 
-# Calculate speeds
-speeds = calculate_speeds_vectorized(pivot_df)
-pivot_df['speed'] = speeds
+    python generate.py EnduranceKnownData.csv -o graphs
 
-# Create final dataset
-data_points = list(zip(pivot_df['seconds'], pivot_df['Latitude'], pivot_df['Longitude'], pivot_df['speed']))
-
-print(f"Processed {len(data_points)} data points")
-
-# Save speed data
-speed_df = pd.DataFrame({
-    'time': pivot_df['seconds'],
-    'speed': pivot_df['speed']
-})
-speed_df.to_csv('speed_data.csv', index=False)
-
-# Create graphs directory if it doesn't exist
-os.makedirs('./graphs', exist_ok=True)
-
-# Convert time to minutes if needed
-time_data = pivot_df['seconds'] / 60 if in_minutes else pivot_df['seconds']
-time_label = 'Time (minutes)' if in_minutes else 'Time (seconds)'
-
-# Plot speed vs time
-plt.figure(figsize=(12, 6))
-plt.plot(time_data, pivot_df['speed'], linewidth=1, alpha=0.8)
-plt.xticks(rotation=45, ticks=np.arange(0, time_data.max(), step=(5 if in_minutes else 200)))
-plt.xlabel(time_label)
-plt.ylabel('Speed (m/s)')
-plt.title('Speed vs Time')
-plt.grid(True, alpha=0.3)
-plt.xlim(time_data.min(), time_data.max())
-plt.ylim(0, max(pivot_df['speed'].max() * 1.1, 1))  # Add some margin at the top
-plt.tight_layout()
-plt.savefig('./graphs/speed_vs_time_line.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-# Create speed vs time heatmap
-plt.figure(figsize=(14, 8))
-
-# Create time bins (e.g., 10-second intervals converted to minutes if needed)
-time_min = time_data.min()
-time_max = time_data.max()
-bin_interval = (10/60) if in_minutes else 10  # 10 seconds = 1/6 minute
-time_bins = np.arange(time_min, time_max + bin_interval, bin_interval)
-speed_bins = np.arange(0, pivot_df['speed'].max() + 5, 2)  # 2 m/s intervals
-
-# Create 2D histogram
-hist, xedges, yedges = np.histogram2d(time_data, pivot_df['speed'], bins=[time_bins, speed_bins])
+The log goes through the web app's ingest stages (see gps_webapp/gps_app/
+charts.py), with its configured outlier filters, at one point per second
+by default. The processed arrays are cached under <output>/.cache, so
+redrawing an unchanged log skips the parse. Charts are drawn in parallel.
+"""
+import argparse
+import os
+import sys
+import time
 
-# Create heatmap
-plt.imshow(hist.T, origin='lower', aspect='auto', cmap='plasma', extent=[time_bins[0], time_bins[-1], speed_bins[0], speed_bins[-1]])
-plt.xticks(rotation=45, ticks=np.arange(0, time_data.max(), step=(5 if in_minutes else 200)))
-plt.colorbar(label='Frequency')
-plt.xlabel(time_label)
-plt.ylabel('Speed (m/s)')
-plt.title('Speed vs Time Heatmap')
-plt.tight_layout()
-plt.savefig('./graphs/speed_vs_time_heatmap.png', dpi=300, bbox_inches='tight')
-plt.close()
+import numpy as np
+import pandas as pd
 
-# Alternative: Scatter plot with color-coded time progression
-plt.figure(figsize=(12, 6))
-scatter = plt.scatter(time_data, pivot_df['speed'], c=time_data, cmap='viridis', alpha=0.6, s=10)
-plt.xticks(rotation=45, ticks=np.arange(0, time_data.max(), step=(5 if in_minutes else 200)))
-plt.colorbar(scatter, label=time_label)
-plt.xlabel(time_label)
-plt.ylabel('Speed (m/s)')
-plt.title('Speed vs Time (Color-coded by Time Progression)')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.savefig('./graphs/speed_vs_time_scatter.png', dpi=300, bbox_inches='tight')
-plt.close()
\ No newline at end of file
+# Share the ingest pipeline with the Django app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gps_webapp'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gps_tracker.settings')
+
+
+def parse_args(argv=None):
+    from gps_app.charts import CHARTS, DPI
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('log', help="CAN log (.csv, .csv.gz, .csv.zst or .parquet)")
+    parser.add_argument('-o', '--output', default='graphs', help="Directory for the charts (default: graphs)")
+    parser.add_argument('--charts', nargs='+', choices=CHARTS, default=list(CHARTS),
+                        help="Charts to draw (default: all)")
+    parser.add_argument('--time-resolution', type=int, default=1,
+                        help="Points per second kept, 0 for every fix (default: 1)")
+    parser.add_argument('--filters', help="Outlier filter chain (default: GPS_OUTLIER_FILTERS)")
+    parser.add_argument('--dpi', type=int, default=DPI, help=f"Resolution of the charts (default: {DPI})")
+    parser.add_argument('--seconds', action='store_true', help="Time axis in seconds rather than minutes")
+    parser.add_argument('--speed-csv', help="Also write the time and speed of every point to this CSV")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes drawing charts (default: one per chart, up to the CPU count)")
+    parser.add_argument('--cache-dir', help="Where processed logs are cached (default: <output>/.cache)")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor write the cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import django
+    django.setup()
+    from gps_app.charts import load_series, matplotlib_available, render_charts
+    from gps_app.outliers import parse_filters
+
+    if not matplotlib_available():
+        sys.exit("matplotlib is required to draw the charts: pip install matplotlib")
+    start = time.perf_counter()
+    cache_dir = None if args.no_cache else (args.cache_dir or os.path.join(args.output, '.cache'))
+    try:
+        filters = ','.join(parse_filters(args.filters)) if args.filters is not None else None
+        series, cached = load_series(args.log, time_resolution=args.time_resolution, filters=filters,
+                                     cache_dir=cache_dir)
+    except (OSError, ValueError) as e:
+        sys.exit(f"{args.log}: {e}")
+    loaded = time.perf_counter() - start
+    print(f"Processed {len(series['seconds'])} data points in {loaded:.2f}s{' (cached)' if cached else ''}")
+
+    if args.speed_csv:
+        pd.DataFrame({'time': series['seconds'], 'speed': series['speed']}).to_csv(args.speed_csv, index=False)
+
+    for chart, path, seconds in render_charts(series, args.output, charts=args.charts, dpi=args.dpi,
+                                              in_minutes=not args.seconds, workers=args.workers):
+        print(f"{chart}: {path} ({seconds:.2f}s)")
+    print(f"Done in {time.perf_counter() - start:.2f}s, max speed {np.max(series['speed']):.1f} m/s")
+
+
+if __name__ == '__main__':
+    main()
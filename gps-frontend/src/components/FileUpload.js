@@ -2,24 +2,77 @@ import React, { useRef, useState } from 'react';
 import axios from 'axios';
 import './FileUpload.css';
 
+const API_URL = 'http://localhost:8000/api';
+const POLL_INTERVAL_MS = 1000;
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+const LOG_SUFFIX = /\.(csv|csv\.gz|csv\.zst|parquet)$/i;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 const FileUpload = ({ onTrackUpload, loading, setLoading }) => {
   const fileInputRef = useRef(null);
   const [uploadProgress, setUploadProgress] = useState(0);
+  const [processingStage, setProcessingStage] = useState('');
   const [timeResolution, setTimeResolution] = useState(2);
 
+  // Poll the processing job until it finishes, then return the processed track
+  const waitForProcessing = async (trackId) => {
+    for (;;) {
+      const { data: job } = await axios.get(`${API_URL}/tracks/${trackId}/status/`);
+      if (job.status === 'succeeded') {
+        const { data: track } = await axios.get(`${API_URL}/tracks/${trackId}/?include=points`);
+        return track;
+      }
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        throw new Error(job.message || `Processing ${job.status}`);
+      }
+      setProcessingStage(job.stage);
+      await sleep(POLL_INTERVAL_MS);
+    }
+  };
+
+  // Send the file in chunks; a failed chunk is retried from the offset the server reports
+  const uploadInChunks = async (file) => {
+    const { data: upload } = await axios.post(`${API_URL}/uploads/`, {
+      name: file.name.replace(LOG_SUFFIX, ''),
+      filename: file.name,
+      size: file.size,
+      time_resolution: timeResolution,
+    });
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + CHUNK_SIZE);
+      try {
+        const { data } = await axios.put(
+          `${API_URL}/uploads/${upload.upload_id}/chunk/?offset=${offset}`,
+          chunk,
+          { headers: { 'Content-Type': 'application/octet-stream' } }
+        );
+        offset = data.offset;
+        failures = 0;
+      } catch (error) {
+        failures += 1;
+        if (failures > CHUNK_RETRIES) throw error;
+        await sleep(POLL_INTERVAL_MS * failures);
+        const { data } = await axios.get(`${API_URL}/uploads/${upload.upload_id}/`);
+        offset = data.offset;
+      }
+      setUploadProgress(Math.round((offset * 100) / file.size));
+    }
+
+    const { data } = await axios.post(`${API_URL}/uploads/${upload.upload_id}/finalize/`);
+    return data;
+  };
+
   const handleFileSelect = async (event) => {
     const file = event.target.files[0];
     if (!file) return;
 
-    if (!file.name.toLowerCase().endsWith('.csv')) {
-      alert('Please select a CSV file');
-      return;
-    }
-
-    // Check file size (500MB limit)
-    const maxSize = 500 * 1024 * 1024; // 500MB
-    if (file.size > maxSize) {
-      alert('File is too large. Maximum size is 300MB.');
+    if (!LOG_SUFFIX.test(file.name)) {
+      alert('Please select a .csv, .csv.gz, .csv.zst or .parquet log');
       return;
     }
 
@@ -27,41 +80,23 @@ const FileUpload = ({ onTrackUpload, loading, setLoading }) => {
     setUploadProgress(0);
 
     try {
-      const formData = new FormData();
-      formData.append('uploaded_file', file);
-      formData.append('name', file.name.replace('.csv', ''));
-      formData.append('time_resolution', timeResolution);
-
-      const response = await axios.post(
-        'http://localhost:8000/api/tracks/upload/',
-        formData,
-        {
-          headers: {
-            'Content-Type': 'multipart/form-data',
-          },
-          timeout: 300000, // 5 minute timeout for large files
-          onUploadProgress: (progressEvent) => {
-            const percentCompleted = Math.round(
-              (progressEvent.loaded * 100) / progressEvent.total
-            );
-            setUploadProgress(percentCompleted);
-          },
-        }
-      );
+      const response = await uploadInChunks(file);
 
-      onTrackUpload(response.data.track);
       setUploadProgress(100);
+      const track = await waitForProcessing(response.track.id);
+      onTrackUpload(track);
       
     } catch (error) {
       console.error('Upload error:', error);
       if (error.code === 'ECONNABORTED') {
         alert('Upload timeout. Please try with a smaller file or check your connection.');
       } else {
-        alert(error.response?.data?.error || 'Failed to upload file');
+        alert(error.response?.data?.error || error.message || 'Failed to upload file');
       }
     } finally {
       setLoading(false);
       setUploadProgress(0);
+      setProcessingStage('');
     }
   };
 
@@ -70,7 +105,7 @@ const FileUpload = ({ onTrackUpload, loading, setLoading }) => {
       <div className="upload-area">
         <div className="upload-content">
           <h3>Upload GPS Data</h3>
-          <p>Select a CSV file</p>
+          <p>Select a CSV (optionally .gz/.zst) or Parquet log</p>
           
           {/* Time Resolution Setting */}
           <div className="time-resolution-setting">
@@ -98,7 +133,7 @@ const FileUpload = ({ onTrackUpload, loading, setLoading }) => {
           <input
             ref={fileInputRef}
             type="file"
-            accept=".csv"
+            accept=".csv,.gz,.zst,.parquet"
             onChange={handleFileSelect}
             style={{ display: 'none' }}
           />
@@ -113,7 +148,7 @@ const FileUpload = ({ onTrackUpload, loading, setLoading }) => {
                 <span className="loading-spinner"></span>
                 {uploadProgress > 0 && uploadProgress < 100 ? 
                   `Uploading... ${uploadProgress}%` : 
-                  'Processing...'
+                  `Processing${processingStage ? ` (${processingStage})` : ''}...`
                 }
               </>
             ) : (
@@ -1,14 +1,14 @@
 from django.contrib import admin
-from .models import GPSTrack, GPSPoint
+from .models import GPSTrack, GPSPoint, Lap, ProcessingJob
 
 @admin.register(GPSTrack)
 class GPSTrackAdmin(admin.ModelAdmin):
     list_display = ('name', 'uploaded_at', 'processed', 'total_points', 'duration', 'max_speed')
-    list_filter = ('processed', 'uploaded_at')
+    list_filter = ('processed', 'live', 'uploaded_at')
     search_fields = ('name',)
     readonly_fields = ('id', 'uploaded_at', 'processed', 'total_points', 'duration', 
                       'max_speed', 'avg_speed', 'min_latitude', 'max_latitude', 
-                      'min_longitude', 'max_longitude')
+                      'min_longitude', 'max_longitude', 'lap_gate', 'lap_gate_detected')
 
 @admin.register(GPSPoint)
 class GPSPointAdmin(admin.ModelAdmin):
@@ -17,3 +17,20 @@ class GPSPointAdmin(admin.ModelAdmin):
     search_fields = ('track__name',)
     readonly_fields = ('track', 'latitude', 'longitude', 'timestamp', 'speed', 
                       'original_timestamp', 'altitude')
+
+@admin.register(Lap)
+class LapAdmin(admin.ModelAdmin):
+    list_display = ('track', 'number', 'lap_time', 'distance', 'max_speed', 'avg_speed')
+    list_filter = ('track',)
+    search_fields = ('track__name',)
+    readonly_fields = ('track', 'number', 'start_time', 'end_time', 'lap_time', 'distance', 'start_index',
+                      'end_index', 'max_speed', 'avg_speed', 'min_speed', 'sectors')
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('track', 'status', 'stage', 'progress', 'attempt', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('track__name',)
+    readonly_fields = ('id', 'track', 'status', 'stage', 'progress', 'message', 'time_resolution',
+                      'outlier_std_multiplier', 'outlier_filters', 'filter_stats', 'attempt', 'cancel_requested', 'cpu_seconds', 'reused_from',
+                      'saved_cpu_seconds', 'saved_bytes', 'created_at', 'started_at', 'finished_at')
@@ -0,0 +1,83 @@
+"""
+Aggregate grids over several tracks, for comparing runs on one course.
+
+Every processed track's per-cell aggregates (grids.CellGrid) are stored at
+ingest as MEDIA_ROOT/gps_grids/<track id>.npz. Aggregating a set of tracks
+merges their grids, so it costs about as much as reading them: points are
+never rescanned. Tracks processed before grids existed get theirs built
+and stored on first use.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+
+from . import storage
+from .geodesy import WGS84_A
+from .grids import GRID_ZOOM, SPEED_BIN, CellGrid
+
+DEFAULT_PERCENTILES = (50, 90)
+
+
+def grid_zoom():
+    return getattr(settings, 'GPS_GRID_ZOOM', GRID_ZOOM)
+
+
+def build_track_grid(track, lats, lons, timestamps, speeds):
+    """Compute and store the grid of track's points. Returns it."""
+    grid = CellGrid.from_points(lats, lons, timestamps, speeds, zoom=grid_zoom())
+    storage.write_grid(track, grid.to_arrays())
+    return grid
+
+
+def track_grid(track):
+    """The stored grid of a processed track, built from its points if missing or at another zoom"""
+    arrays = storage.read_grid(track)
+    if arrays is not None and int(arrays['zoom']) == grid_zoom():
+        return CellGrid.from_arrays(arrays)
+    points = storage.load_point_arrays(track, ['timestamp', 'latitude', 'longitude', 'speed'])
+    return build_track_grid(track, points['latitude'], points['longitude'], points['timestamp'],
+                            points['speed'])
+
+
+def _json_values(values):
+    # NaN (no speed recorded in the cell) is null
+    values = np.asarray(values, dtype=np.float64)
+    return [None if value != value else value for value in values.tolist()]
+
+
+def aggregate(tracks, zoom=None, bbox=None, percentiles=DEFAULT_PERCENTILES):
+    """
+    Merged grid of tracks as a JSON-ready dict of per-cell columns: pixel
+    x/y at zoom, center latitude/longitude, sample count, dwell seconds,
+    mean and max speed and the requested speed percentiles (m/s)
+    """
+    grid = CellGrid.merge([track_grid(track) for track in tracks], zoom=zoom)
+    if bbox is not None:
+        grid = grid.crop(*bbox)
+    x, y = grid.pixels()
+    lats, lons = grid.cell_centers()
+    cells = {
+        'x': x.tolist(),
+        'y': y.tolist(),
+        'latitude': lats.tolist(),
+        'longitude': lons.tolist(),
+        'count': grid.count.tolist(),
+        'dwell': grid.dwell.tolist(),
+        'mean_speed': _json_values(grid.mean_speed()),
+        'max_speed': _json_values(grid.speed_max),
+    }
+    for q in percentiles:
+        cells[f'p{q:g}_speed'] = _json_values(grid.speed_percentile(q))
+    # Pixel size at the grid's latitude
+    latitude = float(np.mean(lats)) if len(lats) else 0.0
+    cell_size = 2 * math.pi * WGS84_A * math.cos(math.radians(latitude)) / (256 * 2 ** grid.zoom)
+    return {
+        'tracks': [str(track.id) for track in tracks],
+        'zoom': grid.zoom,
+        'cell_size': cell_size,
+        'speed_bin': SPEED_BIN,
+        'cell_count': len(grid),
+        'point_count': int(grid.count.sum()),
+        'cells': cells,
+    }
@@ -0,0 +1,172 @@
+"""
+Import of many CAN logs at once, see ``manage.py import_tracks``.
+
+Files are hashed first (in parallel), and any whose SHA-256 is already
+the content_hash of a processed track is skipped, as is every repeat of a
+file within the batch. The rest go through the pipeline of
+utils.process_gps_csv in a pool of worker processes: parse, outlier
+filters, resample and speeds, then derive.derive_track() for the
+statistics, laps, distributions, polylines and grid. Workers never touch
+the database. Their results come back to the calling process, the single
+writer, which stores them as tracks (utils.store_derived) in transactions
+of about transaction_points points each.
+
+Workers are spawned, not forked, and set Django up themselves (see
+import_worker.py), so they don't share the parent's database connections.
+"""
+import glob
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import bulkload, import_worker, storage
+from .ingest import format_from_name
+from .models import GPSTrack, ProcessingJob
+from .utils import align_tolerance, derive_params, speed_method, store_derived
+
+logger = logging.getLogger(__name__)
+
+# Points written per transaction
+TRANSACTION_POINTS = 2_000_000
+
+
+def find_logs(patterns):
+    """Log files (by their suffix) under the given directories or matching the globs, sorted"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*')
+        paths.update(path for path in glob.glob(pattern, recursive=True)
+                     if os.path.isfile(path) and format_from_name(path) is not None)
+    return sorted(paths)
+
+
+class TrackWriter:
+    """Stores computed logs as processed tracks, several per transaction"""
+
+    def __init__(self, time_resolution, filters, std_multiplier, transaction_points=TRANSACTION_POINTS):
+        self.time_resolution = time_resolution
+        self.filters = filters
+        self.std_multiplier = std_multiplier
+        self.transaction_points = transaction_points
+        self.backend = storage.default_backend()
+        self.align_tolerance = align_tolerance()
+        self.speed_method = speed_method()
+        self._pending = []
+        self._pending_points = 0
+        self.tracks = []
+
+    def add(self, path, content_hash, result):
+        self._pending.append((path, content_hash, result))
+        self._pending_points += result['stats']['total_points']
+        if self._pending_points >= self.transaction_points:
+            self.flush()
+
+    def flush(self):
+        """Write the pending tracks in one transaction. Returns them."""
+        pending, self._pending, self._pending_points = self._pending, [], 0
+        if not pending:
+            return []
+        written_files, columnar, tracks = [], [], []
+        try:
+            with transaction.atomic():
+                for path, content_hash, result in pending:
+                    track = self._write(path, content_hash, result, written_files, columnar)
+                    tracks.append(track)
+        except Exception:
+            for track in columnar:
+                storage.delete_columnar(track)
+            for name in written_files:
+                default_storage.delete(name)
+            raise
+        # Grids are files of their own, derived from points now committed
+        for track, (_, _, result) in zip(tracks, pending):
+            storage.write_grid(track, result['grid'])
+        self.tracks.extend(tracks)
+        return tracks
+
+    def _write(self, path, content_hash, result, written_files, columnar):
+        track = GPSTrack(
+            name=os.path.splitext(os.path.basename(path))[0], content_hash=content_hash, processed=True,
+            point_storage=self.backend, time_resolution=self.time_resolution,
+            outlier_std_multiplier=self.std_multiplier, outlier_filters=self.filters,
+            align_tolerance_ms=self.align_tolerance, speed_method=self.speed_method,
+        )
+        with open(path, 'rb') as f:
+            track.uploaded_file.save(os.path.basename(path), File(f), save=False)
+        written_files.append(track.uploaded_file.name)
+        track.save()
+        if self.backend == storage.COLUMNAR:
+            storage.write_columnar(track, result['columns'])
+            columnar.append(track)
+        else:
+            bulkload.insert_points(track, result['columns'])
+        store_derived(track, result)
+        now = timezone.now()
+        ProcessingJob.objects.create(
+            track=track, status=ProcessingJob.SUCCEEDED, progress=1.0, message=f"Imported from {path}",
+            time_resolution=self.time_resolution, outlier_std_multiplier=self.std_multiplier,
+            outlier_filters=self.filters, filter_stats=result['filter_stats'],
+            cpu_seconds=result['cpu_seconds'], started_at=now, finished_at=now,
+        )
+        return track
+
+
+def import_logs(paths, time_resolution, filters, std_multiplier, workers=None,
+                transaction_points=TRANSACTION_POINTS, progress=None):
+    """
+    Import the log files at paths as processed tracks. progress, if given,
+    is called with (path, status, detail) as each file is hashed and
+    skipped, imported or fails. Returns a summary dict.
+    """
+    progress = progress or (lambda path, status, detail: None)
+    start = time.perf_counter()
+    summary = {'files': len(paths), 'imported': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'points': 0}
+    writer = TrackWriter(time_resolution, filters, std_multiplier, transaction_points)
+    workers = max(min(workers or os.cpu_count() or 1, len(paths)), 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=import_worker.setup) as pool:
+        hashes = dict(pool.map(import_worker.file_hash, paths))
+        known = set(GPSTrack.objects.filter(content_hash__in=set(hashes.values()), processed=True)
+                    .values_list('content_hash', flat=True))
+        todo, seen = [], {}
+        for path in paths:
+            content_hash = hashes[path]
+            if content_hash in known or content_hash in seen:
+                summary['skipped'] += 1
+                detail = f"same as {seen[content_hash]}" if content_hash in seen else "already imported"
+                progress(path, 'skipped', f"{detail} ({content_hash[:12]})")
+                continue
+            seen[content_hash] = path
+            todo.append(path)
+
+        worker_settings = dict(derive_params(), tolerance=writer.align_tolerance, speed_method=writer.speed_method)
+        futures = {pool.submit(import_worker.compute_log, path, time_resolution, filters, std_multiplier,
+                               worker_settings): path
+                   for path in todo}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                summary['failed'] += 1
+                progress(path, 'failed', str(e))
+                continue
+            writer.add(path, hashes[path], result)
+            summary['imported'] += 1
+            summary['bytes'] += os.path.getsize(path)
+            summary['points'] += result['stats']['total_points']
+            progress(path, 'imported', f"{result['stats']['total_points']} points, {result['cpu_seconds']:.2f}s CPU")
+    writer.flush()
+    summary['seconds'] = time.perf_counter() - start
+    summary['tracks'] = [str(track.id) for track in writer.tracks]
+    logger.info("Imported %d of %d logs (%d skipped, %d failed) in %.1fs",
+                summary['imported'], summary['files'], summary['skipped'], summary['failed'], summary['seconds'])
+    return summary
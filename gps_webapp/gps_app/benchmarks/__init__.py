@@ -0,0 +1,37 @@
+"""
+Benchmarks for the GPS processing pipeline.
+
+Run with ``python manage.py benchmark <name>``. Each module listed in
+BENCHMARKS provides ``help``, ``add_arguments(parser)`` and
+``run(options, out)``. Modules are imported lazily so benchmarks that spawn
+worker processes don't drag Django models into them.
+"""
+from importlib import import_module
+
+BENCHMARKS = {
+    'ingest': 'gps_app.benchmarks.ingest',
+    'speeds': 'gps_app.benchmarks.speeds',
+    'storage': 'gps_app.benchmarks.storage',
+    'polyline': 'gps_app.benchmarks.polyline',
+    'heatmap': 'gps_app.benchmarks.heatmap',
+    'wire': 'gps_app.benchmarks.wire',
+    'bulkload': 'gps_app.benchmarks.bulkload',
+    'upload': 'gps_app.benchmarks.upload',
+    'formats': 'gps_app.benchmarks.formats',
+    'dedup': 'gps_app.benchmarks.dedup',
+    'resample': 'gps_app.benchmarks.resample',
+    'align': 'gps_app.benchmarks.align',
+    'outliers': 'gps_app.benchmarks.outliers',
+    'spatial': 'gps_app.benchmarks.spatial',
+    'pagination': 'gps_app.benchmarks.pagination',
+    'aggregate': 'gps_app.benchmarks.aggregate',
+    'laps': 'gps_app.benchmarks.laps',
+    'live': 'gps_app.benchmarks.live',
+    'import': 'gps_app.benchmarks.batch_import',
+    'distributions': 'gps_app.benchmarks.distributions',
+    'charts': 'gps_app.benchmarks.charts',
+}
+
+
+def load_benchmark(name):
+    return import_module(BENCHMARKS[name])
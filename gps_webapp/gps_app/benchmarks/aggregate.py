@@ -0,0 +1,70 @@
+"""
+Multi-track aggregate grids: merging the grids stored at ingest vs
+rescanning every point of every track.
+
+Tracks are synthetic laps of the same course (columnar, in a throwaway
+MEDIA_ROOT), each with its own noise and speeds. The merge path is what
+/api/aggregate/ runs; the rescan builds one grid from all the points.
+"""
+import tempfile
+import time
+
+import numpy as np
+from django.test import override_settings
+
+from .. import aggregates, storage
+from ..grids import CellGrid
+from ..models import GPSTrack
+from .synthetic import synthetic_track
+
+help = "Seconds to aggregate N tracks from stored grids vs rescanning their points"
+
+
+def add_arguments(parser):
+    parser.add_argument('--tracks', type=int, default=100,
+                        help="Number of tracks (default: 100)")
+    parser.add_argument('--points', type=int, default=100_000,
+                        help="Points per track (default: 100000)")
+
+
+def run(options, out):
+    n_tracks, n = options['tracks'], options['points']
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        tracks = []
+        build_seconds = 0.0
+        try:
+            for seed in range(n_tracks):
+                timestamps, lats, lons = synthetic_track(n, seed=seed)
+                speeds = np.random.default_rng(seed).random(n) * 40
+                track = GPSTrack.objects.create(name='aggregate benchmark', uploaded_file='', processed=True,
+                                                total_points=n, point_storage=storage.COLUMNAR)
+                storage.write_columnar(track, {'timestamp': timestamps / 1000, 'latitude': lats,
+                                               'longitude': lons, 'speed': speeds})
+                start = time.perf_counter()
+                grid = aggregates.build_track_grid(track, lats, lons, timestamps / 1000, speeds)
+                build_seconds += time.perf_counter() - start
+                tracks.append(track)
+            out(f"{n_tracks} tracks x {n} points, {len(grid)} cells and "
+                f"{storage.read_grid(track) and sum(a.nbytes for a in storage.read_grid(track).values()) / 1e3:.0f} kB "
+                f"per grid, built at ingest in {build_seconds / n_tracks * 1000:.1f} ms per track")
+
+            start = time.perf_counter()
+            merged = aggregates.aggregate(tracks)
+            merge_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            columns = [storage.load_point_arrays(track, ['timestamp', 'latitude', 'longitude', 'speed'])
+                       for track in tracks]
+            rescan = CellGrid.from_points(*(np.concatenate([c[name] for c in columns])
+                                            for name in ('latitude', 'longitude', 'timestamp', 'speed')))
+            for q in aggregates.DEFAULT_PERCENTILES:
+                rescan.speed_percentile(q)
+            rescan_seconds = time.perf_counter() - start
+
+            assert merged['point_count'] == int(rescan.count.sum())
+            out(f"{'method':<16} {'seconds':>8} {'cells':>8}")
+            out(f"{'merge grids':<16} {merge_seconds:>8.3f} {merged['cell_count']:>8}")
+            out(f"{'rescan points':<16} {rescan_seconds:>8.3f} {len(rescan):>8}")
+        finally:
+            for track in tracks:
+                track.delete()
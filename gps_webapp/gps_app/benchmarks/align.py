@@ -0,0 +1,78 @@
+"""
+Lining up Latitude and Longitude frames into fixes: pivot_table and the
+groupby/unstack the streaming reader used, vs the sort-merge join of
+ingest.align_sensor_streams().
+
+A second pass offsets each Longitude frame by a few ms, as happens when
+the two CAN frames of a fix arrive apart: exact matching loses those
+fixes, a nearest-timestamp join with a tolerance keeps them.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from ..ingest import align_sensor_streams, gps_fixes
+from .synthetic import synthetic_track
+
+help = "Seconds to align GPS sensor rows: pivot_table vs sort-merge join"
+
+
+def add_arguments(parser):
+    parser.add_argument('--fixes', type=int, default=2_000_000,
+                        help="Number of GPS fixes (default: 2000000)")
+    parser.add_argument('--jitter-ms', type=int, default=4,
+                        help="Largest Longitude offset of the jittered pass (default: 4)")
+
+
+def _gps_rows(timestamps, lat, lon, lon_offset):
+    n = len(timestamps)
+    return pd.DataFrame({
+        'Timestamp': np.concatenate([timestamps, timestamps + lon_offset]).astype(np.float64),
+        'Sensor': np.repeat(['Latitude', 'Longitude'], n),
+        'Value': np.concatenate([lat, lon]),
+    }).sort_values('Timestamp', kind='stable', ignore_index=True)
+
+
+def _pivot_table(rows):
+    pivot = rows.pivot_table(index='Timestamp', columns='Sensor', values='Value', aggfunc='first')
+    return pivot.dropna().reset_index()
+
+
+def _groupby_unstack(rows):
+    pivot = rows.groupby(['Timestamp', 'Sensor'], sort=False)['Value'].first().unstack('Sensor')
+    return pivot.sort_index().dropna().reset_index()
+
+
+def _timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def run(options, out):
+    n = options['fixes']
+    timestamps, lat, lon = synthetic_track(n, rate_hz=20)
+
+    rows = _gps_rows(timestamps, lat, lon, 0)
+    out(f"{n} fixes, {len(rows)} GPS rows")
+    out(f"{'method':<28} {'seconds':>8} {'fixes':>9}")
+    results = {}
+    for name, function in [
+        ('pivot_table', lambda: _pivot_table(rows)),
+        ('groupby + unstack', lambda: _groupby_unstack(rows)),
+        ('sort-merge', lambda: gps_fixes(rows['Timestamp'], rows['Sensor'], rows['Value'])),
+    ]:
+        elapsed, result = _timed(function)
+        results[name] = result
+        out(f"{name:<28} {elapsed:>8.3f} {len(result):>9}")
+    same = np.array_equal(results['pivot_table'][['Latitude', 'Longitude']].to_numpy(),
+                          results['sort-merge'][['Latitude', 'Longitude']].to_numpy())
+    out(f"sort-merge matches pivot_table: {same}")
+
+    offsets = np.random.default_rng(0).integers(0, options['jitter_ms'] + 1, n)
+    lon_t = timestamps + offsets
+    out(f"\nLongitude frames 0-{options['jitter_ms']} ms late")
+    for tolerance in (0, options['jitter_ms']):
+        elapsed, (t, _, _) = _timed(lambda: align_sensor_streams(timestamps, lat, lon_t, lon, tolerance=tolerance))
+        out(f"{f'sort-merge, tolerance {tolerance} ms':<28} {elapsed:>8.3f} {len(t):>9}")
@@ -0,0 +1,50 @@
+"""
+Scaling of ``manage.py import_tracks``: a directory of synthetic logs
+imported with 1, 2, 4 and 8 worker processes.
+
+Each run imports every log into the configured database, under a
+throwaway MEDIA_ROOT, and its tracks are deleted before the next one, so
+no run skips files as already imported. Speedup is relative to one worker;
+it can't exceed the number of CPUs, nor what the single writer sustains.
+"""
+import os
+import tempfile
+
+from django.test import override_settings
+
+from ..batch_import import find_logs, import_logs
+from ..models import GPSTrack
+from ..utils import outlier_filters, outlier_std_multiplier
+from .synthetic import write_can_log
+
+help = "Files/s and MB/s of the parallel batch import at 1, 2, 4 and 8 workers"
+
+
+def add_arguments(parser):
+    parser.add_argument('--files', type=int, default=16,
+                        help="Synthetic logs in the directory (default: 16)")
+    parser.add_argument('--size-mb', type=int, default=10,
+                        help="Size of each log (default: 10)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Worker counts to run (default: 1 2 4 8)")
+
+
+def run(options, out):
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        log_dir = os.path.join(media_root, 'logs')
+        os.makedirs(log_dir)
+        for i in range(options['files']):
+            write_can_log(os.path.join(log_dir, f'run{i:03d}.csv'), size_mb=options['size_mb'], seed=i)
+        paths = find_logs([log_dir])
+        out(f"{len(paths)} logs of {options['size_mb']} MB, {os.cpu_count()} CPU(s)")
+        out(f"{'workers':>7} {'wall s':>7} {'files/s':>8} {'MB/s':>7} {'points/s':>10} {'speedup':>8}")
+
+        baseline = None
+        for workers in options['workers']:
+            summary = import_logs(paths, 5, outlier_filters(), outlier_std_multiplier(), workers=workers)
+            GPSTrack.objects.filter(id__in=summary['tracks']).delete()
+            seconds = summary['seconds']
+            baseline = baseline or seconds
+            out(f"{workers:>7} {seconds:>7.2f} {summary['imported'] / seconds:>8.2f} "
+                f"{summary['bytes'] / 1e6 / seconds:>7.1f} {summary['points'] / seconds:>10.0f} "
+                f"{baseline / seconds:>7.2f}x")
@@ -0,0 +1,50 @@
+"""
+GPSPoint insert throughput: bulk_create() of model instances vs the
+bulkload fast path (COPY on PostgreSQL, executemany on SQLite).
+
+Uses the configured database, so point DATABASES at PostgreSQL to measure
+COPY. Each run is one transaction, as in process_gps_csv; the benchmark
+track is deleted afterwards.
+"""
+import time
+
+from django.db import connection, transaction
+
+from .. import bulkload
+from ..models import GPSTrack
+from .storage import _arrays, _write_rows
+
+help = "Rows/s of ORM bulk_create vs COPY/executemany point inserts"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, action='append',
+                        help="Track sizes to test (repeatable, default: 100000 and 5000000)")
+    parser.add_argument('--skip-orm', action='store_true',
+                        help="Only time the fast path (bulk_create at 5M points needs several GB)")
+
+
+def _timed_insert(write, n):
+    track = GPSTrack.objects.create(name='bulkload benchmark', uploaded_file='', total_points=n)
+    try:
+        start = time.perf_counter()
+        with transaction.atomic():
+            write(track)
+        return time.perf_counter() - start
+    finally:
+        track.delete()
+
+
+def run(options, out):
+    sizes = options['points'] or [100_000, 5_000_000]
+    out(f"Database: {connection.vendor}")
+    out(f"{'points':>9} {'method':>12} {'seconds':>8} {'rows/s':>10}")
+
+    for n in sizes:
+        arrays = _arrays(n)
+        methods = [('bulkload', lambda track: bulkload.insert_points(track, arrays))]
+        if not options['skip_orm']:
+            methods.insert(0, ('bulk_create', lambda track: _write_rows(track, arrays)))
+        for name, write in methods:
+            elapsed = _timed_insert(write, n)
+            out(f"{n:>9} {name:>12} {elapsed:8.2f} {n / elapsed:10.0f}")
@@ -0,0 +1,87 @@
+"""
+generate.py end to end on a large synthetic log: the old script's flow
+(whole-file read_csv, one fix per second, the three charts drawn one after
+another from every point) vs gps_app.charts with a cold and a warm cache.
+
+Both keep one point per second. --time-resolution raises that for the new
+flow, to show what downsampling to the output's pixels saves. Without
+matplotlib only the processing is timed.
+"""
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from .. import charts
+from ..geodesy import calculate_speeds
+from ..histograms import summarize
+from ..ingest import gps_fixes
+from .synthetic import write_can_log
+
+help = "Seconds for generate.py's charts: old serial full-resolution flow vs cached, parallel, downsampled"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, default=500,
+                        help="Size of the synthetic CSV log (default: 500)")
+    parser.add_argument('--time-resolution', type=int, default=1,
+                        help="Points per second of the new flow (default: 1)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Render processes of the new flow (default: one per chart, up to the CPU count)")
+
+
+def legacy_series(path):
+    """The series as the old generate.py derived it"""
+    df = pd.read_csv(path)
+    filtered_df = df[df['Sensor'].isin(['Longitude', 'Latitude'])]
+    pivot_df = gps_fixes(filtered_df['Timestamp'], filtered_df['Sensor'], filtered_df['Value'])
+    pivot_df['seconds'] = pivot_df['Timestamp'] / 1000
+    pivot_df = pivot_df.iloc[3:].copy()
+    pivot_df['second_int'] = pivot_df['seconds'].astype(int)
+    pivot_df = pivot_df.drop_duplicates(subset=['second_int'], keep='first')
+    pivot_df = pivot_df.sort_values('seconds').reset_index(drop=True)
+    speeds = calculate_speeds(pivot_df['Latitude'].values, pivot_df['Longitude'].values, pivot_df['seconds'].values)
+    return {'seconds': pivot_df['seconds'].to_numpy(), 'speed': speeds}
+
+
+def legacy_render(series, output_dir):
+    """Every point of every chart, one chart after another"""
+    os.makedirs(output_dir, exist_ok=True)
+    for chart in charts.CHARTS:
+        data = {'in_minutes': True, 'time_max': float(series['seconds'].max()),
+                'speed_max': float(series['speed'].max()), **series}
+        if chart == 'heatmap':
+            data['summary'] = summarize(series['seconds'], series['speed'])
+        charts.render_chart(chart, data, os.path.join(output_dir, charts.FILENAMES[chart]))
+
+
+def run(options, out):
+    can_render = charts.matplotlib_available()
+    if not can_render:
+        out("matplotlib is not installed: rendering skipped, processing timed only")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'log.csv')
+        write_can_log(path, size_mb=options['size_mb'])
+        out(f"{os.path.getsize(path) / 1e6:.0f} MB log, {os.cpu_count()} CPU(s)")
+        out(f"{'flow':<20} {'process s':>10} {'render s':>9} {'total s':>8} {'points':>9}")
+
+        start = time.perf_counter()
+        series = legacy_series(path)
+        processed = time.perf_counter()
+        if can_render:
+            legacy_render(series, os.path.join(directory, 'legacy'))
+        rendered = time.perf_counter()
+        out(f"{'old generate.py':<20} {processed - start:>10.2f} {rendered - processed:>9.2f} "
+            f"{rendered - start:>8.2f} {len(series['seconds']):>9}")
+
+        cache_dir = os.path.join(directory, 'cache')
+        for label in ('cold cache', 'warm cache'):
+            start = time.perf_counter()
+            series, _ = charts.load_series(path, time_resolution=options['time_resolution'], cache_dir=cache_dir)
+            processed = time.perf_counter()
+            if can_render:
+                charts.render_charts(series, os.path.join(directory, 'charts'), workers=options['workers'])
+            rendered = time.perf_counter()
+            out(f"{label:<20} {processed - start:>10.2f} {rendered - processed:>9.2f} "
+                f"{rendered - start:>8.2f} {len(series['seconds']):>9}")
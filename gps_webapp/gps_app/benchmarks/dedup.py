@@ -0,0 +1,60 @@
+"""
+Re-uploads of the same log: job time and CPU of a first upload, an
+identical re-upload (points reused), and the same file at another
+time_resolution (parse skipped, resampled from the cached fixes).
+
+Jobs run in this process through jobs.run_job against the configured
+database and point storage; the benchmark tracks are deleted afterwards.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import override_settings
+
+from .. import jobs
+from ..models import GPSTrack
+from .synthetic import write_can_log
+
+help = "Job time of a first upload vs identical and re-parameterized re-uploads"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, default=100,
+                        help="Size of the synthetic CSV log (default: 100)")
+
+
+def _upload(media_root, path, content_hash, time_resolution):
+    # A separate copy per upload, as the upload endpoint would store it
+    name = os.path.join('gps_uploads', f'{time.monotonic_ns()}.csv')
+    shutil.copyfile(path, os.path.join(media_root, name))
+    track = GPSTrack.objects.create(name='dedup benchmark', uploaded_file=name, content_hash=content_hash)
+    job = jobs.enqueue_track(track, time_resolution)
+    start = time.perf_counter()
+    job = jobs.run_job(job.id)
+    return track, job, time.perf_counter() - start
+
+
+def run(options, out):
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root, GPS_JOB_BACKEND='worker'):
+        os.makedirs(os.path.join(media_root, 'gps_uploads'))
+        path = os.path.join(media_root, 'log.csv')
+        write_can_log(path, size_mb=options['size_mb'])
+        with open(path, 'rb') as f:
+            content_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+
+        out(f"{'upload':<24} {'wall s':>7} {'cpu s':>7} {'saved cpu s':>12} {'saved MB':>9} {'points':>8}")
+        tracks = []
+        try:
+            for label, time_resolution in [('first', 5), ('identical', 5), ('time_resolution=2', 2)]:
+                track, job, elapsed = _upload(media_root, path, content_hash, time_resolution)
+                tracks.append(track)
+                track.refresh_from_db()
+                out(f"{label:<24} {elapsed:>7.2f} {job.cpu_seconds:>7.2f} {job.saved_cpu_seconds:>12.2f} "
+                    f"{job.saved_bytes / 1e6:>9.1f} {track.total_points or 0:>8}")
+        finally:
+            for track in tracks:
+                track.delete()
@@ -0,0 +1,74 @@
+"""
+Speed distributions: the distributions/ endpoint serving the summary
+stored at ingest vs summarizing the points on every request (what a
+dashboard had to do before, and what ?time_bin=/?speed_bin= still do).
+
+The track is a synthetic run stored as rows or columnar, as configured by
+--storage, in a throwaway MEDIA_ROOT. The response cache is cleared
+before every request, so both paths do their full work.
+"""
+import json
+import tempfile
+import time
+
+import numpy as np
+from django.test import Client, override_settings
+
+from .. import bulkload, distributions, response_cache, storage
+from ..models import GPSTrack
+from .synthetic import synthetic_track
+
+help = "Seconds per distributions/ request from the stored summary vs rescanning the points"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=1_000_000,
+                        help="Points in the track (default: 1000000)")
+    parser.add_argument('--storage', choices=[storage.ROWS, storage.COLUMNAR], default=storage.COLUMNAR,
+                        help="Point storage of the track (default: columnar)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Requests per path (default: 5)")
+
+
+def _time_requests(client, url, repeat, track):
+    seconds = []
+    for _ in range(repeat):
+        response_cache.invalidate_track(track.id)
+        start = time.perf_counter()
+        response = client.get(url)
+        seconds.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content[:200]
+    return np.median(seconds), len(response.content)
+
+
+def run(options, out):
+    n = options['points']
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root, GPS_POINT_STORAGE=options['storage']):
+        timestamps, lats, lons = synthetic_track(n)
+        speeds = 20 + 10 * np.sin(np.arange(n) / 300) + np.random.default_rng(0).random(n)
+        columns = {'timestamp': timestamps / 1000, 'latitude': lats, 'longitude': lons, 'speed': speeds}
+        track = GPSTrack.objects.create(name='distributions benchmark', uploaded_file='', processed=True,
+                                        total_points=n, point_storage=storage.default_backend())
+        try:
+            if track.point_storage == storage.COLUMNAR:
+                storage.write_columnar(track, columns)
+            else:
+                bulkload.insert_points(track, columns)
+            start = time.perf_counter()
+            distributions.build_track_distributions(track, columns)
+            build_seconds = time.perf_counter() - start
+            track.save()
+            out(f"{n} points ({track.point_storage}), summary of {len(json.dumps(track.distributions)) / 1e3:.0f} kB "
+                f"built at ingest in {build_seconds * 1000:.1f} ms")
+
+            client = Client(SERVER_NAME='localhost')
+            url = f'/api/tracks/{track.id}/distributions/'
+            # Same bins as stored, but through the path that reads the points
+            rescan_url = f'{url}?time_bin={distributions.time_bin_seconds() + 1e-9}'
+            out(f"{'path':<16} {'seconds':>8} {'bytes':>9}")
+            for label, path in (('stored', url), ('rescan points', rescan_url)):
+                seconds, size = _time_requests(client, path, options['repeat'], track)
+                out(f"{label:<16} {seconds:>8.3f} {size:>9}")
+        finally:
+            track.delete()
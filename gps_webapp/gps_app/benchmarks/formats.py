@@ -0,0 +1,81 @@
+"""
+Log formats: disk footprint and GPS ingest time of the same log as plain
+CSV, gzip/zstd compressed CSV and Parquet.
+
+Parquet is written twice: in logger order (every row group holds every
+sensor, so only column pruning applies) and sorted by Sensor (row groups
+without GPS rows are skipped from their statistics). Formats whose library
+isn't installed are reported as skipped.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from .. import ingest
+from .synthetic import write_can_log
+
+help = "Disk size and ingest time of CSV vs .csv.gz / .csv.zst / .parquet"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, default=256,
+                        help="Size of the synthetic CSV log (default: 256)")
+    parser.add_argument('--row-group-rows', type=int, default=1_000_000,
+                        help="Parquet row group size (default: 1000000)")
+
+
+def _write_compressed(src, fmt):
+    dst = f'{src}.{fmt.split(".")[-1]}'
+    if fmt == ingest.CSV_GZIP:
+        with open(src, 'rb') as f, gzip.open(dst, 'wb', compresslevel=6) as out:
+            shutil.copyfileobj(f, out, 1024 * 1024)
+    else:
+        import zstandard
+
+        with open(src, 'rb') as f, open(dst, 'wb') as out:
+            zstandard.ZstdCompressor(level=3).copy_stream(f, out)
+    return dst
+
+
+def _write_parquet(src, directory, row_group_rows, sort_by_sensor):
+    df = pd.read_csv(src, dtype={'Sensor': 'category'})
+    if sort_by_sensor:
+        df = df.sort_values(['Sensor', 'Timestamp'], kind='stable')
+    name = 'sorted.parquet' if sort_by_sensor else 'log.parquet'
+    path = os.path.join(directory, name)
+    df.to_parquet(path, index=False, row_group_size=row_group_rows)
+    return path
+
+
+def run(options, out):
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'log.csv')
+        write_can_log(csv_path, size_mb=options['size_mb'])
+        csv_bytes = os.path.getsize(csv_path)
+
+        cases = [('csv', lambda: csv_path)]
+        cases.append(('csv.gz', lambda: _write_compressed(csv_path, ingest.CSV_GZIP)))
+        if ingest.format_available(ingest.CSV_ZSTD):
+            cases.append(('csv.zst', lambda: _write_compressed(csv_path, ingest.CSV_ZSTD)))
+        else:
+            out("csv.zst: skipped, zstandard is not installed")
+        if ingest.format_available(ingest.PARQUET):
+            cases.append(('parquet', lambda: _write_parquet(
+                csv_path, directory, options['row_group_rows'], sort_by_sensor=False)))
+            cases.append(('parquet sorted', lambda: _write_parquet(
+                csv_path, directory, options['row_group_rows'], sort_by_sensor=True)))
+        else:
+            out("parquet: skipped, pyarrow is not installed")
+
+        out(f"{'format':<16} {'disk MB':>8} {'ratio':>6} {'ingest s':>9} {'gps rows':>9}")
+        for name, write in cases:
+            path = write()
+            size = os.path.getsize(path)
+            start = time.perf_counter()
+            pivot_df, rows_read, gps_rows = ingest.load_gps_pivot(path)
+            elapsed = time.perf_counter() - start
+            out(f"{name:<16} {size / 1e6:>8.1f} {csv_bytes / size:>6.1f} {elapsed:>9.2f} {gps_rows:>9}")
@@ -0,0 +1,88 @@
+"""
+Heatmap tiles: render latency per zoom and cache hit rate under a panning
+workload.
+
+Uses a throwaway columnar track in a temporary MEDIA_ROOT; the track row is
+deleted afterwards.
+"""
+import tempfile
+import time
+
+import numpy as np
+from django.test import override_settings
+
+from .. import heatmap, storage, tiles
+from ..models import GPSTrack
+from .synthetic import synthetic_track
+
+help = "Heatmap tile render latency and on-disk cache hit rate"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=1_000_000,
+                        help="Track size (default: 1000000)")
+    parser.add_argument('--requests', type=int, default=2000,
+                        help="Tile requests in the panning workload (default: 2000)")
+    parser.add_argument('--weight', choices=heatmap.WEIGHTS, default=heatmap.DEFAULT_WEIGHT)
+
+
+def _covering_tiles(lats, lons, z):
+    px, py = heatmap.project([lats.min(), lats.max()], [lons.min(), lons.max()])
+    n = 2 ** z
+    xs = range(int(px.min() / 256 * n), int(px.max() / 256 * n) + 1)
+    ys = range(int(py.min() / 256 * n), int(py.max() / 256 * n) + 1)
+    return [(z, x, y) for x in xs for y in ys]
+
+
+def run(options, out):
+    n = options['points']
+    weight = options['weight']
+    timestamps, lats, lons = synthetic_track(n)
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        track = GPSTrack.objects.create(name='heatmap benchmark', uploaded_file='', processed=True,
+                                        total_points=n, point_storage=storage.COLUMNAR)
+        try:
+            storage.write_columnar(track, {
+                'timestamp': timestamps / 1000, 'latitude': lats, 'longitude': lons,
+                'speed': np.random.default_rng(0).random(n) * 40,
+            })
+            tiles.reset_stats()
+
+            start = time.perf_counter()
+            tiles.track_source(track)
+            out(f"{n} points, projection {time.perf_counter() - start:.3f}s (once per process)")
+            out(f"{'zoom':>5} {'tiles':>6} {'cold ms':>8} {'p95 ms':>8} {'warm ms':>8}")
+
+            all_tiles = []
+            for z in range(13, 19):
+                covering = _covering_tiles(lats, lons, z)
+                all_tiles.extend(covering)
+                cold, warm = [], []
+                for tile in covering:
+                    t0 = time.perf_counter()
+                    tiles.render_tile([track], *tile, weight=weight)
+                    cold.append(time.perf_counter() - t0)
+                    t0 = time.perf_counter()
+                    tiles.render_tile([track], *tile, weight=weight)
+                    warm.append(time.perf_counter() - t0)
+                out(f"{z:>5} {len(covering):>6} {np.mean(cold) * 1000:>8.2f} "
+                    f"{np.percentile(cold, 95) * 1000:>8.2f} {np.mean(warm) * 1000:>8.2f}")
+
+            # Panning: popular tiles are requested far more often (Zipf-like)
+            tiles.invalidate_track(track.id)
+            tiles.reset_stats()
+            rng = np.random.default_rng(1)
+            ranks = np.minimum(rng.zipf(1.3, options['requests']), len(all_tiles)) - 1
+            order = rng.permutation(len(all_tiles))
+            start = time.perf_counter()
+            for rank in ranks:
+                tiles.render_tile([track], *all_tiles[order[rank]], weight=weight)
+            elapsed = time.perf_counter() - start
+            result = tiles.stats()
+            out(f"\nPanning workload: {options['requests']} requests over {len(all_tiles)} tiles "
+                f"in {elapsed:.2f}s")
+            out(f"hit rate {result['hit_rate']:.1%}, mean render {result['render_ms_mean']:.2f} ms, "
+                f"max render {result['render_seconds_max'] * 1000:.2f} ms")
+        finally:
+            track.delete()
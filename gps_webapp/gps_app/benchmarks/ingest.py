@@ -0,0 +1,82 @@
+"""
+CSV ingest throughput and peak memory: full read_csv vs chunked streaming.
+
+Each mode runs in a fresh spawned process so ru_maxrss reflects that mode
+alone.
+"""
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from .synthetic import write_can_log, file_size_mb
+
+help = "CSV ingest MB/s and peak RSS, full read vs chunked streaming"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, default=1024,
+                        help="Size of the synthetic CAN log (default: 1024)")
+    parser.add_argument('--chunksize', type=int, action='append',
+                        help="Chunk sizes to test (repeatable, default: 100000 and 500000)")
+    parser.add_argument('--skip-full', action='store_true',
+                        help="Skip the whole-file read_csv mode")
+    parser.add_argument('--file', help="Use an existing CSV instead of generating one")
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB.
+
+    VmHWM is reset on exec, unlike ru_maxrss which a spawned child inherits
+    from its parent on Linux.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_load(path, chunksize):
+    import pandas as pd
+    from gps_app.ingest import load_gps_pivot
+
+    start = time.perf_counter()
+    pivot_df, rows_read, gps_rows = load_gps_pivot(path, chunksize=chunksize)
+    elapsed = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    # The full read keeps Timestamp as int64, streaming reads it as float64
+    digest = int(pd.util.hash_pandas_object(pivot_df.astype('float64'), index=False).sum())
+    return elapsed, peak_mb, rows_read, len(pivot_df), digest
+
+
+def run(options, out):
+    chunksizes = options['chunksize'] or [100_000, 500_000]
+    modes = [] if options['skip_full'] else [None]
+    modes += chunksizes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = options['file']
+        if not path:
+            path = os.path.join(tmp, 'synthetic_can.csv')
+            out(f"Writing {options['size_mb']} MB synthetic log...")
+            write_can_log(path, size_mb=options['size_mb'])
+        size_mb = file_size_mb(path)
+        out(f"Input: {path} ({size_mb:.1f} MB)")
+
+        ctx = multiprocessing.get_context('spawn')
+        digests = set()
+        out(f"{'mode':>16} {'seconds':>9} {'MB/s':>8} {'peak RSS MB':>12} {'rows':>12} {'points':>9}")
+        for chunksize in modes:
+            with ctx.Pool(1) as pool:
+                elapsed, peak_mb, rows_read, points, digest = pool.apply(_measure_load, (path, chunksize))
+            digests.add(digest)
+            label = 'full read_csv' if chunksize is None else f'chunks of {chunksize}'
+            out(f"{label:>16} {elapsed:9.2f} {size_mb / elapsed:8.1f} {peak_mb:12.1f} {rows_read:12d} {points:9d}")
+
+        out("Outputs identical across modes" if len(digests) == 1 else "WARNING: outputs differ between modes")
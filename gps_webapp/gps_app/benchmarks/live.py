@@ -0,0 +1,151 @@
+"""
+Load generator for live telemetry: frames/s one worker sustains, and the
+end-to-end latency from a batch being sent to its delta reaching the
+subscribers.
+
+The websocket case drives gps_tracker's ASGI application in this process
+(no server needed): one connection sends the batches of a synthetic run,
+--subscribers others only listen. The HTTP case POSTs the same batches to
+telemetry/ through the Django test client. Batches are sent as fast as the
+worker takes them, or at --speed times real time. Uses the configured
+database; the tracks are deleted afterwards.
+"""
+import asyncio
+import json
+import time
+
+import numpy as np
+from django.test import Client
+
+from .. import live
+from ..models import GPSTrack
+from .synthetic import synthetic_track
+
+help = "Frames/s and delta latency of live telemetry over the websocket and HTTP"
+
+
+def add_arguments(parser):
+    parser.add_argument('--seconds', type=int, default=600,
+                        help="Length of the synthetic run in seconds of 10 Hz GPS (default: 600)")
+    parser.add_argument('--batch-seconds', type=float, default=1.0,
+                        help="Seconds of frames per batch (default: 1.0)")
+    parser.add_argument('--subscribers', type=int, default=4,
+                        help="Websocket connections that only listen (default: 4)")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="Send at this multiple of real time (default: 0, as fast as possible)")
+
+
+def _batches(seconds, batch_seconds, rate_hz=10):
+    timestamps, lats, lons = synthetic_track(seconds * rate_hz, rate_hz=rate_hz)
+    per_batch = max(int(batch_seconds * rate_hz), 1)
+    for start in range(0, len(timestamps), per_batch):
+        frames = []
+        for t, lat, lon in zip(timestamps[start:start + per_batch].tolist(), lats[start:start + per_batch].tolist(),
+                               lons[start:start + per_batch].tolist()):
+            frames.append([t, 'Latitude', lat])
+            frames.append([t, 'Longitude', lon])
+        yield frames
+
+
+class _Connection:
+    """One websocket connection to an ASGI application, driven from this event loop"""
+
+    def __init__(self, app, path):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': path, 'headers': [], 'query_string': b''}
+        self.task = asyncio.ensure_future(app(scope, self.incoming.get, self.outgoing.put))
+
+    async def connect(self):
+        await self.incoming.put({'type': 'websocket.connect'})
+        message = await self.outgoing.get()
+        assert message['type'] == 'websocket.accept', message
+
+    async def send(self, data):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def receive(self):
+        message = await self.outgoing.get()
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else None
+
+    async def close(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await self.task
+
+
+async def _websocket_run(app, track, batches, subscribers, interval):
+    path = f'/ws/tracks/{track.id}/live/'
+    producer = _Connection(app, path)
+    listeners = [_Connection(app, path) for _ in range(subscribers)]
+    for connection in [producer] + listeners:
+        await connection.connect()
+
+    sent = []
+    latencies = []
+
+    async def listen(connection):
+        # Deltas arrive in batch order, one per batch
+        for i in range(len(batches)):
+            delta = await connection.receive()
+            if delta is None:
+                return
+            latencies.append(time.perf_counter() - sent[i])
+
+    listening = [asyncio.ensure_future(listen(connection)) for connection in listeners]
+    start = time.perf_counter()
+    for i, frames in enumerate(batches):
+        if interval:
+            await asyncio.sleep(max(start + i * interval - time.perf_counter(), 0))
+        sent.append(time.perf_counter())
+        await producer.send({'seq': i, 'frames': frames})
+        # The producer gets its ack and its own delta, in either order
+        replies = [await producer.receive(), await producer.receive()]
+        assert {reply['type'] for reply in replies} == {'ack', 'points'}, replies
+    await asyncio.gather(*listening)
+    elapsed = time.perf_counter() - start
+    for connection in [producer] + listeners:
+        await connection.close()
+    return elapsed, np.array(latencies) * 1000
+
+
+def _http_run(track, batches, interval):
+    client = Client(SERVER_NAME='localhost')
+    url = f'/api/tracks/{track.id}/telemetry/'
+    latencies = []
+    start = time.perf_counter()
+    for i, frames in enumerate(batches):
+        if interval:
+            time.sleep(max(start + i * interval - time.perf_counter(), 0))
+        sent = time.perf_counter()
+        response = client.post(url, {'frames': frames}, content_type='application/json')
+        assert response.status_code == 200, response.content[:200]
+        latencies.append(time.perf_counter() - sent)
+    return time.perf_counter() - start, np.array(latencies) * 1000
+
+
+def run(options, out):
+    from gps_tracker.asgi import application
+
+    batches = list(_batches(options['seconds'], options['batch_seconds']))
+    frames = sum(len(batch) for batch in batches)
+    interval = options['batch_seconds'] / options['speed'] if options['speed'] else 0
+    pace = f"{options['speed']:g}x real time" if interval else "as fast as possible"
+    out(f"{len(batches)} batches of {len(batches[0])} frames, {options['subscribers']} subscribers, {pace}")
+    out(f"{'transport':<10} {'frames/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'points':>7}")
+
+    tracks = []
+    try:
+        for transport in ('websocket', 'http'):
+            track = live.start_live_track(f'live {transport} benchmark', time_resolution=5)
+            tracks.append(track)
+            if transport == 'websocket':
+                elapsed, ms = asyncio.run(_websocket_run(application, track, batches, options['subscribers'],
+                                                         interval))
+            else:
+                elapsed, ms = _http_run(track, batches, interval)
+            live.finish_live_track(track)
+            out(f"{transport:<10} {frames / elapsed:>10.0f} {np.percentile(ms, 50):>8.2f} "
+                f"{np.percentile(ms, 95):>8.2f} {ms.max():>8.2f} {track.total_points:>7}")
+    finally:
+        for track in tracks:
+            GPSTrack.objects.filter(id=track.id).delete()
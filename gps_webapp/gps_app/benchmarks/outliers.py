@@ -0,0 +1,45 @@
+"""
+Outlier filters: throughput and what each one rejects on a synthetic track
+with injected glitches (single fixes thrown 20-500 m off the path).
+
+"caught" counts injected glitches rejected, "false" good fixes rejected.
+"""
+import numpy as np
+
+from .. import outliers
+from .synthetic import synthetic_track
+
+help = "Points/s and rejected fixes of each outlier filter"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=1_000_000, help="Track size (default: 1000000)")
+    parser.add_argument('--glitches', type=float, default=0.001,
+                        help="Share of fixes to throw off the path (default: 0.001)")
+    parser.add_argument('--rate-hz', type=int, default=10, help="Fix rate (default: 10)")
+
+
+def run(options, out):
+    n = options['points']
+    timestamps, lats, lons = synthetic_track(n, rate_hz=options['rate_hz'])
+    rng = np.random.default_rng(1)
+    bad = rng.choice(np.arange(1, n - 1), int(n * options['glitches']), replace=False)
+    offset = rng.uniform(20, 500, len(bad)) / 111_320
+    angle = rng.uniform(0, 2 * np.pi, len(bad))
+    lats, lons = lats.copy(), lons.copy()
+    lats[bad] += offset * np.sin(angle)
+    lons[bad] += offset * np.cos(angle) / np.cos(np.radians(lats[bad]))
+    seconds = timestamps / 1000
+    is_bad = np.zeros(n, dtype=bool)
+    is_bad[bad] = True
+
+    out(f"{n} fixes, {len(bad)} glitches")
+    out(f"{'filter':<14} {'points/s':>12} {'rejected':>9} {'caught':>7} {'false':>7}")
+    chains = [[name] for name in outliers.FILTERS] + [list(outliers.DEFAULT_FILTERS)]
+    for chain in chains:
+        index, _, _, stats = outliers.apply_filters(seconds, lats, lons, chain)
+        rejected = np.ones(n, dtype=bool)
+        rejected[index] = False
+        elapsed = sum(entry['seconds'] for entry in stats)
+        out(f"{','.join(chain):<14} {n / elapsed:>12,.0f} {rejected.sum():>9} "
+            f"{(rejected & is_bad).sum():>7} {(rejected & ~is_bad).sum():>7}")
@@ -0,0 +1,80 @@
+"""
+Latency of deep pages of the points API: ?page=N (OFFSET) vs ?cursor=
+(keyset on timestamp), for a GPSPoint track and a columnar one, and the
+time to stream the whole track as NDJSON.
+
+Requests go through the Django test client. The tracks are left
+unprocessed so the response cache doesn't serve repeats; they are
+deleted afterwards.
+"""
+import tempfile
+import time
+
+from django.test import Client, override_settings
+
+from .. import bulkload, storage, wire
+from ..models import GPSTrack
+from ..pagination import encode_cursor
+from .storage import _arrays
+
+help = "Deep-page latency of page-number vs cursor pagination of points"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=1_000_000,
+                        help="Track size (default: 1000000)")
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help="Points per page (default: 1000, the API's PAGE_SIZE)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Requests per depth, the median is reported (default: 5)")
+
+
+def _median_ms(client, url, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        times.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content[:200]
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def run(options, out):
+    n, page_size = options['points'], options['page_size']
+    arrays = _arrays(n)
+    timestamps = arrays['timestamp']
+    client = Client(SERVER_NAME='localhost')
+    pages = [page for page in (1, 10, 100, 500, n // page_size) if page * page_size <= n]
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        tracks = {
+            'rows': GPSTrack.objects.create(name='pagination benchmark', uploaded_file='', total_points=n),
+            'columnar': GPSTrack.objects.create(name='pagination benchmark', uploaded_file='', total_points=n,
+                                                point_storage=storage.COLUMNAR),
+        }
+        try:
+            bulkload.insert_points(tracks['rows'], arrays)
+            storage.write_columnar(tracks['columnar'], arrays)
+
+            out(f"{n} points, {page_size} per page, median of {options['repeat']} requests (ms)")
+            out(f"{'backend':<9} {'page':>6} {'?page=':>9} {'?cursor=':>9}")
+            for backend, track in tracks.items():
+                url = f'/api/tracks/{track.id}/points/'
+                for page in pages:
+                    # The cursor a client walking from page 1 would hold at this page
+                    first = (page - 1) * page_size
+                    cursor = encode_cursor(timestamps[first - 1], 1) if first else ''
+                    numbered = _median_ms(client, f'{url}?page={page}', options['repeat'])
+                    keyset = _median_ms(client, f'{url}?cursor={cursor}&page_size={page_size}',
+                                        options['repeat'])
+                    out(f"{backend:<9} {page:>6} {numbered:>9.1f} {keyset:>9.1f}")
+
+            out(f"{'backend':<9} {'NDJSON stream s':>16} {'MB':>7}")
+            for backend, track in tracks.items():
+                start = time.perf_counter()
+                response = client.get(f'/api/tracks/{track.id}/points/', HTTP_ACCEPT=wire.NDJSON_CONTENT_TYPE)
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                out(f"{backend:<9} {time.perf_counter() - start:>16.2f} {size / 1e6:>7.1f}")
+        finally:
+            for track in tracks.values():
+                track.delete()
@@ -0,0 +1,49 @@
+"""
+Polyline level of detail: vertices, simplification time and payload size
+per zoom level, compared with sending every point.
+"""
+import json
+import time
+
+import numpy as np
+
+from .. import simplify
+from .synthetic import synthetic_track
+
+help = "Vertex count, simplification time and payload bytes per zoom level"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=18_000,
+                        help="Track size (default: 18000, a 30 minute run at 10 Hz)")
+    parser.add_argument('--algorithm', choices=simplify.ALGORITHMS, action='append',
+                        help="Algorithms to test (repeatable, default: both)")
+
+
+def _payload_bytes(lats, lons, speeds):
+    points = np.column_stack((lats.round(6), lons.round(6), speeds.round(2))).tolist()
+    return len(json.dumps({'points': points}))
+
+
+def run(options, out):
+    n = options['points']
+    timestamps, lats, lons = synthetic_track(n)
+    speeds = np.random.default_rng(0).random(n) * 40
+    full_bytes = _payload_bytes(lats, lons, speeds)
+    out(f"{n} points, full payload {full_bytes / 1024:.1f} KiB")
+
+    for algorithm in options['algorithm'] or simplify.ALGORITHMS:
+        start = time.perf_counter()
+        ranking = simplify.importance(lats, lons, algorithm)
+        ranking_ms = (time.perf_counter() - start) * 1000
+        out(f"\n{algorithm}: ranking pass {ranking_ms:.1f} ms")
+        out(f"{'zoom':>5} {'tolerance m':>12} {'vertices':>9} {'threshold ms':>13} {'payload KiB':>12} {'reduction':>10}")
+        latitude = float(np.mean(lats))
+        for zoom in simplify.ZOOM_LEVELS:
+            tolerance = simplify.zoom_tolerance(zoom, latitude)
+            start = time.perf_counter()
+            indices = simplify.keep_indices(ranking, tolerance)
+            threshold_ms = (time.perf_counter() - start) * 1000
+            size = _payload_bytes(lats[indices], lons[indices], speeds[indices])
+            out(f"{zoom:>5} {tolerance:>12.3f} {len(indices):>9} {threshold_ms:>13.3f} "
+                f"{size / 1024:>12.1f} {full_bytes / size:>9.0f}x")
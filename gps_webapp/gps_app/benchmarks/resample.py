@@ -0,0 +1,50 @@
+"""
+Re-deriving a processed track at other time resolutions from the cached
+parsed fixes (utils.resample_track) vs processing the log from scratch.
+
+The track is processed once through process_gps_csv into a throwaway
+MEDIA_ROOT, which also caches its parsed fixes; it is deleted afterwards.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.test import override_settings
+
+from ..models import GPSTrack
+from ..utils import process_gps_csv, resample_track
+from .synthetic import write_can_log
+
+help = "Seconds to resample a processed track vs a full reprocess"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, default=100,
+                        help="Size of the synthetic CSV log (default: 100)")
+    parser.add_argument('--resolution', type=int, action='append',
+                        help="Resolutions to derive (repeatable, default: 1, 2, 10 and 20)")
+
+
+def run(options, out):
+    resolutions = options['resolution'] or [1, 2, 10, 20]
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        os.makedirs(os.path.join(media_root, 'gps_uploads'))
+        name = os.path.join('gps_uploads', 'log.csv')
+        path = os.path.join(media_root, name)
+        write_can_log(path, size_mb=options['size_mb'])
+        with open(path, 'rb') as f:
+            content_hash = hashlib.file_digest(f, 'sha256').hexdigest()
+
+        track = GPSTrack.objects.create(name='resample benchmark', uploaded_file=name, content_hash=content_hash)
+        try:
+            start = time.perf_counter()
+            process_gps_csv(track, time_resolution=5)
+            out(f"{'full process @5':<18} {time.perf_counter() - start:>8.3f} s {track.total_points:>9} points")
+            for resolution in resolutions:
+                start = time.perf_counter()
+                columns = resample_track(track, resolution)
+                out(f"{f'resample @{resolution}':<18} {time.perf_counter() - start:>8.3f} s "
+                    f"{len(columns['timestamp']):>9} points")
+        finally:
+            track.delete()
@@ -0,0 +1,104 @@
+"""
+Bounding-box and nearest-point query latency on a large track: the grid
+index (spatial.GridIndex) vs a NumPy scan of every point, and vs a
+latitude/longitude range filter on the GPSPoint table.
+
+Boxes are random squares of --box-m meters around points of the track, so
+they are never empty; nearest-point queries are random locations within
+50 m of the track. The database comparison uses the configured database;
+its track is deleted afterwards.
+"""
+import time
+
+import numpy as np
+
+from .. import bulkload
+from ..geodesy import MEAN_EARTH_RADIUS, haversine_distances
+from ..models import GPSTrack
+from ..spatial import GridIndex
+from .storage import _arrays
+
+help = "Latency of bbox/nearest queries: grid index vs full scan vs GPSPoint range filter"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=1_000_000,
+                        help="Track size (default: 1000000)")
+    parser.add_argument('--queries', type=int, default=200,
+                        help="Queries of each kind (default: 200)")
+    parser.add_argument('--box-m', type=float, action='append',
+                        help="Side of the query boxes in meters (repeatable, default: 20 and 200)")
+    parser.add_argument('--skip-db', action='store_true',
+                        help="Don't load the points into GPSPoint for the database comparison")
+
+
+def _latencies(query, args):
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        query(*arg)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def _report(out, name, ms):
+    out(f"{name:<22} {np.percentile(ms, 50):>9.3f} {np.percentile(ms, 95):>9.3f} {ms.max():>9.3f}")
+
+
+def run(options, out):
+    n = options['points']
+    arrays = _arrays(n)
+    lats, lons = arrays['latitude'], arrays['longitude']
+    rng = np.random.default_rng(1)
+
+    start = time.perf_counter()
+    index = GridIndex(lats, lons)
+    out(f"{n} points, index built in {time.perf_counter() - start:.3f} s: "
+        f"{len(index.keys)} cells of {index.cell_size:.2f} m, {index.nbytes / 1e6:.1f} MB")
+
+    centers = rng.integers(0, n, options['queries'])
+    queries = [(lat + dlat, lon + dlon, 1) for lat, lon, dlat, dlon in zip(
+        lats[centers].tolist(), lons[centers].tolist(),
+        rng.uniform(-4.5e-4, 4.5e-4, len(centers)).tolist(), rng.uniform(-6e-4, 6e-4, len(centers)).tolist())]
+
+    def scan_bbox(min_lon, min_lat, max_lon, max_lat):
+        return np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon))
+
+    def scan_nearest(lat, lon, k):
+        return np.argmin(haversine_distances(lat, lon, lats, lons))
+
+    box_sizes = {}
+    for box_m in options['box_m'] or [20.0, 200.0]:
+        half_lat = np.degrees(box_m / 2 / MEAN_EARTH_RADIUS)
+        half_lon = half_lat / np.cos(np.radians(lats[centers]))
+        box_sizes[box_m] = [
+            (lon - dlon, lat - half_lat, lon + dlon, lat + half_lat)
+            for lat, lon, dlon in zip(lats[centers].tolist(), lons[centers].tolist(), half_lon.tolist())
+        ]
+
+    out(f"{'query':<22} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for box_m, boxes in box_sizes.items():
+        for box in boxes[:10]:
+            assert np.array_equal(index.bbox(*box), scan_bbox(*box))
+        sizes = [len(index.bbox(*box)) for box in boxes]
+        out(f"{box_m:.0f} m boxes, {int(np.median(sizes))} points (median):")
+        _report(out, '  bbox grid index', _latencies(index.bbox, boxes))
+        _report(out, '  bbox full scan', _latencies(scan_bbox, boxes))
+    _report(out, 'nearest grid index', _latencies(index.nearest, queries))
+    _report(out, 'nearest full scan', _latencies(scan_nearest, queries))
+
+    if options['skip_db']:
+        return
+    track = GPSTrack.objects.create(name='spatial benchmark', uploaded_file='', total_points=n)
+    try:
+        bulkload.insert_points(track, arrays)
+
+        def db_bbox(min_lon, min_lat, max_lon, max_lat):
+            return list(track.points.filter(
+                latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon)
+            ).values_list('timestamp', flat=True))
+
+        for box_m, boxes in box_sizes.items():
+            _report(out, f'bbox {box_m:.0f} m GPSPoint', _latencies(db_bbox, boxes[:20]))
+    finally:
+        track.delete()
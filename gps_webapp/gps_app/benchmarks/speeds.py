@@ -0,0 +1,67 @@
+"""
+Speed engine throughput: per-row geopy loop vs the vectorized methods.
+
+The geopy loop is timed on at most --geopy-sample points and extrapolated
+linearly for larger inputs (marked with *), since 10M geodesic calls take
+hours.
+"""
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from ..geodesy import METHODS, MAX_SPEED, calculate_speeds, geopy_error
+from .synthetic import synthetic_track
+
+help = "Vectorized speed calculation vs the geopy loop at 10k/1M/10M points"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, action='append',
+                        help="Track sizes to test (repeatable, default: 10000, 1000000, 10000000)")
+    parser.add_argument('--geopy-sample', type=int, default=20_000,
+                        help="Max points to run through the geopy loop (default: 20000)")
+
+
+def geopy_loop_speeds(lats, lons, seconds):
+    """The original per-row implementation, kept as the baseline."""
+    speeds = np.zeros(len(lats))
+    for i in range(1, len(lats)):
+        distance = geodesic((lats[i - 1], lons[i - 1]), (lats[i], lons[i])).meters
+        time_diff = seconds[i] - seconds[i - 1]
+        speed = distance / time_diff if time_diff > 0 else 0
+        speeds[i] = 0 if speed > MAX_SPEED else speed
+    return speeds
+
+
+def run(options, out):
+    sizes = options['points'] or [10_000, 1_000_000, 10_000_000]
+
+    timestamps, lats, lons = synthetic_track(10_001)
+    out("Error against geopy geodesic on 10k hops:")
+    for method in METHODS:
+        err = geopy_error(lats, lons, method)
+        out(f"  {method:>15}: max {err['max_abs_m']:.2e} m, mean {err['mean_abs_m']:.2e} m, "
+            f"max relative {err['max_rel']:.2e}")
+
+    out(f"\n{'points':>10} {'geopy loop s':>13} " + ' '.join(f"{m + ' s':>17}" for m in METHODS)
+        + f" {'speedup':>9}")
+    for n in sizes:
+        timestamps, lats, lons = synthetic_track(n)
+        seconds = timestamps / 1000
+
+        sample = min(n, options['geopy_sample'])
+        start = time.perf_counter()
+        geopy_loop_speeds(lats[:sample], lons[:sample], seconds[:sample])
+        geopy_seconds = (time.perf_counter() - start) * n / sample
+        marker = '*' if sample < n else ' '
+
+        timings = []
+        for method in METHODS:
+            start = time.perf_counter()
+            calculate_speeds(lats, lons, seconds, method=method)
+            timings.append(time.perf_counter() - start)
+
+        out(f"{n:>10} {geopy_seconds:>12.2f}{marker} " + ' '.join(f"{t:>17.4f}" for t in timings)
+            + f" {geopy_seconds / timings[0]:>8.0f}x")
+    out("\nspeedup is geopy loop vs vincenty; * = extrapolated from the geopy sample")
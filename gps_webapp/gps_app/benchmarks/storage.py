@@ -0,0 +1,103 @@
+"""
+Point storage: GPSPoint rows vs columnar .npy files.
+
+Writes a synthetic track through each backend and compares on-disk size,
+write time and read latency (whole track and one 1000-point page). Uses
+the configured database; the benchmark track is deleted afterwards.
+"""
+import time
+
+import numpy as np
+from django.db import connection
+
+from .. import bulkload, storage
+from ..models import GPSTrack, GPSPoint
+from .synthetic import synthetic_track
+
+help = "Disk size, write time and read latency of row vs columnar point storage"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, action='append',
+                        help="Track sizes to test (repeatable, default: 100000 and 1000000)")
+
+
+def table_bytes():
+    """Bytes used by the GPSPoint table and its indexes, or None if unknown"""
+    table = GPSPoint._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table]
+                )
+            except Exception:
+                return None
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def _arrays(n):
+    timestamps, lats, lons = synthetic_track(n)
+    return {
+        'timestamp': timestamps / 1000,
+        'latitude': lats,
+        'longitude': lons,
+        'speed': np.random.default_rng(0).random(n) * 40,
+        'original_timestamp': timestamps.astype(np.float64),
+    }
+
+
+def _write_rows(track, arrays):
+    """The pre-bulkload insert path: one GPSPoint instance per point"""
+    points = [
+        GPSPoint(track=track, latitude=lat, longitude=lon, timestamp=ts, speed=speed,
+                 original_timestamp=str(orig))
+        for ts, lat, lon, speed, orig in zip(*(
+            arrays[name].tolist() for name in
+            ('timestamp', 'latitude', 'longitude', 'speed', 'original_timestamp')
+        ))
+    ]
+    GPSPoint.objects.bulk_create(points, batch_size=1000)
+
+
+def run(options, out):
+    sizes = options['points'] or [100_000, 1_000_000]
+    out(f"{'points':>9} {'backend':>9} {'disk MB':>8} {'write s':>8} "
+        f"{'read all s':>11} {'models s':>9} {'page ms':>8}")
+
+    for n in sizes:
+        arrays = _arrays(n)
+        track = GPSTrack.objects.create(name='storage benchmark', uploaded_file='', processed=True,
+                                        total_points=n)
+        try:
+            # Row-per-point table
+            before = table_bytes()
+            write_s, _ = _timed(lambda: bulkload.insert_points(track, arrays))
+            after = table_bytes()
+            disk = f"{(after - before) / 1e6:8.1f}" if before is not None else f"{'n/a':>8}"
+            read_s, _ = _timed(lambda: storage.read_rows(track))
+            models_s, _ = _timed(lambda: list(track.points.all()))
+            page_s, _ = _timed(lambda: list(track.points.all()[:1000]))
+            out(f"{n:>9} {'rows':>9} {disk} {write_s:8.2f} {read_s:11.3f} {models_s:9.2f} {page_s * 1000:8.2f}")
+            track.points.all().delete()
+
+            # Columnar files
+            track.point_storage = storage.COLUMNAR
+            write_s, _ = _timed(lambda: storage.write_columnar(track, arrays))
+            disk = storage.columnar_size(track) / 1e6
+            read_s, _ = _timed(lambda: {k: np.array(v) for k, v in storage.read_columnar(track).items()})
+            page_s, _ = _timed(lambda: storage.TrackPoints.for_track(track)[:1000])
+            out(f"{n:>9} {'columnar':>9} {disk:8.1f} {write_s:8.2f} {read_s:11.3f} {'-':>9} {page_s * 1000:8.2f}")
+        finally:
+            track.delete()
@@ -0,0 +1,84 @@
+"""
+Synthetic CAN bus logs for benchmarks.
+
+Tracks are laps of an oval near Golden, CO with a little GPS noise. Every GPS
+timestamp also carries a set of non-GPS channels so the GPS share of the file
+looks like a real endurance log.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+OTHER_SENSORS = [
+    ('RPM', 'rpm'), ('Throttle', '%'), ('Brake', 'bar'), ('CoolantTemp', 'C'),
+    ('OilPressure', 'kPa'), ('BatteryVoltage', 'V'), ('SteeringAngle', 'deg'),
+    ('WheelSpeed', 'km/h'),
+]
+
+CENTER_LAT = 39.7510
+CENTER_LON = -105.2226
+
+
+def synthetic_track(n_points, rate_hz=10, start=0, seed=0, lap_seconds=60.0):
+    """Return (timestamps_ms, latitudes, longitudes) for n_points samples."""
+    rng = np.random.default_rng(seed + start)
+    index = np.arange(start, start + n_points, dtype=np.float64)
+    seconds = index / rate_hz
+    angle = 2 * np.pi * seconds / lap_seconds
+    lat = CENTER_LAT + 0.0020 * np.sin(angle) + rng.normal(0, 2e-6, n_points)
+    lon = CENTER_LON + 0.0035 * np.cos(angle) + rng.normal(0, 2e-6, n_points)
+    timestamps = np.round(seconds * 1000).astype(np.int64)
+    return timestamps, lat, lon
+
+
+def _block_frame(timestamps, lat, lon, other_sensors):
+    sensors = [name for name, _ in OTHER_SENSORS[:other_sensors]] + ['Latitude', 'Longitude']
+    units = [unit for _, unit in OTHER_SENSORS[:other_sensors]] + ['deg', 'deg']
+    per_ts = len(sensors)
+    n = len(timestamps)
+
+    values = np.empty((n, per_ts))
+    values[:, :other_sensors] = np.random.default_rng(int(timestamps[0])).random((n, other_sensors)) * 100
+    values[:, other_sensors] = lat
+    values[:, other_sensors + 1] = lon
+
+    return pd.DataFrame({
+        'Timestamp': np.repeat(timestamps, per_ts),
+        'CANID': np.tile(np.arange(0x100, 0x100 + per_ts), n),
+        'Sensor': np.tile(sensors, n),
+        'Value': values.ravel(),
+        'Unit': np.tile(units, n),
+    })
+
+
+def write_can_log(path, n_points=None, size_mb=None, rate_hz=10, other_sensors=8,
+                  block_points=20_000, seed=0):
+    """
+    Write a synthetic CAN log to path and return the number of GPS samples.
+
+    Stops after n_points GPS samples or once the file reaches size_mb,
+    whichever is given.
+    """
+    if n_points is None and size_mb is None:
+        raise ValueError("Pass n_points or size_mb")
+
+    target_bytes = size_mb * 1024 * 1024 if size_mb is not None else None
+    written = 0
+    with open(path, 'w', newline='') as f:
+        f.write('Timestamp,CANID,Sensor,Value,Unit\n')
+        while True:
+            count = block_points
+            if n_points is not None:
+                count = min(count, n_points - written)
+            if count <= 0:
+                break
+            timestamps, lat, lon = synthetic_track(count, rate_hz=rate_hz, start=written, seed=seed)
+            _block_frame(timestamps, lat, lon, other_sensors).to_csv(f, header=False, index=False)
+            written += count
+            if target_bytes is not None and f.tell() >= target_bytes:
+                break
+    return written
+
+
+def file_size_mb(path):
+    return os.path.getsize(path) / (1024 * 1024)
@@ -0,0 +1,54 @@
+"""
+Resumable uploads: throughput and server-side memory per upload.
+
+Chunks are fed to uploads.append_chunk() from a file object standing in
+for the request stream (the test client would keep every request body
+alive and swamp the measurement). Python heap allocations are tracked with
+tracemalloc; the peak should not grow with the file size or chunk size.
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.test import override_settings
+
+from .. import uploads
+from .synthetic import write_can_log, file_size_mb
+
+help = "Chunked upload MB/s and peak server memory per upload vs file size"
+
+
+def add_arguments(parser):
+    parser.add_argument('--size-mb', type=int, action='append',
+                        help="File sizes to upload (repeatable, default: 50 and 200)")
+    parser.add_argument('--chunk-mb', type=int, default=8, help="Chunk size (default: 8)")
+
+
+def run(options, out):
+    sizes = options['size_mb'] or [50, 200]
+    chunk_bytes = options['chunk_mb'] * 1024 * 1024
+
+    out(f"{'file MB':>8} {'chunks':>7} {'MB/s':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root, GPS_UPLOAD_CHUNK_MAX_BYTES=chunk_bytes):
+        for size_mb in sizes:
+            path = os.path.join(media_root, f'log_{size_mb}.csv')
+            write_can_log(path, size_mb=size_mb)
+            size = os.path.getsize(path)
+
+            session = uploads.start_upload('upload benchmark', size=size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            chunks = 0
+            with open(path, 'rb') as stream:
+                for offset in range(0, size, chunk_bytes):
+                    uploads.append_chunk(session.id, offset, stream, min(chunk_bytes, size - offset))
+                    chunks += 1
+            session, track, _ = uploads.finalize(session.id)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            track.delete()
+
+            out(f"{file_size_mb(path):>8.0f} {chunks:>7} {size / 1e6 / elapsed:>8.1f} {peak / 1e6:>8.2f}")
@@ -0,0 +1,77 @@
+"""
+Points API wire formats: paginated JSON vs NDJSON and the packed binary
+stream (plain and delta+varint coordinates), and Arrow when pyarrow is
+installed.
+
+Requests go through the Django test client against a throwaway columnar
+track, so the timings include negotiation, serialization and streaming.
+"""
+import gzip
+import tempfile
+import time
+
+import numpy as np
+from django.test import Client, override_settings
+
+from .. import storage, wire
+from ..models import GPSTrack
+from ..renderers import arrow_available
+from .synthetic import synthetic_track
+
+help = "Payload size and server time of the points API wire formats"
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', type=int, default=200_000,
+                        help="Track size (default: 200000)")
+
+
+def _fetch_json(client, url):
+    body = []
+    while url:
+        response = client.get(url)
+        body.append(response.content)
+        url = response.json()['next']
+    return b''.join(body)
+
+
+def _fetch_stream(client, url, accept):
+    response = client.get(url, HTTP_ACCEPT=accept)
+    return b''.join(response.streaming_content)
+
+
+def run(options, out):
+    n = options['points']
+    timestamps, lats, lons = synthetic_track(n)
+    client = Client(SERVER_NAME='localhost')
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        track = GPSTrack.objects.create(name='wire benchmark', uploaded_file='', processed=True,
+                                        total_points=n, point_storage=storage.COLUMNAR)
+        try:
+            storage.write_columnar(track, {
+                'timestamp': timestamps / 1000, 'latitude': lats, 'longitude': lons,
+                'speed': np.random.default_rng(0).random(n) * 40,
+            })
+            url = f'/api/tracks/{track.id}/points/'
+            cases = [
+                ('json (paginated)', lambda: _fetch_json(client, url)),
+                ('json (cursor)', lambda: _fetch_json(client, url + '?cursor=')),
+                ('ndjson', lambda: _fetch_stream(client, url, wire.NDJSON_CONTENT_TYPE)),
+                ('gpsb', lambda: _fetch_stream(client, url, wire.CONTENT_TYPE)),
+                ('gpsb delta', lambda: _fetch_stream(client, url + '?encoding=delta', wire.CONTENT_TYPE)),
+            ]
+            if arrow_available():
+                cases.append(('arrow', lambda: _fetch_stream(client, url, wire.ARROW_CONTENT_TYPE)))
+
+            out(f"{n} points")
+            out(f"{'format':<18} {'seconds':>8} {'MB':>8} {'gzip MB':>8} {'bytes/pt':>9}")
+            for name, fetch in cases:
+                start = time.perf_counter()
+                body = fetch()
+                elapsed = time.perf_counter() - start
+                compressed = len(gzip.compress(body, compresslevel=6))
+                out(f"{name:<18} {elapsed:>8.3f} {len(body) / 1e6:>8.2f} {compressed / 1e6:>8.2f} "
+                    f"{len(body) / n:>9.1f}")
+        finally:
+            track.delete()
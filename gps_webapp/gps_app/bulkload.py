@@ -0,0 +1,133 @@
+"""
+Fast bulk insert of GPSPoint rows straight from NumPy arrays.
+
+bulk_create() builds a model instance per point and a multi-row INSERT per
+batch, which dominates ingest time for large tracks. Here rows go to the
+database without any model instances:
+
+- PostgreSQL: COPY ... FROM STDIN through psycopg2's copy_expert (or
+  psycopg 3's cursor.copy), fed with tab-separated text.
+- SQLite (and anything else): executemany() of one prepared INSERT over
+  large batches of plain tuples.
+
+copy_points() duplicates another track's rows with one INSERT ... SELECT,
+so nothing passes through Python at all.
+
+insert_points() and copy_points() are atomic on their own; callers wrap
+them in transaction.atomic() together with their track update so points
+and statistics land together.
+"""
+import io
+import itertools
+import logging
+import time
+
+import numpy as np
+from django.db import connection, transaction
+
+from .models import GPSPoint
+
+logger = logging.getLogger(__name__)
+
+# Rows per COPY buffer / executemany call
+BATCH_ROWS = 100_000
+
+# GPSPoint columns written, in order; track_id is added in front
+COLUMNS = ['latitude', 'longitude', 'timestamp', 'speed', 'original_timestamp', 'altitude']
+NULLABLE = {'speed', 'altitude', 'original_timestamp'}
+
+
+def _column_values(name, values, n):
+    """Python values for one column: NaN/missing become None, original_timestamp becomes str"""
+    if values is None:
+        return itertools.repeat(None, n)
+    values = np.asarray(values, dtype=np.float64)
+    # str(float) keeps the '1234.0' form the ORM path always stored
+    converted = map(str, values.tolist()) if name == 'original_timestamp' else values.tolist()
+    if name in NULLABLE and np.isnan(values).any():
+        missing = np.isnan(values).tolist()
+        return (None if m else v for v, m in zip(converted, missing))
+    return converted
+
+
+def iter_rows(track, columns):
+    """(track_id, latitude, ...) tuples for each point in columns"""
+    n = len(columns['timestamp'])
+    # UUID as the backend stores it (hex string on SQLite, uuid on PostgreSQL)
+    track_id = GPSPoint._meta.get_field('track').get_db_prep_value(track.pk, connection)
+    return zip(itertools.repeat(track_id, n),
+               *(_column_values(name, columns.get(name), n) for name in COLUMNS))
+
+
+def _copy_text(rows):
+    """Tab-separated COPY text for a batch of row tuples"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join('\\N' if value is None else str(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+def _insert_copy(cursor, table, rows):
+    sql = f'COPY {table} (track_id, {", ".join(COLUMNS)}) FROM STDIN'
+    raw = cursor.cursor
+    while True:
+        batch = list(itertools.islice(rows, BATCH_ROWS))
+        if not batch:
+            return
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, _copy_text(batch))
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(_copy_text(batch).read())
+
+
+def _insert_executemany(cursor, table, rows):
+    placeholders = ', '.join(['%s'] * (len(COLUMNS) + 1))
+    sql = f'INSERT INTO {table} (track_id, {", ".join(COLUMNS)}) VALUES ({placeholders})'
+    while True:
+        batch = list(itertools.islice(rows, BATCH_ROWS))
+        if not batch:
+            return
+        cursor.executemany(sql, batch)
+
+
+def insert_points(track, columns):
+    """
+    Insert one GPSPoint row per entry of columns (arrays keyed like
+    storage.COLUMN_DTYPES; altitude and others may be missing). Returns the
+    number of rows written.
+    """
+    n = len(columns['timestamp'])
+    table = connection.ops.quote_name(GPSPoint._meta.db_table)
+    rows = iter_rows(track, columns)
+    start = time.perf_counter()
+    # A savepoint when the caller already has a transaction open; without one
+    # SQLite would commit every INSERT separately
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            _insert_copy(cursor, table, rows)
+        else:
+            _insert_executemany(cursor, table, rows)
+    elapsed = time.perf_counter() - start
+    logger.info("Inserted %d points for %s in %.2fs (%.0f rows/s, %s)",
+                n, track.pk, elapsed, n / elapsed if elapsed else 0, connection.vendor)
+    return n
+
+
+def copy_points(source, track):
+    """Copy every GPSPoint row of source to track inside the database. Returns the number of rows copied."""
+    table = connection.ops.quote_name(GPSPoint._meta.db_table)
+    columns = ', '.join(COLUMNS)
+    track_field = GPSPoint._meta.get_field('track')
+    start = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (track_id, {columns}) SELECT %s, {columns} FROM {table} WHERE track_id = %s',
+            [track_field.get_db_prep_value(track.pk, connection),
+             track_field.get_db_prep_value(source.pk, connection)],
+        )
+        n = cursor.rowcount
+    logger.info("Copied %d points from %s to %s in %.2fs", n, source.pk, track.pk, time.perf_counter() - start)
+    return n
@@ -0,0 +1,210 @@
+"""
+Speed charts of a CAN log, as drawn by generate.py at the repository root.
+
+- load_series() runs a log through the app's ingest stages (parse, outlier
+  filters, resample, speeds) and caches the resulting seconds and speed
+  arrays as .npz, keyed by the file's path, size and mtime and by the
+  processing parameters. Reruns on an unchanged log skip the parse.
+- Series are reduced to what the output can show before plotting:
+  downsample_line() keeps the first, last, min and max point of every
+  pixel column (M4), which draws the same line; thin_scatter() keeps one
+  point per pixel. The heatmap is drawn from the time x speed histogram of
+  histograms.summarize(), as stored on tracks at ingest.
+- render_charts() draws each chart with matplotlib's Agg backend in its own
+  worker process.
+
+load_series() needs Django set up, for the ingest stages and the settings
+they default to. Nothing else here imports Django, so render workers don't.
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .histograms import SPEED_BIN, TIME_BIN, summarize
+
+CHARTS = ('line', 'heatmap', 'scatter')
+FILENAMES = {
+    'line': 'speed_vs_time_line.png',
+    'heatmap': 'speed_vs_time_heatmap.png',
+    'scatter': 'speed_vs_time_scatter.png',
+}
+# Figure size in inches
+FIGSIZES = {'line': (12, 6), 'heatmap': (14, 8), 'scatter': (12, 6)}
+DPI = 300
+
+# Bumped whenever load_series() would compute different arrays
+CACHE_VERSION = 1
+
+
+def matplotlib_available():
+    try:
+        import matplotlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cache_key(path, **params):
+    """Cache file name of a log's series, changing with the file and the parameters"""
+    stat = os.stat(path)
+    parts = [CACHE_VERSION, os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    parts += [f'{name}={params[name]!r}' for name in sorted(params)]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '.npz'
+
+
+def load_series(path, time_resolution=1, filters=None, std_multiplier=None, cache_dir=None):
+    """
+    ({'seconds', 'speed'} arrays of a log, whether they came from the
+    cache). filters and std_multiplier default to the configured ones.
+    """
+    from .ingest import load_gps_pivot
+    from .utils import (
+        align_tolerance, calculate_speeds_vectorized, filter_gps_fixes, outlier_filters, outlier_std_multiplier,
+        resample_gps_fixes,
+    )
+
+    filters = outlier_filters() if filters is None else filters
+    std_multiplier = outlier_std_multiplier() if std_multiplier is None else std_multiplier
+    tolerance = align_tolerance()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, cache_key(path, time_resolution=time_resolution, filters=filters,
+                                                       std_multiplier=std_multiplier, tolerance=tolerance))
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                return {'seconds': cached['seconds'], 'speed': cached['speed']}, True
+
+    pivot_df, _, gps_rows = load_gps_pivot(path, tolerance=tolerance)
+    if gps_rows == 0:
+        raise ValueError("No GPS data found")
+    pivot_df = resample_gps_fixes(filter_gps_fixes(pivot_df, filters, std_multiplier), time_resolution)
+    if len(pivot_df) < 2:
+        raise ValueError("Not enough GPS points after processing")
+    series = {'seconds': pivot_df['seconds'].to_numpy(dtype=np.float64),
+              'speed': np.asarray(calculate_speeds_vectorized(pivot_df), dtype=np.float64)}
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written aside and renamed, so a concurrent run never reads half a file
+        partial = f'{cache_path}.{os.getpid()}.partial.npz'
+        np.savez(partial, **series)
+        os.replace(partial, cache_path)
+    return series, False
+
+
+def _pixel_columns(x, width):
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.zeros(len(x), dtype=np.int64)
+    return np.minimum(((x - x[0]) / span * width).astype(np.int64), width - 1)
+
+
+def downsample_line(x, y, width):
+    """
+    Indices of the points of a line (x ascending) to draw it width pixels
+    wide: the first, last, lowest and highest point of each pixel column
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= 4 * width:
+        return np.arange(len(x))
+    columns = _pixel_columns(x, width)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], len(x)] - 1
+    # Sorted by speed within each column, so each column's run starts at its min and ends at its max
+    order = np.lexsort((y, columns))
+    return np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+
+
+def thin_scatter(x, y, width, height):
+    """Indices of the points of a scatter plot to draw it width x height pixels: the first in each pixel"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= width:
+        return np.arange(len(x))
+    px = _pixel_columns(x, width)
+    y_span = y.max() - y.min()
+    py = (np.minimum((y - y.min()) / y_span * height, height - 1).astype(np.int64) if y_span > 0
+          else np.zeros(len(y), dtype=np.int64))
+    _, first = np.unique(px * height + py, return_index=True)
+    return np.sort(first)
+
+
+def chart_data(chart, series, dpi=DPI, in_minutes=True):
+    """What render_chart() needs of series for one chart, reduced to the figure's pixels"""
+    seconds, speeds = series['seconds'], series['speed']
+    width, height = (int(inches * dpi) for inches in FIGSIZES[chart])
+    data = {'in_minutes': in_minutes, 'time_max': float(seconds.max()), 'speed_max': float(speeds.max())}
+    if chart == 'heatmap':
+        data['summary'] = summarize(seconds, speeds, time_bin=TIME_BIN, speed_bin=SPEED_BIN)
+        return data
+    keep = downsample_line(seconds, speeds, width) if chart == 'line' else thin_scatter(seconds, speeds, width, height)
+    data.update(seconds=seconds[keep], speed=speeds[keep])
+    return data
+
+
+def _time_axis(plt, data):
+    scale = 60 if data['in_minutes'] else 1
+    label = 'Time (minutes)' if data['in_minutes'] else 'Time (seconds)'
+    plt.xticks(rotation=45, ticks=np.arange(0, data['time_max'] / scale, step=(5 if data['in_minutes'] else 200)))
+    plt.xlabel(label)
+    return scale, label
+
+
+def render_chart(chart, data, path, dpi=DPI):
+    """Draw one chart from chart_data() to path with the Agg backend. Returns (chart, path, seconds)."""
+    start = time.perf_counter()
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    scale = 60 if data['in_minutes'] else 1
+    plt.figure(figsize=FIGSIZES[chart])
+    if chart == 'line':
+        times = data['seconds'] / scale
+        plt.plot(times, data['speed'], linewidth=1, alpha=0.8)
+        _time_axis(plt, data)
+        plt.title('Speed vs Time')
+        plt.grid(True, alpha=0.3)
+        plt.xlim(times.min(), times.max())
+        plt.ylim(0, max(data['speed_max'] * 1.1, 1))
+    elif chart == 'heatmap':
+        summary = data['summary']
+        hist = np.asarray(summary['histogram2d'], dtype=np.float64)
+        time_start = summary['time']['start']
+        extent = [time_start / scale, (time_start + hist.shape[0] * summary['time_bin']) / scale,
+                  0, hist.shape[1] * summary['speed_bin']]
+        plt.imshow(hist.T, origin='lower', aspect='auto', cmap='plasma', extent=extent)
+        _time_axis(plt, data)
+        plt.colorbar(label='Frequency')
+        plt.title('Speed vs Time Heatmap')
+    else:
+        times = data['seconds'] / scale
+        scatter = plt.scatter(times, data['speed'], c=times, cmap='viridis', alpha=0.6, s=10)
+        _, label = _time_axis(plt, data)
+        plt.colorbar(scatter, label=label)
+        plt.title('Speed vs Time (Color-coded by Time Progression)')
+        plt.grid(True, alpha=0.3)
+    plt.ylabel('Speed (m/s)')
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close()
+    return chart, path, time.perf_counter() - start
+
+
+def render_charts(series, output_dir, charts=CHARTS, dpi=DPI, in_minutes=True, workers=None):
+    """
+    Draw charts of series into output_dir, each in its own worker process
+    (in this one with workers=1). Returns [(chart, path, seconds)].
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(chart, chart_data(chart, series, dpi, in_minutes), os.path.join(output_dir, FILENAMES[chart]), dpi)
+            for chart in charts]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [render_chart(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_chart, *zip(*jobs)))
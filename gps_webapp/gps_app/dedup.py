@@ -0,0 +1,162 @@
+"""
+Reuse of work across identical uploads.
+
+Uploads are identified by the SHA-256 of their file (GPSTrack.content_hash).
+When the same log is uploaded again:
+
+- the new copy of the file is dropped and the track points at the file of
+  the first upload (share_upload)
+- if an earlier track was processed with the same time_resolution, outlier
+  filters, sensor align tolerance and speed method, its points, statistics, polylines, laps and grid are reused
+  instead of running the pipeline (copy_processed). Columnar points are
+  hard-linked, GPSPoint rows are copied by one INSERT ... SELECT.
+- otherwise only the stages after the parse run, from the parsed fixes
+  cached under the content hash (see storage.write_intermediate)
+
+Jobs record what they saved in saved_cpu_seconds and saved_bytes.
+"""
+import logging
+import os
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from . import bulkload, storage
+from .models import GPSTrack, Lap, ProcessingJob, TrackPolyline, UploadSession
+from .utils import align_tolerance, speed_method
+
+logger = logging.getLogger(__name__)
+
+# Statistics (and the lap line) copied along with the points
+TRACK_STAT_FIELDS = [
+    'total_points', 'duration', 'max_speed', 'avg_speed',
+    'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude',
+    'lap_gate', 'lap_gate_detected', 'laps_split_at', 'distributions',
+]
+# The processing parameters they were made with
+PARAMETER_FIELDS = ['time_resolution', 'outlier_std_multiplier', 'outlier_filters', 'align_tolerance_ms',
+                    'speed_method']
+# All copy_processed writes to the track, so that e.g. a rename made meanwhile stands
+COPIED_FIELDS = TRACK_STAT_FIELDS + PARAMETER_FIELDS + ['processed', 'point_storage']
+
+
+def share_upload(track):
+    """
+    Point track at the stored file of an earlier upload with the same
+    content and delete its own copy. Returns the bytes freed.
+    """
+    if not track.content_hash:
+        return 0
+    original = (GPSTrack.objects.filter(content_hash=track.content_hash)
+                .exclude(id=track.id).exclude(uploaded_file=track.uploaded_file.name)
+                .order_by('uploaded_at').first())
+    if original is None or not os.path.exists(original.uploaded_file.path):
+        return 0
+    # Another upload session may still be writing this one, or another track already shares it
+    if track.upload_sessions.filter(status=UploadSession.UPLOADING).exists():
+        return 0
+    if GPSTrack.objects.filter(uploaded_file=track.uploaded_file.name).exclude(id=track.id).exists():
+        return 0
+    path = track.uploaded_file.path
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    GPSTrack.objects.filter(id=track.id).update(uploaded_file=original.uploaded_file.name)
+    track.uploaded_file.name = original.uploaded_file.name
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    logger.info("Track %s shares the upload of %s (%d bytes freed)", track.id, original.id, size)
+    return size
+
+
+def find_processed_twin(track, time_resolution, std_multiplier, filters):
+    """
+    An earlier track with the same content processed with the same
+    parameters and the current align tolerance and speed method, or None
+    """
+    if not track.content_hash:
+        return None
+    return (GPSTrack.objects.filter(
+                content_hash=track.content_hash, processed=True,
+                time_resolution=time_resolution, outlier_std_multiplier=std_multiplier,
+                outlier_filters=filters, align_tolerance_ms=align_tolerance(), speed_method=speed_method())
+            .exclude(id=track.id).order_by('uploaded_at').first())
+
+
+def processing_cost(track):
+    """CPU seconds it took to process track from its file, including any work it reused itself"""
+    job = (track.jobs.filter(status=ProcessingJob.SUCCEEDED, cpu_seconds__isnull=False)
+           .order_by('-finished_at').first())
+    if job is None:
+        return 0.0
+    return job.cpu_seconds + job.saved_cpu_seconds
+
+
+def copy_processed(source, track):
+    """
+    Give track the points, statistics, polylines, laps and grid of source, processed
+    from the same file with the same parameters, in the configured point
+    storage. Returns the bytes shared.
+    """
+    for name in TRACK_STAT_FIELDS + PARAMETER_FIELDS:
+        setattr(track, name, getattr(source, name))
+    track.processed = True
+    track.point_storage = backend = storage.default_backend()
+
+    polylines = [
+        TrackPolyline(track=track, zoom=p.zoom, algorithm=p.algorithm, tolerance=p.tolerance,
+                      vertex_count=p.vertex_count, vertices=p.vertices)
+        for p in source.polylines.all()
+    ]
+    laps = [Lap(track=track, **{f.name: getattr(lap, f.name) for f in Lap._meta.concrete_fields
+                                if f.name not in ('id', 'track')})
+            for lap in source.laps.all()]
+    # The grid is derived from the same points
+    grid_shared = storage.link_grid(source, track)
+    # Points and statistics land together or not at all
+    if backend == storage.COLUMNAR:
+        if source.point_storage == storage.COLUMNAR:
+            shared = storage.link_columnar(source, track)
+        else:
+            shared = 0
+            storage.write_columnar(track, storage.load_point_arrays(source))
+        try:
+            with transaction.atomic():
+                track.save(update_fields=COPIED_FIELDS)
+                TrackPolyline.objects.bulk_create(polylines)
+                Lap.objects.bulk_create(laps)
+        except Exception:
+            storage.delete_columnar(track)
+            raise
+        return shared + grid_shared
+
+    with transaction.atomic():
+        if source.point_storage == storage.ROWS:
+            bulkload.copy_points(source, track)
+        else:
+            bulkload.insert_points(track, storage.load_point_arrays(source))
+        track.save(update_fields=COPIED_FIELDS)
+        TrackPolyline.objects.bulk_create(polylines)
+        Lap.objects.bulk_create(laps)
+    return grid_shared
+
+
+def intermediate_cost(track):
+    """CPU seconds the parse of track's file took, if its parsed fixes are cached, else None"""
+    meta = storage.read_intermediate_meta(track.content_hash, align_tolerance())
+    return meta.get('parse_cpu_seconds', 0.0) if meta is not None else None
+
+
+def stats():
+    """Totals of the work saved by reusing identical uploads"""
+    totals = ProcessingJob.objects.aggregate(
+        jobs=Count('id', filter=Q(status=ProcessingJob.SUCCEEDED)),
+        reused_points=Count('id', filter=Q(reused_from__isnull=False)),
+        reused_parse=Count('id', filter=Q(reused_from__isnull=True, saved_cpu_seconds__gt=0)),
+        saved_cpu_seconds=Sum('saved_cpu_seconds'),
+        saved_bytes=Sum('saved_bytes'),
+        cpu_seconds=Sum('cpu_seconds'),
+    )
+    for name in ('saved_cpu_seconds', 'saved_bytes', 'cpu_seconds'):
+        totals[name] = totals[name] or 0
+    return totals
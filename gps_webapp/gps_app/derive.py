@@ -0,0 +1,78 @@
+"""
+What ingest derives from a track's point columns: statistics, lap line and
+laps, speed distributions, zoom-level polylines and the cell grid.
+
+derive_track() is the one place this is computed, for uploads
+(utils.process_gps_csv) and for the batch import workers
+(import_worker.compute_log) alike. It writes nothing; see
+utils.store_derived for that.
+
+The GPS_* settings it depends on come in as params (utils.derive_params()),
+since spawned workers don't see the parent's overrides. No Django imports.
+"""
+from contextlib import nullcontext
+
+import numpy as np
+
+from . import simplify
+from .gates import split_laps
+from .grids import CellGrid
+from .histograms import summarize
+from .instrumentation import Stage
+
+
+def track_stats(columns):
+    """Point count, duration, speeds and bounds of point columns, as GPSTrack fields"""
+    speeds, lats, lons = columns['speed'], columns['latitude'], columns['longitude']
+    return {
+        'total_points': len(speeds),
+        'duration': float(columns['timestamp'][-1]) if len(speeds) else 0.0,
+        'max_speed': float(np.max(speeds)) if len(speeds) else 0.0,
+        'avg_speed': float(np.mean(speeds)) if len(speeds) else 0.0,
+        'min_latitude': float(lats.min()),
+        'max_latitude': float(lats.max()),
+        'min_longitude': float(lons.min()),
+        'max_longitude': float(lons.max()),
+    }
+
+
+def zoom_polylines(lats, lons, speeds):
+    """[(zoom, tolerance, vertex_count, packed vertices)] for every zoom in simplify.ZOOM_LEVELS"""
+    return [
+        (zoom, tolerance, len(indices), simplify.pack_vertices(indices, lats, lons, speeds))
+        for zoom, (tolerance, indices) in simplify.zoom_levels(lats, lons).items()
+    ]
+
+
+def derive_track(columns, params, gate=None, profile=None):
+    """
+    Everything ingest derives from point columns, as a dict: stats,
+    lap_gate and laps (split at gate, or at a detected line if None),
+    distributions, polylines (see zoom_polylines) and grid (a CellGrid).
+
+    params holds grid_zoom, sectors, min_lap_seconds, time_bin and
+    speed_bin. With profile (an instrumentation.StageProfile) the laps,
+    distributions, polylines and grid stages are timed.
+    """
+    def stage(name):
+        return profile.stage(name, rows_in=count) if profile is not None else nullcontext(Stage(name, count))
+
+    timestamps, lats, lons, speeds = columns['timestamp'], columns['latitude'], columns['longitude'], columns['speed']
+    count = len(timestamps)
+    derived = {'stats': track_stats(columns)}
+    with stage('laps') as record:
+        derived['lap_gate'], derived['laps'] = split_laps(timestamps, lats, lons, speeds, gate=gate,
+                                                          sectors=params['sectors'],
+                                                          min_lap_seconds=params['min_lap_seconds'])
+        record.rows_out = len(derived['laps'])
+    with stage('distributions') as record:
+        derived['distributions'] = summarize(timestamps, speeds, time_bin=params['time_bin'],
+                                             speed_bin=params['speed_bin'])
+        record.rows_out = len(derived['distributions']['histogram2d'])
+    with stage('polylines') as record:
+        derived['polylines'] = zoom_polylines(lats, lons, speeds)
+        record.rows_out = len(derived['polylines'])
+    with stage('grid') as record:
+        derived['grid'] = CellGrid.from_points(lats, lons, timestamps, speeds, zoom=params['grid_zoom'])
+        record.rows_out = len(derived['grid'])
+    return derived
@@ -0,0 +1,50 @@
+"""
+Speed distributions of processed tracks, stored as GPSTrack.distributions.
+
+They are summarized from the points at ingest (see histograms.py), so the
+distributions/ endpoint and dashboards never rescan a track's points.
+Tracks processed before distributions existed, or with other bin widths
+than the configured ones, get theirs rebuilt and stored on first use.
+"""
+from django.conf import settings
+
+from . import storage
+from .histograms import MAX_CELLS, SPEED_BIN, TIME_BIN, summarize
+
+
+def time_bin_seconds():
+    return float(getattr(settings, 'GPS_DISTRIBUTION_TIME_BIN', TIME_BIN))
+
+
+def speed_bin_width():
+    return float(getattr(settings, 'GPS_DISTRIBUTION_SPEED_BIN', SPEED_BIN))
+
+
+def build_track_distributions(track, columns):
+    """
+    Summarize track's point columns into track.distributions, without
+    saving it; call inside the ingest transaction. Returns the summary.
+    """
+    track.distributions = summarize(columns['timestamp'], columns['speed'],
+                                    time_bin=time_bin_seconds(), speed_bin=speed_bin_width())
+    return track.distributions
+
+
+def summarize_track(track, time_bin, speed_bin):
+    """
+    A processed track's distributions at other bin widths, from its points.
+    Not stored. Raises ValueError if the bins are too narrow for MAX_CELLS.
+    """
+    columns = storage.load_point_arrays(track, ['timestamp', 'speed'])
+    return summarize(columns['timestamp'], columns['speed'], time_bin=time_bin, speed_bin=speed_bin,
+                     max_cells=MAX_CELLS)
+
+
+def track_distributions(track):
+    """The stored distributions of a processed track, rebuilt if missing or at other bin widths"""
+    stored = track.distributions
+    if stored is not None and (stored['time_bin'], stored['speed_bin']) == (time_bin_seconds(), speed_bin_width()):
+        return stored
+    build_track_distributions(track, storage.load_point_arrays(track, ['timestamp', 'speed']))
+    track.save(update_fields=['distributions'])
+    return track.distributions
@@ -0,0 +1,217 @@
+"""
+Lap segmentation of a track at a start/finish line.
+
+A gate is a short segment across the course, [[lat, lon], [lat, lon]].
+Laps start and end where the path crosses it, in the direction most of its
+crossings go. Without a gate, one is found by loop closure: candidate gates
+are placed across the path at points spread over the moving part of the
+track, and the one the path comes back through most often wins.
+
+Only path segments with an end near a gate can cross it; they are found
+through a spatial.GridIndex of the points, so trying a gate costs about as
+much as the points around it, not a scan of the track. Crossing times and
+distances are interpolated between the fixes either side of the line.
+Crossings less than min_lap_seconds after the last one (jitter at the
+line, a spin) are dropped, and the out-lap before the first crossing and
+the in-lap after the last are not laps.
+
+Sector splits are the times between crossings of sector gates, placed
+across the path at equal distances along the first lap.
+
+No Django imports.
+"""
+import math
+
+import numpy as np
+
+from .geodesy import WGS84_A
+from .spatial import GridIndex
+
+SECTORS = 3
+MIN_LAP_SECONDS = 20.0
+
+# Meters either side of the path a gate reaches
+GATE_HALF_WIDTH = 15.0
+# Gates tried when looking for the start/finish line
+GATE_CANDIDATES = 32
+# Candidate gates are only placed where the car moves faster than this (m/s)
+MOVING_SPEED = 3.0
+# A gate is square to the path over this many meters either side of it
+HEADING_SPAN = 5.0
+# Steps longer than this (meters), i.e. gaps in the fixes, are not checked for crossings
+MAX_STEP = 100.0
+
+
+class LapSplitter:
+    """
+    Gate crossings and laps of one track's points (timestamp seconds,
+    latitude, longitude and speed arrays in timestamp order)
+    """
+
+    def __init__(self, seconds, lats, lons, speeds=None, min_lap_seconds=MIN_LAP_SECONDS, indexed=True,
+                 index=None):
+        self.seconds = np.asarray(seconds, dtype=np.float64)
+        self.speeds = np.asarray(speeds, dtype=np.float64) if speeds is not None else None
+        self.min_lap_seconds = min_lap_seconds
+        # The index's local meters are the plane crossings are computed in
+        self.index = index if index is not None else GridIndex(lats, lons)
+        self.indexed = indexed
+        x, y = self.index.x, self.index.y
+        steps = np.hypot(np.diff(x), np.diff(y))
+        self.distance = np.concatenate(([0.0], np.cumsum(steps)))
+        self.reach = min(float(steps.max()), MAX_STEP) if len(steps) else 0.0
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def _local(self, gate):
+        """Gate endpoints in the index's local meters: (ax, ay, bx, by)"""
+        (a_lat, a_lon), (b_lat, b_lon) = gate
+        x, y = self.index.project([a_lat, b_lat], [a_lon, b_lon])
+        x, y = x - self.index.x0, y - self.index.y0
+        return x[0], y[0], x[1], y[1]
+
+    def _degrees(self, x, y):
+        """(lat, lon) of a point in the index's local meters"""
+        lon = math.degrees((x + self.index.x0) / (WGS84_A * math.cos(self.index.phi0)))
+        lat = math.degrees((y + self.index.y0) / WGS84_A)
+        return lat, lon
+
+    def _segments(self, gate):
+        """Start indices, ascending, of the path segments that may cross gate"""
+        n = len(self)
+        if not self.indexed:
+            return np.arange(max(n - 1, 0))
+        (a_lat, a_lon), (b_lat, b_lon) = gate
+        margin = math.degrees(self.reach / WGS84_A)
+        lon_margin = margin / max(math.cos(self.index.phi0), 1e-6)
+        near = self.index.bbox(min(a_lon, b_lon) - lon_margin, min(a_lat, b_lat) - margin,
+                               max(a_lon, b_lon) + lon_margin, max(a_lat, b_lat) + margin)
+        # A segment crossing the gate has an end within reach of it
+        segments = np.unique(np.concatenate((near - 1, near)))
+        return segments[(segments >= 0) & (segments < n - 1)]
+
+    def crossings(self, gate):
+        """(times, distances along the path, directions ±1) of the path's crossings of gate"""
+        ax, ay, bx, by = self._local(gate)
+        s = self._segments(gate)
+        x, y = self.index.x, self.index.y
+        px, py = x[s], y[s]
+        dx, dy = x[s + 1] - px, y[s + 1] - py
+        ex, ey = bx - ax, by - ay
+        denom = dx * ey - dy * ex
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = ((ax - px) * ey - (ay - py) * ex) / denom
+            u = ((ax - px) * dy - (ay - py) * dx) / denom
+        # Half-open along the path so a fix exactly on the line counts once
+        hit = (denom != 0) & (t >= 0) & (t < 1) & (u >= 0) & (u <= 1) & (np.hypot(dx, dy) <= self.reach)
+        s, t = s[hit], t[hit]
+        times = self.seconds[s] + t * (self.seconds[s + 1] - self.seconds[s])
+        distances = self.distance[s] + t * (self.distance[s + 1] - self.distance[s])
+        return times, distances, np.sign(denom[hit]).astype(np.int8)
+
+    def boundaries(self, gate):
+        """(times, distances) of the gate crossings that start or end laps"""
+        times, distances, directions = self.crossings(gate)
+        forward = directions == (1 if (directions > 0).sum() >= (directions < 0).sum() else -1)
+        times, distances = times[forward], distances[forward]
+        keep, last = [], -math.inf
+        for i, time in enumerate(times.tolist()):
+            if time - last >= self.min_lap_seconds:
+                keep.append(i)
+                last = time
+        return times[keep], distances[keep]
+
+    def gate_at(self, distance, half_width=GATE_HALF_WIDTH):
+        """A gate square to the path at distance meters along it, None where it doesn't move"""
+        at = [distance - HEADING_SPAN, distance, distance + HEADING_SPAN]
+        x0, cx, x1 = np.interp(at, self.distance, self.index.x)
+        y0, cy, y1 = np.interp(at, self.distance, self.index.y)
+        hx, hy = x1 - x0, y1 - y0
+        length = math.hypot(hx, hy)
+        if length == 0:
+            return None
+        nx, ny = -hy / length * half_width, hx / length * half_width
+        return [list(self._degrees(cx - nx, cy - ny)), list(self._degrees(cx + nx, cy + ny))]
+
+    def detect_gate(self, candidates=GATE_CANDIDATES):
+        """The candidate gate the path crosses most often (at least twice), or None"""
+        if len(self) < 2:
+            return None
+        moving = np.arange(len(self))
+        if self.speeds is not None:
+            moving = np.flatnonzero(self.speeds > MOVING_SPEED)
+        if not len(moving):
+            return None
+        anchors = np.unique(moving[np.linspace(0, len(moving) - 1, candidates).astype(np.int64)])
+        best, best_count = None, 1
+        for anchor in anchors.tolist():
+            gate = self.gate_at(self.distance[anchor])
+            if gate is None:
+                continue
+            count = len(self.boundaries(gate)[0])
+            # Ties go to the earliest, so the line sits near where the laps start
+            if count > best_count:
+                best, best_count = gate, count
+        return best
+
+    def laps(self, gate, sectors=SECTORS):
+        """The laps between gate's crossings, as dicts of their boundaries, times and speeds"""
+        times, distances = self.boundaries(gate)
+        if len(times) < 2:
+            return []
+        sector_times = []
+        for k in range(1, sectors):
+            sector_gate = self.gate_at(distances[0] + (distances[1] - distances[0]) * k / sectors)
+            if sector_gate is None:
+                sector_times.append(np.zeros(0))
+                continue
+            crossed, _, directions = self.crossings(sector_gate)
+            # The first lap's own direction through the sector line
+            first = (crossed > times[0]) & (crossed < times[1])
+            direction = directions[first][0] if first.any() else 1
+            sector_times.append(crossed[directions == direction])
+
+        laps = []
+        for number, (start, end) in enumerate(zip(times[:-1].tolist(), times[1:].tolist()), start=1):
+            split_times, last = [start], start
+            for crossed in sector_times:
+                inside = crossed[(crossed > last) & (crossed < end)]
+                if len(inside):
+                    last = float(inside[0])
+                    split_times.append(last)
+                else:
+                    split_times.append(None)
+            split_times.append(end)
+            start_index = int(np.searchsorted(self.seconds, start, side='left'))
+            end_index = int(np.searchsorted(self.seconds, end, side='right'))
+            speeds = self.speeds[start_index:end_index] if self.speeds is not None else np.zeros(0)
+            speeds = speeds[np.isfinite(speeds)]
+            laps.append({
+                'number': number,
+                'start_time': start,
+                'end_time': end,
+                'lap_time': end - start,
+                'distance': float(distances[number] - distances[number - 1]),
+                'start_index': start_index,
+                'end_index': end_index,
+                'max_speed': float(speeds.max()) if len(speeds) else None,
+                'avg_speed': float(speeds.mean()) if len(speeds) else None,
+                'min_speed': float(speeds.min()) if len(speeds) else None,
+                'sectors': [b - a if a is not None and b is not None else None
+                            for a, b in zip(split_times[:-1], split_times[1:])],
+            })
+        return laps
+
+
+def split_laps(seconds, lats, lons, speeds=None, gate=None, sectors=SECTORS, min_lap_seconds=MIN_LAP_SECONDS):
+    """
+    (gate, laps) of a track's points. The gate is found by loop closure
+    when not given; it is None, and there are no laps, if none was found.
+    """
+    splitter = LapSplitter(seconds, lats, lons, speeds, min_lap_seconds=min_lap_seconds)
+    if gate is None:
+        gate = splitter.detect_gate()
+        if gate is None:
+            return None, []
+    return gate, splitter.laps(gate, sectors=sectors)
@@ -0,0 +1,194 @@
+"""
+Vectorized distance and speed calculations for GPS tracks.
+
+Every function works on whole NumPy arrays at once. Three methods are
+available:
+
+- 'vincenty': inverse Vincenty on the WGS-84 ellipsoid. Agrees with geopy's
+  geodesic (Karney) to well under a millimetre for consecutive GPS fixes.
+- 'haversine': great circle on a sphere of the mean Earth radius.
+- 'equirectangular': local flat projection using the ellipsoid's radii of
+  curvature at the segment mid-latitude. Cheapest, and accurate to a few ppm
+  over the short hops between fixes.
+
+No Django imports, so generate.py can use this module directly.
+"""
+import numpy as np
+
+# WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+MEAN_EARTH_RADIUS = 6371008.8
+
+# Speeds above this (m/s, ~300 mph) are GPS glitches and are reported as 0
+MAX_SPEED = 134
+
+METHODS = ('vincenty', 'haversine', 'equirectangular')
+DEFAULT_METHOD = 'vincenty'
+
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters between paired points (degrees)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    h = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * MEAN_EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def equirectangular_distances(lat1, lon1, lat2, lon2):
+    """Flat-earth distance in meters using the ellipsoid at the mid-latitude."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dlam = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    dlam = (dlam + np.pi) % (2 * np.pi) - np.pi
+    phi_m = (phi1 + phi2) / 2
+    w = 1 - WGS84_E2 * np.sin(phi_m) ** 2
+    meridional = WGS84_A * (1 - WGS84_E2) / w ** 1.5
+    prime_vertical = WGS84_A / np.sqrt(w)
+    dy = meridional * (phi2 - phi1)
+    dx = prime_vertical * np.cos(phi_m) * dlam
+    return np.hypot(dx, dy)
+
+
+def vincenty_distances(lat1, lon1, lat2, lon2, tol=1e-12, max_iter=200):
+    """
+    Ellipsoidal distance in meters between paired points (degrees).
+
+    Pairs that do not converge (nearly antipodal points, never seen between
+    consecutive fixes) fall back to geographiclib one at a time.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2))
+    )
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (v.ravel() for v in (lat1, lon1, lat2, lon2))
+
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    n = L.size
+    sin_sigma = np.zeros(n)
+    cos_sigma = np.ones(n)
+    sigma = np.zeros(n)
+    cos2_alpha = np.ones(n)
+    cos_2sigma_m = np.zeros(n)
+    lam = L.copy()
+
+    # Only pairs that have not converged yet are iterated
+    active = np.arange(n)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        s_u1, c_u1 = sinU1[active], cosU1[active]
+        s_u2, c_u2 = sinU2[active], cosU2[active]
+        lam_a = lam[active]
+        sin_lam, cos_lam = np.sin(lam_a), np.cos(lam_a)
+
+        s_sigma = np.hypot(c_u2 * sin_lam, c_u1 * s_u2 - s_u1 * c_u2 * cos_lam)
+        c_sigma = s_u1 * s_u2 + c_u1 * c_u2 * cos_lam
+        sig = np.arctan2(s_sigma, c_sigma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(s_sigma == 0, 0.0, c_u1 * c_u2 * sin_lam / s_sigma)
+            c2_alpha = 1 - sin_alpha ** 2
+            c_2sm = np.where(c2_alpha == 0, 0.0, c_sigma - 2 * s_u1 * s_u2 / c2_alpha)
+        C = f / 16 * c2_alpha * (4 + f * (4 - 3 * c2_alpha))
+        lam_new = L[active] + (1 - C) * f * sin_alpha * (
+            sig + C * s_sigma * (c_2sm + C * c_sigma * (-1 + 2 * c_2sm ** 2))
+        )
+
+        sin_sigma[active] = s_sigma
+        cos_sigma[active] = c_sigma
+        sigma[active] = sig
+        cos2_alpha[active] = c2_alpha
+        cos_2sigma_m[active] = c_2sm
+        lam[active] = lam_new
+
+        active = active[np.abs(lam_new - lam_a) > tol]
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (
+        cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        )
+    )
+    distances = WGS84_B * A * (sigma - delta_sigma)
+
+    if active.size:
+        from geographiclib.geodesic import Geodesic
+        for i in active:
+            distances[i] = Geodesic.WGS84.Inverse(lat1[i], lon1[i], lat2[i], lon2[i])['s12']
+    return distances.reshape(shape)
+
+
+DISTANCE_FUNCTIONS = {
+    'vincenty': vincenty_distances,
+    'haversine': haversine_distances,
+    'equirectangular': equirectangular_distances,
+}
+
+
+def path_distances(lats, lons, method=DEFAULT_METHOD):
+    """Distances in meters between consecutive points (length n - 1)."""
+    if method not in DISTANCE_FUNCTIONS:
+        raise ValueError(f"Unknown distance method '{method}', expected one of {METHODS}")
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return DISTANCE_FUNCTIONS[method](lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def calculate_speeds(lats, lons, seconds, method=DEFAULT_METHOD, max_speed=MAX_SPEED):
+    """
+    Speed in m/s at each point, measured from the previous point.
+
+    The first point gets 0, as do points with a zero or negative time delta
+    and points faster than max_speed.
+    """
+    n = len(lats)
+    speeds = np.zeros(n)
+    if n <= 1:
+        return speeds
+
+    distances = path_distances(lats, lons, method)
+    time_diff = np.diff(np.asarray(seconds, dtype=np.float64))
+    moving = time_diff > 0
+    segment_speeds = np.zeros(n - 1)
+    np.divide(distances, time_diff, out=segment_speeds, where=moving)
+    segment_speeds[segment_speeds > max_speed] = 0
+    speeds[1:] = segment_speeds
+    return speeds
+
+
+def geopy_error(lats, lons, method=DEFAULT_METHOD, sample=10_000):
+    """
+    Compare path_distances against geopy's geodesic on up to `sample` hops.
+
+    Returns max and mean absolute error in meters and max relative error.
+    """
+    from geopy.distance import geodesic
+
+    lats = np.asarray(lats, dtype=np.float64)[:sample + 1]
+    lons = np.asarray(lons, dtype=np.float64)[:sample + 1]
+    ours = path_distances(lats, lons, method)
+    reference = np.array([
+        geodesic((lats[i], lons[i]), (lats[i + 1], lons[i + 1])).meters
+        for i in range(len(lats) - 1)
+    ])
+    abs_err = np.abs(ours - reference)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rel_err = np.where(reference > 0, abs_err / reference, 0.0)
+    return {
+        'method': method,
+        'pairs': len(reference),
+        'max_abs_m': float(abs_err.max()) if len(abs_err) else 0.0,
+        'mean_abs_m': float(abs_err.mean()) if len(abs_err) else 0.0,
+        'max_rel': float(rel_err.max()) if len(rel_err) else 0.0,
+    }
@@ -0,0 +1,206 @@
+"""
+Per-cell aggregates of track points that merge across tracks.
+
+Cells are the Web-Mercator pixels of one zoom level (GRID_ZOOM, ~2 m), so
+every track shares the same grid and a cell is keyed by (y << 32) | x of
+its pixel, as in heatmap.HeatmapSource.zoom_max(). Only occupied cells are
+kept. Each one holds:
+
+- count: samples in the cell
+- dwell: seconds spent in it (heatmap.point_weights()'s 'dwell')
+- speed_sum, speed_count and speed_max, for the mean and max speed
+- a histogram of speeds in SPEED_BIN m/s bins, kept sparse as
+  (cell, bin, count) triplets, for percentiles
+
+All of these add up (or max up), so the grid of several tracks is the
+merge of their grids, and a coarser zoom is a merge of 4^k pixels. Speed
+percentiles read the histogram's CDF, linear within a bin, so they are
+good to about SPEED_BIN. No Django imports.
+"""
+import math
+
+import numpy as np
+
+from .geodesy import MAX_SPEED
+from .heatmap import TILE_SIZE, point_weights, project
+
+GRID_ZOOM = 16
+SPEED_BIN = 0.5
+SPEED_BINS = int(math.ceil(MAX_SPEED / SPEED_BIN)) + 1
+
+# Arrays of a grid, as stored
+ARRAYS = ('cells', 'count', 'dwell', 'speed_sum', 'speed_count', 'speed_max',
+          'hist_cell', 'hist_bin', 'hist_count')
+
+_LOW_BITS = np.int64(0xFFFFFFFF)
+
+# Merged histograms up to this many (cell, bin) slots (8 MB of counts) are
+# counted densely
+DENSE_HISTOGRAM_LIMIT = 1024 * 1024
+
+
+def _sorted_groups(keys):
+    """(unique keys, group start offsets) of keys, plus the order that sorts them"""
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else np.zeros(0, int)
+    return keys[starts], starts, order
+
+
+class CellGrid:
+    """Aggregates of some points on the pixels of one zoom level"""
+
+    def __init__(self, zoom, cells, count, dwell, speed_sum, speed_count, speed_max,
+                 hist_cell, hist_bin, hist_count):
+        self.zoom = zoom
+        self.cells = cells
+        self.count = count
+        self.dwell = dwell
+        self.speed_sum = speed_sum
+        self.speed_count = speed_count
+        self.speed_max = speed_max
+        # Sorted by (cell, bin); hist_cell indexes cells
+        self.hist_cell = hist_cell
+        self.hist_bin = hist_bin
+        self.hist_count = hist_count
+
+    @classmethod
+    def from_points(cls, lats, lons, timestamps, speeds, zoom=GRID_ZOOM):
+        px, py = project(lats, lons)
+        scale = 2 ** zoom
+        keys = ((py * scale).astype(np.int64) << 32) | (px * scale).astype(np.int64)
+        cells, inverse = np.unique(keys, return_inverse=True)
+        n_cells = len(cells)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        valid = np.isfinite(speeds)
+        speed_cell, speeds = inverse[valid], speeds[valid]
+        speed_max = np.full(n_cells, -np.inf)
+        np.maximum.at(speed_max, speed_cell, speeds)
+        speed_max[np.isneginf(speed_max)] = np.nan
+
+        bins = np.clip(speeds // SPEED_BIN, 0, SPEED_BINS - 1).astype(np.int64)
+        hist_keys, hist_count = np.unique(speed_cell * SPEED_BINS + bins, return_counts=True)
+        return cls(
+            zoom, cells,
+            count=np.bincount(inverse, minlength=n_cells).astype(np.uint32),
+            dwell=np.bincount(inverse, weights=point_weights(timestamps, 'dwell'), minlength=n_cells),
+            speed_sum=np.bincount(speed_cell, weights=speeds, minlength=n_cells),
+            speed_count=np.bincount(speed_cell, minlength=n_cells).astype(np.uint32),
+            speed_max=speed_max,
+            hist_cell=(hist_keys // SPEED_BINS).astype(np.uint32),
+            hist_bin=(hist_keys % SPEED_BINS).astype(np.uint16),
+            hist_count=hist_count.astype(np.uint32),
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(int(arrays['zoom']), *(arrays[name] for name in ARRAYS))
+
+    def to_arrays(self):
+        return dict({name: getattr(self, name) for name in ARRAYS}, zoom=np.int64(self.zoom))
+
+    def __len__(self):
+        return len(self.cells)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def pixels(self):
+        """(x, y) pixel of each cell at the grid's zoom"""
+        return self.cells & _LOW_BITS, self.cells >> 32
+
+    @classmethod
+    def merge(cls, grids, zoom=None):
+        """One grid of all of grids' points, at zoom (at most the finest of theirs)"""
+        zoom = min([grid.zoom for grid in grids] + ([zoom] if zoom is not None else []))
+        cells, hist_keys, hist_count = [], [], []
+        offset = 0
+        for grid in grids:
+            shift = grid.zoom - zoom
+            x, y = grid.pixels()
+            cells.append(((y >> shift) << 32) | (x >> shift))
+            hist_keys.append((grid.hist_cell.astype(np.int64) + offset) * SPEED_BINS + grid.hist_bin)
+            hist_count.append(grid.hist_count)
+            offset += len(grid)
+        keys = np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64)
+        merged, starts, order = _sorted_groups(keys)
+        # Cell of every input cell in the merged grid
+        inverse = np.empty(len(keys), dtype=np.int64)
+        inverse[order] = np.repeat(np.arange(len(merged)), np.diff(np.append(starts, len(keys))))
+
+        def total(name, dtype):
+            values = np.concatenate([getattr(grid, name) for grid in grids]) if grids else np.zeros(0)
+            return np.bincount(inverse, weights=values, minlength=len(merged)).astype(dtype)
+
+        speed_max = np.concatenate([grid.speed_max for grid in grids]) if grids else np.zeros(0)
+        speed_max = np.fmax.reduceat(speed_max[order], starts) if len(starts) else speed_max
+
+        hist_keys = np.concatenate(hist_keys) if grids else np.zeros(0, dtype=np.int64)
+        hist_keys = inverse[hist_keys // SPEED_BINS] * SPEED_BINS + hist_keys % SPEED_BINS
+        hist_count = np.concatenate(hist_count) if grids else np.zeros(0)
+        if len(merged) * SPEED_BINS <= DENSE_HISTOGRAM_LIMIT:
+            # Counting into every (cell, bin) is cheaper than sorting the triplets
+            dense = np.bincount(hist_keys, weights=hist_count, minlength=len(merged) * SPEED_BINS)
+            hist_keys = np.flatnonzero(dense)
+            hist_count = dense[hist_keys]
+        else:
+            hist_keys, hist_inverse = np.unique(hist_keys, return_inverse=True)
+            hist_count = np.bincount(hist_inverse, weights=hist_count, minlength=len(hist_keys))
+        return cls(
+            zoom, merged,
+            count=total('count', np.uint32),
+            dwell=total('dwell', np.float64),
+            speed_sum=total('speed_sum', np.float64),
+            speed_count=total('speed_count', np.uint32),
+            speed_max=speed_max,
+            hist_cell=(hist_keys // SPEED_BINS).astype(np.uint32),
+            hist_bin=(hist_keys % SPEED_BINS).astype(np.uint16),
+            hist_count=hist_count.astype(np.uint32),
+        )
+
+    def crop(self, west, south, east, north):
+        """The cells whose pixel overlaps the box, in degrees"""
+        (x0, x1), (y1, y0) = (np.floor(v * 2 ** self.zoom).astype(np.int64)
+                              for v in project([south, north], [west, east]))
+        x, y = self.pixels()
+        keep = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        remap = np.cumsum(keep) - 1
+        hist_keep = keep[self.hist_cell]
+        return CellGrid(
+            self.zoom, self.cells[keep], self.count[keep], self.dwell[keep], self.speed_sum[keep],
+            self.speed_count[keep], self.speed_max[keep],
+            remap[self.hist_cell[hist_keep]].astype(np.uint32), self.hist_bin[hist_keep],
+            self.hist_count[hist_keep],
+        )
+
+    def mean_speed(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.speed_count > 0, self.speed_sum / self.speed_count, np.nan)
+
+    def speed_percentile(self, q):
+        """q-th percentile (0-100) of the speeds in each cell, NaN where none were recorded"""
+        result = np.full(len(self), np.nan)
+        if not len(self.hist_count):
+            return result
+        cumulative = np.cumsum(self.hist_count, dtype=np.float64)
+        cells, starts, _ = _sorted_groups(self.hist_cell)
+        ends = np.append(starts[1:], len(cumulative)) - 1
+        before = np.where(starts > 0, cumulative[starts - 1], 0.0)
+        target = before + (cumulative[ends] - before) * q / 100
+        index = np.clip(np.searchsorted(cumulative, target, side='left'), starts, ends)
+        # Linear within the bin holding the target
+        below = cumulative[index] - self.hist_count[index]
+        fraction = np.clip((target - below) / self.hist_count[index], 0.0, 1.0)
+        result[cells] = (self.hist_bin[index] + fraction) * SPEED_BIN
+        return np.fmin(result, self.speed_max)
+
+    def cell_centers(self):
+        """(latitude, longitude) of each cell's center"""
+        x, y = self.pixels()
+        scale = TILE_SIZE * 2 ** self.zoom
+        lons = (x + 0.5) / scale * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 0.5) / scale))))
+        return lats, lons
@@ -0,0 +1,190 @@
+"""
+Web-Mercator heatmap tiles from track points.
+
+Points are projected once to zoom-0 pixel coordinates; a tile at (z, x, y)
+is then a vectorized bincount of the points that fall in it. Three weightings
+are supported:
+
+- 'count': number of samples per pixel
+- 'dwell': seconds spent per pixel (time to the next sample, capped)
+- 'speed': mean speed (m/s) of the samples in each pixel
+
+Colour scaling uses the maximum over the whole track at that zoom, so
+neighbouring tiles line up. No Django imports.
+"""
+import io
+import math
+
+import numpy as np
+
+TILE_SIZE = 256
+WEIGHTS = ('count', 'dwell', 'speed')
+DEFAULT_WEIGHT = 'count'
+
+# Gaps longer than this are the logger pausing, not the car sitting still
+MAX_DWELL_SECONDS = 5.0
+# Speed colour ramp tops out here (m/s)
+SPEED_SCALE_MAX = 50.0
+
+MAX_LATITUDE = 85.05112878
+
+# (position, RGBA) stops of the colour ramp
+HEAT_STOPS = [
+    (0.00, (0, 0, 255, 0)),
+    (0.15, (0, 80, 255, 150)),
+    (0.40, (0, 255, 255, 190)),
+    (0.65, (255, 255, 0, 220)),
+    (1.00, (255, 0, 0, 255)),
+]
+SPEED_STOPS = [
+    (0.00, (40, 40, 255, 220)),
+    (0.50, (0, 255, 0, 230)),
+    (0.75, (255, 255, 0, 240)),
+    (1.00, (255, 0, 0, 255)),
+]
+
+
+def _ramp(stops):
+    positions = [p for p, _ in stops]
+    colours = np.array([c for _, c in stops], dtype=np.float64)
+    x = np.linspace(0, 1, 256)
+    return np.stack([np.interp(x, positions, colours[:, i]) for i in range(4)], axis=1).astype(np.uint8)
+
+
+HEAT_LUT = _ramp(HEAT_STOPS)
+SPEED_LUT = _ramp(SPEED_STOPS)
+
+
+def project(lats, lons):
+    """Web-Mercator pixel coordinates at zoom 0 (0-256 on both axes)"""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lons = np.asarray(lons, dtype=np.float64)
+    px = (lons + 180.0) / 360.0 * TILE_SIZE
+    phi = np.radians(lats)
+    py = (1 - np.log(np.tan(phi) + 1 / np.cos(phi)) / math.pi) / 2 * TILE_SIZE
+    return px, py
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) of a tile in degrees"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def point_weights(timestamps, weight):
+    """Per-point weight for the 'count' and 'dwell' weightings"""
+    if weight == 'dwell':
+        dwell = np.zeros(len(timestamps))
+        if len(timestamps) > 1:
+            dwell[:-1] = np.clip(np.diff(timestamps), 0, MAX_DWELL_SECONDS)
+        return dwell
+    return np.ones(len(timestamps))
+
+
+class HeatmapSource:
+    """Projected points of one or more tracks, ready to be binned into tiles"""
+
+    def __init__(self, px, py, timestamps, speeds):
+        self.px = px
+        self.py = py
+        self.speeds = np.nan_to_num(np.asarray(speeds, dtype=np.float64))
+        self.weights = {
+            'count': point_weights(timestamps, 'count'),
+            'dwell': point_weights(timestamps, 'dwell'),
+        }
+        self._zoom_max = {}
+
+    @classmethod
+    def from_arrays(cls, lats, lons, timestamps, speeds):
+        px, py = project(lats, lons)
+        return cls(px, py, np.asarray(timestamps, dtype=np.float64), speeds)
+
+    @classmethod
+    def combine(cls, sources):
+        """Aggregate several tracks into one source"""
+        combined = cls.__new__(cls)
+        combined.px = np.concatenate([s.px for s in sources])
+        combined.py = np.concatenate([s.py for s in sources])
+        combined.speeds = np.concatenate([s.speeds for s in sources])
+        combined.weights = {
+            name: np.concatenate([s.weights[name] for s in sources]) for name in ('count', 'dwell')
+        }
+        combined._zoom_max = {}
+        return combined
+
+    def __len__(self):
+        return len(self.px)
+
+    def _binned(self, z, x, y, size):
+        """Flat cell index of every point inside tile (z, x, y), plus the mask selecting them"""
+        scale = 2 ** z * size / TILE_SIZE
+        gx = self.px * scale - x * size
+        gy = self.py * scale - y * size
+        mask = (gx >= 0) & (gx < size) & (gy >= 0) & (gy < size)
+        return gy[mask].astype(np.int64) * size + gx[mask].astype(np.int64), mask
+
+    def grid(self, z, x, y, weight=DEFAULT_WEIGHT, size=TILE_SIZE):
+        """size x size array of weighted values for tile (z, x, y); row 0 is north"""
+        flat, mask = self._binned(z, x, y, size)
+        cells = size * size
+        if weight == 'speed':
+            total = np.bincount(flat, weights=self.speeds[mask], minlength=cells)
+            count = np.bincount(flat, minlength=cells)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.where(count > 0, total / np.maximum(count, 1), 0.0)
+        else:
+            values = np.bincount(flat, weights=self.weights[weight][mask], minlength=cells)
+        return values.reshape(size, size)
+
+    def zoom_max(self, z, weight=DEFAULT_WEIGHT, size=TILE_SIZE):
+        """Largest cell value anywhere on the track at this zoom, for consistent scaling"""
+        key = (z, weight, size)
+        if key not in self._zoom_max:
+            if weight == 'speed' or len(self) == 0:
+                value = SPEED_SCALE_MAX if weight == 'speed' else 0.0
+            else:
+                scale = 2 ** z * size / TILE_SIZE
+                keys = ((self.py * scale).astype(np.int64) << 32) | (self.px * scale).astype(np.int64)
+                _, inverse = np.unique(keys, return_inverse=True)
+                value = float(np.bincount(inverse, weights=self.weights[weight]).max())
+            self._zoom_max[key] = value
+        return self._zoom_max[key]
+
+
+def colorize(grid, weight, scale_max):
+    """RGBA uint8 image of a grid"""
+    if weight == 'speed':
+        level = np.clip(grid / SPEED_SCALE_MAX, 0, 1)
+        lut = SPEED_LUT
+    else:
+        level = np.log1p(grid) / math.log1p(scale_max) if scale_max > 0 else np.zeros_like(grid)
+        lut = HEAT_LUT
+    image = lut[(np.clip(level, 0, 1) * 255).astype(np.uint8)]
+    image[grid <= 0] = 0
+    return image
+
+
+def render_png(grid, weight, scale_max):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(colorize(grid, weight, scale_max)).save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+def grid_json(grid, z, x, y, weight, scale_max):
+    """Sparse JSON-friendly form of a grid: [column, row, value] for non-empty cells"""
+    rows, cols = np.nonzero(grid)
+    values = grid[rows, cols]
+    return {
+        'z': z, 'x': x, 'y': y,
+        'size': grid.shape[0],
+        'weight': weight,
+        'bounds': tile_bounds(z, x, y),
+        'scale_max': scale_max,
+        'cells': [list(cell) for cell in zip(cols.tolist(), rows.tolist(), values.round(3).tolist())],
+    }
@@ -0,0 +1,106 @@
+"""
+Speed distributions of a track, summarized once from its points.
+
+summarize() reduces a track's (seconds, speed) columns to what the speed
+plots of generate.py draw, at a size independent of the point count:
+
+- speed: count, mean, standard deviation, min/max, percentiles and a
+  histogram in speed_bin wide bins from 0 m/s.
+- time: per time_bin seconds, the sample count, mean and max speed and the
+  speed percentiles (null where a bin has no points).
+- histogram2d: sample counts per time bin and speed bin, the speed vs time
+  heatmap.
+
+Time bins are aligned to multiples of time_bin, speed bins start at 0.
+Values are rounded to RESOLUTION (1 mm/s) to keep the stored JSON small.
+
+No Django imports.
+"""
+import math
+
+import numpy as np
+
+# Seconds per time bin and m/s per speed bin, as generate.py plots them
+TIME_BIN = 10.0
+SPEED_BIN = 2.0
+PERCENTILES = (5, 25, 50, 75, 95)
+RESOLUTION = 3
+# Largest time x speed histogram built on request, see summarize(max_cells=)
+MAX_CELLS = 1_000_000
+
+
+def binned_percentiles(bins, values, n_bins, percentiles):
+    """
+    Percentiles (as np.percentile's linear interpolation) of values within
+    each of n_bins bins: an array of shape (len(percentiles), n_bins), NaN
+    for empty bins. bins are the bin number of each value.
+    """
+    bins = np.asarray(bins, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    order = np.lexsort((values, bins))
+    bins, values = bins[order], values[order]
+    counts = np.bincount(bins, minlength=n_bins)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((len(percentiles), n_bins), np.nan)
+    filled = counts > 0
+    starts, last = starts[filled], counts[filled] - 1
+    for row, q in enumerate(percentiles):
+        rank = last * (q / 100)
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        fraction = rank - low
+        out[row, filled] = values[starts + low] * (1 - fraction) + values[starts + high] * fraction
+    return out
+
+
+def _rounded(values):
+    values = np.round(np.asarray(values, dtype=np.float64), RESOLUTION)
+    return [None if value != value else value for value in values.tolist()]
+
+
+def summarize(seconds, speeds, time_bin=TIME_BIN, speed_bin=SPEED_BIN, percentiles=PERCENTILES, max_cells=None):
+    """
+    The distribution summary of a track's points, as a JSON-ready dict.
+    Raises ValueError if the time x speed histogram would have more than
+    max_cells cells.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    speeds = np.asarray(speeds, dtype=np.float64)
+    summary = {'time_bin': time_bin, 'speed_bin': speed_bin, 'percentiles': list(percentiles)}
+    if not len(speeds):
+        return dict(summary, speed=None, time=None, histogram2d=[])
+
+    speed_bins = np.floor(np.maximum(speeds, 0) / speed_bin).astype(np.int64)
+    n_speed = int(speed_bins.max()) + 1
+    start = math.floor(seconds.min() / time_bin) * time_bin
+    time_bins = np.floor((seconds - start) / time_bin).astype(np.int64)
+    n_time = int(time_bins.max()) + 1
+    if max_cells is not None and n_time * n_speed > max_cells:
+        raise ValueError(f"{n_time} time bins x {n_speed} speed bins is more than {max_cells} cells")
+
+    counts = np.bincount(time_bins, minlength=n_time)
+    with np.errstate(invalid='ignore'):
+        means = np.bincount(time_bins, weights=speeds, minlength=n_time) / counts
+    maxima = np.full(n_time, -np.inf)
+    np.maximum.at(maxima, time_bins, speeds)
+    maxima[counts == 0] = np.nan
+    histogram2d = np.bincount(time_bins * n_speed + speed_bins, minlength=n_time * n_speed).reshape(n_time, n_speed)
+
+    summary['speed'] = {
+        'count': len(speeds),
+        'mean': round(float(speeds.mean()), RESOLUTION),
+        'std': round(float(speeds.std()), RESOLUTION),
+        'min': round(float(speeds.min()), RESOLUTION),
+        'max': round(float(speeds.max()), RESOLUTION),
+        'percentiles': _rounded(np.percentile(speeds, percentiles)),
+        'histogram': np.bincount(speed_bins, minlength=n_speed).tolist(),
+    }
+    summary['time'] = {
+        'start': start,
+        'count': counts.tolist(),
+        'mean': _rounded(means),
+        'max': _rounded(maxima),
+        'percentiles': [_rounded(row) for row in binned_percentiles(time_bins, speeds, n_time, percentiles)],
+    }
+    summary['histogram2d'] = histogram2d.tolist()
+    return summary
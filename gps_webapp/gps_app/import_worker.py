@@ -0,0 +1,54 @@
+"""
+What the worker processes of batch_import run.
+
+Spawned workers unpickle these functions by importing this module before
+their initializer has set Django up, so it imports nothing of Django (or
+of the modules that need it) at module level.
+"""
+import hashlib
+import os
+import time
+
+HASH_BLOCK = 1024 * 1024
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return path, digest.hexdigest()
+
+
+def setup():
+    """Initializer of the worker processes"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gps_tracker.settings')
+    import django
+    django.setup()
+
+
+def compute_log(path, time_resolution, filters, std_multiplier, settings):
+    """
+    Everything process_gps_csv derives from a log, without writing
+    anything. settings holds the GPS_* values of the parent process, whose
+    overrides a spawned worker wouldn't see: tolerance, speed_method and
+    the derive_params() of utils.py.
+    """
+    from .derive import derive_track
+    from .ingest import load_gps_pivot
+    from .utils import calculate_speeds_vectorized, filter_gps_fixes, point_columns, resample_gps_fixes
+
+    cpu_start = time.process_time()
+    filter_stats = []
+    pivot_df, _, gps_rows = load_gps_pivot(path, tolerance=settings['tolerance'])
+    if gps_rows == 0:
+        raise ValueError("No GPS data found")
+    pivot_df = filter_gps_fixes(pivot_df, filters, std_multiplier, filter_stats)
+    pivot_df = resample_gps_fixes(pivot_df, time_resolution)
+    if len(pivot_df) < 2:
+        raise ValueError("Not enough GPS points after processing")
+    columns = point_columns(pivot_df, calculate_speeds_vectorized(pivot_df, method=settings['speed_method']))
+    derived = derive_track(columns, settings)
+    # Shipped back to the parent as plain arrays
+    derived['grid'] = derived['grid'].to_arrays()
+    return dict(derived, columns=columns, filter_stats=filter_stats, cpu_seconds=time.process_time() - cpu_start)
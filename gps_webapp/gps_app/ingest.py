@@ -0,0 +1,308 @@
+"""
+Streaming ingest helpers for CAN bus logs.
+
+Logs can be plain CSV, gzip or zstd compressed CSV (.csv.gz, .csv.zst) or
+Parquet. zstd needs the `zstandard` package and Parquet needs `pyarrow`;
+both are optional.
+
+Only pandas/numpy are used here (no Django imports) so these functions can
+be reused from worker processes, benchmarks and generate.py.
+"""
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+GPS_SENSORS = ('Latitude', 'Longitude')
+
+# Only the columns the GPS pipeline needs. CANID and Unit are never read.
+CSV_COLUMNS = ['Timestamp', 'Sensor', 'Value']
+CSV_DTYPES = {'Timestamp': 'float64', 'Sensor': 'category'}
+
+# Rows per read_csv chunk. Peak memory scales with this, not with file size.
+DEFAULT_CHUNK_ROWS = 500_000
+
+CSV = 'csv'
+CSV_GZIP = 'csv.gz'
+CSV_ZSTD = 'csv.zst'
+PARQUET = 'parquet'
+# Accepted upload suffixes, longest first so .csv.gz isn't taken for .csv
+LOG_FORMATS = (CSV_GZIP, CSV_ZSTD, PARQUET, CSV)
+CSV_COMPRESSION = {CSV: None, CSV_GZIP: 'gzip', CSV_ZSTD: 'zstd'}
+
+_MAGIC = {
+    b'\x1f\x8b': CSV_GZIP,
+    b'\x28\xb5\x2f\xfd': CSV_ZSTD,
+    b'PAR1': PARQUET,
+}
+
+
+def format_from_name(name):
+    """Log format of a file name by its suffix, or None if it isn't one we accept"""
+    name = str(name).lower()
+    for fmt in LOG_FORMATS:
+        if name.endswith('.' + fmt):
+            return fmt
+    return None
+
+
+def format_available(fmt):
+    """Whether the optional library a format needs is installed"""
+    module = {CSV_ZSTD: 'zstandard', PARQUET: 'pyarrow'}.get(fmt)
+    if module is None:
+        return True
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def detect_format(file_path):
+    """Log format of a file on disk, by magic bytes first and then suffix. File objects are taken as CSV."""
+    if not isinstance(file_path, (str, os.PathLike)):
+        return CSV
+    with open(file_path, 'rb') as f:
+        head = f.read(4)
+    for magic, fmt in _MAGIC.items():
+        if head.startswith(magic):
+            return fmt
+    return format_from_name(file_path) or CSV
+
+
+class GrowingFile(io.RawIOBase):
+    """
+    Read-only view of a file that is still being written.
+
+    At end of file, reads wait for more data until is_complete() returns
+    True, so read_csv can stream an upload while its chunks arrive. Raises
+    TimeoutError if the file stops growing for `timeout` seconds.
+    """
+
+    def __init__(self, path, is_complete, poll_interval=0.5, timeout=600):
+        self._file = open(path, 'rb')
+        self.is_complete = is_complete
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        waited = 0.0
+        while True:
+            n = self._file.readinto(buffer)
+            if n:
+                return n
+            if self.is_complete():
+                # Whatever was appended before completion, then a real EOF
+                return self._file.readinto(buffer) or 0
+            if waited >= self.timeout:
+                raise TimeoutError(f"{self._file.name} stopped growing for {self.timeout}s")
+            time.sleep(self.poll_interval)
+            waited += self.poll_interval
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _gps_rows(chunk):
+    gps = chunk[chunk['Sensor'].isin(GPS_SENSORS)]
+    return pd.DataFrame({
+        'Timestamp': gps['Timestamp'].to_numpy(dtype='float64'),
+        'Sensor': gps['Sensor'].astype(str).to_numpy(),
+        'Value': pd.to_numeric(gps['Value'], errors='coerce').to_numpy(),
+    })
+
+
+def iter_parquet_gps_rows(file_path):
+    """
+    Yield (rows_read, gps_rows) per Parquet row group.
+
+    Only the Timestamp, Sensor and Value columns are read, and row groups
+    whose Sensor statistics rule out Latitude and Longitude are skipped
+    without being decompressed (they still count towards rows_read).
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file_path)
+    sensor_index = parquet_file.schema_arrow.get_field_index('Sensor')
+    for i in range(parquet_file.num_row_groups):
+        row_group = parquet_file.metadata.row_group(i)
+        stats = row_group.column(sensor_index).statistics
+        if stats is not None and stats.has_min_max and not any(
+                stats.min <= sensor <= stats.max for sensor in GPS_SENSORS):
+            yield row_group.num_rows, _gps_rows(pd.DataFrame(columns=CSV_COLUMNS))
+            continue
+        table = parquet_file.read_row_group(i, columns=CSV_COLUMNS)
+        yield table.num_rows, _gps_rows(table.to_pandas())
+
+
+def iter_gps_rows(file_path, chunksize=DEFAULT_CHUNK_ROWS, fmt=None):
+    """
+    Yield (rows_read, gps_rows) for each chunk of the log. file_path may
+    also be a file object, e.g. a GrowingFile; pass its fmt then, as there
+    is no name or header to detect it from.
+
+    gps_rows only contains Latitude/Longitude rows, with Sensor as plain str
+    and Value coerced to float64.
+    """
+    fmt = fmt or detect_format(file_path)
+    if fmt == PARQUET:
+        yield from iter_parquet_gps_rows(file_path)
+        return
+
+    reader = pd.read_csv(
+        file_path,
+        usecols=CSV_COLUMNS,
+        dtype=CSV_DTYPES,
+        chunksize=chunksize,
+        compression=CSV_COMPRESSION[fmt],
+    )
+    with reader:
+        for chunk in reader:
+            yield len(chunk), _gps_rows(chunk)
+
+
+def _first_per_timestamp(timestamps, values):
+    """
+    One sensor stream sorted by timestamp, keeping the first non-NaN value
+    logged at each timestamp, like pivot_table(aggfunc='first')
+    """
+    keep = ~np.isnan(values)
+    timestamps, values = timestamps[keep], values[keep]
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, values = timestamps[order], values[order]
+    first = np.empty(len(timestamps), dtype=bool)
+    first[:1] = True
+    np.not_equal(timestamps[1:], timestamps[:-1], out=first[1:])
+    return timestamps[first], values[first]
+
+
+def align_sensor_streams(lat_timestamps, latitudes, lon_timestamps, longitudes, tolerance=0):
+    """
+    Pair a Latitude and a Longitude stream into fixes with a sort-merge join.
+    Returns (timestamps, latitudes, longitudes) sorted by timestamp.
+
+    With tolerance=0 a fix needs both frames at the same Timestamp, which
+    gives the rows of pivot_table(aggfunc='first') without NaNs. A positive
+    tolerance (in Timestamp units, ms) pairs each Latitude with the nearest
+    Longitude at most that far away, each Longitude being used once; the
+    fix takes the earlier of the two timestamps.
+    """
+    lat_t, lat_v = _first_per_timestamp(np.asarray(lat_timestamps), np.asarray(latitudes, dtype=np.float64))
+    lon_t, lon_v = _first_per_timestamp(np.asarray(lon_timestamps), np.asarray(longitudes, dtype=np.float64))
+    if not len(lat_t) or not len(lon_t):
+        empty = np.empty(0, dtype=np.float64)
+        return lat_t[:0], empty, empty
+
+    # Both streams are sorted, so searchsorted walks them like a merge
+    right = np.searchsorted(lon_t, lat_t, side='left')
+    if tolerance <= 0:
+        right = np.minimum(right, len(lon_t) - 1)
+        match = lon_t[right] == lat_t
+        return lat_t[match], lat_v[match], lon_v[right[match]]
+
+    # Nearest Longitude on either side of each Latitude
+    left = np.maximum(right - 1, 0)
+    right = np.minimum(right, len(lon_t) - 1)
+    left_gap = np.abs(lat_t - lon_t[left])
+    right_gap = np.abs(lon_t[right] - lat_t)
+    nearest = np.where(right_gap < left_gap, right, left)
+    gap = np.minimum(left_gap, right_gap)
+    matched = np.flatnonzero(gap <= tolerance)
+
+    # A Longitude claimed by several Latitudes goes to the closest one
+    order = np.lexsort((gap[matched], nearest[matched]))
+    matched = matched[order]
+    claimed = nearest[matched]
+    first = np.empty(len(claimed), dtype=bool)
+    first[:1] = True
+    np.not_equal(claimed[1:], claimed[:-1], out=first[1:])
+    matched = np.sort(matched[first])
+
+    lon_index = nearest[matched]
+    timestamps = np.minimum(lat_t[matched], lon_t[lon_index])
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], lat_v[matched][order], lon_v[lon_index][order]
+
+
+def gps_fixes(timestamps, sensors, values, tolerance=0):
+    """
+    GPS fixes of a log's rows as a frame with Timestamp, Latitude and
+    Longitude columns, see align_sensor_streams()
+    """
+    timestamps = np.asarray(timestamps)
+    sensors = np.asarray(sensors)
+    values = np.asarray(values, dtype=np.float64)
+    is_lat = sensors == 'Latitude'
+    is_lon = sensors == 'Longitude'
+    t, lat, lon = align_sensor_streams(timestamps[is_lat], values[is_lat],
+                                       timestamps[is_lon], values[is_lon], tolerance=tolerance)
+    return pd.DataFrame({'Timestamp': t, 'Latitude': lat, 'Longitude': lon})
+
+
+class GPSPivotAccumulator:
+    """
+    Collects the GPS rows of a streamed log and aligns them into fixes.
+
+    Each chunk is reduced to plain Timestamp/Value arrays per sensor, so
+    only the GPS share of the log is held; finish() joins the whole streams
+    at once, so Latitude and Longitude frames that land in different chunks
+    still pair up.
+    """
+
+    def __init__(self, tolerance=0):
+        self.tolerance = tolerance
+        self._parts = {sensor: [] for sensor in GPS_SENSORS}
+        self.rows_read = 0
+        self.gps_rows = 0
+
+    def add(self, rows_read, gps_rows):
+        self.rows_read += rows_read
+        self.gps_rows += len(gps_rows)
+        if len(gps_rows) == 0:
+            return
+        timestamps = gps_rows['Timestamp'].to_numpy()
+        values = gps_rows['Value'].to_numpy(dtype=np.float64)
+        sensors = gps_rows['Sensor'].to_numpy()
+        for sensor, parts in self._parts.items():
+            mask = sensors == sensor
+            parts.append((timestamps[mask], values[mask]))
+
+    def finish(self):
+        streams = {}
+        for sensor, parts in self._parts.items():
+            streams[sensor] = (
+                np.concatenate([t for t, _ in parts]) if parts else np.empty(0),
+                np.concatenate([v for _, v in parts]) if parts else np.empty(0),
+            )
+            parts.clear()
+        t, lat, lon = align_sensor_streams(*streams['Latitude'], *streams['Longitude'], tolerance=self.tolerance)
+        return pd.DataFrame({'Timestamp': t, 'Latitude': lat, 'Longitude': lon})
+
+
+def load_gps_pivot(file_path, chunksize=DEFAULT_CHUNK_ROWS, fmt=None, tolerance=0):
+    """
+    Read a CAN bus log and return (pivot_df, rows_read, gps_rows).
+
+    pivot_df has Timestamp, Latitude and Longitude columns, one row per fix
+    with both coordinates (see align_sensor_streams() for tolerance). With
+    chunksize=None a CSV is loaded at once; otherwise it is streamed in
+    chunks of that many rows. Parquet is always streamed by row group.
+    """
+    fmt = fmt or detect_format(file_path)
+    if chunksize is None and fmt != PARQUET:
+        df = pd.read_csv(file_path, compression=CSV_COMPRESSION[fmt])
+        filtered_df = df[df['Sensor'].isin(GPS_SENSORS)]
+        pivot_df = gps_fixes(filtered_df['Timestamp'], filtered_df['Sensor'],
+                             pd.to_numeric(filtered_df['Value'], errors='coerce'), tolerance=tolerance)
+        return pivot_df, len(df), len(filtered_df)
+
+    accumulator = GPSPivotAccumulator(tolerance=tolerance)
+    for rows_read, gps_rows in iter_gps_rows(file_path, chunksize=chunksize, fmt=fmt):
+        accumulator.add(rows_read, gps_rows)
+    return accumulator.finish(), accumulator.rows_read, accumulator.gps_rows
@@ -0,0 +1,153 @@
+"""
+Per-stage measurements of the ingest pipeline.
+
+StageProfile times each stage run inside ``with profile.stage(name)``:
+wall seconds, CPU seconds of the calling thread, the rows the stage took
+in and gave out (set by the stage), and memory:
+
+- max_rss_bytes: the process's peak resident size when the stage ended.
+  It is a high-water mark, so it only moves in the stages that raise it.
+- peak_traced_bytes: the peak of Python and numpy allocations during the
+  stage, above what was allocated when it started. Only while tracemalloc
+  is tracing (GPS_TRACE_MEMORY), since tracing slows everything down.
+
+Each finished stage is logged as one structured record (its fields in the
+record's ``stage`` attribute, rendered by JSONFormatter) and passed to the
+observers, e.g. metrics.observe_stage.
+
+profiled() runs a callable under cProfile and dumps the stats for pstats or
+snakeviz.
+
+No Django imports.
+"""
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def max_rss_bytes():
+    """Peak resident size of this process so far, or None where it can't be read"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Stage:
+    """Measurements of one stage; the stage sets rows_in and rows_out"""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.max_rss_bytes = None
+        self.peak_traced_bytes = None
+        self.failed = False
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'max_rss_bytes': self.max_rss_bytes,
+            'peak_traced_bytes': self.peak_traced_bytes,
+            'failed': self.failed,
+        }
+
+
+class StageProfile:
+    """
+    Stages of one pipeline run, in the order they finished. context (e.g.
+    the job and track ids) is logged with every stage.
+    """
+
+    def __init__(self, context=None, observers=()):
+        self.context = dict(context or {})
+        self.observers = list(observers)
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = Stage(name, rows_in)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException:
+            record.failed = True
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - wall_start
+            record.cpu_seconds = time.thread_time() - cpu_start
+            record.max_rss_bytes = max_rss_bytes()
+            if tracing:
+                record.peak_traced_bytes = max(tracemalloc.get_traced_memory()[1] - traced_start, 0)
+            self._finish(record)
+
+    def _finish(self, record):
+        self.stages.append(record)
+        fields = dict(self.context, **record.as_dict())
+        logger.info("Stage %s%s: %.3fs wall, %.3fs CPU, %s -> %s rows", record.name,
+                    " failed" if record.failed else "", record.wall_seconds, record.cpu_seconds,
+                    record.rows_in, record.rows_out, extra={'stage': fields})
+        for observe in self.observers:
+            observe(record)
+
+    def as_list(self):
+        return [record.as_dict() for record in self.stages]
+
+    @property
+    def wall_seconds(self):
+        return sum(record.wall_seconds for record in self.stages)
+
+
+def profiled(path, function, *args, **kwargs):
+    """function(*args, **kwargs) run under cProfile, its stats dumped to path"""
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
+        logger.info("Profile written to %s", path)
+
+
+# Attributes every LogRecord has, as opposed to those passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((name, value) for name, value in vars(record).items() if name not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
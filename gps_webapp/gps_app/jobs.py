@@ -0,0 +1,321 @@
+"""
+Database-backed job queue for track processing.
+
+Uploads create a ProcessingJob row and return straight away. Jobs are run
+either by a thread pool inside the web process (GPS_JOB_BACKEND = 'thread',
+the default) or by one or more ``manage.py process_jobs`` workers polling the
+table (GPS_JOB_BACKEND = 'worker'). No external broker is needed: claiming a
+job is a conditional UPDATE, so several workers can share the table safely.
+"""
+import logging
+import os
+import socket
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dedup, metrics, point_index, response_cache, storage, tiles, uploads
+from .instrumentation import StageProfile, profiled
+from .models import ProcessingJob
+from .utils import process_gps_csv, outlier_filters, outlier_std_multiplier, ProcessingCancelled
+
+logger = logging.getLogger(__name__)
+
+# How often a job waiting on an early-ingest upload's chunks touches its
+# heartbeat; stages touch it as they start
+HEARTBEAT_SECONDS = 30
+
+_executors = {}
+_executors_lock = Lock()
+
+
+def _get_executor(early_ingest=False):
+    """
+    The thread pool for jobs, GPS_JOB_THREADS wide. Early-ingest jobs wait
+    on their upload's chunks for as long as it lasts, so they run in a pool
+    of their own (GPS_EARLY_INGEST_THREADS wide) rather than hold up every
+    other upload's processing.
+    """
+    name = 'early-ingest' if early_ingest else 'job'
+    with _executors_lock:
+        if name not in _executors:
+            setting = 'GPS_EARLY_INGEST_THREADS' if early_ingest else 'GPS_JOB_THREADS'
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=getattr(settings, setting, 4 if early_ingest else 2),
+                thread_name_prefix=f'gps-{name}',
+            )
+        return _executors[name]
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def profile_jobs():
+    return getattr(settings, 'GPS_PROFILE_JOBS', False)
+
+
+def enqueue_track(track, time_resolution, attempt=1, std_multiplier=None, filters=None, profile=False):
+    """
+    Create a queued job for track and hand it to the configured backend.
+    With profile (or GPS_PROFILE_JOBS) the job runs under cProfile.
+    """
+    job = ProcessingJob.objects.create(
+        track=track,
+        time_resolution=time_resolution,
+        outlier_std_multiplier=std_multiplier if std_multiplier is not None else outlier_std_multiplier(),
+        outlier_filters=filters if filters is not None else outlier_filters(),
+        attempt=attempt,
+        profile=profile or profile_jobs(),
+    )
+    dispatch(job)
+    return job
+
+
+def dispatch(job):
+    backend = getattr(settings, 'GPS_JOB_BACKEND', 'thread')
+    if backend == 'thread':
+        executor = _get_executor(early_ingest=uploads.is_uploading(job.track))
+        # Wait for the job row to be committed before another thread looks for it
+        transaction.on_commit(lambda: executor.submit(_run_in_thread, job.id))
+    elif backend != 'worker':
+        raise ValueError(f"Unknown GPS_JOB_BACKEND '{backend}'")
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+class ClaimLost(ProcessingCancelled):
+    """The running job was reclaimed (see reclaim_stale_jobs) from under its run"""
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running. Returns False if someone else got it."""
+    now = timezone.now()
+    claimed = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.QUEUED).update(
+        status=ProcessingJob.RUNNING,
+        started_at=now,
+        heartbeat_at=now,
+        message=f"Claimed by {worker_name()}",
+    )
+    return claimed == 1
+
+
+def claim_next_job():
+    """Claim the oldest queued job, or return None if the queue is empty"""
+    while True:
+        job_id = (ProcessingJob.objects.filter(status=ProcessingJob.QUEUED)
+                  .order_by('created_at').values_list('id', flat=True).first())
+        if job_id is None:
+            return None
+        if claim_job(job_id):
+            return job_id
+
+
+def stale_job_seconds():
+    return getattr(settings, 'GPS_JOB_STALE_SECONDS', 900)
+
+
+def reclaim_stale_jobs():
+    """
+    Fail running jobs whose heartbeat is more than GPS_JOB_STALE_SECONDS
+    old: their worker died with them, and failing them lets them be
+    retried. Returns the number of jobs reclaimed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_job_seconds())
+    stale = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    reclaimed = ProcessingJob.objects.filter(stale, status=ProcessingJob.RUNNING).update(
+        status=ProcessingJob.FAILED,
+        message="Worker stopped before the job finished",
+        finished_at=timezone.now(),
+    )
+    if reclaimed:
+        logger.warning("Reclaimed %d stale running job(s)", reclaimed)
+    return reclaimed
+
+
+# What run_job records when a job finishes
+FINISH_FIELDS = ['status', 'message', 'stage', 'progress', 'finished_at', 'cpu_seconds', 'reused_from',
+                 'saved_cpu_seconds', 'saved_bytes', 'filter_stats', 'stage_stats']
+
+
+def run_job(job_id, claimed=False):
+    """
+    Run a job through process_gps_csv, recording stage progress as it goes
+    and each stage's measurements in job.stage_stats (see
+    instrumentation.py). Work already done for an identical upload is
+    reused, see dedup.py.
+
+    Each stage touches the job's heartbeat and stops the run if the job was
+    reclaimed meanwhile; a run that lost its claim records nothing.
+    """
+    if not claimed and not claim_job(job_id):
+        return None
+
+    job = ProcessingJob.objects.select_related('track').get(id=job_id)
+    track = job.track
+
+    last_beat = time.monotonic()
+
+    def report(stage):
+        nonlocal last_beat
+        status, cancelled = ProcessingJob.objects.filter(id=job.id).values_list('status', 'cancel_requested').get()
+        if status != ProcessingJob.RUNNING:
+            raise ClaimLost()
+        if cancelled:
+            raise ProcessingCancelled()
+        job.stage = stage
+        job.progress = ProcessingJob.STAGES.index(stage) / len(ProcessingJob.STAGES)
+        job.heartbeat_at = timezone.now()
+        last_beat = time.monotonic()
+        job.save(update_fields=['stage', 'progress', 'heartbeat_at'])
+
+    def keep_alive():
+        nonlocal last_beat
+        if time.monotonic() - last_beat < HEARTBEAT_SECONDS:
+            return
+        last_beat = time.monotonic()
+        alive = ProcessingJob.objects.filter(id=job.id, status=ProcessingJob.RUNNING).update(
+            heartbeat_at=timezone.now())
+        if not alive:
+            raise ClaimLost()
+
+    profile = StageProfile(context={'job_id': str(job.id), 'track_id': str(track.id)},
+                           observers=[metrics.observe_stage])
+    if getattr(settings, 'GPS_TRACE_MEMORY', False) and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    source = None
+    try:
+        # A retried job starts from a clean track
+        track.points.all().delete()
+        track.laps.all().delete()
+        track.polylines.all().delete()
+        storage.delete_columnar(track)
+        storage.delete_resolutions(track)
+        storage.delete_grid(track)
+        tiles.invalidate_track(track.id)
+        point_index.invalidate_track(track.id)
+        response_cache.invalidate_track(track.id)
+
+        # Early-ingest uploads are parsed while their remaining chunks arrive
+        source = uploads.open_track_source(track, on_wait=keep_alive)
+        if source is None:
+            job.saved_bytes = dedup.share_upload(track)
+        twin = dedup.find_processed_twin(track, job.time_resolution, job.outlier_std_multiplier,
+                                         job.outlier_filters)
+        if twin is not None:
+            report('insert')
+            job.saved_bytes += dedup.copy_processed(twin, track)
+            job.reused_from = twin
+            job.saved_cpu_seconds = dedup.processing_cost(twin)
+            success, message = True, f"Reused {track.total_points} points of identical upload {twin.id}"
+        else:
+            parse_cost = dedup.intermediate_cost(track)
+            process = partial(process_gps_csv, track, job.time_resolution, progress=report, source=source,
+                              std_multiplier=job.outlier_std_multiplier, filters=job.outlier_filters,
+                              filter_stats=job.filter_stats, profile=profile)
+            if job.profile:
+                success, message = profiled(storage.profile_path(job), process)
+            else:
+                success, message = process()
+            if success and parse_cost is not None:
+                job.saved_cpu_seconds = parse_cost
+    except ClaimLost:
+        pass
+    except ProcessingCancelled:
+        job.status = ProcessingJob.CANCELLED
+        job.message = "Cancelled"
+    except Exception as e:
+        # Anything else still finishes the job, so that it can be retried
+        logger.exception("Job %s failed", job.id, extra={'job_id': str(job.id), 'track_id': str(track.id)})
+        job.status = ProcessingJob.FAILED
+        job.message = f"Error processing track: {e}"
+    else:
+        job.status = ProcessingJob.SUCCEEDED if success else ProcessingJob.FAILED
+        job.message = message
+        if success:
+            job.stage = ''
+            job.progress = 1.0
+    finally:
+        if source is not None:
+            source.close()
+
+    job.cpu_seconds = time.thread_time() - cpu_start
+    if job.reused_from is not None:
+        # What the twin cost to make, less what copying it did
+        job.saved_cpu_seconds = max(job.saved_cpu_seconds - job.cpu_seconds, 0.0)
+    job.stage_stats = profile.as_list()
+    job.finished_at = timezone.now()
+    finished = ProcessingJob.objects.filter(id=job.id, status=ProcessingJob.RUNNING).update(
+        **{name: getattr(job, name) for name in FINISH_FIELDS})
+    if not finished:
+        logger.warning("Job %s was reclaimed while running; dropping its result", job.id,
+                       extra={'job_id': str(job.id), 'track_id': str(track.id)})
+        job.refresh_from_db()
+        return job
+    wall_seconds = time.perf_counter() - wall_start
+    metrics.observe_job(job.status, wall_seconds)
+    logger.info("Job %s finished: %s (%s)", job.id, job.status, job.message,
+                extra={'job_id': str(job.id), 'track_id': str(track.id), 'status': job.status,
+                       'wall_seconds': wall_seconds, 'cpu_seconds': job.cpu_seconds})
+    return job
+
+
+def cancel_job(job):
+    """Cancel a queued job now, or ask a running one to stop after its current stage"""
+    if job.status == ProcessingJob.QUEUED:
+        updated = ProcessingJob.objects.filter(id=job.id, status=ProcessingJob.QUEUED).update(
+            status=ProcessingJob.CANCELLED,
+            message="Cancelled",
+            finished_at=timezone.now(),
+        )
+        if updated:
+            job.refresh_from_db()
+            return job
+    if job.status in (ProcessingJob.QUEUED, ProcessingJob.RUNNING):
+        ProcessingJob.objects.filter(id=job.id).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def retry_job(job):
+    """Queue a fresh attempt of a failed or cancelled job"""
+    return enqueue_track(job.track, job.time_resolution, attempt=job.attempt + 1,
+                         std_multiplier=job.outlier_std_multiplier, filters=job.outlier_filters,
+                         profile=job.profile)
+
+
+def run_worker(once=False, poll_interval=1.0):
+    """
+    Process queued jobs until interrupted.
+
+    With once=True, return as soon as the queue is empty. Returns the number
+    of jobs run.
+    """
+    processed = 0
+    reclaim_stale_jobs()
+    while True:
+        close_old_connections()
+        job_id = claim_next_job()
+        if job_id is None:
+            reclaim_stale_jobs()
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job_id, claimed=True)
+        processed += 1
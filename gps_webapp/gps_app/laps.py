@@ -0,0 +1,66 @@
+"""
+Laps of processed tracks, stored as Lap rows.
+
+Laps are split at ingest, at the track's start/finish line: the one set
+through the API (GPSTrack.lap_gate with lap_gate_detected off), else one
+found by loop closure, see gates.py. GPSTrack.laps_split_at records each
+split, found laps or not; tracks processed before laps existed get theirs
+split on first use.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import storage
+from .gates import MIN_LAP_SECONDS, SECTORS, split_laps
+from .models import Lap
+
+
+def lap_sectors():
+    return getattr(settings, 'GPS_LAP_SECTORS', SECTORS)
+
+
+def min_lap_seconds():
+    return getattr(settings, 'GPS_LAP_MIN_SECONDS', MIN_LAP_SECONDS)
+
+
+def build_track_laps(track, columns):
+    """
+    Replace the stored laps of track, split from its point columns. Sets
+    track.lap_gate and track.laps_split_at but doesn't save them; call
+    inside the ingest transaction.
+    """
+    gate = None if track.lap_gate_detected else track.lap_gate
+    gate, laps = split_laps(columns['timestamp'], columns['latitude'], columns['longitude'], columns['speed'],
+                            gate=gate, sectors=lap_sectors(), min_lap_seconds=min_lap_seconds())
+    return store_track_laps(track, gate, laps)
+
+
+def store_track_laps(track, gate, laps):
+    """
+    Replace the stored laps of track with laps (dicts of gates.split_laps)
+    split at gate. Sets track.lap_gate and track.laps_split_at but doesn't
+    save them. Returns the Lap rows.
+    """
+    track.lap_gate = gate
+    track.laps_split_at = timezone.now()
+    track.laps.all().delete()
+    return Lap.objects.bulk_create([Lap(track=track, **lap) for lap in laps])
+
+
+def resplit_track(track, gate=None):
+    """Split a processed track's laps again at gate, or at a detected line if None"""
+    track.lap_gate = gate
+    track.lap_gate_detected = gate is None
+    columns = storage.load_point_arrays(track, ['timestamp', 'latitude', 'longitude', 'speed'])
+    with transaction.atomic():
+        laps = build_track_laps(track, columns)
+        track.save(update_fields=['lap_gate', 'lap_gate_detected', 'laps_split_at'])
+    return laps
+
+
+def track_laps(track):
+    """The stored laps of a processed track, split now if it never was"""
+    if track.laps_split_at is None:
+        return resplit_track(track, None if track.lap_gate_detected else track.lap_gate)
+    return list(track.laps.all())
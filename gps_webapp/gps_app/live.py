@@ -0,0 +1,267 @@
+"""
+Live telemetry: tracks that grow while the car is running.
+
+A live track (GPSTrack.live) is created empty and fed batches of CAN GPS
+frames, over POST /api/tracks/<id>/telemetry/ or the websocket at
+/ws/tracks/<id>/live/ (see websocket.py). Each batch goes through the
+ingest stages incrementally (telemetry.LiveFixStream), its points are
+appended as GPSPoint rows and the track's statistics are updated from the
+batch alone. Subscribers get every batch's points and the new statistics
+as a delta. finish_live_track() flushes the held-back fixes and builds
+what the batch pipeline builds at the end: polylines, laps, distributions
+and the grid.
+
+Streams and subscribers live in this process, like the other caches: a
+run's batches and its subscribers must reach the same worker. A stream
+lost to a restart is resumed from the last stored point, losing only the
+frames it was holding.
+"""
+import asyncio
+import logging
+from threading import Lock
+
+from django.db import transaction
+
+from . import bulkload, point_index, response_cache, storage, tiles
+from .aggregates import build_track_grid
+from .distributions import build_track_distributions
+from .laps import build_track_laps
+from .models import GPSTrack
+from .polylines import build_track_polylines
+from .telemetry import LiveFixStream, RunningStats
+from .utils import align_tolerance, outlier_filters, outlier_std_multiplier, speed_method
+
+logger = logging.getLogger(__name__)
+
+# Deltas queued per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_sessions = {}
+_subscribers = {}
+_lock = Lock()
+_counters = {'batches': 0, 'frames': 0, 'points': 0, 'deltas_sent': 0, 'deltas_dropped': 0}
+
+# What finish_live_track writes to the track besides its statistics
+FINISHED_FIELDS = ['live', 'processed', 'lap_gate', 'laps_split_at', 'distributions']
+
+
+class NotLive(ValueError):
+    """The track was finished, e.g. by another request while a batch waited for it"""
+
+    def __init__(self, message="Track is not live"):
+        super().__init__(message)
+
+
+def parse_frames(frames):
+    """
+    (timestamps, sensors, values) of a batch of frames, each
+    [timestamp_ms, sensor, value] or {"timestamp", "sensor", "value"}.
+    Raises ValueError on anything else.
+    """
+    if not isinstance(frames, list):
+        raise ValueError("frames must be a list")
+    timestamps, sensors, values = [], [], []
+    try:
+        for frame in frames:
+            if isinstance(frame, dict):
+                frame = (frame['timestamp'], frame['sensor'], frame['value'])
+            timestamp, sensor, value = frame
+            timestamps.append(float(timestamp))
+            sensors.append(str(sensor))
+            values.append(float(value))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each frame must be [timestamp_ms, sensor, value] or an object with those keys")
+    return timestamps, sensors, values
+
+
+def start_live_track(name, time_resolution=5):
+    """A new, empty live track processed with the configured outlier filters"""
+    return GPSTrack.objects.create(
+        name=name, uploaded_file='', live=True, point_storage=storage.ROWS, total_points=0,
+        time_resolution=time_resolution, outlier_std_multiplier=outlier_std_multiplier(),
+        outlier_filters=outlier_filters(), align_tolerance_ms=align_tolerance(), speed_method=speed_method(),
+    )
+
+
+class _Session:
+    """What this process keeps of a live track between batches"""
+
+    def __init__(self, track):
+        last = track.points.order_by('-timestamp').values_list('timestamp', 'latitude', 'longitude').first()
+        self.stream = LiveFixStream(track.time_resolution, track.outlier_filters or '',
+                                    track.outlier_std_multiplier or 15, tolerance=align_tolerance(),
+                                    last_point=last, method=track.speed_method or speed_method())
+        # Every batch of the track goes through here, so these stay current without reading the track
+        self.stats = RunningStats(**{name: getattr(track, name) for name in RunningStats.FIELDS})
+        # One batch at a time, so points are appended in order
+        self.lock = Lock()
+
+
+def _session(track):
+    """The session of a live track, resumed from its stored points if this process has none"""
+    with _lock:
+        session = _sessions.get(track.id)
+        if session is None:
+            session = _sessions[track.id] = _Session(track)
+        return session
+
+
+def _check_live(track, session):
+    """
+    Raise NotLive if track has been finished. Call holding session.lock:
+    finishing takes it too, so a batch that waited on it sees the result.
+    """
+    track.refresh_from_db(fields=['live'])
+    if not track.live:
+        # A session made after the finish forgot the old one has no business staying
+        with _lock:
+            if _sessions.get(track.id) is session:
+                del _sessions[track.id]
+        raise NotLive()
+
+
+def _append(track, session, columns):
+    """Store a batch's points and update the track's statistics from them"""
+    session.stats.update(columns)
+    for name, value in session.stats.as_dict().items():
+        setattr(track, name, value)
+    with transaction.atomic():
+        bulkload.insert_points(track, columns)
+        track.save(update_fields=list(RunningStats.FIELDS))
+    # Nothing derived from the old points is current any more
+    tiles.invalidate_track(track.id)
+    point_index.invalidate_track(track.id)
+    response_cache.invalidate_track(track.id)
+
+
+def _delta(track, columns, final=False):
+    return {
+        'type': 'finished' if final else 'points',
+        'track_id': str(track.id),
+        'points': {name: columns[name].tolist() for name in ('timestamp', 'latitude', 'longitude', 'speed')},
+        'stats': {name: getattr(track, name) for name in RunningStats.FIELDS},
+    }
+
+
+def ingest_frames(track, timestamps, sensors, values):
+    """
+    Run a batch of frames through a live track's stream, store the points it
+    settles and send them to the subscribers. Returns the delta sent.
+    Raises NotLive if the track has been finished.
+    """
+    session = _session(track)
+    with session.lock:
+        _check_live(track, session)
+        columns = session.stream.push(timestamps, sensors, values)
+        if len(columns['timestamp']):
+            _append(track, session, columns)
+        else:
+            # Still the latest statistics in the delta
+            for name, value in session.stats.as_dict().items():
+                setattr(track, name, value)
+    delta = _delta(track, columns)
+    with _lock:
+        _counters['batches'] += 1
+        _counters['frames'] += len(timestamps)
+        _counters['points'] += len(columns['timestamp'])
+    publish(track.id, delta)
+    return delta
+
+
+def finish_live_track(track):
+    """
+    Store the held-back fixes, then build the track's polylines, laps,
+    distributions and grid. Raises NotLive if it was finished already.
+    """
+    session = _session(track)
+    with session.lock:
+        _check_live(track, session)
+        columns = session.stream.flush()
+        if len(columns['timestamp']):
+            _append(track, session, columns)
+        points = storage.load_point_arrays(track, ['timestamp', 'latitude', 'longitude', 'speed'])
+        track.live = False
+        track.processed = len(points['timestamp']) >= 2
+        with transaction.atomic():
+            if track.processed:
+                build_track_laps(track, points)
+                build_track_distributions(track, points)
+            track.save(update_fields=FINISHED_FIELDS)
+            if track.processed:
+                build_track_polylines(track, points['latitude'], points['longitude'], points['speed'])
+        if track.processed:
+            build_track_grid(track, points['latitude'], points['longitude'], points['timestamp'], points['speed'])
+        forget_track(track.id)
+    logger.info("Live track %s finished with %d points (%d frames, %d fixes rejected)",
+                track.id, track.total_points, session.stream.frames_in, session.stream.rejected)
+    publish(track.id, _delta(track, columns, final=True))
+
+
+def forget_track(track_id):
+    """Drop a track's session, e.g. when it is deleted"""
+    with _lock:
+        _sessions.pop(track_id, None)
+
+
+class Subscription:
+    """Deltas of one live track for one async consumer, see subscribe()"""
+
+    def __init__(self, track_id, loop):
+        self.track_id = track_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def _put(self, delta):
+        # On the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            with _lock:
+                _counters['deltas_dropped'] += 1
+        self.queue.put_nowait(delta)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+def subscribe(track_id):
+    """A Subscription to a track's deltas, for the running event loop"""
+    subscription = Subscription(track_id, asyncio.get_running_loop())
+    with _lock:
+        _subscribers.setdefault(track_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.track_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.track_id]
+
+
+def publish(track_id, delta):
+    """Queue delta for every subscriber of a track, from any thread"""
+    with _lock:
+        subscribers = list(_subscribers.get(track_id, ()))
+        _counters['deltas_sent'] += len(subscribers)
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._put, delta)
+        except RuntimeError:
+            # Its loop has closed
+            unsubscribe(subscription)
+
+
+def stats():
+    with _lock:
+        return dict(_counters, live_tracks=len(_sessions),
+                    subscribers=sum(len(subscribers) for subscribers in _subscribers.values()))
+
+
+def reset_stats():
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from gps_app.benchmarks import BENCHMARKS, load_benchmark
+
+
+class Command(BaseCommand):
+    help = "Run a GPS pipeline benchmark (see gps_app/benchmarks)"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='benchmark', required=True)
+        for name in BENCHMARKS:
+            module = load_benchmark(name)
+            subparser = subparsers.add_parser(name, help=module.help)
+            module.add_arguments(subparser)
+
+    def handle(self, *args, **options):
+        module = load_benchmark(options['benchmark'])
+        module.run(options, self.stdout.write)
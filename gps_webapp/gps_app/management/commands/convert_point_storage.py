@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gps_app import bulkload, storage
+from gps_app.models import GPSTrack
+
+
+def convert_track(track, target):
+    """Move a processed track's points to the target backend. Returns the point count."""
+    arrays = storage.load_point_arrays(track)
+    if target == storage.COLUMNAR:
+        storage.write_columnar(track, arrays)
+        with transaction.atomic():
+            track.point_storage = storage.COLUMNAR
+            track.save(update_fields=['point_storage'])
+            track.points.all().delete()
+    else:
+        with transaction.atomic():
+            bulkload.insert_points(track, arrays)
+            track.point_storage = storage.ROWS
+            track.save(update_fields=['point_storage'])
+        storage.delete_columnar(track)
+    return len(arrays['timestamp'])
+
+
+class Command(BaseCommand):
+    help = "Convert existing tracks between GPSPoint rows and columnar .npy storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('track_ids', nargs='*', help="Tracks to convert (default: all processed tracks)")
+        parser.add_argument('--to', choices=[storage.COLUMNAR, storage.ROWS], default=storage.COLUMNAR,
+                            help="Target storage backend (default: columnar)")
+
+    def handle(self, *args, **options):
+        target = options['to']
+        tracks = GPSTrack.objects.filter(processed=True).exclude(point_storage=target)
+        if options['track_ids']:
+            tracks = tracks.filter(id__in=options['track_ids'])
+
+        converted = 0
+        for track in tracks.iterator():
+            try:
+                count = convert_track(track, target)
+            except Exception as e:
+                raise CommandError(f"Failed to convert {track.id}: {e}")
+            converted += 1
+            self.stdout.write(f"{track.name} ({track.id}): {count} points -> {target}")
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} track(s) to {target} storage"))
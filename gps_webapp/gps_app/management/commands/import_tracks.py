@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gps_app.batch_import import TRANSACTION_POINTS, find_logs, import_logs
+from gps_app.outliers import parse_filters
+from gps_app.utils import outlier_filters, outlier_std_multiplier
+
+
+class Command(BaseCommand):
+    help = "Import a directory (or glob) of CAN logs as processed tracks, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Directories (searched recursively) or glob patterns")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Worker processes (default: one per CPU)")
+        parser.add_argument('--time-resolution', type=int, default=5,
+                            help="Points per second to keep (default: 5)")
+        parser.add_argument('--filters', help="Outlier filter chain (default: GPS_OUTLIER_FILTERS)")
+        parser.add_argument('--transaction-points', type=int, default=TRANSACTION_POINTS,
+                            help=f"Points written per database transaction (default: {TRANSACTION_POINTS})")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['time_resolution'] <= 100:
+            raise CommandError("Time resolution must be between 1 and 100 points per second")
+        try:
+            filters = ','.join(parse_filters(options['filters'])) if options['filters'] else outlier_filters()
+        except ValueError as e:
+            raise CommandError(str(e))
+        paths = find_logs(options['paths'])
+        if not paths:
+            raise CommandError("No log files found")
+        self.stdout.write(f"Importing {len(paths)} file(s) with {options['workers']} worker(s)")
+
+        done = 0
+
+        def progress(path, status, detail):
+            nonlocal done
+            done += 1
+            style = {'imported': self.style.SUCCESS, 'failed': self.style.ERROR}.get(status, str)
+            self.stdout.write(f"[{done}/{len(paths)}] {style(status)} {path}: {detail}")
+
+        summary = import_logs(paths, options['time_resolution'], filters, outlier_std_multiplier(),
+                              workers=options['workers'], transaction_points=options['transaction_points'],
+                              progress=progress)
+        seconds = max(summary['seconds'], 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['imported']} track(s), skipped {summary['skipped']}, failed {summary['failed']} "
+            f"in {seconds:.1f}s: {summary['bytes'] / 1e6 / seconds:.1f} MB/s, {summary['points'] / seconds:.0f} points/s"
+        ))
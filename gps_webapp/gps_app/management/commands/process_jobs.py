@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from gps_app.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued track processing jobs (use with GPS_JOB_BACKEND = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds to wait between polls of an empty queue (default: 1)")
+
+    def handle(self, *args, **options):
+        try:
+            processed = run_worker(once=options['once'], poll_interval=options['poll_interval'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f"Processed {processed} job(s)")
@@ -0,0 +1,180 @@
+"""
+Prometheus metrics of this process, in the text exposition format at /metrics.
+
+- gps_request_duration_seconds: latency histogram of the API viewset
+  actions (RequestMetricsMixin), from DRF's initial() to
+  finalize_response(). For a streamed response that is the time to its
+  first byte.
+- gps_ingest_stage_duration_seconds, gps_ingest_stage_cpu_seconds_total
+  and gps_ingest_stage_rows_total: the ingest stages of the jobs run here,
+  see instrumentation.py.
+- gps_jobs_total and gps_job_duration_seconds: outcomes and wall time of
+  those jobs.
+- The counters behind the /api/*/stats/ endpoints, as gauges.
+
+Like those stats, metrics are kept per process: scrape every worker.
+"""
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from . import live, point_index, response_cache, tiles
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+JOB_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_lock = Lock()
+
+
+def _value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def reset(self):
+        with _lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with _lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            lines.extend(self._lines(key, values))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._series[key] = [self._series.get(key, [0])[0] + value]
+
+    def _lines(self, key, values):
+        return [f'{self.name}{_labels(self.labels, key)} {_value(values[0])}']
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Observations per bucket (not cumulative), then +Inf, sum and count
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _lines(self, key, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), values):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_labels(self.labels, key, le=_value(bound))} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.labels, key)} {_value(values[-2])}')
+        lines.append(f'{self.name}_count{_labels(self.labels, key)} {values[-1]}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('gps_request_duration_seconds', "Latency of API viewset actions",
+                            ('view', 'action', 'method', 'status'), REQUEST_BUCKETS)
+STAGE_SECONDS = Histogram('gps_ingest_stage_duration_seconds', "Wall time of ingest stages",
+                          ('stage',), STAGE_BUCKETS)
+STAGE_CPU_SECONDS = Counter('gps_ingest_stage_cpu_seconds_total', "CPU time of ingest stages", ('stage',))
+STAGE_ROWS = Counter('gps_ingest_stage_rows_total', "Rows given out by ingest stages", ('stage',))
+STAGE_FAILURES = Counter('gps_ingest_stage_failures_total', "Ingest stages that raised", ('stage',))
+JOBS = Counter('gps_jobs_total', "Processing jobs finished, by outcome", ('status',))
+JOB_SECONDS = Histogram('gps_job_duration_seconds', "Wall time of processing jobs", ('status',), JOB_BUCKETS)
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, STAGE_CPU_SECONDS, STAGE_ROWS, STAGE_FAILURES, JOBS, JOB_SECONDS]
+
+# Stats functions exported as gauges, by metric name prefix
+STATS = [
+    ('gps_response_cache', response_cache.stats),
+    ('gps_tile_cache', tiles.stats),
+    ('gps_spatial_index', point_index.stats),
+    ('gps_live', live.stats),
+]
+
+
+def observe_stage(stage):
+    """Record an instrumentation.Stage, as a StageProfile observer"""
+    STAGE_SECONDS.observe(stage.wall_seconds, stage=stage.name)
+    STAGE_CPU_SECONDS.inc(stage.cpu_seconds, stage=stage.name)
+    if stage.rows_out is not None:
+        STAGE_ROWS.inc(stage.rows_out, stage=stage.name)
+    if stage.failed:
+        STAGE_FAILURES.inc(stage=stage.name)
+
+
+def observe_job(status, seconds):
+    JOBS.inc(status=status)
+    JOB_SECONDS.observe(seconds, status=status)
+
+
+def render():
+    """All metrics of this process, in the Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, stats in STATS:
+        for name, value in sorted(stats().items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'# TYPE {prefix}_{name} gauge')
+                lines.append(f'{prefix}_{name} {_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
+
+
+class RequestMetricsMixin:
+    """Records the latency of every action of a DRF viewset in REQUEST_SECONDS"""
+
+    def initial(self, request, *args, **kwargs):
+        self._metrics_start = time.perf_counter()
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        start = getattr(self, '_metrics_start', None)
+        if start is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, view=type(self).__name__,
+                                    action=getattr(self, 'action', None) or request.method.lower(),
+                                    method=request.method, status=response.status_code)
+        return response
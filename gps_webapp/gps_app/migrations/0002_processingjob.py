@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:04
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=16)),
+                ('stage', models.CharField(blank=True, default='', max_length=16)),
+                ('progress', models.FloatField(default=0.0, help_text='Fraction of stages completed')),
+                ('message', models.TextField(blank=True, default='')),
+                ('time_resolution', models.IntegerField(default=5)),
+                ('attempt', models.IntegerField(default=1)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='gps_app.gpstrack')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='gps_app_pro_status_1dd36b_idx')],
+            },
+        ),
+    ]
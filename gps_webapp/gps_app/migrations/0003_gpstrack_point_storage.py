@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0002_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='point_storage',
+            field=models.CharField(choices=[('rows', 'GPSPoint rows'), ('columnar', 'Columnar .npy files')], default='rows', help_text="Where this track's points are stored, see gps_app/storage.py", max_length=16),
+        ),
+    ]
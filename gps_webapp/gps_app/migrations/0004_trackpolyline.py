@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0003_gpstrack_point_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackPolyline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.IntegerField()),
+                ('algorithm', models.CharField(default='douglas-peucker', max_length=32)),
+                ('tolerance', models.FloatField(help_text='Simplification tolerance in meters')),
+                ('vertex_count', models.IntegerField()),
+                ('vertices', models.BinaryField(help_text='Packed VERTEX_DTYPE array, see gps_app/simplify.py')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='polylines', to='gps_app.gpstrack')),
+            ],
+            options={
+                'ordering': ['zoom'],
+                'constraints': [models.UniqueConstraint(fields=('track', 'algorithm', 'zoom'), name='unique_track_polyline_zoom')],
+            },
+        ),
+    ]
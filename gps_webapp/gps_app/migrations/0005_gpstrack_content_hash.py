@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0004_trackpolyline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the uploaded file', max_length=64),
+        ),
+    ]
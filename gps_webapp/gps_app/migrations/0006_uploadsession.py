@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:19
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0005_gpstrack_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('file', models.CharField(help_text='Path of the file being assembled, relative to MEDIA_ROOT', max_length=255)),
+                ('size', models.BigIntegerField(blank=True, help_text='Expected size in bytes, if announced', null=True)),
+                ('received', models.BigIntegerField(default=0, help_text='Bytes written so far, the offset of the next chunk')),
+                ('time_resolution', models.IntegerField(default=5)),
+                ('early_ingest', models.BooleanField(default=False, help_text='Start processing before the upload finishes')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('aborted', 'Aborted')], default='uploading', max_length=16)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('track', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='gps_app.gpstrack')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
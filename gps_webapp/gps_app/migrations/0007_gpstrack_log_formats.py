@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:23
+
+import gps_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gpstrack',
+            name='uploaded_file',
+            field=models.FileField(upload_to='gps_uploads/', validators=[gps_app.models.validate_log_file]),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0007_gpstrack_log_formats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='outlier_std_multiplier',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gpstrack',
+            name='time_resolution',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='cpu_seconds',
+            field=models.FloatField(blank=True, help_text='CPU time spent by the job', null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='outlier_std_multiplier',
+            field=models.FloatField(default=15.0),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='reused_from',
+            field=models.ForeignKey(blank=True, help_text='Identical upload whose points were reused', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='gps_app.gpstrack'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='saved_bytes',
+            field=models.BigIntegerField(default=0, help_text='Storage shared instead of duplicated'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='saved_cpu_seconds',
+            field=models.FloatField(default=0.0, help_text='CPU time the reuse avoided'),
+        ),
+    ]
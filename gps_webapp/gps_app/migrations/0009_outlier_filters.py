@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0008_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='outlier_filters',
+            field=models.CharField(blank=True, help_text='Comma-separated chain, see gps_app/outliers.py', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='filter_stats',
+            field=models.JSONField(blank=True, default=list, help_text='Points in, rejected and throughput of each outlier filter'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='outlier_filters',
+            field=models.CharField(blank=True, default='stddev', max_length=64),
+        ),
+    ]
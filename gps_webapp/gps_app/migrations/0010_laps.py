@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0009_outlier_filters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='lap_gate',
+            field=models.JSONField(blank=True, help_text='[[lat, lon], [lat, lon]]', null=True),
+        ),
+        migrations.AddField(
+            model_name='gpstrack',
+            name='lap_gate_detected',
+            field=models.BooleanField(default=True, help_text='Whether lap_gate is found by loop closure rather than set through the API'),
+        ),
+        migrations.CreateModel(
+            name='Lap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('start_time', models.FloatField(help_text="Seconds from the track's start")),
+                ('end_time', models.FloatField(help_text="Seconds from the track's start")),
+                ('lap_time', models.FloatField(help_text='Seconds')),
+                ('distance', models.FloatField(help_text='Meters')),
+                ('start_index', models.IntegerField(help_text="Index of the lap's first point")),
+                ('end_index', models.IntegerField(help_text="Index after the lap's last point")),
+                ('max_speed', models.FloatField(blank=True, help_text='Max speed in m/s', null=True)),
+                ('avg_speed', models.FloatField(blank=True, help_text='Average speed in m/s', null=True)),
+                ('min_speed', models.FloatField(blank=True, help_text='Min speed in m/s', null=True)),
+                ('sectors', models.JSONField(default=list, help_text='Sector times in seconds, null where a sector line was missed')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='laps', to='gps_app.gpstrack')),
+            ],
+            options={
+                'ordering': ['number'],
+                'constraints': [models.UniqueConstraint(fields=('track', 'number'), name='unique_track_lap_number')],
+            },
+        ),
+    ]
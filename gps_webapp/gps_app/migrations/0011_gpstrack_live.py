@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0010_laps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='live',
+            field=models.BooleanField(default=False, help_text='Receiving telemetry, see gps_app/live.py'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0011_gpstrack_live'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='distributions',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0012_gpstrack_distributions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='profile',
+            field=models.BooleanField(default=False, help_text='Run under cProfile, dumping MEDIA_ROOT/gps_profiles/<job id>.prof'),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='stage_stats',
+            field=models.JSONField(blank=True, default=list, help_text='Wall and CPU time, rows and memory of each pipeline stage'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0013_processingjob_stage_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='align_tolerance_ms',
+            field=models.FloatField(blank=True, help_text='GPS_SENSOR_ALIGN_TOLERANCE_MS the fixes were paired with', null=True),
+        ),
+        migrations.AddField(
+            model_name='gpstrack',
+            name='speed_method',
+            field=models.CharField(blank=True, help_text='GPS_SPEED_METHOD the speeds were computed with', max_length=16, null=True),
+        ),
+    ]
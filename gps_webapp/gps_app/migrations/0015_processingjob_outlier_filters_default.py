@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0014_gpstrack_align_tolerance_speed_method'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='processingjob',
+            name='outlier_filters',
+            field=models.CharField(blank=True, default='median,gate', max_length=64),
+        ),
+    ]
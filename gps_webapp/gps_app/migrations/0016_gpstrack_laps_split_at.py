@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:25
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def mark_split_tracks(apps, schema_editor):
+    """Tracks with laps or a lap line have been split; the others are split on first use"""
+    GPSTrack = apps.get_model('gps_app', 'GPSTrack')
+    GPSTrack.objects.filter(Q(laps__isnull=False) | Q(lap_gate__isnull=False)).update(laps_split_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps_app', '0015_processingjob_outlier_filters_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gpstrack',
+            name='laps_split_at',
+            field=models.DateTimeField(blank=True, help_text='When the laps were last split, whether or not any were found', null=True),
+        ),
+        migrations.RunPython(mark_split_tracks, migrations.RunPython.noop),
+    ]
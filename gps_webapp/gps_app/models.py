@@ -1,17 +1,52 @@
 from django.db import models
-from django.core.validators import FileExtensionValidator
+from django.core.exceptions import ValidationError
 import uuid
 
+from .ingest import LOG_FORMATS, format_available, format_from_name
+from .outliers import DEFAULT_FILTERS
+
+def validate_log_file(value):
+    """Only accept the log formats ingest.py can read (and has the libraries for)"""
+    fmt = format_from_name(value.name)
+    if fmt is None:
+        raise ValidationError(
+            f"Unsupported file type, expected one of {', '.join('.' + f for f in LOG_FORMATS)}"
+        )
+    if not format_available(fmt):
+        raise ValidationError(f".{fmt} files can't be read on this server, upload plain CSV instead")
+
 class GPSTrack(models.Model):
     """Model to store GPS track information"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     uploaded_file = models.FileField(
         upload_to='gps_uploads/',
-        validators=[FileExtensionValidator(allowed_extensions=['csv'])]
+        validators=[validate_log_file]
     )
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(
+        max_length=64, blank=True, db_index=True,
+        help_text="SHA-256 of the uploaded file"
+    )
     processed = models.BooleanField(default=False)
+    live = models.BooleanField(default=False, help_text="Receiving telemetry, see gps_app/live.py")
+    point_storage = models.CharField(
+        max_length=16,
+        choices=[('rows', 'GPSPoint rows'), ('columnar', 'Columnar .npy files')],
+        default='rows',
+        help_text="Where this track's points are stored, see gps_app/storage.py"
+    )
+    
+    # Parameters the points were processed with; identical uploads processed
+    # with the same ones share their points, see gps_app/dedup.py
+    time_resolution = models.IntegerField(null=True, blank=True)
+    outlier_std_multiplier = models.FloatField(null=True, blank=True)
+    outlier_filters = models.CharField(max_length=64, null=True, blank=True,
+                                       help_text="Comma-separated chain, see gps_app/outliers.py")
+    align_tolerance_ms = models.FloatField(null=True, blank=True,
+                                           help_text="GPS_SENSOR_ALIGN_TOLERANCE_MS the fixes were paired with")
+    speed_method = models.CharField(max_length=16, null=True, blank=True,
+                                    help_text="GPS_SPEED_METHOD the speeds were computed with")
     
     # Track statistics
     total_points = models.IntegerField(null=True, blank=True)
@@ -25,6 +60,18 @@ class GPSTrack(models.Model):
     min_longitude = models.FloatField(null=True, blank=True)
     max_longitude = models.FloatField(null=True, blank=True)
     
+    # Start/finish line the laps are split at, see gps_app/gates.py
+    lap_gate = models.JSONField(null=True, blank=True, help_text="[[lat, lon], [lat, lon]]")
+    lap_gate_detected = models.BooleanField(
+        default=True, help_text="Whether lap_gate is found by loop closure rather than set through the API"
+    )
+    laps_split_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the laps were last split, whether or not any were found"
+    )
+    
+    # Speed histograms and percentiles computed at ingest, see gps_app/histograms.py
+    distributions = models.JSONField(null=True, blank=True)
+    
     class Meta:
         ordering = ['-uploaded_at']
     
@@ -51,3 +98,139 @@ class GPSPoint(models.Model):
     
     def __str__(self):
         return f"Point {self.latitude:.6f}, {self.longitude:.6f} at {self.timestamp:.1f}s"
+
+class ProcessingJob(models.Model):
+    """Background processing of an uploaded track"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    
+    # Pipeline stages in the order process_gps_csv runs them
+    STAGES = ['parse', 'filter', 'resample', 'speeds', 'insert']
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    track = models.ForeignKey(GPSTrack, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=16, blank=True, default='')
+    progress = models.FloatField(default=0.0, help_text="Fraction of stages completed")
+    message = models.TextField(blank=True, default='')
+    time_resolution = models.IntegerField(default=5)
+    outlier_std_multiplier = models.FloatField(default=15.0)
+    outlier_filters = models.CharField(max_length=64, blank=True, default=','.join(DEFAULT_FILTERS))
+    attempt = models.IntegerField(default=1)
+    cancel_requested = models.BooleanField(default=False)
+    
+    # What the job cost, and what reusing an identical upload's work saved
+    cpu_seconds = models.FloatField(null=True, blank=True, help_text="CPU time spent by the job")
+    reused_from = models.ForeignKey(GPSTrack, null=True, blank=True, on_delete=models.SET_NULL,
+                                    related_name='+', help_text="Identical upload whose points were reused")
+    saved_cpu_seconds = models.FloatField(default=0.0, help_text="CPU time the reuse avoided")
+    saved_bytes = models.BigIntegerField(default=0, help_text="Storage shared instead of duplicated")
+    filter_stats = models.JSONField(default=list, blank=True,
+                                    help_text="Points in, rejected and throughput of each outlier filter")
+    stage_stats = models.JSONField(default=list, blank=True,
+                                   help_text="Wall and CPU time, rows and memory of each pipeline stage")
+    profile = models.BooleanField(default=False,
+                                  help_text="Run under cProfile, dumping MEDIA_ROOT/gps_profiles/<job id>.prof")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True,
+                                        help_text="Last sign of life of the worker running the job")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} for {self.track.name} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED, self.CANCELLED)
+
+class TrackPolyline(models.Model):
+    """Simplified path of a track for one map zoom level"""
+    track = models.ForeignKey(GPSTrack, on_delete=models.CASCADE, related_name='polylines')
+    zoom = models.IntegerField()
+    algorithm = models.CharField(max_length=32, default='douglas-peucker')
+    tolerance = models.FloatField(help_text="Simplification tolerance in meters")
+    vertex_count = models.IntegerField()
+    vertices = models.BinaryField(help_text="Packed VERTEX_DTYPE array, see gps_app/simplify.py")
+    
+    class Meta:
+        ordering = ['zoom']
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'algorithm', 'zoom'], name='unique_track_polyline_zoom'),
+        ]
+    
+    def __str__(self):
+        return f"{self.track.name} z{self.zoom} ({self.vertex_count} vertices)"
+
+class Lap(models.Model):
+    """One lap of a track between crossings of its start/finish line, see gps_app/laps.py"""
+    track = models.ForeignKey(GPSTrack, on_delete=models.CASCADE, related_name='laps')
+    number = models.IntegerField()
+    start_time = models.FloatField(help_text="Seconds from the track's start")
+    end_time = models.FloatField(help_text="Seconds from the track's start")
+    lap_time = models.FloatField(help_text="Seconds")
+    distance = models.FloatField(help_text="Meters")
+    start_index = models.IntegerField(help_text="Index of the lap's first point")
+    end_index = models.IntegerField(help_text="Index after the lap's last point")
+    max_speed = models.FloatField(null=True, blank=True, help_text="Max speed in m/s")
+    avg_speed = models.FloatField(null=True, blank=True, help_text="Average speed in m/s")
+    min_speed = models.FloatField(null=True, blank=True, help_text="Min speed in m/s")
+    sectors = models.JSONField(default=list, help_text="Sector times in seconds, null where a sector line was missed")
+    
+    class Meta:
+        ordering = ['number']
+        constraints = [
+            models.UniqueConstraint(fields=['track', 'number'], name='unique_track_lap_number'),
+        ]
+    
+    def __str__(self):
+        return f"{self.track.name} lap {self.number} ({self.lap_time:.3f} s)"
+
+class UploadSession(models.Model):
+    """A resumable chunked upload of a CAN log, see gps_app/uploads.py"""
+    UPLOADING = 'uploading'
+    COMPLETE = 'complete'
+    ABORTED = 'aborted'
+    STATUS_CHOICES = [
+        (UPLOADING, 'Uploading'),
+        (COMPLETE, 'Complete'),
+        (ABORTED, 'Aborted'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    file = models.CharField(max_length=255, help_text="Path of the file being assembled, relative to MEDIA_ROOT")
+    size = models.BigIntegerField(null=True, blank=True, help_text="Expected size in bytes, if announced")
+    received = models.BigIntegerField(default=0, help_text="Bytes written so far, the offset of the next chunk")
+    time_resolution = models.IntegerField(default=5)
+    early_ingest = models.BooleanField(default=False, help_text="Start processing before the upload finishes")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=UPLOADING)
+    content_hash = models.CharField(max_length=64, blank=True)
+    track = models.ForeignKey(GPSTrack, null=True, blank=True, on_delete=models.SET_NULL,
+                              related_name='upload_sessions')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return f"Upload {self.name} ({self.received}/{self.size or '?'} bytes, {self.status})"
@@ -0,0 +1,206 @@
+"""
+Outlier filters for GPS fixes.
+
+Each filter takes (seconds, latitudes, longitudes) sorted by time and
+returns (keep, latitudes, longitudes): a boolean mask of the fixes to
+keep, and their coordinates (only the Kalman filter changes them).
+
+- 'stddev': drop fixes more than std_multiplier global standard deviations
+  from the mean fix. The original filter; needs the whole track and misses
+  local glitches.
+- 'median': drop fixes far from the rolling median of their neighbours,
+  the scale being the rolling median absolute deviation (MAD).
+- 'gate': drop fixes that imply an impossible speed or acceleration
+  relative to both neighbours.
+- 'kalman': constant-velocity Kalman filter in local meters. Fixes whose
+  innovation is beyond `gate` sigmas are dropped, the others are replaced
+  by the filtered position. A Python loop, so much slower than the others.
+
+Apart from 'stddev' the filters only look at a bounded neighbourhood of
+each fix, so they give the same answer on overlapping chunks of a track.
+apply_filters() runs a chain and reports each filter's rejections and
+throughput.
+
+No Django imports.
+"""
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from .geodesy import MAX_SPEED, WGS84_A
+from .simplify import project
+
+FILTERS = ('stddev', 'median', 'gate', 'kalman')
+DEFAULT_FILTERS = ('median', 'gate')
+
+
+def stddev_filter(seconds, lats, lons, std_multiplier=15):
+    keep = np.ones(len(lats), dtype=bool)
+    for values in (lats, lons):
+        if len(values) < 2:
+            continue
+        mean, std = values.mean(), values.std(ddof=1)
+        keep &= (values >= mean - std_multiplier * std) & (values <= mean + std_multiplier * std)
+    return keep, lats, lons
+
+
+def rolling_median_filter(seconds, lats, lons, window=7, threshold=5.0, floor_m=5.0):
+    """
+    Drop fixes more than threshold robust sigmas (1.4826 * rolling MAD, at
+    least floor_m meters) from the centered rolling median of `window` fixes
+    """
+    x, y = project(lats, lons)
+    frame = pd.DataFrame({'x': x, 'y': y})
+    median = frame.rolling(window, center=True, min_periods=1).median()
+    deviation = pd.Series(np.hypot(x - median['x'].to_numpy(), y - median['y'].to_numpy()))
+    mad = deviation.rolling(window, center=True, min_periods=1).median().to_numpy()
+    scale = np.maximum(1.4826 * mad, floor_m)
+    return deviation.to_numpy() <= threshold * scale, lats, lons
+
+
+def _spikes(t, x, y, max_speed, max_accel, jitter_m):
+    """Interior fixes inconsistent with both neighbours"""
+    dt = np.diff(t)
+    dt = np.where(dt > 0, dt, np.nan)
+    speed = np.hypot(np.diff(x), np.diff(y)) / dt
+    speed_in, speed_out = speed[:-1], speed[1:]
+    too_fast = (speed_in > max_speed) & (speed_out > max_speed)
+
+    # Distance from where the neighbours say the fix should be
+    dt_in, dt_out = dt[:-1], dt[1:]
+    share = dt_in / (dt_in + dt_out)
+    expected_x = x[:-2] + share * (x[2:] - x[:-2])
+    expected_y = y[:-2] + share * (y[2:] - y[:-2])
+    deviation = np.hypot(x[1:-1] - expected_x, y[1:-1] - expected_y)
+    # The acceleration it takes to pass through the fix instead
+    accel = 2 * deviation / (dt_in * dt_out)
+    # A bad fix also pulls its neighbours off their lines, by less
+    padded = np.concatenate(([0.0], deviation, [0.0]))
+    local_max = (deviation >= padded[:-2]) & (deviation >= padded[2:])
+    off_line = (deviation > jitter_m) & (accel > max_accel) & local_max
+
+    spikes = np.zeros(len(t), dtype=bool)
+    spikes[1:-1] = too_fast | off_line
+    return spikes
+
+
+def speed_gate_filter(seconds, lats, lons, max_speed=MAX_SPEED, max_accel=50.0, jitter_m=5.0, max_passes=5):
+    """
+    Drop fixes reached and left faster than max_speed (m/s), or lying more
+    than jitter_m meters off the path between their neighbours where that
+    takes more than max_accel (m/s^2). Repeated on the survivors, so runs of
+    a few bad fixes peel away from the edges.
+    """
+    keep = np.ones(len(lats), dtype=bool)
+    x, y = project(lats, lons)
+    t = np.asarray(seconds, dtype=np.float64)
+    for _ in range(max_passes):
+        index = np.flatnonzero(keep)
+        if len(index) < 3:
+            break
+        spikes = _spikes(t[index], x[index], y[index], max_speed, max_accel, jitter_m)
+        if not spikes.any():
+            break
+        keep[index[spikes]] = False
+    return keep, lats, lons
+
+
+def kalman_filter(seconds, lats, lons, accel_sigma=5.0, gps_sigma=3.0, gate=5.0):
+    """
+    Constant-velocity Kalman filter on each projected axis, with white
+    acceleration noise accel_sigma (m/s^2) and fix noise gps_sigma (m).
+    Fixes with an innovation beyond gate sigmas on either axis are dropped
+    without updating the state of either.
+    """
+    n = len(lats)
+    keep = np.ones(n, dtype=bool)
+    if n < 2:
+        return keep, lats, lons
+    x, y = project(lats, lons)
+    xs, ys = x.tolist(), y.tolist()
+    t = np.asarray(seconds, dtype=np.float64).tolist()
+    filtered = np.empty((n, 2))
+    q, r = accel_sigma ** 2, gps_sigma ** 2
+    gate2 = gate ** 2
+
+    # Both axes see the same fixes at the same times, so they share one covariance
+    pos_x, vel_x, pos_y, vel_y = xs[0], 0.0, ys[0], 0.0
+    p00, p01, p11 = r, 0.0, 100.0
+    filtered[0] = pos_x, pos_y
+    last = t[0]
+    for i in range(1, n):
+        dt = t[i] - last
+        # Predict
+        pred_x, pred_y = pos_x + dt * vel_x, pos_y + dt * vel_y
+        p00_p = p00 + dt * (2 * p01 + dt * p11) + q * dt ** 4 / 4
+        p01_p = p01 + dt * p11 + q * dt ** 3 / 2
+        p11_p = p11 + q * dt ** 2
+        innovation_x, innovation_y = xs[i] - pred_x, ys[i] - pred_y
+        s = p00_p + r
+        if max(innovation_x * innovation_x, innovation_y * innovation_y) > gate2 * s:
+            keep[i] = False
+            continue
+        # Update
+        k0, k1 = p00_p / s, p01_p / s
+        pos_x, vel_x = pred_x + k0 * innovation_x, vel_x + k1 * innovation_x
+        pos_y, vel_y = pred_y + k0 * innovation_y, vel_y + k1 * innovation_y
+        p00, p01, p11 = (1 - k0) * p00_p, (1 - k0) * p01_p, p11_p - k1 * p01_p
+        filtered[i] = pos_x, pos_y
+        last = t[i]
+
+    # Back from simplify.project()'s meters
+    phi0 = math.radians(float(np.mean(lats)))
+    out_lons = np.degrees(filtered[:, 0] / (WGS84_A * math.cos(phi0)))
+    out_lats = np.degrees(filtered[:, 1] / WGS84_A)
+    return keep, np.where(keep, out_lats, lats), np.where(keep, out_lons, lons)
+
+
+FILTER_FUNCTIONS = {
+    'stddev': stddev_filter,
+    'median': rolling_median_filter,
+    'gate': speed_gate_filter,
+    'kalman': kalman_filter,
+}
+
+
+def parse_filters(names):
+    """Filter names from a list or a comma-separated string, validated"""
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',')]
+    names = [name for name in names if name]
+    unknown = [name for name in names if name not in FILTER_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"Unknown outlier filter '{unknown[0]}', expected some of {', '.join(FILTERS)}")
+    return names
+
+
+def apply_filters(seconds, lats, lons, names, params=None):
+    """
+    Run the named filters in order, each on the survivors of the previous
+    one. params maps a filter name to extra keyword arguments.
+
+    Returns (index, latitudes, longitudes, stats): the indices of the kept
+    fixes in the input, their coordinates, and per filter a dict of
+    points_in, rejected, seconds and points_per_second.
+    """
+    params = params or {}
+    seconds = np.asarray(seconds, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    index = np.arange(len(lats))
+    stats = []
+    for name in parse_filters(names):
+        start = time.perf_counter()
+        keep, new_lats, new_lons = FILTER_FUNCTIONS[name](seconds, lats, lons, **params.get(name, {}))
+        elapsed = time.perf_counter() - start
+        stats.append({
+            'name': name,
+            'points_in': len(lats),
+            'rejected': int(len(lats) - keep.sum()),
+            'seconds': elapsed,
+            'points_per_second': len(lats) / elapsed if elapsed else None,
+        })
+        seconds, lats, lons, index = seconds[keep], new_lats[keep], new_lons[keep], index[keep]
+    return index, lats, lons, stats
@@ -0,0 +1,111 @@
+"""
+Keyset pagination of track points on their timestamp.
+
+Page-number pagination turns deep pages into OFFSET scans over the
+(track, timestamp) index. Here the cursor is the position after the last
+point returned: its timestamp, plus how many points at that timestamp
+were already returned (timestamps are unique in practice, but nothing
+enforces it). The next page is found by seeking the index, or
+searchsorted on column arrays, so every page costs the same however deep
+it is.
+
+Cursors only go forward, and responses carry no count, which would need a
+scan of its own. Works on GPSPoint querysets and storage.TrackPoints.
+"""
+import base64
+from collections import OrderedDict
+
+import numpy as np
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .storage import TrackPoints
+
+
+def encode_cursor(timestamp, offset=0):
+    return base64.urlsafe_b64encode(f'{float(timestamp)!r}:{int(offset)}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(timestamp, offset) of a cursor, (None, 0) for an empty one (the first page)"""
+    if not cursor:
+        return None, 0
+    try:
+        timestamp, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        timestamp, offset = float(timestamp), int(offset)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise NotFound(TimestampCursorPagination.invalid_cursor_message)
+    if offset < 0 or timestamp != timestamp:
+        raise NotFound(TimestampCursorPagination.invalid_cursor_message)
+    return timestamp, offset
+
+
+class TimestampCursorPagination(BasePagination):
+    """Forward-only keyset pagination on timestamp, chosen with ?cursor= (empty for the first page)"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 10_000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        timestamp, offset = decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        if isinstance(queryset, TrackPoints):
+            timestamps = queryset.arrays['timestamp']
+            start = 0 if timestamp is None else int(np.searchsorted(timestamps, timestamp, side='left'))
+            start += offset
+            rows = queryset[start:start + page_size + 1]
+        else:
+            if timestamp is not None:
+                queryset = queryset.filter(timestamp__gte=timestamp)
+            # id breaks ties; on SQLite it is the rowid the (track, timestamp) index already ends with
+            rows = list(queryset.order_by('timestamp', 'id')[offset:offset + page_size + 1])
+
+        has_next = len(rows) > page_size
+        page = rows[:page_size]
+        self.next_cursor = None
+        if has_next:
+            last = self._timestamp(page[-1])
+            repeats = sum(1 for row in page if self._timestamp(row) == last)
+            if last == timestamp:
+                repeats += offset
+            self.next_cursor = encode_cursor(last, repeats)
+        return page
+
+    @staticmethod
+    def _timestamp(row):
+        return row['timestamp'] if isinstance(row, dict) else row.timestamp
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,104 @@
+"""
+Per-process cache of spatial indexes (spatial.GridIndex) over track points.
+
+Building the index of a million-point track takes a fraction of a second
+and a query a millisecond, so indexes are built on first use and kept,
+together with the point arrays they index, in an LRU capped at
+GPS_SPATIAL_INDEX_MAX_BYTES. Entries are keyed on the track's id, content
+hash and processing parameters, so a worker holding an index of a track
+reprocessed elsewhere doesn't serve it. A track's entries are dropped when
+it is reprocessed or deleted in this process.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+from . import storage
+from .spatial import GridIndex
+
+_entries = OrderedDict()
+_entries_bytes = 0
+_lock = Lock()
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'build_seconds_total': 0.0,
+    'build_seconds_max': 0.0,
+}
+
+
+def max_bytes():
+    return getattr(settings, 'GPS_SPATIAL_INDEX_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def stats():
+    """Hit/miss counters, build latency and cache size for this process"""
+    with _lock:
+        result = dict(_stats, entries=len(_entries), bytes=_entries_bytes, max_bytes=max_bytes())
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+    result['build_ms_mean'] = (
+        result['build_seconds_total'] / result['misses'] * 1000 if result['misses'] else 0.0
+    )
+    return result
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0 if isinstance(_stats[key], int) else 0.0
+
+
+def _key(track, resolution):
+    return (track.id, track.content_hash, track.time_resolution, track.outlier_filters, resolution)
+
+
+def _nbytes(arrays, index):
+    return index.nbytes + sum(values.nbytes for values in arrays.values())
+
+
+def track_index(track, resolution=None, arrays=None):
+    """
+    (arrays, index) for a track's points, or for its points at another
+    resolution when arrays (that resolution's) are given
+    """
+    global _entries_bytes
+    key = _key(track, resolution)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[:2]
+
+    start = time.perf_counter()
+    if arrays is None:
+        arrays = storage.load_point_arrays(track, storage.POINT_FIELDS)
+    index = GridIndex(arrays['latitude'], arrays['longitude'])
+    elapsed = time.perf_counter() - start
+    size = _nbytes(arrays, index)
+
+    with _lock:
+        _stats['misses'] += 1
+        _stats['build_seconds_total'] += elapsed
+        _stats['build_seconds_max'] = max(_stats['build_seconds_max'], elapsed)
+        if key not in _entries:
+            _entries[key] = (arrays, index, size)
+            _entries_bytes += size
+        while _entries_bytes > max_bytes() and len(_entries) > 1:
+            _, (_, _, evicted) = _entries.popitem(last=False)
+            _entries_bytes -= evicted
+            _stats['evictions'] += 1
+    return arrays, index
+
+
+def invalidate_track(track_id):
+    """Forget the indexes of a track"""
+    global _entries_bytes
+    with _lock:
+        for key in [key for key in _entries if key[0] == track_id]:
+            _entries_bytes -= _entries.pop(key)[2]
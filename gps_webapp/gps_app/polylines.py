@@ -0,0 +1,88 @@
+"""
+Level-of-detail paths for the polyline endpoint.
+
+Douglas-Peucker paths for every zoom in simplify.ZOOM_LEVELS are built at
+ingest and stored as TrackPolyline rows. Any other zoom, tolerance or
+algorithm is a threshold of the track's importance ranking, which is
+computed once and kept in a small in-process LRU.
+"""
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from . import simplify, storage
+from .derive import zoom_polylines
+from .models import TrackPolyline
+
+RANKING_CACHE_SIZE = 32
+
+_rankings = OrderedDict()
+_rankings_lock = Lock()
+
+
+def build_track_polylines(track, lats, lons, speeds):
+    """Replace the stored zoom-level paths of track. Call inside the ingest transaction. Returns them."""
+    return store_track_polylines(track, zoom_polylines(lats, lons, speeds))
+
+
+def store_track_polylines(track, polylines):
+    """Replace the stored zoom-level paths of track with those of derive.zoom_polylines(). Returns them."""
+    track.polylines.all().delete()
+    stored = TrackPolyline.objects.bulk_create([
+        TrackPolyline(
+            track=track,
+            zoom=zoom,
+            algorithm=simplify.DEFAULT_ALGORITHM,
+            tolerance=tolerance,
+            vertex_count=vertex_count,
+            vertices=vertices,
+        )
+        for zoom, tolerance, vertex_count, vertices in polylines
+    ])
+    forget_track(track)
+    return stored
+
+
+def forget_track(track):
+    with _rankings_lock:
+        for key in [key for key in _rankings if key[0] == track.id]:
+            del _rankings[key]
+
+
+def _ranked_points(track, algorithm):
+    key = (track.id, algorithm)
+    with _rankings_lock:
+        if key in _rankings:
+            _rankings.move_to_end(key)
+            return _rankings[key]
+
+    arrays = storage.load_point_arrays(track, ['latitude', 'longitude', 'speed'])
+    ranking = simplify.importance(arrays['latitude'], arrays['longitude'], algorithm)
+    entry = (ranking, arrays)
+    with _rankings_lock:
+        _rankings[key] = entry
+        while len(_rankings) > RANKING_CACHE_SIZE:
+            _rankings.popitem(last=False)
+    return entry
+
+
+def track_polyline(track, zoom=None, tolerance=None, algorithm=simplify.DEFAULT_ALGORITHM):
+    """
+    Simplified path as a VERTEX_DTYPE array plus the tolerance used.
+
+    Give either a zoom level or a tolerance in meters.
+    """
+    if tolerance is None:
+        stored = track.polylines.filter(zoom=zoom, algorithm=algorithm).first()
+        if stored is not None:
+            return simplify.unpack_vertices(bytes(stored.vertices)), stored.tolerance
+        latitude = ((track.min_latitude or 0.0) + (track.max_latitude or 0.0)) / 2
+        tolerance = simplify.zoom_tolerance(zoom, latitude)
+
+    ranking, arrays = _ranked_points(track, algorithm)
+    indices = simplify.keep_indices(ranking, tolerance)
+    vertices = simplify.unpack_vertices(simplify.pack_vertices(
+        indices, arrays['latitude'], arrays['longitude'], np.nan_to_num(arrays['speed'])
+    ))
+    return vertices, tolerance
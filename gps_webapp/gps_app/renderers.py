@@ -0,0 +1,45 @@
+"""
+Streaming renderers for the points API: packed binary, Arrow and NDJSON.
+
+They take part in content negotiation (Accept header or ?format=), but the
+views stream the payload themselves with wire.iter_encoded()/iter_arrow()/
+iter_ndjson().
+Anything that does reach render() is an error or a non-point response, and
+is sent as JSON so clients can still read it.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from . import wire
+
+
+class _StreamedPointsRenderer(BaseRenderer):
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data)
+
+
+class PackedPointsRenderer(_StreamedPointsRenderer):
+    media_type = wire.CONTENT_TYPE
+    format = 'gpsb'
+
+
+class ArrowPointsRenderer(_StreamedPointsRenderer):
+    media_type = wire.ARROW_CONTENT_TYPE
+    format = 'arrow'
+
+
+class NDJSONPointsRenderer(_StreamedPointsRenderer):
+    media_type = wire.NDJSON_CONTENT_TYPE
+    format = 'ndjson'
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,161 @@
+"""
+Cache of rendered API responses for processed tracks.
+
+A processed track never changes (failed or cancelled tracks are the only
+ones that get reprocessed), so its stats, bounds, detail and point pages
+can be rendered once. Entries are keyed on the track id, the SHA-256 of
+the uploaded file, the endpoint, the request URI and the negotiated media
+type, plus when the laps were split for the responses that depend on them
+(those are sent with REVALIDATE rather than as immutable); the same key gives the strong ETag, so clients can revalidate with
+If-None-Match without the body ever being rebuilt.
+
+Two levels:
+
+- an in-process LRU capped at GPS_RESPONSE_CACHE_MAX_BYTES
+- optionally, a Django cache shared by all gunicorn workers
+  (GPS_RESPONSE_CACHE_ALIAS, e.g. a FileBasedCache entry of CACHES)
+
+Entries of a deleted track are dropped from both.
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Processed tracks are immutable, so clients may keep responses for a year
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Except for their laps, which can be split again: clients revalidate those
+REVALIDATE = 'public, no-cache'
+
+_entries = OrderedDict()
+_entries_bytes = 0
+_track_keys = {}
+_lock = Lock()
+
+_stats = {
+    'memory_hits': 0,
+    'shared_hits': 0,
+    'misses': 0,
+    'not_modified': 0,
+    'evictions': 0,
+}
+
+
+def max_bytes():
+    return getattr(settings, 'GPS_RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+
+def shared_cache():
+    alias = getattr(settings, 'GPS_RESPONSE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def stats():
+    """Hit/miss counters and in-process cache size for this process"""
+    with _lock:
+        result = dict(_stats, entries=len(_entries), bytes=_entries_bytes, max_bytes=max_bytes())
+    hits = result['memory_hits'] + result['shared_hits']
+    lookups = hits + result['misses']
+    result['hit_rate'] = hits / lookups if lookups else 0.0
+    return result
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def note_not_modified():
+    _count('not_modified')
+
+
+def cache_key(track, endpoint, uri='', media_type='', version=''):
+    parts = [str(track.id), track.content_hash or '', endpoint, uri, media_type, version]
+    return 'gps:response:' + hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def etag(key):
+    return '"' + key.rsplit(':', 1)[-1][:32] + '"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return tag in (value.strip() for value in if_none_match.split(','))
+
+
+def _remember(track_id, key, content, content_type):
+    global _entries_bytes
+    with _lock:
+        if key in _entries:
+            return
+        _entries[key] = (content, content_type, track_id)
+        _entries_bytes += len(content)
+        _track_keys.setdefault(track_id, set()).add(key)
+        while _entries_bytes > max_bytes() and _entries:
+            old_key, (old_content, _, old_track_id) = _entries.popitem(last=False)
+            _entries_bytes -= len(old_content)
+            _track_keys.get(old_track_id, set()).discard(old_key)
+            _stats['evictions'] += 1
+
+
+def get(track, key):
+    """(content, content_type) for key, or None"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats['memory_hits'] += 1
+            return entry[:2]
+
+    shared = shared_cache()
+    entry = shared.get(key) if shared is not None else None
+    if entry is not None:
+        _count('shared_hits')
+        _remember(track.id, key, *entry)
+        return entry
+    _count('misses')
+    return None
+
+
+def put(track, key, content, content_type):
+    _remember(track.id, key, content, content_type)
+    shared = shared_cache()
+    if shared is not None:
+        shared.set(key, (content, content_type))
+        # Remember the keys of each track so a delete can find them
+        index_key = f'gps:response-keys:{track.id}'
+        shared.set(index_key, list(set(shared.get(index_key, [])) | {key}))
+
+
+def clear():
+    """Empty this process's cache (the shared cache is left alone)"""
+    global _entries_bytes
+    with _lock:
+        _entries.clear()
+        _track_keys.clear()
+        _entries_bytes = 0
+
+
+def invalidate_track(track_id):
+    """Drop every cached response of a track"""
+    global _entries_bytes
+    with _lock:
+        for key in _track_keys.pop(track_id, ()):
+            entry = _entries.pop(key, None)
+            if entry is not None:
+                _entries_bytes -= len(entry[0])
+    shared = shared_cache()
+    if shared is not None:
+        index_key = f'gps:response-keys:{track_id}'
+        shared.delete_many(shared.get(index_key, []) + [index_key])
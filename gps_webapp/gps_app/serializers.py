@@ -1,37 +1,148 @@
+import hashlib
+from types import SimpleNamespace
+
 from rest_framework import serializers
-from .models import GPSTrack, GPSPoint
+from .ingest import format_from_name, PARQUET
+from .models import GPSTrack, GPSPoint, Lap, ProcessingJob, UploadSession, validate_log_file
+from .storage import TrackPoints
 
 class GPSPointSerializer(serializers.ModelSerializer):
     class Meta:
         model = GPSPoint
         fields = ['latitude', 'longitude', 'timestamp', 'speed', 'altitude']
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields= projects the output onto a subset of Meta.fields
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class LapSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lap
+        fields = ['number', 'start_time', 'end_time', 'lap_time', 'distance', 'start_index', 'end_index',
+                  'max_speed', 'avg_speed', 'min_speed', 'sectors']
+
+def stored_points_count(track):
+    # total_points is written in the same transaction as the points, so no COUNT query is needed
+    return track.total_points or 0
 
 class GPSTrackSerializer(serializers.ModelSerializer):
-    points = GPSPointSerializer(many=True, read_only=True)
-    points_count = serializers.IntegerField(source='points.count', read_only=True)
+    """
+    Track detail. Points are only embedded with ?include=points; otherwise use
+    the paginated (or binary streamed) /points/ endpoint.
+    """
+    points = serializers.SerializerMethodField()
+    points_count = serializers.SerializerMethodField()
     
     class Meta:
         model = GPSTrack
         fields = [
-            'id', 'name', 'uploaded_at', 'processed', 'total_points', 
+            'id', 'name', 'uploaded_at', 'processed', 'live', 'total_points', 
             'duration', 'max_speed', 'avg_speed', 'min_latitude', 
             'max_latitude', 'min_longitude', 'max_longitude', 
             'points', 'points_count'
         ]
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        include = request.query_params.get('include', '').split(',') if request is not None else []
+        if 'points' not in include:
+            self.fields.pop('points')
+    
+    def get_points(self, obj):
+        # Read as column arrays in one query; the point dicts already match GPSPointSerializer
+        return TrackPoints.for_track(obj)[:]
+    
+    def get_points_count(self, obj):
+        return stored_points_count(obj)
 
 class GPSTrackListSerializer(serializers.ModelSerializer):
     """Lighter serializer for listing tracks without points"""
-    points_count = serializers.IntegerField(source='points.count', read_only=True)
+    points_count = serializers.SerializerMethodField()
     
     class Meta:
         model = GPSTrack
         fields = [
-            'id', 'name', 'uploaded_at', 'processed', 'total_points', 
+            'id', 'name', 'uploaded_at', 'processed', 'live', 'total_points', 
             'duration', 'max_speed', 'avg_speed', 'min_latitude', 
             'max_latitude', 'min_longitude', 'max_longitude', 'points_count'
         ]
+    
+    def get_points_count(self, obj):
+        return stored_points_count(obj)
 
 class FileUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = GPSTrack
-        fields = ['name', 'uploaded_file']
\ No newline at end of file
+        fields = ['name', 'uploaded_file']
+    
+    def create(self, validated_data):
+        # Hash while the upload is still in memory / the temp file, not from MEDIA_ROOT afterwards
+        digest = hashlib.sha256()
+        for chunk in validated_data['uploaded_file'].chunks():
+            digest.update(chunk)
+        validated_data['content_hash'] = digest.hexdigest()
+        return super().create(validated_data)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    offset = serializers.IntegerField(source='received', read_only=True)
+    track_id = serializers.UUIDField(read_only=True)
+    time_resolution = serializers.IntegerField(min_value=1, max_value=100, default=5)
+    size = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    filename = serializers.CharField(write_only=True, required=False,
+                                     help_text="Original file name, its suffix sets the log format")
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'upload_id', 'name', 'filename', 'size', 'offset', 'time_resolution', 'early_ingest',
+            'status', 'content_hash', 'track_id', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['status', 'content_hash', 'created_at', 'updated_at']
+    
+    def validate_filename(self, value):
+        validate_log_file(SimpleNamespace(name=value))
+        return value
+    
+    def validate(self, attrs):
+        # Parquet keeps its metadata at the end of the file, so it can't be read while growing
+        if attrs.get('early_ingest') and format_from_name(attrs.get('filename', '')) == PARQUET:
+            raise serializers.ValidationError({'early_ingest': "Parquet logs can't be ingested before the upload finishes"})
+        return attrs
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    track_id = serializers.UUIDField(source='track.id', read_only=True)
+    reused_from = serializers.UUIDField(source='reused_from_id', read_only=True)
+    stages = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ProcessingJob
+        fields = [
+            'job_id', 'track_id', 'status', 'stage', 'progress', 'stages',
+            'message', 'time_resolution', 'outlier_std_multiplier', 'outlier_filters', 'filter_stats',
+            'stage_stats', 'profile',
+            'attempt', 'cancel_requested', 'cpu_seconds', 'reused_from', 'saved_cpu_seconds', 'saved_bytes',
+            'created_at', 'started_at', 'finished_at'
+        ]
+    
+    def get_stages(self, obj):
+        """State of each pipeline stage: pending, running, done or skipped"""
+        if obj.status == ProcessingJob.SUCCEEDED:
+            return [{'name': name, 'state': 'done'} for name in ProcessingJob.STAGES]
+        
+        current = ProcessingJob.STAGES.index(obj.stage) if obj.stage in ProcessingJob.STAGES else -1
+        stages = []
+        for i, name in enumerate(ProcessingJob.STAGES):
+            if i < current:
+                state = 'done'
+            elif i == current:
+                state = 'running' if obj.status == ProcessingJob.RUNNING else obj.status
+            else:
+                state = 'pending' if not obj.is_finished else 'skipped'
+            stages.append({'name': name, 'state': state})
+        return stages
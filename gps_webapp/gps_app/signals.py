@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import GPSTrack, ProcessingJob
+from . import live, point_index, response_cache, storage, tiles
+
+
+@receiver(post_delete, sender=GPSTrack)
+def delete_track_files(sender, instance, **kwargs):
+    """Remove columnar point files, cached tiles and cached responses along with their track"""
+    storage.delete_columnar(instance)
+    storage.delete_resolutions(instance)
+    storage.delete_grid(instance)
+    # Parsed fixes are shared by every upload of the same file
+    if instance.content_hash and not GPSTrack.objects.filter(content_hash=instance.content_hash).exists():
+        storage.delete_intermediate(instance.content_hash)
+    tiles.invalidate_track(instance.id)
+    point_index.invalidate_track(instance.id)
+    response_cache.invalidate_track(instance.id)
+    live.forget_track(instance.id)
+
+
+@receiver(post_delete, sender=ProcessingJob)
+def delete_job_profile(sender, instance, **kwargs):
+    if instance.profile:
+        storage.delete_profile(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """WAL journal and relaxed fsync on SQLite, so bulk point loads aren't fsync-bound"""
+    if connection.vendor != 'sqlite' or not getattr(settings, 'GPS_SQLITE_WAL', True):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-65536')
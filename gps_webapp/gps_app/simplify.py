@@ -0,0 +1,186 @@
+"""
+Polyline simplification for drawing tracks at a given map zoom.
+
+Both algorithms compute an importance value for every vertex in one pass;
+simplifying at tolerance t then just keeps the vertices whose importance is
+above t. That makes every zoom level a cheap threshold of the same ranking.
+
+- Douglas-Peucker: importance is the vertex's distance (meters) from the
+  segment it split, capped by its parent's importance so the ranking gives
+  exactly the recursive result for any tolerance.
+- Visvalingam-Whyatt: importance is the square root of the effective
+  triangle area (m^2), made monotone in elimination order.
+
+No Django imports.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from .geodesy import WGS84_A
+
+ALGORITHMS = ('douglas-peucker', 'visvalingam')
+DEFAULT_ALGORITHM = 'douglas-peucker'
+
+# Zoom levels precomputed at ingest (city block to single corner)
+ZOOM_LEVELS = tuple(range(10, 19))
+
+# Meters per 256px tile pixel at the equator, zoom 0
+METERS_PER_PIXEL_Z0 = 2 * math.pi * WGS84_A / 256
+
+# Packed layout of a simplified path: source point index plus what the map draws
+VERTEX_DTYPE = np.dtype([
+    ('index', '<u4'), ('latitude', '<f8'), ('longitude', '<f8'), ('speed', '<f4'),
+])
+
+
+def zoom_tolerance(zoom, latitude=0.0):
+    """Half a screen pixel in meters at this zoom and latitude"""
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / 2 ** zoom / 2
+
+
+def project(lats, lons):
+    """Local equirectangular projection to meters around the track's mean latitude"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    phi0 = math.radians(float(np.mean(lats))) if len(lats) else 0.0
+    x = np.radians(lons) * WGS84_A * math.cos(phi0)
+    y = np.radians(lats) * WGS84_A
+    return x, y
+
+
+def douglas_peucker_importance(x, y, min_tolerance=0.0):
+    """
+    Douglas-Peucker importance per vertex. Endpoints are inf; vertices that
+    would never be kept at min_tolerance are 0.
+
+    The recursion is run breadth-first: every open segment of one level is
+    split in a single vectorized pass over its interior points.
+    """
+    n = len(x)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    parents = np.array([np.inf])
+    while len(starts):
+        lengths = ends - starts - 1
+        open_ = lengths > 0
+        starts, ends, parents, lengths = starts[open_], ends[open_], parents[open_], lengths[open_]
+        if not len(starts):
+            break
+
+        # Interior point indices of every open segment, concatenated
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        segment = np.repeat(np.arange(len(starts)), lengths)
+        idx = np.arange(lengths.sum()) - offsets[segment] + starts[segment] + 1
+
+        a, b = starts[segment], ends[segment]
+        ax, ay = x[a], y[a]
+        dx, dy = x[b] - ax, y[b] - ay
+        length2 = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(length2 > 0, ((x[idx] - ax) * dx + (y[idx] - ay) * dy) / length2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        d = np.hypot(x[idx] - (ax + t * dx), y[idx] - (ay + t * dy))
+
+        # Farthest interior point of each segment (first one on ties)
+        dmax = np.maximum.reduceat(d, offsets)
+        hits = np.flatnonzero(d == dmax[segment])
+        _, first = np.unique(segment[hits], return_index=True)
+        split = idx[hits[first]]
+
+        keep = dmax > min_tolerance
+        split, dmax = split[keep], dmax[keep]
+        starts, ends, parents = starts[keep], ends[keep], parents[keep]
+        importance[split] = np.minimum(dmax, parents)
+
+        starts, ends, parents = (
+            np.concatenate((starts, split)),
+            np.concatenate((split, ends)),
+            np.concatenate((importance[split], importance[split])),
+        )
+    return importance
+
+
+def visvalingam_importance(x, y):
+    """Visvalingam-Whyatt importance per vertex (sqrt of effective area, meters)"""
+    n = len(x)
+    importance = np.full(n, np.inf)
+    if n < 3:
+        return importance
+
+    def area(a, b, c):
+        return abs((x[b] - x[a]) * (y[c] - y[a]) - (x[c] - x[a]) * (y[b] - y[a])) / 2
+
+    prev = np.arange(-1, n - 1)
+    nxt = np.arange(1, n + 1)
+    ax, ay = x[:-2], y[:-2]
+    areas = np.abs((x[1:-1] - ax) * (y[2:] - ay) - (x[2:] - ax) * (y[1:-1] - ay)) / 2
+    current = np.full(n, np.inf)
+    current[1:-1] = areas
+    heap = [(float(a), i + 1) for i, a in enumerate(areas)]
+    heapq.heapify(heap)
+
+    removed = np.zeros(n, dtype=bool)
+    last = 0.0
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or a != current[i]:
+            continue
+        # Effective area never decreases along the elimination order
+        last = max(last, a)
+        importance[i] = math.sqrt(last)
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                current[j] = area(prev[j], j, nxt[j])
+                heapq.heappush(heap, (float(current[j]), j))
+    return importance
+
+
+def importance(lats, lons, algorithm=DEFAULT_ALGORITHM, min_tolerance=0.0):
+    x, y = project(lats, lons)
+    if algorithm == 'douglas-peucker':
+        return douglas_peucker_importance(x, y, min_tolerance)
+    if algorithm == 'visvalingam':
+        return visvalingam_importance(x, y)
+    raise ValueError(f"Unknown simplification algorithm '{algorithm}', expected one of {ALGORITHMS}")
+
+
+def keep_indices(ranking, tolerance):
+    """Indices of the vertices kept at tolerance (meters)"""
+    return np.flatnonzero(ranking > tolerance).astype(np.uint32)
+
+
+def simplify(lats, lons, tolerance, algorithm=DEFAULT_ALGORITHM):
+    """Indices of the vertices kept when simplifying at tolerance (meters)"""
+    return keep_indices(importance(lats, lons, algorithm, min_tolerance=tolerance), tolerance)
+
+
+def zoom_levels(lats, lons, algorithm=DEFAULT_ALGORITHM, zooms=ZOOM_LEVELS):
+    """{zoom: (tolerance, indices)} for every zoom level, from a single ranking pass"""
+    latitude = float(np.mean(lats)) if len(lats) else 0.0
+    tolerances = {zoom: zoom_tolerance(zoom, latitude) for zoom in zooms}
+    ranking = importance(lats, lons, algorithm, min_tolerance=min(tolerances.values()))
+    return {zoom: (tol, keep_indices(ranking, tol)) for zoom, tol in tolerances.items()}
+
+
+def pack_vertices(indices, lats, lons, speeds):
+    """Pack the kept vertices into VERTEX_DTYPE bytes"""
+    vertices = np.empty(len(indices), dtype=VERTEX_DTYPE)
+    vertices['index'] = indices
+    vertices['latitude'] = np.asarray(lats)[indices]
+    vertices['longitude'] = np.asarray(lons)[indices]
+    vertices['speed'] = np.asarray(speeds)[indices]
+    return vertices.tobytes()
+
+
+def unpack_vertices(data):
+    return np.frombuffer(data, dtype=VERTEX_DTYPE)
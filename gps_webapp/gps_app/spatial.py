@@ -0,0 +1,162 @@
+"""
+Grid spatial index over the points of a track.
+
+Points are projected to local meters and bucketed into square cells. Only
+occupied cells are stored: their keys (row * columns + column) sorted, the
+offset of each cell's points in a permutation of the points, and nothing
+else, so the index costs a few bytes per point whatever the track's extent.
+
+- bbox(): the cells a bounding box covers are contiguous key ranges, one
+  per grid row, found with searchsorted; their points are then checked
+  exactly. Boxes holding a large share of the track are scanned instead.
+- nearest(): searches the square of cells around the query, growing it
+  until it holds k points and is wider than the k-th distance found.
+
+Cells are sized so they hold about points_per_cell points on average. GPS
+tracks are lines, so the size is fitted to the occupied cells rather than
+the area of the bounding box.
+
+No Django imports.
+"""
+import math
+
+import numpy as np
+
+from .geodesy import WGS84_A, haversine_distances
+
+POINTS_PER_CELL = 16
+
+# Cells never get smaller than this (meters), GPS noise is larger anyway
+MIN_CELL_SIZE = 0.5
+
+
+def _ranges(starts, stops):
+    """Concatenation of arange(start, stop) for each pair, without a Python loop"""
+    lengths = stops - starts
+    keep = lengths > 0
+    starts, lengths = starts[keep], lengths[keep]
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    # Step of 1 inside a range, a jump to the next range's start at its first element
+    steps = np.ones(total, dtype=np.int64)
+    offsets = np.cumsum(lengths)[:-1]
+    steps[0] = starts[0]
+    steps[offsets] = starts[1:] - (starts[:-1] + lengths[:-1] - 1)
+    return np.cumsum(steps)
+
+
+class GridIndex:
+    """Index of points (latitude, longitude arrays) on a grid of square cells"""
+
+    def __init__(self, lats, lons, points_per_cell=POINTS_PER_CELL, cell_size=None):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        n = len(self.lats)
+        self.phi0 = math.radians(float(np.mean(self.lats))) if n else 0.0
+        x, y = self.project(self.lats, self.lons)
+        self.x0 = float(x.min()) if n else 0.0
+        self.y0 = float(y.min()) if n else 0.0
+        self.x, self.y = x - self.x0, y - self.y0
+        width = float(self.x.max()) if n else 0.0
+        height = float(self.y.max()) if n else 0.0
+
+        if cell_size is None:
+            # First guess as if the points filled their bounding box, then
+            # one correction for how many cells they actually occupy
+            cells = max(n / points_per_cell, 1.0)
+            cell_size = max(math.sqrt(max(width * height, 1.0) / cells), width / cells, height / cells)
+            cell_size = max(cell_size, MIN_CELL_SIZE)
+            if n:
+                occupied = len(np.unique(self._keys(self.x, self.y, cell_size, width)))
+                cell_size = max(cell_size * points_per_cell * occupied / n, MIN_CELL_SIZE)
+        self.cell_size = cell_size
+        self.columns = int(width // cell_size) + 1
+        self.rows = int(height // cell_size) + 1
+
+        keys = self._keys(self.x, self.y, cell_size, width)
+        self.order = np.argsort(keys, kind='stable').astype(np.int64 if n >= 2 ** 31 else np.int32)
+        sorted_keys = keys[self.order]
+        self.keys, self.starts = np.unique(sorted_keys, return_index=True)
+        self.starts = np.append(self.starts, n).astype(np.int64)
+
+    def project(self, lats, lons):
+        x = np.radians(np.asarray(lons, dtype=np.float64)) * WGS84_A * math.cos(self.phi0)
+        y = np.radians(np.asarray(lats, dtype=np.float64)) * WGS84_A
+        return x, y
+
+    @staticmethod
+    def _keys(x, y, cell_size, width):
+        columns = int(width // cell_size) + 1
+        return (y // cell_size).astype(np.int64) * columns + (x // cell_size).astype(np.int64)
+
+    def __len__(self):
+        return len(self.lats)
+
+    @property
+    def nbytes(self):
+        arrays = (self.lats, self.lons, self.x, self.y, self.order, self.keys, self.starts)
+        return sum(a.nbytes for a in arrays)
+
+    def _cell(self, x, y):
+        return math.floor((x - self.x0) / self.cell_size), math.floor((y - self.y0) / self.cell_size)
+
+    def _cell_ranges(self, col0, col1, row0, row1):
+        """(starts, stops) in order of the points in the cells of columns col0..col1, rows row0..row1"""
+        col0, col1 = max(col0, 0), min(col1, self.columns - 1)
+        row0, row1 = max(row0, 0), min(row1, self.rows - 1)
+        if col0 > col1 or row0 > row1 or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows = np.arange(row0, row1 + 1, dtype=np.int64) * self.columns
+        first = np.searchsorted(self.keys, rows + col0, side='left')
+        last = np.searchsorted(self.keys, rows + col1, side='right')
+        return self.starts[first], self.starts[last]
+
+    def _candidates(self, col0, col1, row0, row1):
+        """Point indices (unordered) in the cells of columns col0..col1 and rows row0..row1"""
+        return self.order[_ranges(*self._cell_ranges(col0, col1, row0, row1))]
+
+    def bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Indices, ascending, of the points inside the box (edges included)"""
+        x, y = self.project([min_lat, max_lat], [min_lon, max_lon])
+        col0, row0 = self._cell(x[0], y[0])
+        col1, row1 = self._cell(x[1], y[1])
+        starts, stops = self._cell_ranges(col0, col1, row0, row1)
+        if (stops - starts).sum() > len(self) // 8:
+            # Gathering and sorting that many costs more than a scan
+            candidates, lats, lons = None, self.lats, self.lons
+        else:
+            candidates = self.order[_ranges(starts, stops)]
+            lats, lons = self.lats[candidates], self.lons[candidates]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        if candidates is None:
+            return np.flatnonzero(inside)
+        return np.sort(candidates[inside])
+
+    def nearest(self, lat, lon, k=1):
+        """(indices, meters) of the k points closest to (lat, lon), closest first"""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        x, y = self.project([lat], [lon])
+        qx, qy = float(x[0]), float(y[0])
+        col, row = self._cell(qx, qy)
+        # No point is closer than the grid's edge, start the search there
+        outside = max(-col, col - self.columns + 1, -row, row - self.rows + 1, 0)
+        radius = max(outside, 1)
+        while True:
+            candidates = self._candidates(col - radius, col + radius, row - radius, row + radius)
+            if len(candidates) >= k:
+                dist = np.hypot(self.x[candidates] + self.x0 - qx, self.y[candidates] + self.y0 - qy)
+                nearest = np.argpartition(dist, k - 1)[:k]
+                # Every point within radius cells of the query's cell has been seen
+                reach = math.ceil(float(dist[nearest].max()) / self.cell_size)
+                if reach <= radius:
+                    break
+                radius = reach
+            else:
+                radius *= 2
+        indices = candidates[nearest]
+        meters = haversine_distances(lat, lon, self.lats[indices], self.lons[indices])
+        order = np.argsort(meters, kind='stable')
+        return indices[order], meters[order]
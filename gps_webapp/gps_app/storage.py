@@ -0,0 +1,367 @@
+"""
+Point storage backends.
+
+A track's points live either as GPSPoint rows ('rows', the default) or as
+one .npy file per column under MEDIA_ROOT/gps_points/<track id>/
+('columnar'). Columnar files are plain uncompressed .npy so reads can be
+memory-mapped; speed and altitude are stored as float32 to keep them small.
+
+Everything that reads points goes through load_point_arrays() or
+TrackPoints so callers never care which backend a track uses.
+
+The parsed GPS fixes of an upload, before outlier filtering and
+resampling, are also kept as .npy under
+MEDIA_ROOT/gps_intermediate/<content hash>/, so re-processing the same
+file with other parameters skips the parse. Points re-derived from them
+at other time resolutions are kept next to the track's own, always
+columnar, under MEDIA_ROOT/gps_resolutions/<track id>/<points per second>/.
+The per-cell aggregates of a track's points (grids.py) are one .npz under
+MEDIA_ROOT/gps_grids/.
+"""
+import itertools
+import json
+import os
+import shutil
+
+import numpy as np
+from django.conf import settings
+
+ROWS = 'rows'
+COLUMNAR = 'columnar'
+
+COLUMN_DTYPES = {
+    'timestamp': np.float64,
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'speed': np.float32,
+    'altitude': np.float32,
+    'original_timestamp': np.float64,
+}
+
+# Parsed GPS fixes of an upload: Timestamp in ms as logged, Latitude, Longitude
+INTERMEDIATE_COLUMNS = ['Timestamp', 'Latitude', 'Longitude']
+
+# Fields exposed by the points API, in GPSPointSerializer order
+POINT_FIELDS = ['latitude', 'longitude', 'timestamp', 'speed', 'altitude']
+
+
+def default_backend():
+    return getattr(settings, 'GPS_POINT_STORAGE', ROWS)
+
+
+def columnar_dir(track):
+    return os.path.join(settings.MEDIA_ROOT, 'gps_points', str(track.id))
+
+
+def _write_arrays(directory, columns):
+    n = len(columns['timestamp'])
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    for name, dtype in COLUMN_DTYPES.items():
+        values = columns.get(name)
+        if values is None:
+            values = np.full(n, np.nan, dtype=dtype)
+        np.save(os.path.join(tmp_directory, f'{name}.npy'), np.ascontiguousarray(values, dtype=dtype))
+    # Swap the whole directory in so readers never see half a track
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return directory
+
+
+def _read_arrays(directory, fields=None, mmap=True):
+    mode = 'r' if mmap else None
+    return {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode)
+        for name in (fields or COLUMN_DTYPES)
+    }
+
+
+def write_columnar(track, columns):
+    """Write arrays (keyed by COLUMN_DTYPES names) for track. Missing columns are stored as NaN."""
+    return _write_arrays(columnar_dir(track), columns)
+
+
+def read_columnar(track, fields=None, mmap=True):
+    return _read_arrays(columnar_dir(track), fields, mmap)
+
+
+def delete_columnar(track):
+    shutil.rmtree(columnar_dir(track), ignore_errors=True)
+
+
+def columnar_size(track):
+    directory = columnar_dir(track)
+    if not os.path.isdir(directory):
+        return 0
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def link_columnar(source, track):
+    """
+    Give track the columnar files of source. Files are never modified in
+    place, so they are hard-linked where the filesystem allows and copied
+    otherwise. Returns the number of bytes shared rather than copied.
+    """
+    source_directory = columnar_dir(source)
+    directory = columnar_dir(track)
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    shared = 0
+    for name in os.listdir(source_directory):
+        src = os.path.join(source_directory, name)
+        dst = os.path.join(tmp_directory, name)
+        try:
+            os.link(src, dst)
+            shared += os.path.getsize(dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return shared
+
+
+def intermediate_enabled():
+    return getattr(settings, 'GPS_INTERMEDIATE_CACHE', True)
+
+
+def intermediate_dir(content_hash):
+    return os.path.join(settings.MEDIA_ROOT, 'gps_intermediate', content_hash)
+
+
+def write_intermediate(content_hash, pivot_df, meta):
+    """Keep the parsed GPS fixes of an upload, with meta (row counts, parse CPU time) as JSON"""
+    directory = intermediate_dir(content_hash)
+    tmp_directory = f'{directory}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    for name in INTERMEDIATE_COLUMNS:
+        np.save(os.path.join(tmp_directory, f'{name}.npy'), np.ascontiguousarray(pivot_df[name].values))
+    with open(os.path.join(tmp_directory, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return directory
+
+
+def read_intermediate_meta(content_hash, tolerance=0):
+    """
+    Meta of the cached fixes of an upload, or None if there are none or
+    their sensor streams were aligned with another tolerance
+    """
+    if not content_hash or not intermediate_enabled():
+        return None
+    try:
+        with open(os.path.join(intermediate_dir(content_hash), 'meta.json')) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get('align_tolerance_ms', 0) == tolerance else None
+
+
+def read_intermediate(content_hash, tolerance=0):
+    """({column: array}, meta) of the cached fixes of an upload, or None"""
+    meta = read_intermediate_meta(content_hash, tolerance)
+    if meta is None:
+        return None
+    directory = intermediate_dir(content_hash)
+    try:
+        columns = {name: np.load(os.path.join(directory, f'{name}.npy')) for name in INTERMEDIATE_COLUMNS}
+    except (FileNotFoundError, ValueError):
+        return None
+    return columns, meta
+
+
+def delete_intermediate(content_hash):
+    if content_hash:
+        shutil.rmtree(intermediate_dir(content_hash), ignore_errors=True)
+
+
+def resolutions_dir(track):
+    return os.path.join(settings.MEDIA_ROOT, 'gps_resolutions', str(track.id))
+
+
+def write_resolution(track, time_resolution, columns):
+    """Store points of track re-derived at time_resolution points per second"""
+    return _write_arrays(os.path.join(resolutions_dir(track), str(time_resolution)), columns)
+
+
+def read_resolution(track, time_resolution, fields=None):
+    """Memory-mapped point arrays of track at time_resolution, or None if not derived"""
+    directory = os.path.join(resolutions_dir(track), str(time_resolution))
+    if not os.path.isdir(directory):
+        return None
+    return _read_arrays(directory, fields)
+
+
+def stored_resolutions(track):
+    """Time resolutions track's points have been re-derived at"""
+    try:
+        names = os.listdir(resolutions_dir(track))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def delete_resolutions(track):
+    shutil.rmtree(resolutions_dir(track), ignore_errors=True)
+
+
+def grid_path(track):
+    return os.path.join(settings.MEDIA_ROOT, 'gps_grids', f'{track.id}.npz')
+
+
+def write_grid(track, arrays):
+    """Store the per-cell aggregates of track (grids.CellGrid.to_arrays())"""
+    path = grid_path(track)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def profile_path(job):
+    """Where a processing job run with profile=True dumps its cProfile stats"""
+    return os.path.join(settings.MEDIA_ROOT, 'gps_profiles', f'{job.id}.prof')
+
+
+def delete_profile(job):
+    try:
+        os.remove(profile_path(job))
+    except FileNotFoundError:
+        pass
+
+
+def read_grid(track):
+    """Per-cell aggregate arrays of track, or None if they haven't been stored"""
+    try:
+        with np.load(grid_path(track)) as data:
+            return {name: data[name] for name in data.files}
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def link_grid(source, track):
+    """Give track the stored grid of source, see link_columnar(). Returns the bytes shared."""
+    src, dst = grid_path(source), grid_path(track)
+    if not os.path.exists(src):
+        return 0
+    tmp_path = f'{dst}.{os.getpid()}.tmp'
+    try:
+        os.link(src, tmp_path)
+        shared = os.path.getsize(tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+        shared = 0
+    os.replace(tmp_path, dst)
+    return shared
+
+
+def delete_grid(track):
+    try:
+        os.remove(grid_path(track))
+    except FileNotFoundError:
+        pass
+
+
+def read_rows(track, fields=None):
+    fields = list(fields or COLUMN_DTYPES)
+    rows = track.points.order_by('timestamp').values_list(*fields)
+    # NULLs become NaN and original_timestamp strings are parsed as floats
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, len(fields))
+    return {
+        name: data[:, i].astype(COLUMN_DTYPES[name], copy=False)
+        for i, name in enumerate(fields)
+    }
+
+
+def iter_point_blocks(track, fields=None, start_time=None, end_time=None, block_size=65536):
+    """
+    Point columns of a track in timestamp order, as a series of {field: array}
+    blocks of at most block_size points. Rows are read with a server-side
+    iterator, so no model instances are built and memory stays bounded.
+    """
+    fields = list(fields or POINT_FIELDS)
+    if track.point_storage == COLUMNAR:
+        yield from iter_array_blocks(read_columnar(track, fields + ['timestamp']), fields,
+                                     start_time, end_time, block_size)
+        return
+
+    points = track.points.order_by('timestamp')
+    if start_time is not None:
+        points = points.filter(timestamp__gte=start_time)
+    if end_time is not None:
+        points = points.filter(timestamp__lte=end_time)
+    rows = points.values_list(*fields).iterator(chunk_size=block_size)
+    while True:
+        chunk = list(itertools.islice(rows, block_size))
+        if not chunk:
+            return
+        data = np.array(chunk, dtype=np.float64).reshape(-1, len(fields))
+        yield {name: data[:, i] for i, name in enumerate(fields)}
+
+
+def _time_range(timestamps, start_time, end_time):
+    lo = 0 if start_time is None else np.searchsorted(timestamps, start_time, side='left')
+    hi = len(timestamps) if end_time is None else np.searchsorted(timestamps, end_time, side='right')
+    return lo, hi
+
+
+def iter_array_blocks(arrays, fields=None, start_time=None, end_time=None, block_size=65536):
+    """iter_point_blocks() over point arrays already at hand, e.g. another resolution's"""
+    fields = list(fields or POINT_FIELDS)
+    lo, hi = _time_range(arrays['timestamp'], start_time, end_time)
+    for start in range(lo, hi, block_size):
+        stop = min(start + block_size, hi)
+        yield {name: arrays[name][start:stop] for name in fields}
+
+
+def load_point_arrays(track, fields=None):
+    """Point columns of a track as NumPy arrays ordered by timestamp, whatever the backend"""
+    if track.point_storage == COLUMNAR:
+        return read_columnar(track, fields)
+    return read_rows(track, fields)
+
+
+class TrackPoints:
+    """
+    Read-only sequence of point dicts backed by column arrays.
+
+    Slicing only materializes the requested rows, so it can be handed to
+    DRF's paginator and GPSPointSerializer in place of a queryset.
+    """
+
+    def __init__(self, arrays, fields=POINT_FIELDS):
+        self.arrays = arrays
+        self.fields = fields
+
+    @classmethod
+    def for_track(cls, track, start_time=None, end_time=None, fields=POINT_FIELDS):
+        return cls.for_arrays(load_point_arrays(track, fields), start_time, end_time, fields)
+
+    @classmethod
+    def for_arrays(cls, arrays, start_time=None, end_time=None, fields=POINT_FIELDS):
+        lo, hi = _time_range(arrays['timestamp'], start_time, end_time)
+        return cls({name: arrays[name][lo:hi] for name in fields}, fields)
+
+    def __len__(self):
+        return len(self.arrays['timestamp'])
+
+    def count(self):
+        return len(self)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            columns = [np.asarray(self.arrays[name][key]).tolist() for name in self.fields]
+            return [self._row(values) for values in zip(*columns)]
+        return self._row([np.asarray(self.arrays[name][key]).item() for name in self.fields])
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def _row(self, values):
+        # NaN means "not recorded", which the API reports as null
+        return {name: (None if value != value else value) for name, value in zip(self.fields, values)}
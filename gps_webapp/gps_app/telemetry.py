@@ -0,0 +1,197 @@
+"""
+The ingest stages, run incrementally on GPS frames arriving in batches.
+
+A batch is the Timestamp (ms), Sensor and Value of some CAN frames; only
+Latitude and Longitude frames are used. LiveFixStream keeps the little
+state the stages need between batches, so a batch costs about as much as
+its own frames:
+
+- align: frames are paired into fixes as in ingest.align_sensor_streams(),
+  once both streams have moved past them (by the alignment tolerance).
+  Frames still waiting for their partner are held over.
+- filter: the outlier chain runs over the last `context` fixes kept, plus
+  the fixes not decided yet. The newest `lookahead` fixes are held back
+  until later ones arrive, since 'median' and 'gate' look at both
+  neighbours. Those filters then decide a fix as they would on the whole
+  track; 'stddev' only sees the window, and 'kalman' restarts on it.
+- resample: the first fix of each 1/time_resolution second bin not
+  emitted yet is kept, as in utils.resample_gps_fixes().
+- speeds: measured from the previous point, the last one emitted for the
+  first fix of a batch.
+
+Fixes older than the last one decided are dropped, so the points come out
+in timestamp order. flush() decides the held-back fixes at the end of a
+run. RunningStats keeps a track's statistics up to date in O(1) per batch.
+
+No Django imports.
+"""
+import math
+
+import numpy as np
+
+from .geodesy import DEFAULT_METHOD, calculate_speeds
+from .ingest import align_sensor_streams
+from .outliers import apply_filters, parse_filters
+
+# Fixes kept before the undecided ones, as context for the outlier filters
+CONTEXT = 16
+# Newest fixes held back until later ones arrive
+LOOKAHEAD = 4
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+def empty_columns():
+    return {name: _EMPTY for name in ('timestamp', 'latitude', 'longitude', 'speed', 'original_timestamp')}
+
+
+class LiveFixStream:
+    """
+    Point columns (keyed like storage.COLUMN_DTYPES) of one track's live
+    frames. last_point is (seconds, latitude, longitude) of the last point
+    already stored, when resuming a track.
+    """
+
+    def __init__(self, time_resolution, filters, std_multiplier=15, tolerance=0, lookahead=LOOKAHEAD,
+                 context=CONTEXT, last_point=None, method=DEFAULT_METHOD):
+        self.interval = 1.0 / time_resolution if time_resolution and time_resolution > 0 else None
+        self.filters = parse_filters(filters)
+        self.params = {'stddev': {'std_multiplier': std_multiplier}}
+        self.tolerance = tolerance
+        self.method = method
+        self.lookahead = lookahead
+        self.context = context
+        self._frames = {'Latitude': (_EMPTY, _EMPTY), 'Longitude': (_EMPTY, _EMPTY)}
+        # (Timestamp ms, latitude, longitude) of the context fixes, then of the undecided ones
+        self._kept = (_EMPTY, _EMPTY, _EMPTY)
+        self._undecided = (_EMPTY, _EMPTY, _EMPTY)
+        self._last_point = last_point
+        self._last_bin = self._bin(last_point[0]) if last_point is not None else None
+        # Timestamp (ms) fixes must be later than
+        self._horizon = last_point[0] * 1000 if last_point is not None else -math.inf
+        self.frames_in = 0
+        self.fixes_in = 0
+        self.rejected = 0
+        self.points_out = 0
+
+    def _bin(self, seconds):
+        return int(seconds / self.interval) if self.interval else None
+
+    def _pair(self, timestamps, sensors, values):
+        """New fixes from a batch of frames, holding over the ones that may still pair up"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        sensors = np.asarray(sensors)
+        values = np.asarray(values, dtype=np.float64)
+        for sensor, (held_t, held_v) in self._frames.items():
+            mask = sensors == sensor
+            self._frames[sensor] = (np.concatenate((held_t, timestamps[mask])),
+                                    np.concatenate((held_v, values[mask])))
+        (lat_t, lat_v), (lon_t, lon_v) = self._frames['Latitude'], self._frames['Longitude']
+        if not len(lat_t) or not len(lon_t):
+            return _EMPTY, _EMPTY, _EMPTY
+        # Frames no later frame can pair better
+        settled = min(lat_t.max(), lon_t.max()) - self.tolerance
+        lat_done, lon_done = lat_t <= settled, lon_t <= settled
+        fixes = align_sensor_streams(lat_t[lat_done], lat_v[lat_done], lon_t[lon_done], lon_v[lon_done],
+                                     tolerance=self.tolerance)
+        self._frames = {'Latitude': (lat_t[~lat_done], lat_v[~lat_done]),
+                        'Longitude': (lon_t[~lon_done], lon_v[~lon_done])}
+        return fixes
+
+    def _decide(self, final):
+        """(Timestamp ms, latitude, longitude) of the undecided fixes the filter chain now keeps"""
+        kept_t, kept_lat, kept_lon = self._kept
+        t, lats, lons = self._undecided
+        decided = len(t) if final else max(len(t) - self.lookahead, 0)
+        if not decided:
+            return _EMPTY, _EMPTY, _EMPTY
+        window_t = np.concatenate((kept_t, t))
+        index, window_lat, window_lon, _ = apply_filters(
+            window_t / 1000, np.concatenate((kept_lat, lats)), np.concatenate((kept_lon, lons)),
+            self.filters, params=self.params,
+        )
+        # Survivors among the fixes decided now
+        offset = len(kept_t)
+        mine = (index >= offset) & (index < offset + decided)
+        self.rejected += decided - int(mine.sum())
+        out = (window_t[index[mine]], window_lat[mine], window_lon[mine])
+        self._kept = tuple(np.concatenate((k, o))[-self.context:] for k, o in zip(self._kept, out))
+        self._undecided = tuple(a[decided:] for a in self._undecided)
+        return out
+
+    def _resample(self, t, lats, lons):
+        seconds = t / 1000
+        if self.interval is None:
+            return seconds, lats, lons, t
+        bins = (seconds / self.interval).astype(np.int64)
+        first = np.empty(len(bins), dtype=bool)
+        first[:1] = True
+        np.not_equal(bins[1:], bins[:-1], out=first[1:])
+        if self._last_bin is not None:
+            first &= bins > self._last_bin
+        if first.any():
+            self._last_bin = int(bins[first][-1])
+        return seconds[first], lats[first], lons[first], t[first]
+
+    def _points(self, fixes):
+        seconds, lats, lons, original = self._resample(*fixes)
+        if not len(seconds):
+            return empty_columns()
+        if self._last_point is not None:
+            last_s, last_lat, last_lon = self._last_point
+            speeds = calculate_speeds(np.append(last_lat, lats), np.append(last_lon, lons),
+                                      np.append(last_s, seconds), method=self.method)[1:]
+        else:
+            speeds = calculate_speeds(lats, lons, seconds, method=self.method)
+        self._last_point = (float(seconds[-1]), float(lats[-1]), float(lons[-1]))
+        self.points_out += len(seconds)
+        return {'timestamp': seconds, 'latitude': lats, 'longitude': lons, 'speed': speeds,
+                'original_timestamp': original}
+
+    def push(self, timestamps, sensors, values):
+        """Point columns of the fixes a batch of frames settles"""
+        self.frames_in += len(timestamps)
+        t, lats, lons = self._pair(timestamps, sensors, values)
+        late = t <= self._horizon
+        t, lats, lons = t[~late], lats[~late], lons[~late]
+        self.fixes_in += len(t)
+        if len(t):
+            self._horizon = float(t[-1])
+            self._undecided = tuple(np.concatenate((u, new)) for u, new in zip(self._undecided, (t, lats, lons)))
+        return self._points(self._decide(final=False))
+
+    def flush(self):
+        """Point columns of every fix still held back, at the end of a run"""
+        return self._points(self._decide(final=True))
+
+
+class RunningStats:
+    """
+    A track's point count, duration, speeds and bounds, updated from each
+    batch of points without looking at the earlier ones
+    """
+    FIELDS = ('total_points', 'duration', 'max_speed', 'avg_speed',
+              'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude')
+
+    def __init__(self, **values):
+        for name in self.FIELDS:
+            setattr(self, name, values.get(name))
+
+    def update(self, columns):
+        n = len(columns['timestamp'])
+        if not n:
+            return
+        total = self.total_points or 0
+        speeds = columns['speed']
+        self.avg_speed = ((self.avg_speed or 0.0) * total + float(speeds.sum())) / (total + n)
+        self.max_speed = max(self.max_speed or 0.0, float(speeds.max()))
+        self.total_points = total + n
+        self.duration = float(columns['timestamp'][-1])
+        for name, values in (('latitude', columns['latitude']), ('longitude', columns['longitude'])):
+            low, high = float(values.min()), float(values.max())
+            current_low, current_high = getattr(self, f'min_{name}'), getattr(self, f'max_{name}')
+            setattr(self, f'min_{name}', low if current_low is None else min(current_low, low))
+            setattr(self, f'max_{name}', high if current_high is None else max(current_high, high))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
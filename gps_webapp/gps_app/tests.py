@@ -1,3 +1,1525 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import unittest
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .benchmarks.speeds import geopy_loop_speeds
+from .benchmarks.synthetic import synthetic_track, write_can_log
+from .geodesy import METHODS, calculate_speeds, haversine_distances
+from .ingest import (
+    GrowingFile, GPSPivotAccumulator, align_sensor_streams, format_available, gps_fixes, load_gps_pivot,
+    PARQUET, CSV_ZSTD,
+)
+from .jobs import claim_job, run_job, run_worker
+from . import (
+    bulkload, charts, dedup, gates, grids, heatmap, histograms, instrumentation, live, metrics, outliers,
+    point_index, response_cache, simplify, spatial, storage, telemetry, tiles, uploads, wire,
+)
+from .models import GPSTrack, GPSPoint, ProcessingJob
+
+
+class StreamingIngestTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.csv_path = os.path.join(self.tmpdir, 'log.csv')
+        write_can_log(self.csv_path, n_points=600, other_sensors=3, block_points=111)
+
+    def test_streaming_matches_full_read(self):
+        full, full_rows, full_gps = load_gps_pivot(self.csv_path, chunksize=None)
+        # 7 rows per chunk splits Latitude/Longitude pairs across chunk boundaries
+        for chunksize in (7, 1000):
+            streamed, rows, gps = load_gps_pivot(self.csv_path, chunksize=chunksize)
+            self.assertEqual((rows, gps), (full_rows, full_gps))
+            pd.testing.assert_frame_equal(streamed, full.astype({'Timestamp': 'float64'}))
+
+
+class SensorAlignTests(TestCase):
+    def messy_rows(self, n=5000, seed=1):
+        """Shuffled GPS rows with duplicate frames, NaN values and unpaired timestamps"""
+        rng = np.random.default_rng(seed)
+        timestamps = rng.integers(0, n // 2, n).astype(np.float64)
+        sensors = rng.choice(['Latitude', 'Longitude'], n)
+        values = rng.normal(0, 1, n)
+        values[rng.random(n) < 0.05] = np.nan
+        return pd.DataFrame({'Timestamp': timestamps, 'Sensor': sensors, 'Value': values})
+
+    def test_matches_pivot_table(self):
+        rows = self.messy_rows()
+        expected = rows.pivot_table(index='Timestamp', columns='Sensor', values='Value', aggfunc='first')
+        expected = expected.dropna(subset=['Latitude', 'Longitude']).reset_index()
+        expected.columns.name = None
+        aligned = gps_fixes(rows['Timestamp'], rows['Sensor'], rows['Value'])
+        pd.testing.assert_frame_equal(aligned, expected[['Timestamp', 'Latitude', 'Longitude']])
+
+        accumulator = GPSPivotAccumulator()
+        for start in range(0, len(rows), 600):
+            chunk = rows.iloc[start:start + 600]
+            accumulator.add(len(chunk), chunk)
+        pd.testing.assert_frame_equal(accumulator.finish(), aligned)
+
+    def test_tolerance_pairs_nearby_frames(self):
+        lat_t = np.arange(0, 1000, 100.0)
+        lon_t = lat_t + 3
+        # A stray Longitude 2 ms before the next Latitude, closer to it than its own frame
+        lon_t[5] = lat_t[6] - 2
+        values = np.arange(10.0)
+
+        t, lat, lon = align_sensor_streams(lat_t, values, lon_t, values)
+        self.assertEqual(len(t), 0)
+
+        t, lat, lon = align_sensor_streams(lat_t, values, lon_t, values, tolerance=5)
+        # Latitude 5 loses its Longitude to Latitude 6; nothing is paired twice
+        np.testing.assert_array_equal(lat, [0, 1, 2, 3, 4, 6, 7, 8, 9])
+        np.testing.assert_array_equal(lon, [0, 1, 2, 3, 4, 5, 7, 8, 9])
+        np.testing.assert_array_equal(t, [0, 100, 200, 300, 400, 598, 700, 800, 900])
+
+
+class OutlierFilterTests(TestCase):
+    def glitched_track(self, n=20_000):
+        timestamps, lats, lons = synthetic_track(n, rate_hz=10)
+        rng = np.random.default_rng(2)
+        bad = np.sort(rng.choice(np.arange(5, n - 5), 40, replace=False))
+        lats = lats.copy()
+        # 100-300 m jumps: local glitches well inside the track's spread
+        lats[bad] += rng.choice([-1, 1], len(bad)) * rng.uniform(1e-3, 3e-3, len(bad))
+        return timestamps / 1000, lats, lons, bad
+
+    def test_local_filters_catch_glitches(self):
+        seconds, lats, lons, bad = self.glitched_track()
+        for name in ('median', 'gate', 'kalman'):
+            index, _, _, stats = outliers.apply_filters(seconds, lats, lons, [name])
+            dropped = np.setdiff1d(np.arange(len(lats)), index)
+            np.testing.assert_array_equal(dropped, bad, err_msg=name)
+            self.assertEqual(stats[0]['rejected'], len(bad))
+
+        # The global box doesn't see them
+        index, _, _, _ = outliers.apply_filters(seconds, lats, lons, ['stddev'],
+                                                params={'stddev': {'std_multiplier': 15}})
+        self.assertEqual(len(index), len(lats))
+
+    def test_chain_stats(self):
+        seconds, lats, lons, bad = self.glitched_track()
+        index, _, _, stats = outliers.apply_filters(seconds, lats, lons, 'median,gate')
+        self.assertEqual([entry['name'] for entry in stats], ['median', 'gate'])
+        self.assertEqual(stats[1]['points_in'], len(lats) - stats[0]['rejected'])
+        with self.assertRaises(ValueError):
+            outliers.parse_filters('median,wavelet')
+
+    def test_kalman_rejects_fix_on_both_axes(self):
+        timestamps, lats, lons = synthetic_track(500, rate_hz=10)
+        seconds = timestamps / 1000
+        glitched_lats, glitched_lons = lats.copy(), lons.copy()
+        # Rejected for its latitude; its longitude alone would pass the gate
+        glitched_lats[200] += 2e-3
+        glitched_lons[200] += 1e-4
+        keep, _, out_lons = outliers.kalman_filter(seconds, glitched_lats, glitched_lons)
+        self.assertFalse(keep[200])
+        _, _, clean_lons = outliers.kalman_filter(np.delete(seconds, 200), np.delete(lats, 200), np.delete(lons, 200))
+        np.testing.assert_allclose(np.delete(out_lons, 200), clean_lons, rtol=0, atol=1e-9)
+
+
+class SpeedEngineTests(TestCase):
+    def test_matches_geopy_loop(self):
+        timestamps, lats, lons = synthetic_track(500)
+        seconds = timestamps / 1000
+        seconds[10] = seconds[9]  # zero time delta
+        lats[20] += 0.05  # ~5.5 km jump, over the 134 m/s cap
+        expected = geopy_loop_speeds(lats, lons, seconds)
+        for method in METHODS:
+            speeds = calculate_speeds(lats, lons, seconds, method=method)
+            self.assertEqual(speeds[10], 0)
+            self.assertEqual(speeds[20], 0)
+            np.testing.assert_allclose(speeds, expected, rtol=5e-3, atol=1e-3)
+
+
+class TempMediaMixin:
+    """Write uploads to a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def make_log(self, n_points=300, name='log.csv'):
+        path = os.path.join(self.media_root, name)
+        write_can_log(path, n_points=n_points, other_sensors=2)
+        with open(path, 'rb') as f:
+            return SimpleUploadedFile(name, f.read(), content_type='text/csv')
+
+    def upload(self, uploaded_file, **data):
+        data = {'name': 'Endurance', 'uploaded_file': uploaded_file, 'time_resolution': 5, **data}
+        return self.client.post('/api/tracks/upload/', data)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ProcessingJobTests(TempMediaMixin, TestCase):
+    def test_upload_returns_202_and_worker_processes_it(self):
+        response = self.upload(self.make_log())
+        self.assertEqual(response.status_code, 202)
+        track_id = response.json()['track']['id']
+        self.assertEqual(response.json()['job']['status'], 'queued')
+
+        self.assertEqual(run_worker(once=True), 1)
+
+        status = self.client.get(f'/api/tracks/{track_id}/status/').json()
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['progress'], 1.0)
+        self.assertEqual([s['state'] for s in status['stages']], ['done'] * 5)
+        self.assertEqual([f['name'] for f in status['filter_stats']], ['median', 'gate'])
+        track = GPSTrack.objects.get(id=track_id)
+        self.assertTrue(track.processed)
+        self.assertEqual(track.points.count(), track.total_points)
+
+    def test_cancel_queued_job(self):
+        track_id = self.upload(self.make_log()).json()['track']['id']
+        response = self.client.post(f'/api/tracks/{track_id}/cancel/')
+        self.assertEqual(response.json()['status'], 'cancelled')
+        self.assertEqual(run_worker(once=True), 0)
+        self.assertFalse(GPSTrack.objects.get(id=track_id).processed)
+
+    def test_retry_failed_job(self):
+        no_gps = SimpleUploadedFile('empty.csv', b'Timestamp,CANID,Sensor,Value,Unit\n1,2,RPM,3,rpm\n')
+        track_id = self.upload(no_gps).json()['track']['id']
+        run_worker(once=True)
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/status/').json()['status'], 'failed')
+
+        response = self.client.post(f'/api/tracks/{track_id}/retry/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['attempt'], 2)
+        self.assertEqual(ProcessingJob.objects.filter(track_id=track_id).count(), 2)
+        self.assertEqual(self.client.post(f'/api/tracks/{track_id}/retry/').status_code, 409)
+
+    def test_unexpected_error_fails_job(self):
+        track_id = self.upload(self.make_log()).json()['track']['id']
+        with mock.patch('gps_app.jobs.dedup.find_processed_twin', side_effect=RuntimeError("disk gone")), \
+                self.assertLogs('gps_app.jobs', level='ERROR'):
+            run_worker(once=True)
+        status = self.client.get(f'/api/tracks/{track_id}/status/').json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn("disk gone", status['message'])
+        self.assertEqual(self.client.post(f'/api/tracks/{track_id}/retry/').status_code, 202)
+
+    def test_reclaim_stale_running_job(self):
+        track_id = self.upload(self.make_log()).json()['track']['id']
+        job = ProcessingJob.objects.get(track_id=track_id)
+        self.assertTrue(claim_job(job.id))
+        self.assertEqual(self.client.post(f'/api/tracks/{track_id}/retry/').status_code, 409)
+
+        # A long job is alive as long as its heartbeat is
+        ProcessingJob.objects.filter(id=job.id).update(started_at=job.created_at - timedelta(hours=2))
+        self.assertEqual(self.client.post(f'/api/tracks/{track_id}/retry/').status_code, 409)
+
+        # Its worker was killed an hour ago
+        ProcessingJob.objects.filter(id=job.id).update(heartbeat_at=job.created_at - timedelta(hours=1))
+        with self.assertLogs('gps_app.jobs', level='WARNING'):
+            response = self.client.post(f'/api/tracks/{track_id}/retry/')
+        self.assertEqual(response.status_code, 202)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.FAILED)
+
+    def test_reclaimed_run_drops_its_result(self):
+        track_id = self.upload(self.make_log()).json()['track']['id']
+        job = ProcessingJob.objects.get(track_id=track_id)
+        self.assertTrue(claim_job(job.id))
+
+        def reclaim(track, **kwargs):
+            ProcessingJob.objects.filter(id=job.id).update(status=ProcessingJob.FAILED, message="Reclaimed")
+            return None
+
+        with mock.patch('gps_app.jobs.uploads.open_track_source', side_effect=reclaim), \
+                self.assertLogs('gps_app.jobs', level='WARNING'):
+            run_job(job.id, claimed=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.FAILED)
+        self.assertEqual(job.message, "Reclaimed")
+        self.assertIsNone(job.finished_at)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ColumnarStorageTests(TempMediaMixin, TestCase):
+    def process(self, backend):
+        with override_settings(GPS_POINT_STORAGE=backend):
+            track_id = self.upload(self.make_log(n_points=2500)).json()['track']['id']
+            run_worker(once=True)
+        return GPSTrack.objects.get(id=track_id)
+
+    def get_points(self, track, query=''):
+        return self.client.get(f'/api/tracks/{track.id}/points/?{query}').json()
+
+    def test_columnar_track_serves_same_points_as_rows(self):
+        rows_track = self.process(storage.ROWS)
+        columnar_track = self.process(storage.COLUMNAR)
+        self.assertEqual(columnar_track.point_storage, storage.COLUMNAR)
+        self.assertEqual(columnar_track.points.count(), 0)
+
+        for query in ('', 'page=2', 'start_time=10&end_time=20'):
+            expected, actual = self.get_points(rows_track, query), self.get_points(columnar_track, query)
+            self.assertEqual(actual['count'], expected['count'])
+            for a, b in zip(actual['results'], expected['results']):
+                self.assertEqual(a.keys(), b.keys())
+                np.testing.assert_allclose([a['latitude'], a['longitude'], a['timestamp']],
+                                           [b['latitude'], b['longitude'], b['timestamp']])
+                self.assertAlmostEqual(a['speed'], b['speed'], places=4)
+                self.assertIsNone(a['altitude'])
+
+        detail = self.client.get(f'/api/tracks/{columnar_track.id}/?include=points').json()
+        self.assertEqual(detail['points_count'], columnar_track.total_points)
+        self.assertEqual(len(detail['points']), columnar_track.total_points)
+
+    def test_convert_command_round_trip(self):
+        track = self.process(storage.ROWS)
+        before = storage.load_point_arrays(track)
+
+        call_command('convert_point_storage', '--to', 'columnar', stdout=io.StringIO())
+        track.refresh_from_db()
+        self.assertEqual(track.point_storage, storage.COLUMNAR)
+        self.assertEqual(track.points.count(), 0)
+
+        call_command('convert_point_storage', '--to', 'rows', stdout=io.StringIO())
+        track.refresh_from_db()
+        self.assertEqual(track.point_storage, storage.ROWS)
+        self.assertFalse(os.path.exists(storage.columnar_dir(track)))
+        after = storage.load_point_arrays(track)
+        for name in ('timestamp', 'latitude', 'longitude', 'original_timestamp'):
+            np.testing.assert_array_equal(after[name], before[name])
+
+
+class QueryCountTests(TestCase):
+    """Lock in the number of queries of the track endpoints, whatever the number of tracks or points"""
+
+    def make_track(self, n_points):
+        track = GPSTrack.objects.create(name='track', uploaded_file='', processed=True, total_points=n_points)
+        bulkload.insert_points(track, {
+            'timestamp': np.arange(n_points, dtype=np.float64),
+            'latitude': np.full(n_points, 39.75),
+            'longitude': np.full(n_points, -105.22),
+        })
+        return track
+
+    def test_list_does_not_query_per_track(self):
+        for _ in range(3):
+            self.make_track(10)
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/tracks/').json()
+        for _ in range(20):
+            self.make_track(10)
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/tracks/').json()
+        self.assertEqual(large['count'], 23)
+        self.assertEqual({t['points_count'] for t in small['results'] + large['results']}, {10})
+
+    def test_detail_points_are_opt_in(self):
+        track = self.make_track(500)
+        with self.assertNumQueries(1):
+            detail = self.client.get(f'/api/tracks/{track.id}/').json()
+        self.assertNotIn('points', detail)
+        self.assertEqual(detail['points_count'], 500)
+
+        with self.assertNumQueries(2):
+            detail = self.client.get(f'/api/tracks/{track.id}/?include=points').json()
+        self.assertEqual(len(detail['points']), 500)
+        self.assertEqual(detail['points'][0],
+                         {'latitude': 39.75, 'longitude': -105.22, 'timestamp': 0.0, 'speed': None,
+                          'altitude': None})
+
+    def test_points_page_is_constant(self):
+        track = self.make_track(3000)
+        with self.assertNumQueries(3):
+            page = self.client.get(f'/api/tracks/{track.id}/points/?page=2').json()
+        self.assertEqual(page['count'], 3000)
+        self.assertEqual(len(page['results']), 1000)
+
+
+class BulkLoadTests(TestCase):
+    def test_matches_orm_bulk_create(self):
+        columns = {
+            'timestamp': np.array([0.0, 0.2, 0.4]),
+            'latitude': np.array([39.75, 39.7501, 39.7502]),
+            'longitude': np.array([-105.22, -105.2201, -105.2202]),
+            'speed': np.array([0.0, np.nan, 12.5]),
+            'original_timestamp': np.array([1000.0, 1200.0, 1400.0]),
+        }
+        orm_track = GPSTrack.objects.create(name='orm', uploaded_file='')
+        GPSPoint.objects.bulk_create([
+            GPSPoint(track=orm_track, latitude=lat, longitude=lon, timestamp=ts,
+                     speed=None if speed != speed else speed, original_timestamp=str(orig))
+            for ts, lat, lon, speed, orig in zip(*(columns[name].tolist() for name in
+                                                   ('timestamp', 'latitude', 'longitude', 'speed',
+                                                    'original_timestamp')))
+        ])
+        fast_track = GPSTrack.objects.create(name='fast', uploaded_file='')
+        self.assertEqual(bulkload.insert_points(fast_track, columns), 3)
+
+        fields = ('latitude', 'longitude', 'timestamp', 'speed', 'original_timestamp', 'altitude')
+        self.assertEqual(list(fast_track.points.values_list(*fields)),
+                         list(orm_track.points.values_list(*fields)))
+        self.assertEqual(fast_track.points.first().original_timestamp, '1000.0')
+
+
+class SimplificationTests(TestCase):
+    def reference_douglas_peucker(self, x, y, tolerance):
+        kept = {0, len(x) - 1}
+
+        def split(start, end):
+            if end - start < 2:
+                return
+            px, py = x[start + 1:end], y[start + 1:end]
+            dx, dy = x[end] - x[start], y[end] - y[start]
+            t = np.clip(((px - x[start]) * dx + (py - y[start]) * dy) / (dx * dx + dy * dy), 0, 1)
+            d = np.hypot(px - (x[start] + t * dx), py - (y[start] + t * dy))
+            if d.max() > tolerance:
+                k = start + 1 + int(np.argmax(d))
+                kept.add(k)
+                split(start, k)
+                split(k, end)
+
+        split(0, len(x) - 1)
+        return sorted(kept)
+
+    def test_ranking_matches_recursive_douglas_peucker(self):
+        timestamps, lats, lons = synthetic_track(1500, lap_seconds=40)
+        x, y = simplify.project(lats, lons)
+        levels = simplify.zoom_levels(lats, lons)
+        for zoom, (tolerance, indices) in levels.items():
+            self.assertEqual(indices.tolist(), self.reference_douglas_peucker(x, y, tolerance))
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class PolylineEndpointTests(TempMediaMixin, TestCase):
+    def test_polyline_levels_are_precomputed_at_ingest(self):
+        track_id = self.upload(self.make_log(n_points=3000)).json()['track']['id']
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/polyline/').status_code, 409)
+        run_worker(once=True)
+        track = GPSTrack.objects.get(id=track_id)
+        self.assertEqual(sorted(track.polylines.values_list('zoom', flat=True)), list(simplify.ZOOM_LEVELS))
+
+        coarse = self.client.get(f'/api/tracks/{track_id}/polyline/?zoom=12').json()
+        fine = self.client.get(f'/api/tracks/{track_id}/polyline/?zoom=18').json()
+        self.assertLess(coarse['vertex_count'], fine['vertex_count'])
+        self.assertLessEqual(fine['vertex_count'], track.total_points)
+        self.assertEqual(len(coarse['points'][0]), 3)
+
+        adhoc = self.client.get(f'/api/tracks/{track_id}/polyline/?tolerance=5&algorithm=visvalingam')
+        self.assertEqual(adhoc.status_code, 200)
+        self.assertEqual(adhoc.json()['tolerance'], 5.0)
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/polyline/?zoom=abc').status_code, 400)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class HeatmapTileTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        ids = [self.upload(self.make_log(n_points=1200, name=f'log{i}.csv')).json()['track']['id']
+               for i in range(2)]
+        run_worker(once=True)
+        self.tracks = list(GPSTrack.objects.filter(id__in=ids))
+        track = self.tracks[0]
+        px, py = heatmap.project([(track.min_latitude + track.max_latitude) / 2],
+                                 [(track.min_longitude + track.max_longitude) / 2])
+        self.tile = (15, int(px[0] / 256 * 2 ** 15), int(py[0] / 256 * 2 ** 15))
+
+    def test_png_tile_is_cached_and_invalidated_on_delete(self):
+        z, x, y = self.tile
+        url = f'/api/tracks/{self.tracks[0].id}/heatmap/{z}/{x}/{y}.png'
+        first = self.client.get(url)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertEqual(first['X-Tile-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Tile-Cache'], 'hit')
+        self.assertGreaterEqual(self.client.get('/api/heatmap/stats/').json()['hits'], 1)
+
+        self.tracks[0].delete()
+        self.assertFalse(os.path.exists(os.path.join(tiles.cache_root(), str(self.tracks[0].id))))
+
+    def test_json_grid_aggregates_tracks(self):
+        z, x, y = self.tile
+        single = [self.client.get(f'/api/tracks/{t.id}/heatmap/{z}/{x}/{y}.json?size=64').json()
+                  for t in self.tracks]
+        ids = ','.join(str(t.id) for t in self.tracks)
+        combined = self.client.get(f'/api/heatmap/{z}/{x}/{y}.json?size=64&tracks={ids}').json()
+        self.assertEqual(sum(c[2] for c in combined['cells']),
+                         sum(c[2] for grid in single for c in grid['cells']))
+        self.assertEqual(self.client.get(f'/api/heatmap/{z}/{x}/{y}.json?weight=bogus&tracks={ids}').status_code, 400)
+
+    def test_multi_track_tiles_are_invalidated_with_their_tracks(self):
+        z, x, y = self.tile
+        other_id = self.upload(self.make_log(n_points=1200, name='other.csv')).json()['track']['id']
+        run_worker(once=True)
+        ids = ','.join(str(t.id) for t in self.tracks)
+        url = f'/api/heatmap/{z}/{x}/{y}.png?tracks={ids}'
+        self.assertEqual(self.client.get(url)['X-Tile-Cache'], 'miss')
+
+        GPSTrack.objects.get(id=other_id).delete()
+        self.assertEqual(self.client.get(url)['X-Tile-Cache'], 'hit')
+        directory = tiles._tile_directory(self.tracks)
+        self.assertTrue(os.path.exists(os.path.join(directory, tiles.MANIFEST)))
+        self.tracks[1].delete()
+        self.assertFalse(os.path.exists(directory))
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class WireFormatTests(TempMediaMixin, TestCase):
+    def test_varint_round_trip(self):
+        values = np.array([0, 1, 127, 128, 300, 2 ** 35, 2 ** 64 - 1], dtype=np.uint64)
+        np.testing.assert_array_equal(wire.decode_varints(wire.encode_varints(values), len(values)), values)
+        signed = np.array([0, -1, 1, -(2 ** 40), 2 ** 40])
+        np.testing.assert_array_equal(wire.unzigzag(wire.zigzag(signed)), signed)
+
+    def test_binary_points_match_json(self):
+        for backend in (storage.ROWS, storage.COLUMNAR):
+            with override_settings(GPS_POINT_STORAGE=backend):
+                track_id = self.upload(self.make_log(n_points=2000)).json()['track']['id']
+                run_worker(once=True)
+            track = GPSTrack.objects.get(id=track_id)
+            expected = storage.load_point_arrays(track, wire.DEFAULT_FIELDS)
+
+            response = self.client.get(f'/api/tracks/{track_id}/points/', HTTP_ACCEPT=wire.CONTENT_TYPE)
+            self.assertEqual(response['Content-Type'], wire.CONTENT_TYPE)
+            meta, columns = wire.decode(b''.join(response.streaming_content))
+            self.assertEqual(meta['fields'], wire.DEFAULT_FIELDS)
+            for name in wire.DEFAULT_FIELDS:
+                np.testing.assert_array_equal(columns[name], expected[name].astype(wire.FIELD_DTYPES[name]))
+
+            packed = self.client.get(f'/api/tracks/{track_id}/?format=gpsb&encoding=delta')
+            meta, columns = wire.decode(b''.join(packed.streaming_content))
+            self.assertEqual(meta['track']['id'], track_id)
+            np.testing.assert_allclose(columns['latitude'], expected['latitude'], atol=1e-7)
+            np.testing.assert_allclose(columns['longitude'], expected['longitude'], atol=1e-7)
+
+        bad = self.client.get(f'/api/tracks/{track_id}/points/?format=gpsb&fields=bogus')
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(bad['Content-Type'], 'application/json')
+
+
+class PointPaginationTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Runs of equal timestamps straddle the page boundaries
+        timestamps = np.repeat(np.arange(250) * 0.2, 4)[:997]
+        n = len(timestamps)
+        self.columns = {
+            'timestamp': timestamps,
+            'latitude': 39.75 + np.arange(n) * 1e-6,
+            'longitude': np.full(n, -105.22),
+            'speed': np.where(np.arange(n) % 10 == 0, np.nan, 12.5),
+        }
+        self.tracks = []
+        for backend in (storage.ROWS, storage.COLUMNAR):
+            track = GPSTrack.objects.create(name=backend, uploaded_file='', point_storage=backend)
+            if backend == storage.ROWS:
+                bulkload.insert_points(track, self.columns)
+            else:
+                storage.write_columnar(track, self.columns)
+            self.tracks.append(track)
+
+    def walk(self, url):
+        points = []
+        while url:
+            response = self.client.get(url).json()
+            points.extend(response['results'])
+            url = response['next']
+        return points
+
+    def test_cursor_walk(self):
+        for track in self.tracks:
+            url = f'/api/tracks/{track.id}/points/'
+            points = self.walk(url + '?cursor=&page_size=7')
+            self.assertNotIn('count', self.client.get(url + '?cursor=').json())
+            self.assertEqual([p['latitude'] for p in points], self.columns['latitude'].tolist())
+            self.assertEqual(points, self.walk(url))
+
+            window = self.walk(url + '?cursor=&page_size=10&start_time=10&end_time=20&fields=timestamp')
+            inside = (self.columns['timestamp'] >= 10) & (self.columns['timestamp'] <= 20)
+            self.assertEqual([p['timestamp'] for p in window], self.columns['timestamp'][inside].tolist())
+            self.assertEqual(self.client.get(url + '?cursor=bogus').status_code, 404)
+
+    def test_fields_and_ndjson(self):
+        for track in self.tracks:
+            url = f'/api/tracks/{track.id}/points/'
+            page = self.client.get(url + '?fields=latitude,speed').json()['results']
+            self.assertEqual(set(page[0]), {'latitude', 'speed'})
+            self.assertIsNone(page[0]['speed'])
+            self.assertEqual(self.client.get(url + '?fields=latitude,bogus').status_code, 400)
+
+            response = self.client.get(url + '?fields=timestamp,speed', HTTP_ACCEPT=wire.NDJSON_CONTENT_TYPE)
+            self.assertEqual(response['Content-Type'], wire.NDJSON_CONTENT_TYPE)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            rows = [json.loads(line) for line in lines]
+            self.assertEqual(len(rows), len(self.columns['timestamp']))
+            self.assertEqual(rows[0], {'timestamp': 0.0, 'speed': None})
+            self.assertEqual(rows[1], {'timestamp': 0.0, 'speed': 12.5})
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ResponseCacheTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.track_id = self.upload(self.make_log(n_points=1000)).json()['track']['id']
+        run_worker(once=True)
+        response_cache.reset_stats()
+
+    def test_etag_and_conditional_requests(self):
+        track = GPSTrack.objects.get(id=self.track_id)
+        self.assertEqual(len(track.content_hash), 64)
+
+        for url in (f'/api/tracks/{self.track_id}/stats/', f'/api/tracks/{self.track_id}/bounds/',
+                    f'/api/tracks/{self.track_id}/', f'/api/tracks/{self.track_id}/points/?page=1'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('immutable', first['Cache-Control'])
+            with self.assertNumQueries(1):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        stats = self.client.get('/api/cache/stats/').json()
+        self.assertEqual((stats['misses'], stats['memory_hits'], stats['not_modified']), (4, 4, 4))
+
+    def test_shared_cache_and_invalidation_on_delete(self):
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'responses'},
+        }
+        with self.settings(CACHES=caches_setting, GPS_RESPONSE_CACHE_ALIAS='responses'):
+            url = f'/api/tracks/{self.track_id}/stats/'
+            self.client.get(url)
+            # Another worker process would only see the shared copy
+            response_cache.clear()
+            self.client.get(url)
+            self.assertEqual(response_cache.stats()['shared_hits'], 1)
+
+            GPSTrack.objects.get(id=self.track_id).delete()
+            self.assertEqual(response_cache.stats()['entries'], 0)
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(response_cache.shared_cache().get(f'gps:response-keys:{self.track_id}'), None)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+    chunk_size = 64 * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.data = self.make_log(n_points=3000).read()
+
+    def put_chunk(self, upload_id, offset, data):
+        return self.client.put(f'/api/uploads/{upload_id}/chunk/?offset={offset}', data,
+                               content_type='application/octet-stream')
+
+    def test_resume_after_dropped_chunks(self):
+        start = self.client.post('/api/uploads/', {'name': 'Endurance', 'size': len(self.data)},
+                                 content_type='application/json')
+        self.assertEqual(start.status_code, 201)
+        upload_id = start.json()['upload_id']
+
+        offset = 0
+        while offset < len(self.data):
+            chunk = self.data[offset:offset + self.chunk_size]
+            response = self.put_chunk(upload_id, offset, chunk)
+            self.assertEqual(response.status_code, 200)
+            # The client never saw that response and sends the chunk again
+            self.assertEqual(self.put_chunk(upload_id, offset, chunk).json()['offset'], offset + len(chunk))
+            offset = response.json()['offset']
+            if offset < len(self.data):
+                skipped = self.put_chunk(upload_id, offset + 10, self.data[offset + 10:offset + 20])
+                self.assertEqual(skipped.status_code, 409)
+                self.assertEqual(skipped.json()['offset'], offset)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()['offset'], len(self.data))
+
+        finalized = self.client.post(f'/api/uploads/{upload_id}/finalize/')
+        self.assertEqual(finalized.status_code, 202)
+        run_worker(once=True)
+
+        track = GPSTrack.objects.get(id=finalized.json()['track']['id'])
+        self.assertEqual(track.content_hash, hashlib.sha256(self.data).hexdigest())
+        with open(track.uploaded_file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertTrue(track.processed)
+        direct = self.upload(SimpleUploadedFile('log.csv', self.data)).json()['track']['id']
+        run_worker(once=True)
+        self.assertEqual(track.total_points, GPSTrack.objects.get(id=direct).total_points)
+
+    def test_early_ingest_and_incomplete_finalize(self):
+        start = self.client.post('/api/uploads/', {'name': 'Early', 'size': len(self.data), 'early_ingest': True},
+                                 content_type='application/json').json()
+        self.assertEqual(start['job']['status'], 'queued')
+        self.put_chunk(start['upload_id'], 0, self.data[:1000])
+        self.assertEqual(self.client.post(f'/api/uploads/{start["upload_id"]}/finalize/').status_code, 409)
+
+        # The job has loaded its track and opened the upload before the rest arrives
+        open_track_source = uploads.open_track_source
+
+        def finish_upload_meanwhile(track, **kwargs):
+            source = open_track_source(track, **kwargs)
+            self.put_chunk(start['upload_id'], 1000, self.data[1000:])
+            finalized = self.client.post(f'/api/uploads/{start["upload_id"]}/finalize/').json()
+            self.assertEqual(finalized['track']['id'], start['track_id'])
+            return source
+
+        with mock.patch('gps_app.jobs.uploads.open_track_source', side_effect=finish_upload_meanwhile):
+            self.assertEqual(run_worker(once=True), 1)
+        track = GPSTrack.objects.get(id=start['track_id'])
+        self.assertTrue(track.processed)
+        self.assertEqual(track.content_hash, hashlib.sha256(self.data).hexdigest())
+        self.assertIsNotNone(storage.read_intermediate_meta(track.content_hash, 0))
+
+    def test_growing_file_streams_while_written(self):
+        path = os.path.join(self.media_root, 'growing.csv')
+        with open(path, 'wb') as f:
+            f.write(self.data[:5000])
+        done = threading.Event()
+
+        def writer():
+            with open(path, 'ab') as f:
+                for offset in range(5000, len(self.data), 20000):
+                    f.write(self.data[offset:offset + 20000])
+                    f.flush()
+            done.set()
+
+        threading.Timer(0.05, writer).start()
+        with GrowingFile(path, done.is_set, poll_interval=0.01, timeout=10) as source:
+            streamed, rows_read, _ = load_gps_pivot(source, chunksize=500)
+        expected, expected_rows, _ = load_gps_pivot(io.BytesIO(self.data))
+        self.assertEqual(rows_read, expected_rows)
+        pd.testing.assert_frame_equal(streamed, expected)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class LogFormatTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.csv_path = os.path.join(self.media_root, 'plain.csv')
+        write_can_log(self.csv_path, n_points=2000, other_sensors=2)
+        self.expected, self.expected_rows, _ = load_gps_pivot(self.csv_path)
+
+    def assert_same_pivot(self, path):
+        pivot_df, rows_read, _ = load_gps_pivot(path, chunksize=1000)
+        self.assertEqual(rows_read, self.expected_rows)
+        pd.testing.assert_frame_equal(pivot_df, self.expected)
+
+    def test_gzip_upload_is_processed(self):
+        with open(self.csv_path, 'rb') as f:
+            data = gzip.compress(f.read())
+        gz_path = os.path.join(self.media_root, 'log.csv.gz')
+        with open(gz_path, 'wb') as f:
+            f.write(data)
+        self.assert_same_pivot(gz_path)
+
+        track_id = self.upload(SimpleUploadedFile('log.csv.gz', data)).json()['track']['id']
+        run_worker(once=True)
+        plain_id = self.upload(self.make_log(n_points=2000)).json()['track']['id']
+        run_worker(once=True)
+        self.assertEqual(GPSTrack.objects.get(id=track_id).total_points,
+                         GPSTrack.objects.get(id=plain_id).total_points)
+
+    def test_unsupported_extension_is_rejected(self):
+        response = self.upload(SimpleUploadedFile('log.txt', b'Timestamp,Sensor,Value\n'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('uploaded_file', response.json())
+
+    @unittest.skipUnless(format_available(PARQUET), "pyarrow is not installed")
+    def test_parquet_matches_csv(self):
+        parquet_path = os.path.join(self.media_root, 'log.parquet')
+        pd.read_csv(self.csv_path).to_parquet(parquet_path, row_group_size=1000)
+        self.assert_same_pivot(parquet_path)
+
+    @unittest.skipUnless(format_available(CSV_ZSTD), "zstandard is not installed")
+    def test_zstd_matches_csv(self):
+        zst_path = os.path.join(self.media_root, 'log.csv.zst')
+        pd.read_csv(self.csv_path).to_csv(zst_path, index=False, compression='zstd')
+        self.assert_same_pivot(zst_path)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class DedupTests(TempMediaMixin, TestCase):
+    def upload_and_process(self, **data):
+        track_id = self.upload(self.make_log(n_points=1000), **data).json()['track']['id']
+        run_worker(once=True)
+        track = GPSTrack.objects.get(id=track_id)
+        return track, track.jobs.get()
+
+    def test_identical_upload_reuses_points(self):
+        first, first_job = self.upload_and_process()
+        self.assertIsNone(first_job.reused_from)
+        self.assertGreater(first_job.cpu_seconds, 0)
+        self.assertTrue(os.path.isdir(storage.intermediate_dir(first.content_hash)))
+
+        with mock.patch('gps_app.jobs.process_gps_csv') as process:
+            second, second_job = self.upload_and_process()
+        process.assert_not_called()
+        self.assertEqual(second_job.status, ProcessingJob.SUCCEEDED)
+        self.assertEqual(second_job.reused_from_id, first.id)
+        self.assertGreater(second_job.saved_bytes, 0)
+        # The second copy of the file is dropped in favour of the first
+        self.assertEqual(second.uploaded_file.name, first.uploaded_file.name)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'gps_uploads'))), 1)
+        self.assertEqual(second.total_points, first.total_points)
+        self.assertEqual(second.polylines.count(), first.polylines.count())
+        np.testing.assert_array_equal(storage.load_point_arrays(second)['latitude'],
+                                      storage.load_point_arrays(first)['latitude'])
+
+        # Deleting one upload leaves the other intact
+        first.delete()
+        self.assertTrue(os.path.exists(second.uploaded_file.path))
+        self.assertTrue(os.path.isdir(storage.intermediate_dir(second.content_hash)))
+        second.delete()
+        self.assertFalse(os.path.isdir(storage.intermediate_dir(second.content_hash)))
+
+    def test_reuse_keeps_a_rename_made_meanwhile(self):
+        first, _ = self.upload_and_process()
+        find_twin = dedup.find_processed_twin
+
+        def rename_meanwhile(track, *args):
+            GPSTrack.objects.filter(id=track.id).update(name='Renamed')
+            return find_twin(track, *args)
+
+        with mock.patch('gps_app.jobs.dedup.find_processed_twin', side_effect=rename_meanwhile):
+            second, second_job = self.upload_and_process()
+        self.assertEqual(second_job.reused_from_id, first.id)
+        self.assertEqual(second.name, 'Renamed')
+        self.assertTrue(second.processed)
+
+    @override_settings(GPS_POINT_STORAGE='columnar')
+    def test_columnar_points_are_hard_linked(self):
+        first, _ = self.upload_and_process()
+        second, second_job = self.upload_and_process()
+        self.assertEqual(second.point_storage, storage.COLUMNAR)
+        self.assertGreaterEqual(second_job.saved_bytes, storage.columnar_size(first))
+        first_file = os.path.join(storage.columnar_dir(first), 'latitude.npy')
+        second_file = os.path.join(storage.columnar_dir(second), 'latitude.npy')
+        self.assertEqual(os.stat(first_file).st_ino, os.stat(second_file).st_ino)
+
+    def test_other_resolution_only_resamples(self):
+        first, first_job = self.upload_and_process(time_resolution=5)
+        with mock.patch('gps_app.utils.load_gps_pivot') as load:
+            second, second_job = self.upload_and_process(time_resolution=2)
+        load.assert_not_called()
+        self.assertIsNone(second_job.reused_from)
+        self.assertGreater(second_job.saved_cpu_seconds, 0)
+        self.assertEqual(second.time_resolution, 2)
+        self.assertLess(second.total_points, first.total_points)
+
+        stats = self.client.get('/api/dedup/stats/').json()
+        self.assertEqual(stats['reused_parse'], 1)
+        self.assertEqual(stats['reused_points'], 0)
+
+    def test_changed_settings_reprocess(self):
+        first, _ = self.upload_and_process()
+        self.assertEqual((first.align_tolerance_ms, first.speed_method), (0, 'vincenty'))
+        with override_settings(GPS_SPEED_METHOD='haversine'):
+            second, second_job = self.upload_and_process()
+        self.assertIsNone(second_job.reused_from)
+        self.assertEqual(second.speed_method, 'haversine')
+        with override_settings(GPS_SENSOR_ALIGN_TOLERANCE_MS=5):
+            _, third_job = self.upload_and_process()
+        self.assertIsNone(third_job.reused_from)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ResampleTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        track_id = self.upload(self.make_log(n_points=1000), time_resolution=5).json()['track']['id']
+        run_worker(once=True)
+        self.track = GPSTrack.objects.get(id=track_id)
+        self.url = f'/api/tracks/{self.track.id}/'
+
+    def test_resample_from_cached_fixes(self):
+        with mock.patch('gps_app.utils.load_gps_pivot') as load:
+            response = self.client.post(self.url + 'resample/', {'time_resolution': 2},
+                                        content_type='application/json')
+        load.assert_not_called()
+        self.assertEqual(response.status_code, 201)
+        summary = response.json()
+        self.assertLess(summary['total_points'], self.track.total_points)
+
+        # Derived once, then served from disk
+        again = self.client.post(self.url + 'resample/', {'time_resolution': 2}, content_type='application/json')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['total_points'], summary['total_points'])
+        self.assertEqual(self.client.get(self.url + 'resample/').json()['resolutions'], [2, 5])
+
+        points = self.client.get(self.url + 'points/?resolution=2').json()
+        self.assertEqual(points['count'], summary['total_points'])
+        self.assertEqual(self.client.get(self.url + 'points/?resolution=5').json()['count'],
+                         self.track.total_points)
+        packed = self.client.get(self.url + 'points/?resolution=2', HTTP_ACCEPT=wire.CONTENT_TYPE)
+        _, columns = wire.decode(b''.join(packed.streaming_content))
+        self.assertEqual(len(columns['latitude']), summary['total_points'])
+
+        self.track.delete()
+        self.assertFalse(os.path.exists(storage.resolutions_dir(self.track)))
+
+    def test_unknown_resolution(self):
+        self.assertEqual(self.client.get(self.url + 'points/?resolution=3').status_code, 404)
+        response = self.client.post(self.url + 'resample/', {'time_resolution': 500},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class GridIndexTests(TestCase):
+    def test_matches_full_scan(self):
+        _, lats, lons = synthetic_track(20_000)
+        index = spatial.GridIndex(lats, lons)
+        rng = np.random.default_rng(3)
+        for _ in range(20):
+            lat = rng.uniform(lats.min(), lats.max())
+            lon = rng.uniform(lons.min(), lons.max())
+            box = (lon, lat, lon + rng.uniform(0, 1e-3), lat + rng.uniform(0, 1e-3))
+            inside = (lats >= box[1]) & (lats <= box[3]) & (lons >= box[0]) & (lons <= box[2])
+            np.testing.assert_array_equal(index.bbox(*box), np.flatnonzero(inside))
+
+            indices, meters = index.nearest(lat, lon, k=5)
+            distances = haversine_distances(lat, lon, lats, lons)
+            np.testing.assert_allclose(meters, np.sort(distances)[:5], atol=1e-3)
+            np.testing.assert_allclose(distances[indices], meters)
+
+        # Far from the track, and more neighbours than points
+        _, meters = spatial.GridIndex(lats[:3], lons[:3]).nearest(0.0, 0.0, k=10)
+        self.assertEqual(len(meters), 3)
+        self.assertEqual(len(spatial.GridIndex([], []).bbox(-180, -90, 180, 90)), 0)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class SpatialQueryTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        track_id = self.upload(self.make_log(n_points=1000)).json()['track']['id']
+        run_worker(once=True)
+        self.track = GPSTrack.objects.get(id=track_id)
+        self.url = f'/api/tracks/{self.track.id}/'
+        self.arrays = storage.load_point_arrays(self.track)
+
+    def test_bbox(self):
+        lats, lons = self.arrays['latitude'], self.arrays['longitude']
+        box = (float(np.median(lons)), float(lats.min()), float(lons.max()), float(np.median(lats)))
+        inside = (lats >= box[1]) & (lats <= box[3]) & (lons >= box[0]) & (lons <= box[2])
+        bbox = ','.join(map(repr, box))
+
+        response = self.client.get(self.url + f'points/?bbox={bbox}').json()
+        self.assertEqual(response['count'], int(inside.sum()))
+        self.assertEqual([p['timestamp'] for p in response['results']],
+                         self.arrays['timestamp'][inside].tolist())
+        packed = self.client.get(self.url + f'points/?bbox={bbox}', HTTP_ACCEPT=wire.CONTENT_TYPE)
+        _, columns = wire.decode(b''.join(packed.streaming_content))
+        self.assertEqual(len(columns['latitude']), int(inside.sum()))
+
+        self.assertEqual(self.client.get(self.url + 'points/?bbox=1,2,3').status_code, 400)
+        self.assertEqual(self.client.get(self.url + 'points/?bbox=10,0,5,1').status_code, 400)
+
+    def test_nearest(self):
+        i = 123
+        lat, lon = float(self.arrays['latitude'][i]), float(self.arrays['longitude'][i])
+        response = self.client.get(self.url + f'nearest/?lat={lat!r}&lon={lon!r}&k=3')
+        self.assertEqual(response.status_code, 200)
+        points = response.json()['points']
+        self.assertEqual(len(points), 3)
+        self.assertEqual(points[0]['index'], i)
+        self.assertEqual(points[0]['distance'], 0.0)
+        self.assertEqual(points[0]['timestamp'], self.arrays['timestamp'][i])
+        self.assertLessEqual(points[1]['distance'], points[2]['distance'])
+
+        self.assertEqual(self.client.get(self.url + 'nearest/?lat=91&lon=0').status_code, 400)
+        self.assertEqual(self.client.get(self.url + f'nearest/?lat={lat}&lon={lon}&k=0').status_code, 400)
+
+        # Deleting the track drops its cached index
+        entries = point_index.stats()['entries']
+        self.track.delete()
+        self.assertEqual(point_index.stats()['entries'], entries - 1)
+
+
+class CellGridTests(TestCase):
+    def test_merge_matches_combined_points(self):
+        rng = np.random.default_rng(0)
+        tracks = []
+        for seed in range(3):
+            timestamps, lats, lons = synthetic_track(5000, seed=seed)
+            speeds = rng.random(5000) * 40
+            speeds[::17] = np.nan
+            tracks.append((lats, lons, timestamps / 1000, speeds))
+        merged = grids.CellGrid.merge([grids.CellGrid.from_points(*track) for track in tracks])
+        lats, lons, _, speeds = (np.concatenate(arrays) for arrays in zip(*tracks))
+        combined = grids.CellGrid.from_points(lats, lons, np.arange(len(lats)), speeds)
+
+        np.testing.assert_array_equal(merged.cells, combined.cells)
+        np.testing.assert_array_equal(merged.count, combined.count)
+        np.testing.assert_array_equal(merged.speed_max, combined.speed_max)
+        np.testing.assert_allclose(merged.mean_speed(), combined.mean_speed())
+        np.testing.assert_array_equal(merged.hist_count, combined.hist_count)
+        self.assertAlmostEqual(merged.dwell.sum(), sum(grids.CellGrid.from_points(*t).dwell.sum() for t in tracks))
+
+        coarse = grids.CellGrid.merge([merged], zoom=12)
+        self.assertLess(len(coarse), len(merged))
+        self.assertEqual(coarse.count.sum(), merged.count.sum())
+
+    def test_speed_percentiles(self):
+        speeds = np.array([1.0, 2.0, 3.0, 4.0, 30.0, np.nan])
+        grid = grids.CellGrid.from_points(np.full(6, 39.75), np.full(6, -105.22), np.arange(6.0), speeds)
+        self.assertEqual(len(grid), 1)
+        self.assertEqual(grid.speed_max[0], 30.0)
+        self.assertAlmostEqual(grid.mean_speed()[0], 8.0)
+        self.assertLessEqual(abs(grid.speed_percentile(50)[0] - 3.0), grids.SPEED_BIN)
+        self.assertEqual(grid.speed_percentile(100)[0], 30.0)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class AggregateEndpointTests(TempMediaMixin, TestCase):
+    def test_aggregate_tracks(self):
+        ids = [self.upload(self.make_log(n_points=600 + 100 * i, name=f'run{i}.csv')).json()['track']['id']
+               for i in range(2)]
+        run_worker(once=True)
+        tracks = list(GPSTrack.objects.filter(id__in=ids))
+        for track in tracks:
+            self.assertTrue(os.path.exists(storage.grid_path(track)))
+
+        # Merged from the stored grids, without reading points
+        with mock.patch('gps_app.storage.load_point_arrays') as load:
+            response = self.client.get(f'/api/aggregate/?tracks={",".join(ids)}&percentiles=50,95')
+        load.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['point_count'], sum(track.total_points for track in tracks))
+        self.assertEqual(len(data['cells']['p95_speed']), data['cell_count'])
+        self.assertEqual(max(data['cells']['max_speed']), max(track.max_speed for track in tracks))
+
+        # Grids missing (tracks processed before they existed) are built on first use
+        storage.delete_grid(tracks[0])
+        again = self.client.get(f'/api/aggregate/?tracks={",".join(ids)}&zoom=14').json()
+        self.assertEqual(again['point_count'], data['point_count'])
+        self.assertEqual(again['zoom'], 14)
+        self.assertTrue(os.path.exists(storage.grid_path(tracks[0])))
+
+        self.assertEqual(self.client.get('/api/aggregate/').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/aggregate/?tracks={ids[0]}&zoom=30').status_code, 400)
+        for bbox in ('1,2,3', 'nan,0,1,1', '0,0,inf,1', '0,-91,1,1', '0,0,181,1', '1,0,0,1'):
+            self.assertEqual(self.client.get(f'/api/aggregate/?tracks={ids[0]}&bbox={bbox}').status_code, 400)
+        deleted, path = tracks[0].id, storage.grid_path(tracks[0])
+        tracks[0].delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.client.get(f'/api/aggregate/?tracks={deleted}').status_code, 404)
+
+
+class LapSplitTests(TestCase):
+    def setUp(self):
+        # Six 60 s laps at 10 Hz
+        timestamps, self.lats, self.lons = synthetic_track(3600, seed=3)
+        self.seconds = timestamps / 1000
+        self.speeds = calculate_speeds(self.lats, self.lons, self.seconds)
+
+    def test_detected_gate(self):
+        gate, laps = gates.split_laps(self.seconds, self.lats, self.lons, self.speeds)
+        self.assertIsNotNone(gate)
+        self.assertGreaterEqual(len(laps), 5)
+        self.assertEqual([lap['number'] for lap in laps], list(range(1, len(laps) + 1)))
+        for lap in laps:
+            self.assertAlmostEqual(lap['lap_time'], 60.0, delta=0.2)
+            self.assertEqual(len(lap['sectors']), gates.SECTORS)
+            self.assertAlmostEqual(sum(lap['sectors']), lap['lap_time'])
+            self.assertAlmostEqual(lap['distance'], laps[0]['distance'], delta=5)
+            self.assertLessEqual(self.seconds[lap['start_index']] - lap['start_time'], 0.1)
+            self.assertLessEqual(lap['end_time'], self.seconds[lap['end_index'] - 1] + 0.1)
+            self.assertLessEqual(lap['min_speed'], lap['avg_speed'])
+            self.assertLessEqual(lap['avg_speed'], lap['max_speed'])
+
+    def test_given_gate(self):
+        # A line across the top of the oval, either way round
+        gate = [[39.7510 + 0.0015, -105.2226], [39.7510 + 0.0025, -105.2226]]
+        _, laps = gates.split_laps(self.seconds, self.lats, self.lons, self.speeds, gate=gate)
+        _, reversed_laps = gates.split_laps(self.seconds, self.lats, self.lons, self.speeds, gate=gate[::-1])
+        self.assertEqual(len(laps), 5)
+        self.assertAlmostEqual(laps[0]['start_time'], 15.0, delta=0.2)
+        self.assertEqual([lap['start_time'] for lap in laps], [lap['start_time'] for lap in reversed_laps])
+
+        # Crossings through the index are those of a scan of every segment
+        indexed = gates.LapSplitter(self.seconds, self.lats, self.lons, self.speeds)
+        scanned = gates.LapSplitter(self.seconds, self.lats, self.lons, self.speeds, indexed=False)
+        np.testing.assert_array_equal(indexed.crossings(gate)[0], scanned.crossings(gate)[0])
+
+        # Nowhere near the path, or a track that never comes back
+        far = [[40.0, -105.0], [40.0, -105.001]]
+        self.assertEqual(gates.split_laps(self.seconds, self.lats, self.lons, self.speeds, gate=far)[1], [])
+        line = np.linspace(0, 0.01, 500)
+        self.assertEqual(gates.split_laps(np.arange(500.0), 39.75 + line, -105.22 + line), (None, []))
+
+    def test_jitter_at_the_line(self):
+        # Back and forth across the line within a few seconds counts once
+        gate = [[39.7510 + 0.0015, -105.2226], [39.7510 + 0.0025, -105.2226]]
+        lons = self.lons.copy()
+        lons[748:756] = -105.2226 + np.array([-1, 1, -1, 1, -1, 1, -1, 1]) * 1e-5
+        _, laps = gates.split_laps(self.seconds, self.lats, lons, self.speeds, gate=gate)
+        self.assertEqual(len(laps), 5)
+        self.assertTrue(all(lap['lap_time'] > gates.MIN_LAP_SECONDS for lap in laps))
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class LapEndpointTests(TempMediaMixin, TestCase):
+    def test_laps(self):
+        track_id = self.upload(self.make_log(n_points=2500)).json()['track']['id']
+        url = f'/api/tracks/{track_id}/laps/'
+        self.assertEqual(self.client.get(url).status_code, 409)
+        run_worker(once=True)
+
+        data = self.client.get(url).json()
+        self.assertTrue(data['gate_detected'])
+        self.assertGreaterEqual(data['lap_count'], 3)
+        self.assertEqual(len(data['laps']), data['lap_count'])
+        self.assertAlmostEqual(data['laps'][0]['lap_time'], 60.0, delta=0.5)
+
+        # A lap's points without the rest of the track
+        lap = data['laps'][1]
+        points = self.client.get(f'/api/tracks/{track_id}/points/?lap=2&page_size=10000').json()
+        self.assertEqual(points['count'], lap['end_index'] - lap['start_index'])
+        self.assertGreaterEqual(points['results'][0]['timestamp'], lap['start_time'])
+        self.assertLessEqual(points['results'][-1]['timestamp'], lap['end_time'])
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/points/?lap=99').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/points/?lap=x').status_code, 400)
+
+        # Split again at a line of our own, then back to a detected one
+        before = self.client.get(url)
+        lap_points = self.client.get(f'/api/tracks/{track_id}/points/?lap=2')
+        self.assertEqual(before['Cache-Control'], response_cache.REVALIDATE)
+        gate = [[39.7510 + 0.0015, -105.2226], [39.7510 + 0.0025, -105.2226]]
+        response = self.client.post(url, {'gate': gate}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['gate_detected'])
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()['gate'], gate)
+        self.assertNotEqual(self.client.get(f'/api/tracks/{track_id}/points/?lap=2')['ETag'], lap_points['ETag'])
+        track = GPSTrack.objects.get(id=track_id)
+        self.assertEqual(track.laps.count(), response.json()['lap_count'])
+        response = self.client.post(url, {'gate': None}, content_type='application/json')
+        self.assertTrue(response.json()['gate_detected'])
+        self.assertEqual(response.json()['lap_count'], data['lap_count'])
+        bad = self.client.post(url, {'gate': [[39.75, -105.22]]}, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+        # A track without a line to split at isn't split again on every read
+        track.laps.all().delete()
+        GPSTrack.objects.filter(id=track_id).update(lap_gate=None)
+        response_cache.invalidate_track(track.id)
+        with mock.patch('gps_app.laps.resplit_track') as resplit:
+            self.assertEqual(self.client.get(url).json()['lap_count'], 0)
+        resplit.assert_not_called()
+
+        # Tracks processed before laps existed are split on first use
+        GPSTrack.objects.filter(id=track_id).update(laps_split_at=None)
+        response_cache.invalidate_track(track.id)
+        self.assertEqual(self.client.get(url).json()['lap_count'], data['lap_count'])
+        self.assertIsNotNone(GPSTrack.objects.get(id=track_id).laps_split_at)
+
+
+
+class HistogramTests(TestCase):
+    def test_summarize(self):
+        seconds = np.arange(1000) / 5 + 3.0
+        speeds = np.abs(np.sin(seconds / 7)) * 30
+        summary = histograms.summarize(seconds, speeds, time_bin=10, speed_bin=2, percentiles=(5, 50, 95))
+        self.assertEqual(summary['speed']['count'], 1000)
+        self.assertEqual(summary['speed']['histogram'], np.bincount((speeds // 2).astype(int)).tolist())
+        self.assertEqual(summary['speed']['percentiles'], np.round(np.percentile(speeds, (5, 50, 95)), 3).tolist())
+
+        # Time bins are aligned to multiples of time_bin
+        time = summary['time']
+        self.assertEqual(time['start'], 0)
+        self.assertEqual(len(time['count']), 21)
+        self.assertEqual(time['count'][0], 35)
+        in_bin = speeds[(seconds >= 50) & (seconds < 60)]
+        self.assertEqual([row[5] for row in time['percentiles']],
+                         np.round(np.percentile(in_bin, (5, 50, 95)), 3).tolist())
+        self.assertAlmostEqual(time['max'][5], in_bin.max(), places=3)
+        self.assertEqual(np.array(summary['histogram2d']).sum(axis=1).tolist(), time['count'])
+
+        # Empty bins are null
+        gap = np.concatenate((seconds[:100], seconds[-100:]))
+        summary = histograms.summarize(gap, np.concatenate((speeds[:100], speeds[-100:])))
+        self.assertIn(None, summary['time']['mean'])
+        self.assertIn(0, summary['time']['count'])
+        with self.assertRaises(ValueError):
+            histograms.summarize(seconds, speeds, time_bin=0.1, speed_bin=0.1, max_cells=1000)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class DistributionEndpointTests(TempMediaMixin, TestCase):
+    def test_distributions(self):
+        track_id = self.upload(self.make_log(n_points=2500)).json()['track']['id']
+        url = f'/api/tracks/{track_id}/distributions/'
+        self.assertEqual(self.client.get(url).status_code, 409)
+        run_worker(once=True)
+
+        # Stored at ingest, so served without reading the points
+        track = GPSTrack.objects.get(id=track_id)
+        self.assertEqual(track.distributions['speed']['count'], track.total_points)
+        with mock.patch.object(storage, 'load_point_arrays') as load:
+            data = self.client.get(url).json()
+        load.assert_not_called()
+        self.assertEqual(data['time_bin'], 10)
+        self.assertEqual(data['speed']['max'], round(track.max_speed, 3))
+        self.assertEqual(sum(data['time']['count']), track.total_points)
+
+        # Other bin widths come from the points
+        data = self.client.get(url + '?time_bin=60&speed_bin=5').json()
+        self.assertEqual((data['time_bin'], data['speed_bin']), (60, 5))
+        self.assertEqual(sum(map(sum, data['histogram2d'])), track.total_points)
+        self.assertEqual(self.client.get(url + '?time_bin=0').status_code, 400)
+        self.assertEqual(self.client.get(url + '?speed_bin=x').status_code, 400)
+        with mock.patch('gps_app.distributions.MAX_CELLS', 1000):
+            self.assertEqual(self.client.get(url + '?time_bin=1&speed_bin=0.5').status_code, 400)
+
+        # Tracks processed before distributions existed get theirs on first use
+        GPSTrack.objects.filter(id=track_id).update(distributions=None)
+        response_cache.invalidate_track(track.id)
+        self.assertEqual(self.client.get(url).json()['speed']['count'], track.total_points)
+        self.assertIsNotNone(GPSTrack.objects.get(id=track_id).distributions)
+
+        # The default bins are part of the cache key and ETag
+        tag = self.client.get(url)['ETag']
+        with override_settings(GPS_DISTRIBUTION_TIME_BIN=30):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+        self.assertEqual(response.json()['time_bin'], 30)
+
+
+
+class ChartTests(TempMediaMixin, TestCase):
+    def test_downsample_line(self):
+        x = np.arange(100_000) / 10
+        y = np.random.default_rng(0).random(len(x))
+        keep = charts.downsample_line(x, y, 500)
+        self.assertLessEqual(len(keep), 4 * 500)
+        self.assertEqual((keep[0], keep[-1]), (0, len(x) - 1))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+        # Every pixel column keeps its extremes
+        columns = np.minimum((x / x[-1] * 500).astype(int), 499)
+        for column in (0, 123, 499):
+            in_column = columns == column
+            self.assertIn(y[in_column].max(), y[keep])
+            self.assertIn(y[in_column].min(), y[keep])
+        self.assertEqual(len(charts.downsample_line(x[:100], y[:100], 500)), 100)
+
+    def test_thin_scatter(self):
+        x = np.repeat(np.arange(1000.0), 20)
+        y = np.tile(np.arange(20.0), 1000)
+        keep = charts.thin_scatter(x, y, 100, 10)
+        self.assertEqual(len(keep), 100 * 10)
+        self.assertEqual(len(set(zip(x[keep] // 10, y[keep] // 2))), len(keep))
+
+    def test_load_series_cache(self):
+        path = os.path.join(self.media_root, 'log.csv')
+        write_can_log(path, n_points=3000, other_sensors=2)
+        cache_dir = os.path.join(self.media_root, 'cache')
+        series, cached = charts.load_series(path, time_resolution=1, cache_dir=cache_dir)
+        self.assertFalse(cached)
+        self.assertEqual(len(series['seconds']), 300)
+
+        with mock.patch('gps_app.ingest.load_gps_pivot') as load:
+            again, cached = charts.load_series(path, time_resolution=1, cache_dir=cache_dir)
+        load.assert_not_called()
+        self.assertTrue(cached)
+        np.testing.assert_array_equal(again['speed'], series['speed'])
+        # Other parameters, or a changed file, are processed again
+        self.assertFalse(charts.load_series(path, time_resolution=2, cache_dir=cache_dir)[1])
+        write_can_log(path, n_points=2000, other_sensors=2)
+        series, cached = charts.load_series(path, time_resolution=1, cache_dir=cache_dir)
+        self.assertFalse(cached)
+        self.assertEqual(len(series['seconds']), 200)
+
+    @unittest.skipUnless(charts.matplotlib_available(), "matplotlib is not installed")
+    def test_render_charts(self):
+        seconds = np.arange(20_000) / 5
+        series = {'seconds': seconds, 'speed': 20 + 10 * np.sin(seconds / 30)}
+        rendered = charts.render_charts(series, self.media_root, dpi=50, workers=1)
+        self.assertEqual([chart for chart, _, _ in rendered], list(charts.CHARTS))
+        for _, path, _ in rendered:
+            self.assertGreater(os.path.getsize(path), 0)
+
+
+def _frames(n_points, seed=0):
+    """(timestamps, sensors, values) of the Latitude and Longitude frames of a synthetic run"""
+    timestamps, lats, lons = synthetic_track(n_points, seed=seed)
+    lats = lats.copy()
+    lats[n_points // 3] += 0.01
+    return (np.repeat(timestamps, 2), np.tile(['Latitude', 'Longitude'], n_points),
+            np.column_stack((lats, lons)).ravel())
+
+
+class LiveFixStreamTests(TestCase):
+    def test_batches_match_whole_run(self):
+        from .utils import calculate_speeds_vectorized, filter_gps_fixes, resample_gps_fixes
+        timestamps, sensors, values = _frames(3000)
+        with mock.patch('builtins.print'):
+            fixes = resample_gps_fixes(filter_gps_fixes(gps_fixes(timestamps, sensors, values), 'median,gate'), 5)
+
+        stream = telemetry.LiveFixStream(5, 'median,gate')
+        stats = telemetry.RunningStats()
+        cuts = np.sort(np.random.default_rng(0).choice(len(timestamps), 80, replace=False))
+        batches = [stream.push(timestamps[a:b], sensors[a:b], values[a:b])
+                   for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(timestamps)])]
+        batches.append(stream.flush())
+        for batch in batches:
+            stats.update(batch)
+        points = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+        np.testing.assert_array_equal(points['timestamp'], fixes['seconds'].values)
+        np.testing.assert_array_equal(points['latitude'], fixes['Latitude'].values)
+        np.testing.assert_allclose(points['speed'], calculate_speeds_vectorized(fixes))
+        self.assertEqual(stream.rejected, 1)
+        self.assertEqual(stats.total_points, len(fixes))
+        self.assertAlmostEqual(stats.avg_speed, points['speed'].mean())
+        self.assertEqual(stats.max_speed, points['speed'].max())
+        self.assertEqual(stats.min_latitude, points['latitude'].min())
+        self.assertEqual(stats.duration, points['timestamp'][-1])
+
+    def test_frames_split_across_batches(self):
+        stream = telemetry.LiveFixStream(0, '', lookahead=0)
+        # A Latitude waits for its Longitude; late and unpaired frames are dropped
+        self.assertEqual(len(stream.push([0, 100], ['Latitude', 'Latitude'], [39.75, 39.75001])['timestamp']), 0)
+        self.assertEqual(len(stream.push([0, 100], ['Longitude', 'Longitude'], [-105.22, -105.22001])['timestamp']), 2)
+        self.assertEqual(len(stream.push([50, 50], ['Latitude', 'Longitude'], [39.75, -105.22])['timestamp']), 0)
+        points = stream.push([200, 300, 300], ['Latitude', 'Latitude', 'Longitude'], [39.75002, 39.75003, -105.22003])
+        np.testing.assert_array_equal(points['timestamp'], [0.3])
+        self.assertGreater(points['speed'][0], 0)
+
+
+class LiveTelemetryTests(TempMediaMixin, TestCase):
+    def post_frames(self, track_id, timestamps, sensors, values):
+        frames = [[float(t), str(s), float(v)] for t, s, v in zip(timestamps, sensors, values)]
+        return self.client.post(f'/api/tracks/{track_id}/telemetry/', {'frames': frames},
+                                content_type='application/json')
+
+    def test_http_batches(self):
+        response = self.client.post('/api/tracks/live/', {'name': 'Endurance', 'time_resolution': 5},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        track_id = response.json()['track']['id']
+        timestamps, sensors, values = _frames(3000)
+        for start in range(0, len(timestamps), 400):
+            delta = self.post_frames(track_id, *(a[start:start + 400] for a in (timestamps, sensors, values))).json()
+            self.assertEqual(delta['type'], 'points')
+
+        # Statistics kept up to date batch by batch match the stored points
+        track = GPSTrack.objects.get(id=track_id)
+        self.assertTrue(track.live)
+        self.assertFalse(track.processed)
+        self.assertEqual(track.total_points, track.points.count())
+        self.assertEqual(track.max_speed, max(track.points.values_list('speed', flat=True)))
+        self.assertEqual(delta['stats']['total_points'], track.total_points)
+        self.assertEqual(self.client.get(f'/api/tracks/{track_id}/points/?page_size=10000').json()['count'],
+                         track.total_points)
+
+        self.assertEqual(self.client.post(f'/api/tracks/{track_id}/telemetry/', {'frames': [[1, 'Latitude']]},
+                                          content_type='application/json').status_code, 400)
+        response = self.client.post(f'/api/tracks/{track_id}/finish/')
+        self.assertEqual(response.status_code, 200)
+        track.refresh_from_db()
+        self.assertFalse(track.live)
+        self.assertTrue(track.processed)
+        self.assertEqual(track.total_points, track.points.count())
+        self.assertTrue(track.polylines.exists())
+        self.assertGreater(track.laps.count(), 0)
+        self.assertTrue(os.path.exists(storage.grid_path(track)))
+        self.assertEqual(self.post_frames(track_id, [0], ['Latitude'], [39.75]).status_code, 409)
+
+    def test_batch_racing_finish_is_rejected(self):
+        track = live.start_live_track('Endurance')
+        timestamps, sensors, values = _frames(600)
+        live.ingest_frames(track, timestamps[:300], sensors[:300], values[:300])
+        # The batch's request loaded the track before another finished it
+        waiting = GPSTrack.objects.get(id=track.id)
+        live.finish_live_track(track)
+        track.refresh_from_db()
+        with self.assertRaises(live.NotLive):
+            live.ingest_frames(waiting, timestamps[300:], sensors[300:], values[300:])
+        with self.assertRaises(live.NotLive):
+            live.finish_live_track(waiting)
+        self.assertNotIn(track.id, live._sessions)
+        self.assertEqual(track.points.count(), track.total_points)
+
+    def test_websocket(self):
+        from .websocket import live_telemetry
+        track = live.start_live_track('Endurance')
+        timestamps, sensors, values = _frames(600)
+        frames = [[float(t), str(s), float(v)] for t, s, v in zip(timestamps, sensors, values)]
+
+        async def connect(path):
+            incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+            scope = {'type': 'websocket', 'path': path, 'headers': [], 'query_string': b''}
+            task = asyncio.ensure_future(live_telemetry(scope, incoming.get, outgoing.put))
+            await incoming.put({'type': 'websocket.connect'})
+            return incoming, outgoing, task, await outgoing.get()
+
+        async def session():
+            *_, refused = await connect(f'/ws/tracks/{uuid.uuid4()}/live/')
+            self.assertEqual(refused, {'type': 'websocket.close', 'code': 4404})
+
+            producer, producer_out, producer_task, accepted = await connect(f'/ws/tracks/{track.id}/live/')
+            self.assertEqual(accepted['type'], 'websocket.accept')
+            listener, listener_out, listener_task, _ = await connect(f'/ws/tracks/{track.id}/live/')
+            await producer.put({'type': 'websocket.receive', 'text': json.dumps({'seq': 1, 'frames': frames})})
+            replies = [json.loads((await producer_out.get())['text']) for _ in range(2)]
+            self.assertEqual({reply['type'] for reply in replies}, {'ack', 'points'})
+            delta = json.loads((await listener_out.get())['text'])
+            self.assertEqual(delta['type'], 'points')
+            self.assertGreater(len(delta['points']['timestamp']), 0)
+
+            await producer.put({'type': 'websocket.receive', 'text': json.dumps({'finish': True})})
+            finished = json.loads((await listener_out.get())['text'])
+            self.assertEqual(finished['type'], 'finished')
+            self.assertEqual((await listener_out.get())['type'], 'websocket.close')
+            for queue in (producer, listener):
+                await queue.put({'type': 'websocket.disconnect', 'code': 1000})
+            await asyncio.gather(producer_task, listener_task)
+            return delta, finished
+
+        delta, finished = async_to_sync(session)()
+        track.refresh_from_db()
+        self.assertTrue(track.processed)
+        self.assertEqual(finished['stats']['total_points'], track.total_points)
+        self.assertEqual(len(delta['points']['timestamp']) + len(finished['points']['timestamp']),
+                         track.total_points)
+        self.assertEqual(live.stats()['subscribers'], 0)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class ImportTracksTests(TempMediaMixin, TestCase):
+    # Not the default, so the spawned workers only use it if it's passed on to them
+    @override_settings(GPS_SPEED_METHOD='haversine')
+    def test_import_directory(self):
+        log_dir = os.path.join(self.media_root, 'logs')
+        os.makedirs(os.path.join(log_dir, 'day2'))
+        write_can_log(os.path.join(log_dir, 'run1.csv'), n_points=3000, other_sensors=2, seed=1)
+        write_can_log(os.path.join(log_dir, 'day2', 'run2.csv'), n_points=2000, other_sensors=2, seed=2)
+        shutil.copyfile(os.path.join(log_dir, 'run1.csv'), os.path.join(log_dir, 'day2', 'run1.csv'))
+        with open(os.path.join(log_dir, 'notes.txt'), 'w') as f:
+            f.write("not a log")
+
+        # What the upload pipeline makes of one of them
+        with open(os.path.join(log_dir, 'day2', 'run2.csv'), 'rb') as f:
+            response = self.upload(SimpleUploadedFile('run2.csv', f.read(), content_type='text/csv'))
+        run_worker(once=True)
+        uploaded = GPSTrack.objects.get(id=response.json()['track']['id'])
+        expected = (uploaded.total_points, uploaded.max_speed, uploaded.laps.count())
+        uploaded.delete()
+
+        out = io.StringIO()
+        call_command('import_tracks', log_dir, workers=1, transaction_points=1, stdout=out)
+        self.assertIn("Imported 2 track(s), skipped 1, failed 0", out.getvalue())
+        tracks = {track.name: track for track in GPSTrack.objects.all()}
+        self.assertEqual(sorted(tracks), ['run1', 'run2'])
+        for track in tracks.values():
+            self.assertTrue(track.processed)
+            self.assertEqual(track.total_points, track.points.count())
+            self.assertTrue(track.polylines.exists())
+            self.assertEqual(track.jobs.get().status, ProcessingJob.SUCCEEDED)
+        run2 = tracks['run2']
+        self.assertEqual(run2.speed_method, 'haversine')
+        self.assertEqual((run2.total_points, run2.laps.count()), (expected[0], expected[2]))
+        self.assertAlmostEqual(run2.max_speed, expected[1])
+
+        # Everything is known now, by content
+        out = io.StringIO()
+        call_command('import_tracks', os.path.join(log_dir, '**', '*.csv'), workers=2, stdout=out)
+        self.assertIn("Imported 0 track(s), skipped 3, failed 0", out.getvalue())
+
+
+class StageProfileTests(TestCase):
+    def test_stages_and_log_records(self):
+        observed = []
+        profile = instrumentation.StageProfile(context={'job_id': 'job'}, observers=[observed.append])
+        with self.assertLogs('gps_app.instrumentation', level='INFO') as logs:
+            with profile.stage('parse', rows_in=10) as stage:
+                stage.rows_out = 4
+            with self.assertRaises(ValueError):
+                with profile.stage('filter', rows_in=4):
+                    raise ValueError("bad fix")
+
+        self.assertEqual(observed, profile.stages)
+        parse, failed = profile.as_list()
+        self.assertEqual((parse['name'], parse['rows_in'], parse['rows_out'], parse['failed']), ('parse', 10, 4, False))
+        self.assertGreaterEqual(parse['wall_seconds'], 0)
+        self.assertTrue(failed['failed'])
+        self.assertIsNone(parse['peak_traced_bytes'])
+
+        entry = json.loads(instrumentation.JSONFormatter().format(logs.records[0]))
+        self.assertEqual(entry['logger'], 'gps_app.instrumentation')
+        self.assertEqual(entry['stage'], dict(parse, job_id='job'))
+
+    def test_traced_memory(self):
+        import tracemalloc
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        profile = instrumentation.StageProfile()
+        with self.assertLogs('gps_app.instrumentation', level='INFO'):
+            with profile.stage('alloc'):
+                block = np.ones(1_000_000)
+        del block
+        self.assertGreaterEqual(profile.stages[0].peak_traced_bytes, 8_000_000)
+
+
+@override_settings(GPS_JOB_BACKEND='worker')
+class IngestMetricsTests(TempMediaMixin, TestCase):
+    STAGES = ['parse', 'filter', 'resample', 'speeds', 'laps', 'distributions', 'polylines', 'grid', 'insert']
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_stage_stats_and_metrics(self):
+        track_id = self.upload(self.make_log()).json()['track']['id']
+        run_worker(once=True)
+
+        job = self.client.get(f'/api/tracks/{track_id}/status/').json()
+        self.assertEqual([stage['name'] for stage in job['stage_stats']], self.STAGES)
+        self.assertFalse(any(stage['failed'] for stage in job['stage_stats']))
+        parse, insert = job['stage_stats'][0], job['stage_stats'][-1]
+        self.assertGreater(parse['rows_in'], parse['rows_out'])
+        self.assertEqual(insert['rows_out'], GPSTrack.objects.get(id=track_id).total_points)
+        self.assertFalse(job['profile'])
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('gps_ingest_stage_duration_seconds_count{stage="parse"} 1', text)
+        self.assertIn('gps_jobs_total{status="succeeded"} 1', text)
+        self.assertIn('gps_request_duration_seconds_bucket{view="GPSTrackViewSet",action="upload",method="POST",'
+                      'status="202",le="+Inf"} 1', text)
+        self.assertIn('action="job_status"', text)
+        self.assertIn('gps_tile_cache_', text)
+
+    def test_opt_in_profile(self):
+        track_id = self.upload(self.make_log(), profile='true').json()['track']['id']
+        run_worker(once=True)
+        job = ProcessingJob.objects.get(track_id=track_id)
+        self.assertTrue(job.profile)
+        path = storage.profile_path(job)
+        functions = {name for _, _, name in pstats.Stats(path).stats}
+        self.assertIn('process_gps_csv', functions)
+
+        job.delete()
+        self.assertFalse(os.path.exists(path))
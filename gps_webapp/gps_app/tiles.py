@@ -0,0 +1,259 @@
+"""
+Heatmap tile rendering with an on-disk LRU cache.
+
+Rendered tiles are written under MEDIA_ROOT/heatmap_tiles/ so every gunicorn
+worker shares them. The cache is capped at GPS_TILE_CACHE_MAX_BYTES; when it
+grows past that the least recently used tiles (by mtime, refreshed on every
+hit) are deleted. A track's tiles, and the multi-track tiles that include
+it, are dropped whenever the track is reprocessed or deleted. Each
+multi-track directory lists its tracks in a MANIFEST file for that.
+
+Projected points are kept per process in a small LRU, per track and per set
+of tracks, so consecutive tiles of the same tracks don't reload or recombine
+them.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+from . import heatmap, storage
+
+SOURCE_CACHE_SIZE = 16
+MANIFEST = 'tracks'
+
+_sources = OrderedDict()
+_sources_lock = Lock()
+
+_stats_lock = Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'render_seconds_total': 0.0,
+    'render_seconds_max': 0.0,
+}
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, 'heatmap_tiles')
+
+
+def max_cache_bytes():
+    return getattr(settings, 'GPS_TILE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def stats():
+    """Hit/miss counters and render latency for this process"""
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+    result['render_ms_mean'] = (
+        result['render_seconds_total'] / result['misses'] * 1000 if result['misses'] else 0.0
+    )
+    return result
+
+
+def reset_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0 if isinstance(_stats[key], int) else 0.0
+
+
+def _cached_source(key):
+    with _sources_lock:
+        if key in _sources:
+            _sources.move_to_end(key)
+            return _sources[key]
+    return None
+
+
+def _cache_source(key, source):
+    with _sources_lock:
+        _sources[key] = source
+        while len(_sources) > SOURCE_CACHE_SIZE:
+            _sources.popitem(last=False)
+    return source
+
+
+def track_source(track):
+    """HeatmapSource for one track, cached per process"""
+    source = _cached_source(track.id)
+    if source is not None:
+        return source
+    arrays = storage.load_point_arrays(track, ['timestamp', 'latitude', 'longitude', 'speed'])
+    return _cache_source(track.id, heatmap.HeatmapSource.from_arrays(
+        arrays['latitude'], arrays['longitude'], arrays['timestamp'], arrays['speed']
+    ))
+
+
+def tracks_source(tracks):
+    """
+    HeatmapSource for several tracks, cached per process by the set of
+    tracks, so that its per-zoom maxima are only computed once
+    """
+    if len(tracks) == 1:
+        return track_source(tracks[0])
+    key = frozenset(track.id for track in tracks)
+    source = _cached_source(key)
+    if source is not None:
+        return source
+    return _cache_source(key, heatmap.HeatmapSource.combine([track_source(track) for track in tracks]))
+
+
+def _tile_directory(tracks):
+    if len(tracks) == 1:
+        return os.path.join(cache_root(), str(tracks[0].id))
+    ids = ','.join(sorted(str(track.id) for track in tracks))
+    return os.path.join(cache_root(), 'multi', hashlib.sha1(ids.encode()).hexdigest())
+
+
+def _tile_path(tracks, z, x, y, weight, fmt, size):
+    return os.path.join(_tile_directory(tracks), weight, str(size), str(z), str(x), f'{y}.{fmt}')
+
+
+def _write_manifest(tracks):
+    path = os.path.join(_tile_directory(tracks), MANIFEST)
+    if not os.path.exists(path):
+        _write_cached(path, '\n'.join(str(track.id) for track in tracks).encode())
+
+
+def _multi_directories(track_id):
+    """Multi-track tile directories that include track_id, or whose manifest is gone"""
+    root = os.path.join(cache_root(), 'multi')
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return
+    for name in names:
+        directory = os.path.join(root, name)
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                ids = f.read().split()
+        except FileNotFoundError:
+            # Evicted, so which tracks it holds is unknown
+            yield directory
+            continue
+        if str(track_id) in ids:
+            yield directory
+
+
+def _read_cached(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # mtime doubles as the LRU clock
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def _write_cached(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _cache_files():
+    for directory, _, names in os.walk(cache_root()):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield st.st_mtime, st.st_size, path
+
+
+def evict(limit=None):
+    """Delete least recently used tiles until the cache is under 90% of its cap"""
+    limit = max_cache_bytes() if limit is None else limit
+    files = sorted(_cache_files())
+    total = sum(size for _, size, _ in files)
+    if total <= limit:
+        return 0
+    removed = 0
+    for _, size, path in files:
+        if total <= limit * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    _count('evictions', removed)
+    return removed
+
+
+_written_since_evict = 0
+
+
+def _maybe_evict(written):
+    # Walking the cache on every miss would be slow; check every ~5% of the cap
+    global _written_since_evict
+    _written_since_evict += written
+    if _written_since_evict >= max_cache_bytes() / 20:
+        _written_since_evict = 0
+        evict()
+
+
+def invalidate_track(track_id):
+    """Forget everything rendered from a track, alone or with others"""
+    with _sources_lock:
+        stale = [key for key in _sources
+                 if key == track_id or (isinstance(key, frozenset) and track_id in key)]
+        for key in stale:
+            del _sources[key]
+    shutil.rmtree(os.path.join(cache_root(), str(track_id)), ignore_errors=True)
+    for directory in _multi_directories(track_id):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def render_tile(tracks, z, x, y, weight=heatmap.DEFAULT_WEIGHT, fmt='png', size=heatmap.TILE_SIZE):
+    """Return (bytes, cache_hit) for a tile covering all of tracks"""
+    path = _tile_path(tracks, z, x, y, weight, fmt, size)
+    data = _read_cached(path)
+    if data is not None:
+        _count('hits')
+        return data, True
+
+    start = time.perf_counter()
+    source = tracks_source(tracks)
+    grid = source.grid(z, x, y, weight=weight, size=size)
+    scale_max = source.zoom_max(z, weight=weight, size=size)
+    if fmt == 'png':
+        data = heatmap.render_png(grid, weight, scale_max)
+    else:
+        payload = heatmap.grid_json(grid, z, x, y, weight, scale_max)
+        payload['tracks'] = [str(track.id) for track in tracks]
+        data = json.dumps(payload).encode()
+    elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        _stats['misses'] += 1
+        _stats['render_seconds_total'] += elapsed
+        _stats['render_seconds_max'] = max(_stats['render_seconds_max'], elapsed)
+
+    if len(tracks) > 1:
+        _write_manifest(tracks)
+    _write_cached(path, data)
+    _maybe_evict(len(data))
+    return data, False
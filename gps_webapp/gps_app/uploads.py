@@ -0,0 +1,200 @@
+"""
+Resumable chunked uploads.
+
+    POST   /api/uploads/                     start: name, filename, size, time_resolution, early_ingest
+    GET    /api/uploads/<id>/                current offset, to resume after a dropped connection
+    PUT    /api/uploads/<id>/chunk/?offset=N raw bytes of the file from offset N
+    POST   /api/uploads/<id>/finalize/       create the track (if not yet) and queue processing
+    DELETE /api/uploads/<id>/                abort
+
+Chunks are streamed from the request to the file under MEDIA_ROOT in
+fixed-size blocks, so memory per upload stays flat whatever the file size.
+Bytes are appended strictly in order; a chunk that starts before the
+current offset (a retry after a lost response) has its already-received
+prefix skipped. The SHA-256 is updated as blocks arrive; a process that
+doesn't hold the running hash (another gunicorn worker, a restart)
+rebuilds it from the bytes on disk.
+
+With early_ingest the track and its job are created when the upload
+starts, and the job parses the file through ingest.GrowingFile while the
+remaining chunks arrive.
+"""
+import hashlib
+import os
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+
+from .ingest import GrowingFile, format_from_name, CSV
+from .models import GPSTrack, UploadSession
+
+BLOCK_SIZE = 1024 * 1024
+
+_hashers = {}
+_hashers_lock = Lock()
+
+
+class UploadError(Exception):
+    """A chunk or finalize request that can't be applied; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_chunk_bytes():
+    return getattr(settings, 'GPS_UPLOAD_CHUNK_MAX_BYTES', 16 * 1024 * 1024)
+
+
+def file_path(session):
+    return os.path.join(settings.MEDIA_ROOT, session.file)
+
+
+def start_upload(name, size=None, time_resolution=5, early_ingest=False, filename=None):
+    """Create an upload session and its empty file. filename's suffix sets the log format."""
+    session = UploadSession(name=name, size=size, time_resolution=time_resolution, early_ingest=early_ingest)
+    fmt = format_from_name(filename or '') or CSV
+    session.file = os.path.join('gps_uploads', f'{session.id}.{fmt}')
+    os.makedirs(os.path.dirname(file_path(session)), exist_ok=True)
+    open(file_path(session), 'wb').close()
+    with transaction.atomic():
+        if early_ingest:
+            session.track = GPSTrack.objects.create(name=name, uploaded_file=session.file)
+        session.save()
+    return session
+
+
+def _hasher(session):
+    """Running SHA-256 of the first session.received bytes"""
+    with _hashers_lock:
+        offset, hasher = _hashers.get(session.id, (None, None))
+    if offset == session.received:
+        return hasher
+    hasher = hashlib.sha256()
+    with open(file_path(session), 'rb') as f:
+        remaining = session.received
+        while remaining:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def append_chunk(session_id, offset, stream, length):
+    """
+    Write `length` bytes read from stream at `offset`. Returns the updated
+    session. Raises UploadError if the chunk can't be applied.
+    """
+    if length > max_chunk_bytes():
+        raise UploadError(f"Chunks are limited to {max_chunk_bytes()} bytes", status=413)
+
+    with transaction.atomic():
+        # Serializes concurrent chunks of the same upload
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        if session.status != UploadSession.UPLOADING:
+            raise UploadError(f"Upload is {session.status}", status=409)
+        if offset > session.received:
+            raise UploadError(f"Expected offset {session.received}", status=409)
+        if session.size is not None and offset + length > session.size:
+            raise UploadError(f"Chunk ends past the announced size of {session.size} bytes")
+
+        skip = session.received - offset
+        hasher = _hasher(session)
+        written = 0
+        with open(file_path(session), 'r+b') as f:
+            f.seek(session.received)
+            try:
+                remaining = length
+                while remaining:
+                    block = stream.read(min(BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    if skip:
+                        dropped = min(skip, len(block))
+                        block, skip = block[dropped:], skip - dropped
+                    f.write(block)
+                    hasher.update(block)
+                    written += len(block)
+            except Exception:
+                # Keep the file and the hash consistent with `received`
+                f.truncate(session.received)
+                with _hashers_lock:
+                    _hashers.pop(session.id, None)
+                raise
+            f.truncate()
+
+        session.received += written
+        session.save(update_fields=['received', 'updated_at'])
+        with _hashers_lock:
+            _hashers[session.id] = (session.received, hasher)
+    return session
+
+
+def finalize(session_id):
+    """
+    Close an upload: check its size, record the content hash and return
+    (session, track, created), created being False if early ingest already
+    made the track.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        if session.status != UploadSession.UPLOADING:
+            raise UploadError(f"Upload is {session.status}", status=409)
+        if session.size is not None and session.received != session.size:
+            raise UploadError(f"Received {session.received} of {session.size} bytes", status=409)
+        if session.received == 0:
+            raise UploadError("Upload is empty")
+
+        session.content_hash = _hasher(session).hexdigest()
+        session.status = UploadSession.COMPLETE
+        created = session.track is None
+        if created:
+            session.track = GPSTrack.objects.create(name=session.name, uploaded_file=session.file,
+                                                    content_hash=session.content_hash)
+        else:
+            GPSTrack.objects.filter(id=session.track_id).update(content_hash=session.content_hash)
+        session.save()
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    return session, session.track, created
+
+
+def abort(session):
+    UploadSession.objects.filter(id=session.id).update(status=UploadSession.ABORTED)
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    if session.track_id is None:
+        try:
+            os.remove(file_path(session))
+        except FileNotFoundError:
+            pass
+
+
+def is_uploading(track):
+    """Whether track is an early-ingest upload whose chunks are still arriving"""
+    return track.upload_sessions.filter(status=UploadSession.UPLOADING).exists()
+
+
+def open_track_source(track, poll_interval=0.5, timeout=600, on_wait=None):
+    """
+    A GrowingFile over the upload if track is still being uploaded (early
+    ingest), otherwise None. on_wait is called each time it polls for more
+    chunks.
+    """
+    session = track.upload_sessions.filter(status=UploadSession.UPLOADING).first()
+    if session is None:
+        return None
+
+    def is_complete():
+        if on_wait is not None:
+            on_wait()
+        status = UploadSession.objects.filter(id=session.id).values_list('status', flat=True).first()
+        if status == UploadSession.ABORTED or status is None:
+            raise UploadError("Upload was aborted", status=409)
+        return status == UploadSession.COMPLETE
+
+    return GrowingFile(file_path(session), is_complete, poll_interval=poll_interval, timeout=timeout)
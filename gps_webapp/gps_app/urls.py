@@ -4,8 +4,18 @@ from . import views
 
 router = DefaultRouter()
 router.register(r'tracks', views.GPSTrackViewSet)
+router.register(r'uploads', views.UploadSessionViewSet)
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('api/tracks/<uuid:pk>/heatmap/<int:z>/<int:x>/<int:y>.<str:fmt>', views.track_heatmap_tile, name='track-heatmap-tile'),
+    path('api/heatmap/<int:z>/<int:x>/<int:y>.<str:fmt>', views.heatmap_tile, name='heatmap-tile'),
+    path('api/heatmap/stats/', views.heatmap_stats, name='heatmap-stats'),
+    path('api/aggregate/', views.track_aggregate, name='track-aggregate'),
+    path('api/cache/stats/', views.response_cache_stats, name='response-cache-stats'),
+    path('api/dedup/stats/', views.dedup_stats, name='dedup-stats'),
+    path('api/spatial/stats/', views.spatial_index_stats, name='spatial-index-stats'),
+    path('api/live/stats/', views.live_stats, name='live-stats'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
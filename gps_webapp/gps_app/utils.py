@@ -1,212 +1,340 @@
 import pandas as pd
 import numpy as np
-from geopy.distance import geodesic
-from .models import GPSTrack, GPSPoint
+from .ingest import load_gps_pivot, detect_format, format_from_name, CSV, DEFAULT_CHUNK_ROWS
+from .geodesy import calculate_speeds, DEFAULT_METHOD
+from . import bulkload, outliers, storage
+from . import aggregates, distributions, laps
+from .derive import derive_track
+from .polylines import store_track_polylines
+from .instrumentation import StageProfile
+from django.conf import settings
 from django.db import transaction
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 time_resolution = 10 # amount of data points per second
 
-def filter_gps_outliers(pivot_df, std_multiplier=20):
+# What process_gps_csv sets on the track. Only these are saved, so columns
+# written meanwhile elsewhere (an early-ingest upload's content_hash) are kept
+INGEST_FIELDS = [
+    'total_points', 'duration', 'max_speed', 'avg_speed',
+    'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude',
+    'processed', 'point_storage', 'time_resolution', 'outlier_std_multiplier', 'outlier_filters',
+    'align_tolerance_ms', 'speed_method',
+    'lap_gate', 'lap_gate_detected', 'laps_split_at', 'distributions',
+]
+
+def filter_gps_fixes(pivot_df, filters, std_multiplier=15, filter_stats=None):
     """
-    Filter out GPS outliers using standard deviation
-    Remove points that are more than std_multiplier * standard deviation away from mean
+    Run the outlier filter chain (see outliers.py) over the fixes of
+    pivot_df. Each filter's rejections and throughput are appended to
+    filter_stats if given.
     """
-    print(f"Filtering GPS outliers (threshold: {std_multiplier}x standard deviation)")
-    
-    # Calculate standard deviation for latitude and longitude
-    lat_mean = pivot_df['Latitude'].mean()
-    lat_std = pivot_df['Latitude'].std()
-    lon_mean = pivot_df['Longitude'].mean()
-    lon_std = pivot_df['Longitude'].std()
-    
-    print(f"Latitude: mean={lat_mean:.6f}, std={lat_std:.6f}")
-    print(f"Longitude: mean={lon_mean:.6f}, std={lon_std:.6f}")
-    
-    # Define outlier thresholds
-    lat_min_threshold = lat_mean - (std_multiplier * lat_std)
-    lat_max_threshold = lat_mean + (std_multiplier * lat_std)
-    lon_min_threshold = lon_mean - (std_multiplier * lon_std)
-    lon_max_threshold = lon_mean + (std_multiplier * lon_std)
-    
-    print(f"Latitude valid range: [{lat_min_threshold:.6f}, {lat_max_threshold:.6f}]")
-    print(f"Longitude valid range: [{lon_min_threshold:.6f}, {lon_max_threshold:.6f}]")
-    
-    # Filter out outliers
-    initial_count = len(pivot_df)
-    
-    valid_mask = (
-        (pivot_df['Latitude'] >= lat_min_threshold) &
-        (pivot_df['Latitude'] <= lat_max_threshold) &
-        (pivot_df['Longitude'] >= lon_min_threshold) &
-        (pivot_df['Longitude'] <= lon_max_threshold)
+    seconds = pivot_df['Timestamp'].to_numpy(dtype=np.float64) / 1000
+    index, lats, lons, stats = outliers.apply_filters(
+        seconds, pivot_df['Latitude'].to_numpy(), pivot_df['Longitude'].to_numpy(), filters,
+        params={'stddev': {'std_multiplier': std_multiplier}},
     )
+    for entry in stats:
+        rate = f"{entry['points_per_second']:.0f} points/s" if entry['points_per_second'] else "instant"
+        logger.debug("Outlier filter %s: removed %d of %d (%s)", entry['name'], entry['rejected'],
+                     entry['points_in'], rate)
+    if filter_stats is not None:
+        filter_stats.extend(stats)
     
-    filtered_df = pivot_df[valid_mask].copy()
-    outliers_removed = initial_count - len(filtered_df)
+    filtered_df = pivot_df.iloc[index].reset_index(drop=True)
+    filtered_df['Latitude'] = lats
+    filtered_df['Longitude'] = lons
+    return filtered_df
+
+def resample_gps_fixes(pivot_df, time_resolution):
+    """
+    Keep the first fix of every 1/time_resolution second bin, with a seconds
+    column, sorted by time. A time_resolution of 0 or less keeps every fix.
+    """
+    # Convert timestamp to seconds 
+    pivot_df = pivot_df.copy()
+    pivot_df['seconds'] = pivot_df['Timestamp'] / 1000
     
-    print(f"Removed {outliers_removed} outliers ({(outliers_removed/initial_count)*100:.2f}%)")
+    # Create time bins based on time_resolution
+    if time_resolution > 0:
+        # Calculate the time interval for each bin (1/time_resolution seconds)
+        time_interval = 1.0 / time_resolution
+        
+        # Create time bins
+        pivot_df['time_bin'] = (pivot_df['seconds'] / time_interval).astype(int)
+        
+        # Group by time bins and keep first point in each bin
+        initial_count = len(pivot_df)
+        pivot_df = pivot_df.drop_duplicates(subset=['time_bin'], keep='first')
+        
+        logger.debug("Time resolution %s points/second reduced %d fixes to %d", time_resolution,
+                     initial_count, len(pivot_df))
+    else:
+        # If time_resolution is 0 or negative, keep all points
+        logger.debug("Time resolution disabled, keeping all %d fixes", len(pivot_df))
     
-    return filtered_df
+    # Sort by timestamp to ensure proper order 
+    return pivot_df.sort_values('seconds').reset_index(drop=True)
+
+def point_columns(pivot_df, speeds):
+    """Point arrays keyed like storage.COLUMN_DTYPES"""
+    return {
+        'timestamp': pivot_df['seconds'].values,
+        'latitude': pivot_df['Latitude'].values,
+        'longitude': pivot_df['Longitude'].values,
+        'speed': speeds,
+        'original_timestamp': pivot_df['Timestamp'].values,
+    }
+
+class ProcessingCancelled(Exception):
+    """Raised from a progress callback to stop process_gps_csv between stages"""
+
+def outlier_std_multiplier():
+    return getattr(settings, 'GPS_OUTLIER_STD_MULTIPLIER', 15)
 
-def process_gps_csv(track_instance, time_resolution=5):
+def outlier_filters():
+    """The configured outlier filter chain, as stored on jobs and tracks"""
+    return ','.join(outliers.parse_filters(getattr(settings, 'GPS_OUTLIER_FILTERS', outliers.DEFAULT_FILTERS)))
+
+def align_tolerance():
+    return getattr(settings, 'GPS_SENSOR_ALIGN_TOLERANCE_MS', 0)
+
+def speed_method():
+    return getattr(settings, 'GPS_SPEED_METHOD', DEFAULT_METHOD)
+
+def parse_gps_fixes(track_instance, chunksize=DEFAULT_CHUNK_ROWS, source=None):
+    """
+    (pivot_df, rows_read, gps_rows) of an upload, one row per GPS fix.
+
+    Served from the intermediate cache of the upload's content hash when it
+    has one; otherwise the log is parsed and, once its hash is known, cached
+    along with the CPU time the parse took.
+    """
+    tolerance = align_tolerance()
+    cached = storage.read_intermediate(track_instance.content_hash, tolerance)
+    if cached is not None:
+        columns, meta = cached
+        logger.debug("Reusing parsed GPS fixes of %s (%d rows)", track_instance.content_hash[:12],
+                     len(columns['Timestamp']))
+        return pd.DataFrame(columns), meta['rows_read'], meta['gps_rows']
+    
+    file_path = track_instance.uploaded_file.path
+    cpu_start = time.thread_time()
+    # A file still being uploaded can't be sniffed, so go by its name
+    fmt = (format_from_name(file_path) or CSV) if source is not None else detect_format(file_path)
+    pivot_df, total_rows, gps_rows = load_gps_pivot(source or file_path, chunksize=chunksize, fmt=fmt,
+                                                    tolerance=tolerance)
+    # Early-ingest uploads only get their hash once the last chunk is in,
+    # i.e. by the time the source has been read to its end
+    if source is not None:
+        track_instance.refresh_from_db(fields=['content_hash'])
+    if gps_rows and track_instance.content_hash and storage.intermediate_enabled():
+        storage.write_intermediate(track_instance.content_hash, pivot_df, {
+            'rows_read': total_rows,
+            'gps_rows': gps_rows,
+            'align_tolerance_ms': tolerance,
+            'parse_cpu_seconds': time.thread_time() - cpu_start,
+        })
+    return pivot_df, total_rows, gps_rows
+
+def derive_params():
+    """The settings derive.derive_track() runs with, for this process or a batch import worker"""
+    return {
+        'grid_zoom': aggregates.grid_zoom(),
+        'sectors': laps.lap_sectors(),
+        'min_lap_seconds': laps.min_lap_seconds(),
+        'time_bin': distributions.time_bin_seconds(),
+        'speed_bin': distributions.speed_bin_width(),
+    }
+
+def store_derived(track_instance, derived):
+    """
+    Save track_instance with the statistics, laps, distributions and
+    polylines of derive.derive_track() (INGEST_FIELDS only). Call inside
+    the ingest transaction; the grid is written after it commits.
+    """
+    for name, value in derived['stats'].items():
+        setattr(track_instance, name, value)
+    track_instance.distributions = derived['distributions']
+    laps.store_track_laps(track_instance, derived['lap_gate'], derived['laps'])
+    track_instance.save(update_fields=INGEST_FIELDS)
+    store_track_polylines(track_instance, derived['polylines'])
+
+def process_gps_csv(track_instance, time_resolution=5, chunksize=DEFAULT_CHUNK_ROWS, progress=None, source=None,
+                    std_multiplier=None, filters=None, filter_stats=None, profile=None):
     """
     Handles CAN bus data format with Timestamp, CANID, Sensor, Value, Unit columns
     
     Args:
         track_instance: GPSTrack instance
         time_resolution: Number of data points per second (default: 5)
+        chunksize: Rows per CSV chunk when streaming, or None to read the whole file at once
+        progress: Optional callable, called with each stage name ('parse', 'filter',
+            'resample', 'speeds', 'insert') as it starts. It may raise
+            ProcessingCancelled to abort.
+        source: Optional file object to read the CSV from instead of the
+            uploaded file's path, e.g. a GrowingFile of an upload in progress
+        std_multiplier: Threshold of the 'stddev' outlier filter in standard
+            deviations (default: GPS_OUTLIER_STD_MULTIPLIER)
+        filters: Outlier filter chain, comma-separated (default: GPS_OUTLIER_FILTERS)
+        filter_stats: Optional list that each outlier filter's stats are appended to
+        profile: Optional instrumentation.StageProfile that times each stage
+            (the first four above, then 'laps', 'distributions', 'polylines',
+            'grid' and 'insert', which writes everything)
     """
+    if progress is None:
+        progress = lambda stage: None
+    if std_multiplier is None:
+        std_multiplier = outlier_std_multiplier()
+    if filters is None:
+        filters = outlier_filters()
+    if profile is None:
+        profile = StageProfile(context={'track_id': str(track_instance.id)})
+    
     try:
         file_path = track_instance.uploaded_file.path
         file_size = os.path.getsize(file_path)
         
-        print(f"Processing CSV file: {file_path} ({file_size / (1024*1024):.1f} MB)")
-        
-        # Read and filter data more efficiently 
-        df = pd.read_csv(file_path)
-        print(f"Total rows in CSV: {len(df)}")
-        print(f"CSV columns: {list(df.columns)}")
+        logger.info("Processing %s (%.1f MB)", file_path, file_size / (1024 * 1024),
+                    extra={'track_id': str(track_instance.id), 'file_bytes': file_size})
         
-        # Filter for GPS sensors
-        filtered_df = df[df['Sensor'].isin(['Longitude', 'Latitude'])]
-        print(f"Rows with GPS data: {len(filtered_df)}")
+        # Stream the CSV in chunks, keeping only the GPS rows
+        progress('parse')
+        with profile.stage('parse') as stage:
+            pivot_df, total_rows, gps_rows = parse_gps_fixes(track_instance, chunksize=chunksize, source=source)
+            stage.rows_in, stage.rows_out = total_rows, len(pivot_df)
+        logger.debug("%d rows read, %d GPS rows, %d fixes", total_rows, gps_rows, len(pivot_df))
         
-        if len(filtered_df) == 0:
+        if gps_rows == 0:
             return False, "No GPS data found. CSV must contain rows with Sensor = 'Longitude' and 'Latitude'"
         
-        # Pivot the data to have lat/lon in separate columns 
-        pivot_df = filtered_df.pivot_table(
-            index='Timestamp', 
-            columns='Sensor', 
-            values='Value', 
-            aggfunc='first'
-        ).reset_index()
-        
-        print(f"Pivoted data shape: {pivot_df.shape}")
-        print(f"Pivot columns: {list(pivot_df.columns)}")
-        
-        # Drop rows where either lat or lon is missing 
-        pivot_df = pivot_df.dropna(subset=['Latitude', 'Longitude'])
-        print(f"After dropping NaN: {len(pivot_df)} rows")
-        
         if len(pivot_df) < 2:
             return False, "Need at least 2 valid GPS coordinate pairs"
         
-        # NEW: Filter out GPS outliers using standard deviation
-        pivot_df = filter_gps_outliers(pivot_df, std_multiplier=15)
-        print(f"After outlier removal: {len(pivot_df)} rows")
+        progress('filter')
+        with profile.stage('filter', rows_in=len(pivot_df)) as stage:
+            pivot_df = filter_gps_fixes(pivot_df, filters, std_multiplier, filter_stats)
+            stage.rows_out = len(pivot_df)
         
         if len(pivot_df) < 2:
             return False, "Not enough GPS points after outlier removal"
         
-        # Convert timestamp to seconds 
-        pivot_df['seconds'] = pivot_df['Timestamp'] / 1000
-        
-        # Process data based on time_resolution per second
-        pivot_df = pivot_df.iloc[0:].copy()
-        
-        # Create time bins based on time_resolution
-        if time_resolution > 0:
-            # Calculate the time interval for each bin (1/time_resolution seconds)
-            time_interval = 1.0 / time_resolution
-            
-            # Create time bins
-            pivot_df['time_bin'] = (pivot_df['seconds'] / time_interval).astype(int)
-            
-            # Group by time bins and keep first point in each bin
-            initial_count = len(pivot_df)
-            pivot_df = pivot_df.drop_duplicates(subset=['time_bin'], keep='first')
-            
-            print(f"Time resolution: {time_resolution} points/second (interval: {time_interval:.3f}s)")
-            print(f"Reduced from {initial_count} to {len(pivot_df)} points based on time resolution")
-        else:
-            # If time_resolution is 0 or negative, keep all points
-            print("Time resolution disabled - keeping all data points")
-        
-        # Sort by timestamp to ensure proper order 
-        pivot_df = pivot_df.sort_values('seconds').reset_index(drop=True)
-        
-        print(f"Final processed data: {len(pivot_df)} points")
+        progress('resample')
+        with profile.stage('resample', rows_in=len(pivot_df)) as stage:
+            pivot_df = resample_gps_fixes(pivot_df, time_resolution)
+            stage.rows_out = len(pivot_df)
         
         if len(pivot_df) < 2:
             return False, "Not enough GPS points after processing"
         
         # Calculate speeds
-        speeds = calculate_speeds_vectorized(pivot_df)
-        pivot_df['speed'] = speeds
-        
-        # Create GPS points for database
-        gps_points = []
-        for i, row in pivot_df.iterrows():
-            point = GPSPoint(
-                track=track_instance,
-                latitude=row['Latitude'],
-                longitude=row['Longitude'],
-                timestamp=row['seconds'],
-                speed=row['speed'],
-                original_timestamp=str(row['Timestamp'])
-            )
-            gps_points.append(point)
-        
-        # Bulk create all points
-        GPSPoint.objects.bulk_create(gps_points, batch_size=1000)
-        
-        # Update track statistics
-        lats = pivot_df['Latitude'].values
-        lons = pivot_df['Longitude'].values
-        
-        track_instance.total_points = len(gps_points)
-        track_instance.duration = float(pivot_df['seconds'].iloc[-1]) if len(pivot_df) > 0 else 0.0
-        track_instance.max_speed = float(speeds.max()) if len(speeds) > 0 else 0.0
-        track_instance.avg_speed = float(np.mean(speeds)) if len(speeds) > 0 else 0.0
-        track_instance.min_latitude = float(lats.min())
-        track_instance.max_latitude = float(lats.max())
-        track_instance.min_longitude = float(lons.min())
-        track_instance.max_longitude = float(lons.max())
+        progress('speeds')
+        with profile.stage('speeds', rows_in=len(pivot_df)) as stage:
+            speeds = calculate_speeds_vectorized(pivot_df)
+            pivot_df['speed'] = speeds
+            stage.rows_out = len(speeds)
+        
+        columns = point_columns(pivot_df, speeds)
+        point_count = len(speeds)
+        derived = derive_track(columns, derive_params(), gate=None if track_instance.lap_gate_detected else
+                               track_instance.lap_gate, profile=profile)
+        
+        # Points go in straight from the arrays, see bulkload.py
+        progress('insert')
+        backend = storage.default_backend()
         track_instance.processed = True
-        track_instance.save()
+        track_instance.point_storage = backend
+        track_instance.time_resolution = time_resolution
+        track_instance.outlier_std_multiplier = std_multiplier
+        track_instance.outlier_filters = filters
+        track_instance.align_tolerance_ms = align_tolerance()
+        track_instance.speed_method = speed_method()
+        
+        # Points and statistics land together or not at all
+        with profile.stage('insert', rows_in=point_count) as stage:
+            if backend == storage.COLUMNAR:
+                storage.write_columnar(track_instance, columns)
+                try:
+                    with transaction.atomic():
+                        store_derived(track_instance, derived)
+                except Exception:
+                    storage.delete_columnar(track_instance)
+                    raise
+            else:
+                with transaction.atomic():
+                    bulkload.insert_points(track_instance, columns)
+                    store_derived(track_instance, derived)
+            stage.rows_out = point_count
+        # Per-cell aggregates for multi-track grids, see aggregates.py
+        storage.write_grid(track_instance, derived['grid'].to_arrays())
         
-        return True, f"Successfully processed {len(gps_points)} GPS points from CAN bus data"
+        logger.info("Processed %d GPS points in %.2fs", point_count, profile.wall_seconds,
+                    extra={'track_id': str(track_instance.id), 'points': point_count})
+        return True, f"Successfully processed {point_count} GPS points from CAN bus data"
         
+    except ProcessingCancelled:
+        raise
     except Exception as e:
-        print(f"Error processing CSV: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error processing CSV of track %s", track_instance.id)
         return False, f"Error processing CSV: {str(e)}"
 
-def calculate_speeds_vectorized(df):
+def resample_track(track_instance, time_resolution):
+    """
+    Re-derive a processed track's points at another time_resolution from the
+    cached parsed fixes of its upload (parsing the file once if they aren't
+    cached yet), with the outlier filters the track was processed with.
+    The points are stored next to the track's own, see
+    storage.write_resolution. Returns their arrays.
+    """
+    pivot_df, _, gps_rows = parse_gps_fixes(track_instance)
+    if gps_rows == 0:
+        raise ValueError("No GPS data found")
+    std_multiplier = track_instance.outlier_std_multiplier or outlier_std_multiplier()
+    filters = track_instance.outlier_filters if track_instance.outlier_filters is not None else outlier_filters()
+    pivot_df = resample_gps_fixes(filter_gps_fixes(pivot_df, filters, std_multiplier), time_resolution)
+    if len(pivot_df) < 2:
+        raise ValueError("Not enough GPS points after processing")
+    columns = point_columns(pivot_df, calculate_speeds_vectorized(pivot_df))
+    storage.write_resolution(track_instance, time_resolution, columns)
+    return columns
+
+def resolution_summary(time_resolution, columns):
+    """Point count and speed statistics of a track's points at one time resolution"""
+    speeds = np.asarray(columns['speed'], dtype=np.float64)
+    return {
+        'time_resolution': time_resolution,
+        'total_points': len(speeds),
+        'duration': float(columns['timestamp'][-1]) if len(speeds) else 0.0,
+        'max_speed': float(speeds.max()) if len(speeds) else 0.0,
+        'avg_speed': float(speeds.mean()) if len(speeds) else 0.0,
+    }
+
+def calculate_speeds_vectorized(df, method=None):
+    """Speed in m/s for each row of a frame with Latitude, Longitude and seconds"""
     if len(df) <= 1:
         return np.array([0])
     
-    # Get coordinate arrays
-    coords = df[['Latitude', 'Longitude']].values
-    times = df['seconds'].values
-    
-    # Calculate distances vectorized (for small datasets, loop is still needed for geodesic)
-    speeds = np.zeros(len(df))
-    
-    for i in range(1, len(df)):
-        distance = geodesic(coords[i-1], coords[i]).meters
-        time_diff = times[i] - times[i-1]
-        speed = distance / time_diff if time_diff > 0 else 0
-        
-        # Cap unrealistic speeds 
-        speeds[i] = 0 if speed > 134 else speed
-    
-    return speeds
+    method = method or speed_method()
+    return calculate_speeds(
+        df['Latitude'].values,
+        df['Longitude'].values,
+        df['seconds'].values,
+        method=method,
+    )
 
-def get_track_bounds(track_id):
-    """Get geographic bounds for a track"""
-    try:
-        track = GPSTrack.objects.get(id=track_id)
-        return {
-            'min_lat': track.min_latitude,
-            'max_lat': track.max_latitude,
-            'min_lon': track.min_longitude,
-            'max_lon': track.max_longitude,
-            'center_lat': (track.min_latitude + track.max_latitude) / 2,
-            'center_lon': (track.min_longitude + track.max_longitude) / 2,
-        }
-    except GPSTrack.DoesNotExist:
-        return None
\ No newline at end of file
+def get_track_bounds(track):
+    """Get geographic bounds for a track, or None if it has not been processed"""
+    if track.min_latitude is None:
+        return None
+    return {
+        'min_lat': track.min_latitude,
+        'max_lat': track.max_latitude,
+        'min_lon': track.min_longitude,
+        'max_lon': track.max_longitude,
+        'center_lat': (track.min_latitude + track.max_latitude) / 2,
+        'center_lon': (track.min_longitude + track.max_longitude) / 2,
+    }
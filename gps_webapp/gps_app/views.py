@@ -1,14 +1,31 @@
-from django.shortcuts import render
-from rest_framework import viewsets, status
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.shortcuts import render, get_object_or_404
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
-from django.http import JsonResponse
-from .models import GPSTrack, GPSPoint
-from .serializers import GPSTrackSerializer, GPSTrackListSerializer, FileUploadSerializer, GPSPointSerializer
-from .utils import process_gps_csv, get_track_bounds
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.settings import api_settings
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from .models import GPSTrack, GPSPoint, ProcessingJob, UploadSession
+from .serializers import (
+    GPSTrackSerializer, GPSTrackListSerializer, FileUploadSerializer, GPSPointSerializer,
+    LapSerializer, ProcessingJobSerializer, UploadSessionSerializer,
+)
+from .utils import get_track_bounds, resample_track, resolution_summary
+from . import aggregates, dedup, distributions, laps, live, metrics, point_index, response_cache, storage, uploads
+from .storage import TrackPoints
+from . import simplify
+from .polylines import track_polyline
+from . import heatmap
+from . import wire
+from .renderers import PackedPointsRenderer, ArrowPointsRenderer, NDJSONPointsRenderer, arrow_available
+from .pagination import TimestampCursorPagination
+from .tiles import render_tile, stats as tile_stats
+from .jobs import enqueue_track, cancel_job, reclaim_stale_jobs, retry_job
 
-class GPSTrackViewSet(viewsets.ModelViewSet):
+class GPSTrackViewSet(metrics.RequestMetricsMixin, viewsets.ModelViewSet):
     queryset = GPSTrack.objects.all()
     parser_classes = (MultiPartParser, FormParser)
     
@@ -19,9 +36,122 @@ class GPSTrackViewSet(viewsets.ModelViewSet):
             return FileUploadSerializer
         return GPSTrackSerializer
     
+    @property
+    def pagination_class(self):
+        # ?cursor= walks the points by timestamp instead of numbered pages
+        if self.action == 'points' and TimestampCursorPagination.cursor_query_param in self.request.query_params:
+            return TimestampCursorPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+    
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        # Point data can also be negotiated as packed binary (or Arrow, if installed) or NDJSON
+        if self.action in ('points', 'retrieve'):
+            renderers.append(PackedPointsRenderer())
+            if arrow_available():
+                renderers.append(ArrowPointsRenderer())
+            renderers.append(NDJSONPointsRenderer())
+        return renderers
+    
+    def _wants_stream(self, request):
+        return request.accepted_renderer.format in (
+            PackedPointsRenderer.format, ArrowPointsRenderer.format, NDJSONPointsRenderer.format
+        )
+    
+    def _fields(self, request, default):
+        """(point fields from ?fields=, or default, and an error response)"""
+        fields = request.query_params.get('fields')
+        fields = fields.split(',') if fields else list(default)
+        unknown = [name for name in fields if name not in wire.FIELD_DTYPES]
+        if unknown or not fields:
+            return None, Response({
+                'error': f"fields must be a subset of {', '.join(wire.FIELD_DTYPES)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return fields, None
+    
+    def _stream_points(self, request, track, meta, start_time=None, end_time=None, arrays=None):
+        """
+        Stream a track's points (or the given point arrays, e.g. another
+        resolution's) in the negotiated binary or NDJSON format, without
+        building model instances
+        """
+        ndjson = request.accepted_renderer.format == NDJSONPointsRenderer.format
+        fields, error = self._fields(request, GPSPointSerializer.Meta.fields if ndjson else wire.DEFAULT_FIELDS)
+        if error is not None:
+            return error
+        
+        if arrays is not None:
+            blocks = storage.iter_array_blocks(arrays, fields, start_time=start_time, end_time=end_time)
+        else:
+            blocks = storage.iter_point_blocks(track, fields, start_time=start_time, end_time=end_time)
+        if ndjson:
+            body = wire.iter_ndjson(blocks, fields)
+            content_type = wire.NDJSON_CONTENT_TYPE
+        elif request.accepted_renderer.format == ArrowPointsRenderer.format:
+            body = wire.iter_arrow(blocks, fields, meta)
+            content_type = wire.ARROW_CONTENT_TYPE
+        else:
+            delta = request.query_params.get('encoding') == 'delta'
+            body = wire.iter_encoded(blocks, fields, meta, delta=delta)
+            content_type = wire.CONTENT_TYPE
+        return StreamingHttpResponse(body, content_type=content_type)
+    
+    def _cached_response(self, request, track, build, by_laps=False, version=''):
+        """
+        build()'s response for a processed track, served from the response
+        cache with a strong ETag. Binary streams aren't stored, but still get
+        the ETag and conditional requests. Responses by_laps change when the
+        laps are split again, so they are keyed on that and revalidated.
+        version keys on anything else the response depends on besides the
+        URI, such as settings.
+        """
+        if not track.processed:
+            return build()
+        if by_laps and track.laps_split_at:
+            version = ':'.join(filter(None, (version, track.laps_split_at.isoformat())))
+        # The full URI, since paginated responses embed absolute next/previous links
+        key = response_cache.cache_key(track, self.action, request.build_absolute_uri(), request.accepted_media_type,
+                                       version)
+        tag = response_cache.etag(key)
+        
+        if response_cache.etag_matches(request.headers.get('If-None-Match'), tag):
+            response_cache.note_not_modified()
+            response = HttpResponseNotModified()
+        elif request.accepted_renderer.format == 'json':
+            entry = response_cache.get(track, key)
+            if entry is None:
+                response = build()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = request.accepted_renderer.render(
+                    response.data, request.accepted_media_type, self.get_renderer_context()
+                )
+                entry = (content, request.accepted_renderer.media_type)
+                response_cache.put(track, key, *entry)
+            response = HttpResponse(entry[0], content_type=entry[1])
+        else:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        
+        response['ETag'] = tag
+        response['Cache-Control'] = response_cache.REVALIDATE if by_laps else response_cache.CACHE_CONTROL
+        patch_vary_headers(response, ['Accept'])
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        track = self.get_object()
+        
+        def build():
+            if self._wants_stream(request):
+                return self._stream_points(request, track, {'track': GPSTrackListSerializer(track).data})
+            return Response(self.get_serializer(track).data)
+        
+        return self._cached_response(request, track, build)
+    
     @action(detail=False, methods=['post'])
     def upload(self, request):
-        """Upload and process a GPS CSV file"""
+        """Upload a GPS CSV file and queue it for processing"""
         serializer = FileUploadSerializer(data=request.data)
         if serializer.is_valid():
             track = serializer.save()
@@ -36,62 +166,357 @@ class GPSTrackViewSet(viewsets.ModelViewSet):
                     'error': 'Time resolution must be between 1 and 100 points per second'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Process the CSV file with specified time resolution
-            success, message = process_gps_csv(track, time_resolution)
+            # Process the CSV file in the background, under cProfile if asked to
+            profile = str(request.data.get('profile', '')).lower() in ('1', 'true', 'yes', 'on')
+            job = enqueue_track(track, time_resolution, profile=profile)
             
-            if success:
-                # Return the processed track data
-                track_serializer = GPSTrackSerializer(track)
-                return Response({
-                    'track': track_serializer.data,
-                    'message': message
-                }, status=status.HTTP_201_CREATED)
-            else:
-                # Delete the track if processing failed
-                track.delete()
-                return Response({
-                    'error': message
-                }, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'track': GPSTrackListSerializer(track).data,
+                'job': ProcessingJobSerializer(job).data,
+                'message': 'Upload received, processing started'
+            }, status=status.HTTP_202_ACCEPTED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, FormParser])
+    def live(self, request):
+        """Start a live track, then send it CAN GPS frames with telemetry/ or over its websocket"""
+        name = request.data.get('name') or 'Live'
+        try:
+            time_resolution = int(request.data.get('time_resolution', 5))
+        except (TypeError, ValueError):
+            time_resolution = 0
+        if time_resolution < 1 or time_resolution > 100:
+            return Response({
+                'error': 'Time resolution must be between 1 and 100 points per second'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        track = live.start_live_track(name, time_resolution)
+        return Response({
+            'track': GPSTrackListSerializer(track).data,
+            'websocket': f'/ws/tracks/{track.id}/live/',
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser])
+    def telemetry(self, request, pk=None):
+        """
+        Append a batch of CAN GPS frames ({"frames": [[timestamp_ms, sensor,
+        value], ...]}) to a live track. Returns the points it settled and the
+        track's statistics; the same delta goes to its subscribers.
+        """
+        track = self.get_object()
+        if not track.live:
+            return Response({'error': 'Track is not live'}, status=status.HTTP_409_CONFLICT)
+        try:
+            frames = live.parse_frames(request.data.get('frames'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(live.ingest_frames(track, *frames))
+        except live.NotLive as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    
+    @action(detail=True, methods=['post'])
+    def finish(self, request, pk=None):
+        """End a live track: store its last fixes and build its polylines, laps and grid"""
+        track = self.get_object()
+        if not track.live:
+            return Response({'error': 'Track is not live'}, status=status.HTTP_409_CONFLICT)
+        try:
+            live.finish_live_track(track)
+        except live.NotLive as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(GPSTrackListSerializer(track).data)
+    
     @action(detail=True, methods=['get'])
     def points(self, request, pk=None):
-        """Get GPS points for a specific track with pagination"""
+        """
+        Get GPS points for a specific track, paginated by page number or by
+        ?cursor=, or streamed whole as binary or NDJSON. Optionally within
+        ?bbox= and a time window or ?lap=, and projected onto ?fields=
+        """
         track = self.get_object()
-        points = track.points.all()
+        return self._cached_response(request, track, lambda: self._points(request, track),
+                                     by_laps='lap' in request.query_params)
+    
+    def _resolution_arrays(self, request, track):
+        """
+        (arrays, error response) for ?resolution=. arrays is None when the
+        track's own points are wanted.
+        """
+        resolution = request.query_params.get('resolution')
+        if resolution is None:
+            return None, None
+        try:
+            resolution = int(resolution)
+        except ValueError:
+            return None, Response({'error': 'resolution must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if resolution == track.time_resolution:
+            return None, None
+        arrays = storage.read_resolution(track, resolution)
+        if arrays is None:
+            return None, Response({
+                'error': f"Points at {resolution} points/second have not been derived, POST to resample/ first"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return arrays, None
+    
+    def _indexed_points(self, request, track, arrays):
+        """(point arrays, spatial index) of the points ?resolution= selects, cached per process"""
+        resolution = int(request.query_params['resolution']) if arrays is not None else None
+        return point_index.track_index(track, resolution, arrays)
+    
+    def _bbox(self, request):
+        """(min_lon, min_lat, max_lon, max_lat) from ?bbox=, or None, and an error response"""
+        bbox = request.query_params.get('bbox')
+        if bbox is None:
+            return None, None
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+        except ValueError:
+            min_lon = min_lat = max_lon = max_lat = float('nan')
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            return None, Response({
+                'error': 'bbox must be min_lon,min_lat,max_lon,max_lat in degrees'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return (min_lon, min_lat, max_lon, max_lat), None
+    
+    def _time_window(self, request, track):
+        """(start_time, end_time) from ?start_time=, ?end_time= and ?lap=, either None, and an error response"""
+        try:
+            start_time, end_time = (float(request.query_params[name]) if request.query_params.get(name) else None
+                                    for name in ('start_time', 'end_time'))
+            number = int(request.query_params['lap']) if 'lap' in request.query_params else None
+        except ValueError:
+            return None, None, Response({'error': 'start_time and end_time must be numbers and lap an integer'},
+                                        status=status.HTTP_400_BAD_REQUEST)
+        if number is None:
+            return start_time, end_time, None
+        lap = track.laps.filter(number=number).first()
+        if lap is None:
+            return None, None, Response({'error': f"Track has no lap {number}"}, status=status.HTTP_404_NOT_FOUND)
+        # Within the lap, and within any time range given too
+        start_time = lap.start_time if start_time is None else max(start_time, lap.start_time)
+        end_time = lap.end_time if end_time is None else min(end_time, lap.end_time)
+        return start_time, end_time, None
+    
+    def _points(self, request, track):
+        # Optional filtering by time range or lap
+        start_time, end_time, error = self._time_window(request, track)
+        if error is not None:
+            return error
+        arrays, error = self._resolution_arrays(request, track)
+        if error is not None:
+            return error
+        bbox, error = self._bbox(request)
+        if error is not None:
+            return error
+        if bbox is not None:
+            # Points inside the box, still in timestamp order
+            arrays, index = self._indexed_points(request, track, arrays)
+            inside = index.bbox(*bbox)
+            arrays = {name: values[inside] for name, values in arrays.items()}
         
-        # Optional filtering by time range
-        start_time = request.query_params.get('start_time')
-        end_time = request.query_params.get('end_time')
+        if self._wants_stream(request):
+            meta = {'track_id': track.id, 'start_time': start_time, 'end_time': end_time}
+            return self._stream_points(request, track, meta, start_time, end_time, arrays=arrays)
         
-        if start_time:
-            points = points.filter(timestamp__gte=float(start_time))
-        if end_time:
-            points = points.filter(timestamp__lte=float(end_time))
+        fields, error = self._fields(request, GPSPointSerializer.Meta.fields)
+        if error is not None:
+            return error
+        # Cursors are made from timestamps, so those are read even when not returned
+        read_fields = fields if 'timestamp' in fields else fields + ['timestamp']
+        if arrays is not None:
+            points = TrackPoints.for_arrays(arrays, start_time=start_time, end_time=end_time, fields=read_fields)
+        elif track.point_storage == storage.COLUMNAR:
+            points = TrackPoints.for_track(track, start_time=start_time, end_time=end_time, fields=read_fields)
+        else:
+            points = track.points.values(*read_fields)
+            if start_time is not None:
+                points = points.filter(timestamp__gte=start_time)
+            if end_time is not None:
+                points = points.filter(timestamp__lte=end_time)
         
-        # Pagination
+        # Pagination, by page number or by cursor
         page = self.paginate_queryset(points)
         if page is not None:
-            serializer = GPSPointSerializer(page, many=True)
+            serializer = GPSPointSerializer(page, many=True, fields=fields)
             return self.get_paginated_response(serializer.data)
         
-        serializer = GPSPointSerializer(points, many=True)
+        serializer = GPSPointSerializer(points, many=True, fields=fields)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get', 'post'], parser_classes=[JSONParser, FormParser, MultiPartParser])
+    def resample(self, request, pk=None):
+        """
+        GET: the time resolutions the track's points are available at.
+        POST time_resolution: re-derive the points at another resolution from
+        the cached parsed fixes, then read them with points/?resolution=
+        """
+        track = self.get_object()
+        if not track.processed:
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_409_CONFLICT)
+        
+        if request.method == 'GET':
+            resolutions = set(storage.stored_resolutions(track))
+            if track.time_resolution is not None:
+                resolutions.add(track.time_resolution)
+            return Response({'time_resolution': track.time_resolution, 'resolutions': sorted(resolutions)})
+        
+        try:
+            time_resolution = int(request.data.get('time_resolution'))
+        except (TypeError, ValueError):
+            time_resolution = 0
+        if time_resolution < 1 or time_resolution > 100:
+            return Response({
+                'error': 'Time resolution must be between 1 and 100 points per second'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if time_resolution == track.time_resolution:
+            summary = {name: getattr(track, name)
+                       for name in ('time_resolution', 'total_points', 'duration', 'max_speed', 'avg_speed')}
+            return Response(dict(summary, created=False))
+        
+        arrays = storage.read_resolution(track, time_resolution, fields=['timestamp', 'speed'])
+        created = arrays is None
+        if created:
+            try:
+                arrays = resample_track(track, time_resolution)
+            except (ValueError, OSError) as e:
+                return Response({'error': f"Could not resample track: {e}"},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(dict(resolution_summary(time_resolution, arrays), created=created),
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def nearest(self, request, pk=None):
+        """The k (default 1, at most 100) points of the track closest to ?lat=&lon=, closest first"""
+        track = self.get_object()
+        if not track.processed:
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_409_CONFLICT)
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+            k = int(request.query_params.get('k', 1))
+        except (KeyError, ValueError):
+            lat = lon = float('nan')
+            k = 0
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 1 <= k <= 100):
+            return Response({
+                'error': 'lat and lon are required in degrees, k must be between 1 and 100'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        arrays, error = self._resolution_arrays(request, track)
+        if error is not None:
+            return error
+        
+        def build():
+            points, index = self._indexed_points(request, track, arrays)
+            indices, meters = index.nearest(lat, lon, k)
+            nearest = TrackPoints({name: points[name][indices] for name in storage.POINT_FIELDS})[:]
+            for point, i, distance in zip(nearest, indices.tolist(), meters.tolist()):
+                point.update(index=i, distance=distance)
+            return Response({'latitude': lat, 'longitude': lon, 'points': nearest})
+        
+        return self._cached_response(request, track, build)
+    
+    @action(detail=True, methods=['get', 'post'], parser_classes=[JSONParser])
+    def laps(self, request, pk=None):
+        """
+        GET: the track's laps with their times, sector splits and speeds,
+        and the start/finish line they are split at. Read a lap's points
+        with points/?lap=.
+        POST gate ([[lat, lon], [lat, lon]], or null to detect one): split
+        the laps again at that line
+        """
+        track = self.get_object()
+        if not track.processed:
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_409_CONFLICT)
+        
+        if request.method == 'POST':
+            gate = request.data.get('gate')
+            try:
+                if gate is not None:
+                    (a_lat, a_lon), (b_lat, b_lon) = gate
+                    gate = [[float(a_lat), float(a_lon)], [float(b_lat), float(b_lon)]]
+                    valid = (all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in gate)
+                             and gate[0] != gate[1])
+                else:
+                    valid = True
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                return Response({
+                    'error': 'gate must be [[lat, lon], [lat, lon]], two distinct points in degrees, or null'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            laps.resplit_track(track, gate)
+            response_cache.invalidate_track(track.id)
+        
+        def build():
+            track_laps = laps.track_laps(track)
+            best = min(track_laps, key=lambda lap: lap.lap_time, default=None)
+            return Response({
+                'track_id': track.id,
+                'gate': track.lap_gate,
+                'gate_detected': track.lap_gate_detected,
+                'lap_count': len(track_laps),
+                'best_lap': best.number if best is not None else None,
+                'laps': LapSerializer(track_laps, many=True).data,
+            })
+        
+        if request.method == 'POST':
+            return build()
+        return self._cached_response(request, track, build, by_laps=True)
+    
+    @action(detail=True, methods=['get'])
+    def distributions(self, request, pk=None):
+        """
+        The track's speed distribution: overall histogram and percentiles,
+        speed percentiles per time bin and the time x speed histogram,
+        stored at ingest. ?time_bin= (seconds) and ?speed_bin= (m/s)
+        summarize the points at other bin widths instead.
+        """
+        track = self.get_object()
+        if not track.processed:
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_409_CONFLICT)
+        try:
+            time_bin = float(request.query_params.get('time_bin', distributions.time_bin_seconds()))
+            speed_bin = float(request.query_params.get('speed_bin', distributions.speed_bin_width()))
+        except ValueError:
+            time_bin = speed_bin = 0
+        if not (0.1 <= time_bin <= 86400 and 0.1 <= speed_bin <= 100):
+            return Response({
+                'error': 'time_bin must be between 0.1 and 86400 seconds, speed_bin between 0.1 and 100 m/s'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        def build():
+            if (time_bin, speed_bin) == (distributions.time_bin_seconds(), distributions.speed_bin_width()):
+                summary = distributions.track_distributions(track)
+            else:
+                try:
+                    summary = distributions.summarize_track(track, time_bin, speed_bin)
+                except ValueError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(dict(summary, track_id=track.id))
+        
+        # Without ?time_bin= or ?speed_bin= the bins come from the settings
+        return self._cached_response(request, track, build, version=f'{time_bin}:{speed_bin}')
+    
     @action(detail=True, methods=['get'])
     def bounds(self, request, pk=None):
         """Get geographic bounds for a track"""
-        bounds = get_track_bounds(pk)
-        if bounds:
-            return Response(bounds)
-        return Response({'error': 'Track not found'}, status=status.HTTP_404_NOT_FOUND)
+        track = self.get_object()
+        
+        def build():
+            bounds = get_track_bounds(track)
+            if bounds:
+                return Response(bounds)
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return self._cached_response(request, track, build)
     
     @action(detail=True, methods=['get'])
     def stats(self, request, pk=None):
         """Get track statistics"""
         track = self.get_object()
-        return Response({
+        return self._cached_response(request, track, lambda: Response({
             'total_points': track.total_points,
             'duration': track.duration,
             'max_speed': track.max_speed,
@@ -104,7 +529,242 @@ class GPSTrackViewSet(viewsets.ModelViewSet):
                 'min_lon': track.min_longitude,
                 'max_lon': track.max_longitude,
             }
+        }))
+
+    @action(detail=True, methods=['get'])
+    def polyline(self, request, pk=None):
+        """Get the track path simplified for a map zoom level or a tolerance in meters"""
+        track = self.get_object()
+        if not track.processed:
+            return Response({'error': 'Track has not been processed'}, status=status.HTTP_409_CONFLICT)
+        algorithm = request.query_params.get('algorithm', simplify.DEFAULT_ALGORITHM)
+        if algorithm not in simplify.ALGORITHMS:
+            return Response({
+                'error': f"algorithm must be one of {', '.join(simplify.ALGORITHMS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            zoom = request.query_params.get('zoom')
+            tolerance = request.query_params.get('tolerance')
+            zoom = int(zoom) if zoom is not None else None
+            tolerance = float(tolerance) if tolerance is not None else None
+        except ValueError:
+            return Response({'error': 'zoom must be an integer and tolerance a number'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if zoom is None and tolerance is None:
+            zoom = max(simplify.ZOOM_LEVELS)
+        if (zoom is not None and not 0 <= zoom <= 24) or (tolerance is not None and tolerance < 0):
+            return Response({'error': 'zoom must be 0-24 and tolerance non-negative'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        vertices, tolerance = track_polyline(track, zoom=zoom, tolerance=tolerance, algorithm=algorithm)
+        return Response({
+            'track_id': track.id,
+            'algorithm': algorithm,
+            'zoom': zoom,
+            'tolerance': tolerance,
+            'total_points': track.total_points,
+            'vertex_count': len(vertices),
+            # [latitude, longitude, speed] per kept vertex
+            'points': np.column_stack((
+                vertices['latitude'].round(6),
+                vertices['longitude'].round(6),
+                vertices['speed'].astype(np.float64).round(2),
+            )).tolist(),
         })
+    
+    def _latest_job(self, track):
+        return track.jobs.order_by('-created_at').first()
+    
+    @action(detail=True, methods=['get'], url_path='status')
+    def job_status(self, request, pk=None):
+        """Get processing progress of the track's latest job"""
+        job = self._latest_job(self.get_object())
+        if job is None:
+            return Response({'error': 'No processing job for this track'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ProcessingJobSerializer(job).data)
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel the track's queued or running job"""
+        job = self._latest_job(self.get_object())
+        if job is None or job.is_finished:
+            return Response({'error': 'No active processing job for this track'}, status=status.HTTP_409_CONFLICT)
+        job = cancel_job(job)
+        return Response(ProcessingJobSerializer(job).data)
+    
+    @action(detail=True, methods=['post'])
+    def retry(self, request, pk=None):
+        """Queue a new attempt of the track's failed or cancelled job"""
+        track = self.get_object()
+        reclaim_stale_jobs()
+        job = self._latest_job(track)
+        if job is None or job.status not in (ProcessingJob.FAILED, ProcessingJob.CANCELLED):
+            return Response({'error': 'Only failed or cancelled jobs can be retried'}, status=status.HTTP_409_CONFLICT)
+        job = retry_job(job)
+        return Response(ProcessingJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class UploadSessionViewSet(metrics.RequestMetricsMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Resumable chunked uploads, see gps_app/uploads.py for the protocol"""
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+    
+    def create(self, request):
+        """Start an upload. With early_ingest the track is created and queued straight away."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = uploads.start_upload(**serializer.validated_data)
+        data = self.get_serializer(session).data
+        if session.early_ingest:
+            data['job'] = ProcessingJobSerializer(enqueue_track(session.track, session.time_resolution)).data
+        data['max_chunk_bytes'] = uploads.max_chunk_bytes()
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Append the raw request body at ?offset="""
+        session = self.get_object()
+        try:
+            offset = int(request.query_params['offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'offset is required and must be an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if offset < 0 or length <= 0:
+            return Response({'error': 'Chunk must be non-empty and offset non-negative'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # request.stream is read block by block, never loaded whole
+            session = uploads.append_chunk(session.id, offset, request.stream, length)
+        except uploads.UploadError as e:
+            session.refresh_from_db()
+            return Response({'error': str(e), 'offset': session.received}, status=e.status)
+        return Response(self.get_serializer(session).data)
+    
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Finish the upload and queue processing (already running with early_ingest)"""
+        session = self.get_object()
+        try:
+            session, track, created = uploads.finalize(session.id)
+        except uploads.UploadError as e:
+            return Response({'error': str(e), 'offset': session.received}, status=e.status)
+        
+        if created:
+            job = enqueue_track(track, session.time_resolution)
+        else:
+            job = track.jobs.order_by('-created_at').first()
+        return Response({
+            'upload': self.get_serializer(session).data,
+            'track': GPSTrackListSerializer(track).data,
+            'job': ProcessingJobSerializer(job).data,
+            'message': 'Upload complete, processing started'
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    def perform_destroy(self, instance):
+        uploads.abort(instance)
+
+def _tile_response(tracks, request, z, x, y, fmt):
+    """Shared validation and rendering for the heatmap tile views"""
+    weight = request.GET.get('weight', heatmap.DEFAULT_WEIGHT)
+    if weight not in heatmap.WEIGHTS:
+        return JsonResponse({'error': f"weight must be one of {', '.join(heatmap.WEIGHTS)}"}, status=400)
+    if fmt not in ('png', 'json'):
+        return JsonResponse({'error': 'Tiles are available as .png or .json'}, status=404)
+    if z > 22 or x >= 2 ** z or y >= 2 ** z:
+        return JsonResponse({'error': 'Tile out of range'}, status=404)
+    
+    size = heatmap.TILE_SIZE
+    if fmt == 'json':
+        try:
+            size = int(request.GET.get('size', heatmap.TILE_SIZE))
+        except ValueError:
+            size = 0
+        if size not in (32, 64, 128, 256):
+            return JsonResponse({'error': 'size must be 32, 64, 128 or 256'}, status=400)
+    
+    data, hit = render_tile(tracks, z, x, y, weight=weight, fmt=fmt, size=size)
+    content_type = 'image/png' if fmt == 'png' else 'application/json'
+    response = HttpResponse(data, content_type=content_type)
+    response['X-Tile-Cache'] = 'hit' if hit else 'miss'
+    return response
+
+def track_heatmap_tile(request, pk, z, x, y, fmt):
+    """Heatmap tile for one track"""
+    track = get_object_or_404(GPSTrack, pk=pk, processed=True)
+    return _tile_response([track], request, z, x, y, fmt)
+
+def heatmap_tile(request, z, x, y, fmt):
+    """Heatmap tile aggregated over ?tracks=<id>,<id>,..."""
+    ids = [i for i in request.GET.get('tracks', '').split(',') if i]
+    if not ids:
+        return JsonResponse({'error': 'Pass the tracks to aggregate as ?tracks=<id>,<id>'}, status=400)
+    try:
+        tracks = list(GPSTrack.objects.filter(id__in=ids, processed=True))
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid track id'}, status=400)
+    if len(tracks) != len(set(ids)):
+        return JsonResponse({'error': 'Track not found'}, status=404)
+    return _tile_response(tracks, request, z, x, y, fmt)
+
+def track_aggregate(request):
+    """
+    Merged per-cell grid of ?tracks=<id>,<id>: sample count, dwell and
+    mean/max/percentile speed per cell. Optional ?zoom= (coarser than the
+    stored grids), ?bbox=min_lon,min_lat,max_lon,max_lat and
+    ?percentiles=50,90
+    """
+    ids = [i for i in request.GET.get('tracks', '').split(',') if i]
+    if not ids:
+        return JsonResponse({'error': 'Pass the tracks to aggregate as ?tracks=<id>,<id>'}, status=400)
+    try:
+        tracks = list(GPSTrack.objects.filter(id__in=ids, processed=True).order_by('uploaded_at'))
+    except ValidationError:
+        return JsonResponse({'error': 'Invalid track id'}, status=400)
+    if len(tracks) != len(set(ids)):
+        return JsonResponse({'error': 'Track not found'}, status=404)
+    
+    try:
+        zoom = int(request.GET['zoom']) if 'zoom' in request.GET else None
+        percentiles = ([float(q) for q in request.GET['percentiles'].split(',') if q]
+                       if 'percentiles' in request.GET else aggregates.DEFAULT_PERCENTILES)
+        bbox = [float(v) for v in request.GET['bbox'].split(',')] if 'bbox' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'zoom, percentiles and bbox must be numbers'}, status=400)
+    if zoom is not None and not 0 <= zoom <= aggregates.grid_zoom():
+        return JsonResponse({'error': f'zoom must be between 0 and {aggregates.grid_zoom()}'}, status=400)
+    if not all(0 <= q <= 100 for q in percentiles):
+        return JsonResponse({'error': 'percentiles must be between 0 and 100'}, status=400)
+    if bbox is not None and not (len(bbox) == 4 and -90 <= bbox[1] <= bbox[3] <= 90
+                                 and -180 <= bbox[0] <= bbox[2] <= 180):
+        return JsonResponse({'error': 'bbox must be min_lon,min_lat,max_lon,max_lat in degrees'}, status=400)
+    return JsonResponse(aggregates.aggregate(tracks, zoom=zoom, bbox=bbox, percentiles=percentiles))
+
+def response_cache_stats(request):
+    """Response cache hit/miss counters for this worker process"""
+    return JsonResponse(response_cache.stats())
+
+def dedup_stats(request):
+    """CPU time and storage saved by reusing the work of identical uploads"""
+    return JsonResponse(dedup.stats())
+
+def spatial_index_stats(request):
+    """Spatial index cache hit rate and build latency for this worker process"""
+    return JsonResponse(point_index.stats())
+
+def live_stats(request):
+    """Live telemetry batches, points and subscriber deltas of this worker process"""
+    return JsonResponse(live.stats())
+
+def metrics_view(request):
+    """Prometheus metrics of this worker process"""
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def heatmap_stats(request):
+    """Tile cache hit rate and render latency for this worker process"""
+    return JsonResponse(tile_stats())
 
 def index(request):
     """Serve the React frontend"""
@@ -0,0 +1,94 @@
+"""
+Websocket endpoint of live tracks, a plain ASGI application.
+
+/ws/tracks/<id>/live/ subscribes to a live track: every batch appended to
+it, from any connection or from POST telemetry/, arrives as a JSON delta
+(see live.py). A connection may also send batches itself, as text
+messages of {"frames": [...]}; each is answered with an "ack" holding the
+points it settled. {"finish": true} ends the track.
+
+gps_tracker/asgi.py routes websocket connections here and everything else
+to Django. Database work runs in Django's sync thread.
+"""
+import asyncio
+import json
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+
+from . import live
+from .models import GPSTrack
+
+PATH = re.compile(r'^/ws/tracks/(?P<pk>[0-9a-fA-F-]{36})/live/?$')
+
+# Close codes
+NOT_FOUND = 4404
+NOT_LIVE = 4409
+
+
+@sync_to_async
+def _live_track(pk):
+    try:
+        return GPSTrack.objects.get(id=uuid.UUID(pk))
+    except (ValueError, GPSTrack.DoesNotExist):
+        return None
+
+
+@sync_to_async
+def _ingest(track, message):
+    """The reply to a text message sent by the client"""
+    try:
+        data = json.loads(message)
+        if not isinstance(data, dict):
+            raise ValueError("Messages must be JSON objects")
+        # It may have been finished through the API meanwhile
+        track.refresh_from_db(fields=['live'])
+        if not track.live:
+            raise ValueError("Track is not live")
+        if data.get('finish'):
+            live.finish_live_track(track)
+            return None
+        frames = live.parse_frames(data.get('frames'))
+        delta = live.ingest_frames(track, *frames)
+    except ValueError as e:
+        return {'type': 'error', 'error': str(e)}
+    return dict(delta, type='ack', seq=data.get('seq'))
+
+
+async def _send_deltas(subscription, send):
+    while True:
+        delta = await subscription.get()
+        await send({'type': 'websocket.send', 'text': json.dumps(delta)})
+        if delta['type'] == 'finished':
+            await send({'type': 'websocket.close', 'code': 1000})
+            return
+
+
+async def live_telemetry(scope, receive, send):
+    """ASGI application of the live track websocket"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    match = PATH.match(scope['path'])
+    track = await _live_track(match['pk']) if match else None
+    if track is None or not track.live:
+        await send({'type': 'websocket.close', 'code': NOT_FOUND if track is None else NOT_LIVE})
+        return
+    await send({'type': 'websocket.accept'})
+
+    subscription = live.subscribe(track.id)
+    sender = asyncio.ensure_future(_send_deltas(subscription, send))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] != 'websocket.receive' or message.get('text') is None:
+                continue
+            reply = await _ingest(track, message['text'])
+            if reply is not None:
+                await send({'type': 'websocket.send', 'text': json.dumps(reply)})
+    finally:
+        live.unsubscribe(subscription)
+        sender.cancel()
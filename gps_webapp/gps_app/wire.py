@@ -0,0 +1,204 @@
+"""
+Packed binary wire format for track points ("GPSB").
+
+Layout, all little-endian:
+
+    header   b'GPSB' | version u8 | flags u8 | reserved u16 | meta_len u32 | meta (UTF-8 JSON)
+    block*   count u32 | one column per field, in meta['fields'] order
+    end      count u32 = 0
+
+A plain column is `count` values of the field's dtype (meta['dtypes']).
+With FLAG_DELTA_VARINT, latitude and longitude are instead sent as
+u32 byte length + LEB128 varints of the zigzag-encoded deltas of
+round(degrees * COORD_SCALE); the first delta of every block is taken from
+0, so blocks decode independently.
+
+Points are streamed block by block, so a response never holds the whole
+track. iter_ndjson() streams the same blocks as one JSON object per line,
+for clients that want text. No Django imports.
+"""
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'GPSB'
+VERSION = 1
+FLAG_DELTA_VARINT = 0x01
+
+CONTENT_TYPE = 'application/x-gps-points'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# 1e-7 degrees is ~1 cm, finer than any GPS fix
+COORD_SCALE = 10 ** 7
+
+FIELD_DTYPES = {
+    'latitude': '<f8',
+    'longitude': '<f8',
+    'timestamp': '<f8',
+    'speed': '<f4',
+    'altitude': '<f4',
+}
+DEFAULT_FIELDS = ['latitude', 'longitude', 'timestamp', 'speed']
+VARINT_FIELDS = ('latitude', 'longitude')
+
+_HEADER = struct.Struct('<4sBBHI')
+_U32 = struct.Struct('<I')
+
+
+def zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def unzigzag(values):
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def encode_varints(values):
+    """LEB128-encode an array of uint64 into bytes, vectorized"""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= (np.uint64(1) << np.uint64(7 * k))
+
+    width = int(nbytes.max())
+    shifts = (7 * np.arange(width)).astype(np.uint64)
+    groups = ((values[:, None] >> shifts[None, :]) & np.uint64(0x7F)).astype(np.uint8)
+    position = np.arange(width)[None, :]
+    groups[position < (nbytes[:, None] - 1)] |= 0x80
+    return groups[position < nbytes[:, None]].tobytes()
+
+
+def decode_varints(data, count):
+    """Decode `count` LEB128 varints from bytes into uint64"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero((raw & 0x80) == 0)[:count]
+    if not len(ends):
+        return np.zeros(0, dtype=np.uint64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    value_index = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    position = np.arange(len(value_index)) - starts[value_index]
+    parts = (raw[:len(value_index)] & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_header(fields, meta=None, delta=False):
+    meta = dict(meta or {})
+    meta['fields'] = list(fields)
+    meta['dtypes'] = {name: FIELD_DTYPES[name] for name in fields}
+    if delta:
+        meta['coord_scale'] = COORD_SCALE
+        meta['varint_fields'] = [name for name in fields if name in VARINT_FIELDS]
+    meta_bytes = json.dumps(meta, default=str).encode()
+    flags = FLAG_DELTA_VARINT if delta else 0
+    return _HEADER.pack(MAGIC, VERSION, flags, 0, len(meta_bytes)) + meta_bytes
+
+
+def encode_block(columns, fields, delta=False):
+    """Encode one block of points; columns maps field name to array"""
+    count = len(columns[fields[0]]) if fields else 0
+    parts = [_U32.pack(count)]
+    for name in fields:
+        values = np.asarray(columns[name])
+        if delta and name in VARINT_FIELDS:
+            scaled = np.round(values.astype(np.float64) * COORD_SCALE).astype(np.int64)
+            encoded = encode_varints(zigzag(np.diff(scaled, prepend=0)))
+            parts.append(_U32.pack(len(encoded)))
+            parts.append(encoded)
+        else:
+            parts.append(np.ascontiguousarray(values, dtype=FIELD_DTYPES[name]).tobytes())
+    return b''.join(parts)
+
+
+def encode_end():
+    return _U32.pack(0)
+
+
+def iter_encoded(blocks, fields, meta=None, delta=False):
+    """Yield the header, each encoded block and the end marker"""
+    yield encode_header(fields, meta, delta)
+    for columns in blocks:
+        if len(columns[fields[0]]):
+            yield encode_block(columns, fields, delta)
+    yield encode_end()
+
+
+def decode(data):
+    """Decode a whole GPSB payload into (meta, {field: array}). Reference client."""
+    magic, version, flags, _, meta_len = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a GPSB v1 payload")
+    offset = _HEADER.size
+    meta = json.loads(data[offset:offset + meta_len])
+    offset += meta_len
+    fields = meta['fields']
+    delta = bool(flags & FLAG_DELTA_VARINT)
+    columns = {name: [] for name in fields}
+
+    while True:
+        (count,) = _U32.unpack_from(data, offset)
+        offset += 4
+        if count == 0:
+            break
+        for name in fields:
+            if delta and name in VARINT_FIELDS:
+                (length,) = _U32.unpack_from(data, offset)
+                offset += 4
+                deltas = unzigzag(decode_varints(data[offset:offset + length], count))
+                columns[name].append(np.cumsum(deltas) / meta['coord_scale'])
+                offset += length
+            else:
+                dtype = np.dtype(meta['dtypes'][name])
+                columns[name].append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+                offset += count * dtype.itemsize
+
+    return meta, {
+        name: np.concatenate(parts) if parts else np.zeros(0, dtype=meta['dtypes'][name])
+        for name, parts in columns.items()
+    }
+
+
+def iter_arrow(blocks, fields, meta=None):
+    """Yield an Arrow IPC stream of the blocks. Needs pyarrow."""
+    import io
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [pa.field(name, pa.float64() if FIELD_DTYPES[name] == '<f8' else pa.float32()) for name in fields],
+        metadata={'gps': json.dumps(meta or {}, default=str)},
+    )
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for columns in blocks:
+            if not len(columns[fields[0]]):
+                continue
+            writer.write_batch(pa.record_batch(
+                [pa.array(np.asarray(columns[name], dtype=FIELD_DTYPES[name])) for name in fields],
+                schema=schema,
+            ))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def iter_ndjson(blocks, fields):
+    """Yield each block as newline-delimited JSON objects, NaN (not recorded) as null"""
+    # repr() of a finite float is valid JSON, and much cheaper than encoding a dict per point
+    template = '{' + ','.join(f'"{name}":%s' for name in fields) + '}\n'
+    for columns in blocks:
+        values = []
+        for name in fields:
+            column = np.asarray(columns[name], dtype=np.float64)
+            text = list(map(repr, column.tolist()))
+            missing = ~np.isfinite(column)
+            if missing.any():
+                text = ['null' if m else v for v, m in zip(text, missing.tolist())]
+            values.append(text)
+        if values and values[0]:
+            yield ''.join(template % row for row in zip(*values)).encode()
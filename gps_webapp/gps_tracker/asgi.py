@@ -2,6 +2,8 @@
 ASGI config for gps_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Websocket connections go to the live telemetry endpoint (gps_app/websocket.py),
+everything else to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gps_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imports models, so only once Django is set up
+from gps_app.websocket import live_telemetry  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await live_telemetry(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -143,10 +145,122 @@ REST_FRAMEWORK = {
 }
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB
+# Multipart uploads above this spool to a temp file instead of worker memory.
+# Large logs should use the resumable /api/uploads/ protocol (gps_app/uploads.py)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB, the Django default
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB, file parts not included
 FILE_UPLOAD_TEMP_DIR = None  # Use system temp directory for large files
 
+# GPS processing
+# Distance method for speed calculation: 'vincenty', 'haversine' or 'equirectangular'
+GPS_SPEED_METHOD = 'vincenty'
+
+# Outlier filters run on the fixes of each upload, in order (gps_app/outliers.py):
+# 'stddev' (global mean/std box), 'median' (rolling median/MAD), 'gate' (speed
+# and acceleration plausibility) and 'kalman' (constant-velocity smoother, slow)
+GPS_OUTLIER_FILTERS = ['median', 'gate']
+
+# Threshold of the 'stddev' filter, in standard deviations from the mean fix
+GPS_OUTLIER_STD_MULTIPLIER = 15
+
+# Latitude and Longitude frames further apart than this (in log Timestamp
+# units, ms) aren't paired into a fix. 0 pairs only frames with equal Timestamps
+GPS_SENSOR_ALIGN_TOLERANCE_MS = 0
+
+# Keep the parsed GPS fixes of each upload under MEDIA_ROOT/gps_intermediate,
+# so re-uploads of the same file with other parameters skip the parse.
+# Identical re-uploads with the same parameters reuse the points outright
+GPS_INTERMEDIATE_CACHE = True
+
+# Where uploaded tracks are processed: 'thread' runs jobs in a thread pool inside
+# the web process, 'worker' leaves them for `python manage.py process_jobs`
+GPS_JOB_BACKEND = 'thread'
+GPS_JOB_THREADS = 2
+# Early-ingest jobs (chunked uploads with early_ingest) run for as long as their
+# upload does, so the thread backend gives them a pool of their own. A
+# process_jobs worker is busy with one until its upload is finalized
+GPS_EARLY_INGEST_THREADS = 4
+# Running jobs whose heartbeat (touched as each stage starts, and every 30s
+# while an early-ingest job waits on chunks) is older than this are taken
+# for dead (their worker was killed) and failed, so they can be retried.
+# Keep it above the longest single stage
+GPS_JOB_STALE_SECONDS = 900
+
+# Where new tracks keep their points: 'rows' (GPSPoint table) or 'columnar'
+# (.npy files under MEDIA_ROOT/gps_points, memory-mapped on read).
+# Convert existing tracks with `python manage.py convert_point_storage`
+GPS_POINT_STORAGE = 'rows'
+
+# Size cap of the rendered heatmap tile cache under MEDIA_ROOT/heatmap_tiles
+GPS_TILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Spatial indexes behind points/?bbox= and nearest/ are built on first use
+# and kept per process, with the points they index, up to this size
+GPS_SPATIAL_INDEX_MAX_BYTES = 256 * 1024 * 1024
+
+# Zoom level whose Web-Mercator pixels are the cells of the per-track
+# aggregate grids stored at ingest (16 is ~2.4 m at the equator)
+GPS_GRID_ZOOM = 16
+
+# Sectors each lap is split into, at equal distances along the first lap,
+# and the shortest lap: start/finish crossings closer together are jitter
+GPS_LAP_SECTORS = 3
+GPS_LAP_MIN_SECONDS = 20.0
+
+# Bin widths of the speed distributions stored at ingest: seconds per time
+# bin and m/s per speed bin. Changing them rebuilds each track's on first use
+GPS_DISTRIBUTION_TIME_BIN = 10.0
+GPS_DISTRIBUTION_SPEED_BIN = 2.0
+
+# Largest chunk accepted by PUT /api/uploads/<id>/chunk/
+GPS_UPLOAD_CHUNK_MAX_BYTES = 16 * 1024 * 1024
+
+# Rendered responses of processed tracks (stats, bounds, detail, points pages)
+# are cached per process up to this size. Set GPS_RESPONSE_CACHE_ALIAS to a
+# CACHES entry to also share them between gunicorn workers, e.g.
+#   CACHES = {
+#       'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+#       'gps_responses': {
+#           'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#           'LOCATION': BASE_DIR / 'cache' / 'responses',
+#           'TIMEOUT': 7 * 24 * 3600,
+#       },
+#   }
+#   GPS_RESPONSE_CACHE_ALIAS = 'gps_responses'
+GPS_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+GPS_RESPONSE_CACHE_ALIAS = None
+
+# Put SQLite in WAL mode with synchronous=NORMAL on every connection, so bulk
+# point inserts (gps_app/bulkload.py) aren't bound by fsync
+GPS_SQLITE_WAL = True
+
+# Profile every processing job with cProfile (uploads can also ask for it with
+# profile=true), dumping MEDIA_ROOT/gps_profiles/<job id>.prof
+GPS_PROFILE_JOBS = False
+
+# Trace allocations with tracemalloc, so each pipeline stage records its peak
+# memory (ProcessingJob.stage_stats). Slows processing down noticeably
+GPS_TRACE_MEMORY = False
+
+# gps_app logs one JSON object per line; each pipeline stage's measurements
+# are in its record's "stage" field, see gps_app/instrumentation.py. The level
+# comes from the GPS_LOG_LEVEL environment variable: INFO by default, WARNING
+# under `manage.py test`, which would otherwise print every stage of every job
+GPS_LOG_LEVEL = os.environ.get('GPS_LOG_LEVEL') or ('WARNING' if sys.argv[1:2] == ['test'] else 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'gps_app.instrumentation.JSONFormatter'},
+    },
+    'handlers': {
+        'gps_console': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'gps_app': {'handlers': ['gps_console'], 'level': GPS_LOG_LEVEL, 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 